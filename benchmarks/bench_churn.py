@@ -0,0 +1,314 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+"""
+Connection churn and memory benchmarks.  Measures:
+
+``tcp/connect`` and ``tcp/accept``
+  The rate at which TCP tendrils can be connected and accepted when
+  each connection is closed right after it is established.
+
+``tcp/idle``
+  The resident memory used by each idle TCP connection.  Both ends of
+  every connection live in this process, so the figure covers a
+  client tendril and a server tendril together.
+
+``udp/pseudo``
+  The rate at which UDP pseudo-tendrils can be created and closed,
+  and the resident memory used by each.
+
+``track``
+  The cost of ``TendrilManager._track_tendril()`` and
+  ``_untrack_tendril()`` alone.
+
+Usage::
+
+    python -m benchmarks.bench_churn --output churn.json
+"""
+
+from __future__ import print_function
+
+import gc
+import sys
+import time
+
+import gevent
+
+import tendril
+from tendril import udp
+
+from benchmarks import common
+
+
+# Fields compared against a baseline; True if larger is better
+FIELDS = {
+    'per_s': True,
+    'close_per_s': True,
+    'rss_per_tendril': False,
+}
+
+
+class Sink(tendril.Application):
+    """
+    Discard all received frames.
+    """
+
+    def recv_frame(self, frame):
+        pass
+
+
+def _wait_for(predicate, timeout=30.0):
+    """
+    Yield to other greenlets until the predicate is true or the
+    timeout expires.
+    """
+
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        gevent.sleep(0.01)
+
+
+def _address(index):
+    """
+    Construct a distinct loopback address for the given index.
+    """
+
+    return ('127.0.%d.%d' % (index // 65535 // 254 % 256,
+                             1 + index // 65535 % 254),
+            1 + index % 65535)
+
+
+def _rss():
+    """Collect garbage and return the resident set size."""
+
+    gc.collect()
+    return common.rss()
+
+
+def bench_tcp_churn(args):
+    """
+    Benchmark connecting, accepting and closing TCP tendrils.
+    Returns the results for the connecting and accepting sides.
+    """
+
+    server = tendril.get_manager('tcp', ('127.0.0.1', 0))
+    server.start(Sink)
+    target = server.local_addr
+    client = tendril.get_manager('tcp')
+    client.start()
+
+    count = max(args.churn // args.concurrency, 1)
+
+    def worker():
+        for _i in range(count):
+            client.connect(target, Sink).close()
+
+    try:
+        base_accepts = server.stats.accepts
+        start = time.time()
+
+        gevent.joinall([gevent.spawn(worker)
+                        for _i in range(args.concurrency)])
+        connect_elapsed = time.time() - start
+
+        total = count * args.concurrency
+        _wait_for(lambda: server.stats.accepts - base_accepts >= total)
+        accept_elapsed = time.time() - start
+        accepts = server.stats.accepts - base_accepts
+    finally:
+        client.shutdown()
+        server.shutdown()
+
+    return {
+        'tendrils': total,
+        'seconds': connect_elapsed,
+        'per_s': common.rate(total, connect_elapsed),
+    }, {
+        'tendrils': accepts,
+        'seconds': accept_elapsed,
+        'per_s': common.rate(accepts, accept_elapsed),
+    }
+
+
+def bench_tcp_idle(args):
+    """
+    Benchmark the memory used by idle TCP tendrils, and the rate at
+    which they can be closed.  Returns the results.
+    """
+
+    server = tendril.get_manager('tcp', ('127.0.0.1', 0))
+    server.start(Sink)
+    target = server.local_addr
+    client = tendril.get_manager('tcp')
+    client.start()
+
+    # Each connection uses a descriptor at either end
+    count = min(args.idle, (common.raise_fd_limit() - 64) // 2)
+
+    try:
+        base_rss = _rss()
+        start = time.time()
+
+        tends = [client.connect(target, Sink) for _i in range(count)]
+        _wait_for(lambda: len(server.tendrils) >= count)
+        elapsed = time.time() - start
+
+        idle_rss = _rss()
+
+        start = time.time()
+        for tend in tends:
+            tend.close()
+        _wait_for(lambda: not server.tendrils)
+        close_elapsed = time.time() - start
+    finally:
+        client.shutdown()
+        server.shutdown()
+
+    return {
+        'tendrils': count,
+        'seconds': elapsed,
+        'per_s': common.rate(count, elapsed),
+        'close_per_s': common.rate(count, close_elapsed),
+        'rss_per_tendril': (idle_rss - base_rss) // count,
+    }
+
+
+def bench_udp_pseudo(args):
+    """
+    Benchmark creating and closing UDP pseudo-tendrils, and the memory
+    they use.  Returns the results.
+    """
+
+    manager = tendril.get_manager('udp', ('127.0.0.1', 0))
+    manager.start()
+    manager.local_addr  # Wait for the socket to be bound
+
+    count = args.pseudo
+
+    try:
+        base_rss = _rss()
+        start = time.time()
+
+        tends = [manager.connect(_address(i), Sink)
+                 for i in range(count)]
+        elapsed = time.time() - start
+
+        idle_rss = _rss()
+
+        start = time.time()
+        for tend in tends:
+            tend.close()
+        close_elapsed = time.time() - start
+    finally:
+        manager.shutdown()
+
+    return {
+        'tendrils': count,
+        'seconds': elapsed,
+        'per_s': common.rate(count, elapsed),
+        'close_per_s': common.rate(count, close_elapsed),
+        'rss_per_tendril': (idle_rss - base_rss) // count,
+    }
+
+
+def bench_track(args):
+    """
+    Benchmark tracking and untracking tendrils.  Returns the results.
+    """
+
+    manager = tendril.get_manager('udp', ('127.0.0.1', 0))
+    tends = [udp.UDPTendril(manager, ('127.0.0.1', 0), _address(i))
+             for i in range(args.pseudo)]
+
+    start = time.time()
+    for tend in tends:
+        manager._track_tendril(tend)
+    elapsed = time.time() - start
+
+    start = time.time()
+    for tend in tends:
+        manager._untrack_tendril(tend)
+    close_elapsed = time.time() - start
+
+    return {
+        'tendrils': len(tends),
+        'seconds': elapsed,
+        'per_s': common.rate(len(tends), elapsed),
+        'close_per_s': common.rate(len(tends), close_elapsed),
+    }
+
+
+def run(args):
+    """
+    Run all the churn benchmarks.  Returns the results.
+    """
+
+    results = {}
+
+    results['tcp/connect'], results['tcp/accept'] = bench_tcp_churn(args)
+    report('tcp/connect', results['tcp/connect'])
+    report('tcp/accept', results['tcp/accept'])
+
+    results['tcp/idle'] = bench_tcp_idle(args)
+    report('tcp/idle', results['tcp/idle'])
+
+    results['udp/pseudo'] = bench_udp_pseudo(args)
+    report('udp/pseudo', results['udp/pseudo'])
+
+    results['track'] = bench_track(args)
+    report('track', results['track'])
+
+    return results
+
+
+def report(key, result):
+    """Print a single result."""
+
+    line = ("%-12s %8d tendrils %10.0f/s" %
+            (key, result['tendrils'], result['per_s']))
+    if 'close_per_s' in result:
+        line += "  close %10.0f/s" % result['close_per_s']
+    if 'rss_per_tendril' in result:
+        line += "  %8d B RSS/tendril" % result['rss_per_tendril']
+
+    print(line)
+    sys.stdout.flush()
+
+
+def main():
+    parser = common.get_parser("Benchmark tendril churn and memory use.")
+    parser.add_argument('--churn', type=int, default=10000,
+                        help="The number of TCP connections to open and "
+                        "close.  Default: %(default)s")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="The number of greenlets opening TCP "
+                        "connections concurrently.  Default: %(default)s")
+    parser.add_argument('--idle', type=int, default=5000,
+                        help="The number of idle TCP connections to hold "
+                        "open; limited by the open file limit.  "
+                        "Default: %(default)s")
+    parser.add_argument('--pseudo', type=int, default=50000,
+                        help="The number of UDP pseudo-tendrils to "
+                        "create.  Default: %(default)s")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    return common.finish(args, 'churn', results, FIELDS)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+"""
+Throughput and allocation benchmarks for the built-in framers.  For
+each framer, measures ``streamify()`` over a range of frame sizes, and
+``frameify()`` over a range of frame sizes and read chunk sizes.
+Allocation peaks are traced with ``tracemalloc`` where it is
+available; on Python 2, the peak growth of the resident set size is
+reported instead, on Linux.  Baselines should therefore be compared
+only with results from the same Python.
+
+Usage::
+
+    python -m benchmarks.bench_framers --output framers.json
+    python -m benchmarks.bench_framers --baseline framers.json
+"""
+
+from __future__ import print_function
+
+import random
+import sys
+
+from tendril import framers
+
+from benchmarks import common
+
+
+FRAME_SIZES = (16, 512, 8192)
+CHUNK_SIZES = (1, 1500, 65536)
+
+# Target amount of stream data for each frameify pass; single-byte
+# reads are much slower, so they get a smaller stream
+STREAM_LEN = 256 * 1024
+STREAM_LEN_SMALL = 16 * 1024
+
+# Fields compared against a baseline; True if larger is better
+FIELDS = {
+    'mb_per_s': True,
+    'frames_per_s': True,
+    'alloc_peak': False,
+}
+
+# Without tracemalloc, allocation peaks are measured from the resident
+# set size, which varies by a few pages from run to run as freed
+# memory is reused
+SLACK = {} if common.tracemalloc else {
+    'alloc_peak': 256 * 1024,
+}
+
+
+def _text_payload(rand, size):
+    """Generate a payload suitable for line-oriented framers."""
+
+    return ''.join(chr(rand.randint(32, 126)) for _i in range(size))
+
+
+def _binary_payload(rand, size):
+    """
+    Generate a binary payload, including bytes significant to the
+    stuffing framers.
+    """
+
+    return ''.join(rand.choice(('\0', '\xff', chr(rand.randint(0, 255))))
+                   for _i in range(size))
+
+
+# Each entry: name, framer factory, payload generator
+FRAMERS = [
+    ('identity', framers.IdentityFramer, _binary_payload),
+    ('chunk', lambda: framers.ChunkFramer(sys.maxsize), _binary_payload),
+    ('line', framers.LineFramer, _text_payload),
+    ('line_nocr', lambda: framers.LineFramer(False), _text_payload),
+    ('struct', lambda: framers.StructFramer('!I'), _binary_payload),
+    ('stuffing', framers.StuffingFramer, _binary_payload),
+    ('cobs', framers.COBSFramer, _binary_payload),
+    ('cobs_zpe', lambda: framers.COBSFramer(True), _binary_payload),
+]
+
+
+def _new_state(framer):
+    """Set up a fresh framer state for the framer."""
+
+    state = framers.FrameState()
+    state._reset(framer)
+    return state
+
+
+def bench_streamify(factory, frames, min_time):
+    """
+    Benchmark ``streamify()``.  Returns the measurements.
+    """
+
+    framer = factory()
+    state = _new_state(framer)
+    nbytes = sum(len(framer.streamify(state, f)) for f in frames)
+
+    def run():
+        for frame in frames:
+            framer.streamify(state, frame)
+        return len(frames)
+
+    count, elapsed = common.timed(run, min_time)
+    passes = count // len(frames)
+
+    return {
+        'frames': count,
+        'bytes': nbytes * passes,
+        'seconds': elapsed,
+        'frames_per_s': common.rate(count, elapsed),
+        'mb_per_s': common.rate(nbytes * passes / 1e6, elapsed),
+        'alloc_peak': common.traced(run),
+    }
+
+
+def bench_frameify(factory, stream, chunk_size, min_time):
+    """
+    Benchmark ``frameify()``, feeding the stream in chunks of the
+    given size.  Returns the measurements.
+    """
+
+    chunks = [stream[i:i + chunk_size]
+              for i in range(0, len(stream), chunk_size)]
+
+    def run():
+        framer = factory()
+        state = _new_state(framer)
+        count = 0
+        for chunk in chunks:
+            for _frame in framer.frameify(state, chunk):
+                count += 1
+        return count
+
+    # Work out how many frames one pass yields
+    per_pass = run() or 1
+
+    count, elapsed = common.timed(run, min_time)
+    passes = max(count // per_pass, 1)
+
+    return {
+        'frames': count,
+        'bytes': len(stream) * passes,
+        'seconds': elapsed,
+        'frames_per_s': common.rate(count, elapsed),
+        'mb_per_s': common.rate(len(stream) * passes / 1e6, elapsed),
+        'alloc_peak': common.traced(run),
+    }
+
+
+def run(args):
+    """
+    Run all the framer benchmarks.  Returns the results.
+    """
+
+    rand = random.Random(42)
+    results = {}
+
+    for name, factory, payload in FRAMERS:
+        for frame_size in args.frame_sizes:
+            # Build the frames and the corresponding stream
+            target = max(STREAM_LEN // frame_size, 1)
+            frames = [payload(rand, frame_size)
+                      for _i in range(min(target, 64))]
+            framer = factory()
+            state = _new_state(framer)
+            encoded = ''.join(framer.streamify(state, f) for f in frames)
+            stream = encoded * max(STREAM_LEN // len(encoded), 1)
+
+            key = '%s/streamify/%d' % (name, frame_size)
+            results[key] = bench_streamify(factory, frames, args.min_time)
+            report(key, results[key])
+
+            for chunk_size in args.chunk_sizes:
+                data = stream
+                if chunk_size < 64:
+                    data = stream[:max(STREAM_LEN_SMALL, len(encoded))]
+
+                key = '%s/frameify/%d/%d' % (name, frame_size, chunk_size)
+                results[key] = bench_frameify(factory, data, chunk_size,
+                                              args.min_time)
+                report(key, results[key])
+
+    return results
+
+
+def report(key, result):
+    """Print a single result."""
+
+    alloc = result['alloc_peak']
+    print("%-32s %10.2f MB/s %12.0f frames/s %12s" %
+          (key, result['mb_per_s'], result['frames_per_s'],
+           '-' if alloc is None else '%d B peak' % alloc))
+    sys.stdout.flush()
+
+
+def main():
+    parser = common.get_parser("Benchmark the Tendril framers.")
+    parser.add_argument('--frame-size', dest='frame_sizes', type=int,
+                        action='append',
+                        help="A frame size to benchmark.  May be given "
+                        "multiple times.  Default: %s" %
+                        ', '.join(str(s) for s in FRAME_SIZES))
+    parser.add_argument('--chunk-size', dest='chunk_sizes', type=int,
+                        action='append',
+                        help="A read chunk size to benchmark.  May be "
+                        "given multiple times.  Default: %s" %
+                        ', '.join(str(s) for s in CHUNK_SIZES))
+    args = parser.parse_args()
+    args.frame_sizes = args.frame_sizes or FRAME_SIZES
+    args.chunk_sizes = args.chunk_sizes or CHUNK_SIZES
+
+    results = run(args)
+
+    return common.finish(args, 'framers', results, FIELDS, SLACK)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+"""
+End-to-end loopback benchmark for the TCP and UDP tendril managers.
+Starts an echo server and a number of client tendrils on localhost,
+then has each client send a fixed number of request frames, keeping a
+configurable number outstanding, and waits for all the echoed
+responses.  Reports throughput, request/response latency percentiles,
+and processor time per message.  Since the clients and the server run
+in the same process, the processor time covers both ends.
+
+Usage::
+
+    python -m benchmarks.bench_loopback --output loopback.json
+    python -m benchmarks.bench_loopback --proto tcp --concurrency 64
+"""
+
+from __future__ import print_function
+
+import collections
+import sys
+import time
+
+import gevent
+from gevent import event
+
+import tendril
+from tendril import stats
+
+from benchmarks import common
+
+
+PROTOS = ('tcp', 'udp')
+FRAME_SIZES = (64, 1024, 8192)
+CONCURRENCY = (1, 16, 64)
+
+FRAMERS = {
+    'line': tendril.LineFramer,
+    'struct': lambda: tendril.StructFramer('!I'),
+    'cobs': tendril.COBSFramer,
+}
+
+# Fields compared against a baseline; True if larger is better
+FIELDS = {
+    'msgs_per_s': True,
+    'mb_per_s': True,
+    'p50': False,
+    'p99': False,
+    'cpu_us_per_msg': False,
+}
+
+
+class EchoServer(tendril.Application):
+    """
+    Echo every received frame back to the sender.
+    """
+
+    def recv_frame(self, frame):
+        self.send_frame(frame)
+
+
+class LoadClient(tendril.Application):
+    """
+    Send a fixed number of requests, keeping up to ``depth`` of them
+    outstanding, and record the latency of each response.
+    """
+
+    def __init__(self, parent, payload, count, depth, hist):
+        super(LoadClient, self).__init__(parent)
+
+        self.payload = payload
+        self.count = count
+        self.depth = depth
+        self.hist = hist
+
+        self.sent = 0
+        self.received = 0
+        self.last = None
+        self.times = collections.deque()
+        self.done = event.Event()
+
+    def start(self):
+        """Send the initial window of requests."""
+
+        for _i in range(min(self.depth, self.count)):
+            self._send()
+
+    def _send(self):
+        self.times.append(time.time())
+        self.sent += 1
+        self.send_frame(self.payload)
+
+    def recv_frame(self, frame):
+        self.last = time.time()
+        self.hist.record(self.last - self.times.popleft())
+        self.received += 1
+
+        if self.sent < self.count:
+            self._send()
+        elif self.received >= self.count:
+            self.done.set()
+
+
+def server_acceptor(tend, framer):
+    tend.framers = framer()
+    return EchoServer(tend)
+
+
+def client_acceptor(tend, framer, *args):
+    tend.framers = framer()
+    return LoadClient(tend, *args)
+
+
+def _get_manager(proto, endpoint):
+    """
+    Get a manager, raising the receive buffer size for datagram
+    protocols so large frames are not truncated.
+    """
+
+    manager = tendril.get_manager(proto, endpoint)
+    if proto == 'udp':
+        manager.recv_bufsize = 65536
+    return manager
+
+
+def run_case(proto, framer, frame_size, concurrency, args):
+    """
+    Run one benchmark case.  Returns the measurements.
+    """
+
+    hist = stats.LatencyHistogram()
+    payload = 'x' * frame_size
+    count = max(args.messages // concurrency, 1)
+
+    # Start the server
+    server = _get_manager(proto, ('127.0.0.1', 0))
+    server.start(tendril.TendrilPartial(server_acceptor, framer))
+    target = server.local_addr
+
+    # Start the clients; datagram tendrils are keyed by address, so
+    # each datagram client needs its own manager
+    managers = []
+    clients = []
+    try:
+        for _i in range(concurrency):
+            if proto == 'udp':
+                endpoint = ('127.0.0.1', common.free_port())
+                managers.append(_get_manager(proto, endpoint))
+                managers[-1].start()
+            elif not managers:
+                managers.append(_get_manager(proto, None))
+                managers[-1].start()
+
+            acceptor = tendril.TendrilPartial(client_acceptor, framer,
+                                              payload, count, args.depth,
+                                              hist)
+            tend = managers[-1].connect(target, acceptor)
+            clients.append(tend.application)
+
+        # Let the connections settle
+        gevent.sleep(0.1)
+
+        cpu_start = common.cpu_time()
+        start = time.time()
+
+        for cli in clients:
+            cli.start()
+
+        # Wait for the clients to finish; give up if no responses
+        # arrive for a while, since lost datagrams stall their clients
+        deadline = start + args.timeout
+        progress = -1
+        while time.time() < deadline:
+            pending = [cli for cli in clients if not cli.done.is_set()]
+            total = sum(cli.received for cli in clients)
+            if not pending or total == progress:
+                break
+
+            progress = total
+            pending[0].done.wait(min(args.stall, deadline - time.time()))
+
+        cpu = common.cpu_time() - cpu_start
+        elapsed = max(cli.last or start for cli in clients) - start
+    finally:
+        server.shutdown()
+        for manager in managers:
+            manager.shutdown()
+
+    received = sum(cli.received for cli in clients)
+    sent = sum(cli.sent for cli in clients)
+
+    return {
+        'messages': received,
+        'lost': sent - received,
+        'seconds': elapsed,
+        'msgs_per_s': common.rate(received, elapsed),
+        # Payload bytes, counting both requests and responses
+        'mb_per_s': common.rate(received * frame_size * 2 / 1e6, elapsed),
+        'cpu_us_per_msg': cpu * 1e6 / received if received else None,
+        'p50': hist.percentile(50),
+        'p90': hist.percentile(90),
+        'p99': hist.percentile(99),
+        'p999': hist.percentile(99.9),
+    }
+
+
+def run(args):
+    """
+    Run all the loopback benchmarks.  Returns the results.
+    """
+
+    results = {}
+
+    for proto in args.protos:
+        for name in args.framers:
+            for frame_size in args.frame_sizes:
+                for concurrency in args.concurrency:
+                    key = '%s/%s/%d/%d' % (proto, name, frame_size,
+                                           concurrency)
+                    results[key] = run_case(proto, FRAMERS[name],
+                                            frame_size, concurrency, args)
+                    report(key, results[key])
+
+    return results
+
+
+def _usecs(value):
+    """Format a time given in seconds as microseconds."""
+
+    return '-' if value is None else '%.0fus' % (value * 1e6)
+
+
+def report(key, result):
+    """Print a single result."""
+
+    print("%-24s %9.0f msg/s %8.2f MB/s p50 %8s p99 %8s %8s cpu/msg "
+          "%d lost" %
+          (key, result['msgs_per_s'], result['mb_per_s'],
+           _usecs(result['p50']), _usecs(result['p99']),
+           '-' if result['cpu_us_per_msg'] is None else
+           '%.1fus' % result['cpu_us_per_msg'],
+           result['lost']))
+    sys.stdout.flush()
+
+
+def main():
+    parser = common.get_parser("Benchmark the Tendril managers over "
+                               "loopback.")
+    parser.add_argument('--proto', dest='protos', action='append',
+                        choices=PROTOS,
+                        help="A protocol to benchmark.  May be given "
+                        "multiple times.  Default: all")
+    parser.add_argument('--framer', dest='framers', action='append',
+                        choices=sorted(FRAMERS),
+                        help="A framer to benchmark.  May be given "
+                        "multiple times.  Default: all")
+    parser.add_argument('--frame-size', dest='frame_sizes', type=int,
+                        action='append',
+                        help="A frame size to benchmark.  May be given "
+                        "multiple times.  Default: %s" %
+                        ', '.join(str(s) for s in FRAME_SIZES))
+    parser.add_argument('--concurrency', type=int, action='append',
+                        help="A number of concurrent clients to "
+                        "benchmark.  May be given multiple times.  "
+                        "Default: %s" %
+                        ', '.join(str(c) for c in CONCURRENCY))
+    parser.add_argument('--messages', '-n', type=int, default=20000,
+                        help="The total number of requests to send in "
+                        "each case.  Default: %(default)s")
+    parser.add_argument('--depth', '-d', type=int, default=1,
+                        help="The number of requests each client keeps "
+                        "outstanding.  Default: %(default)s")
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help="The maximum time to wait for the responses "
+                        "in each case.  Default: %(default)s")
+    parser.add_argument('--stall', type=float, default=1.0,
+                        help="The time without any responses after which "
+                        "the remaining requests are considered lost.  "
+                        "Default: %(default)s")
+    args = parser.parse_args()
+    args.protos = args.protos or PROTOS
+    args.framers = args.framers or sorted(FRAMERS)
+    args.frame_sizes = args.frame_sizes or FRAME_SIZES
+    args.concurrency = args.concurrency or CONCURRENCY
+
+    results = run(args)
+
+    return common.finish(args, 'loopback', results, FIELDS)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
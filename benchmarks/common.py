@@ -0,0 +1,321 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+"""
+Support code shared by the Tendril benchmarks.  Each benchmark
+produces a dictionary of results, keyed by a string identifying the
+benchmark case; each result is itself a dictionary of measurements.
+Results may be written to a JSON file, which may later be used as a
+baseline for detecting regressions.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import socket
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # Allocation tracing is only available on newer Pythons
+    tracemalloc = None
+
+try:
+    import ctypes
+    import ctypes.util
+
+    # Used to return free memory to the system before measuring the
+    # peak resident set size; only glibc provides malloc_trim()
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'))
+    _libc.malloc_trim
+except (ImportError, OSError, AttributeError):
+    _libc = None
+
+
+def timed(func, min_time=0.5):
+    """
+    Repeatedly call a function until at least ``min_time`` seconds
+    have elapsed.  The function must return the number of operations
+    it performed.  Returns a tuple of the total number of operations
+    and the elapsed time.
+    """
+
+    ops = 0
+    start = time.time()
+    while True:
+        ops += func()
+        elapsed = time.time() - start
+        if elapsed >= min_time:
+            return ops, elapsed
+
+
+def traced(func):
+    """
+    Call a function once, measuring the memory it allocates.  Returns
+    the peak amount of memory, in bytes, allocated while the function
+    ran, as traced by ``tracemalloc``.  Where ``tracemalloc`` is not
+    available, as on Python 2, returns instead the peak growth of the
+    resident set size while the function ran, which is measured in
+    whole pages, and only on Linux; elsewhere, returns ``None``.  The
+    function is then called several times, and the smallest growth
+    is returned, since stray pages only ever add to it.
+    """
+
+    if not tracemalloc:
+        growth = _peak_rss_growth(func)
+        if growth is None:
+            return None
+        return min([growth] + [_peak_rss_growth(func) for _i in range(2)])
+
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def _proc_status(field):
+    """
+    Return a memory size, in bytes, from ``/proc/self/status``, or
+    ``None`` if it is not available.
+    """
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                name, _sep, value = line.partition(':')
+                if name == field:
+                    return int(value.split()[0]) * 1024
+    except (IOError, OSError):
+        pass
+
+    return None
+
+
+def _peak_rss_growth(func):
+    """
+    Call a function once, returning the growth of the peak resident
+    set size (``VmHWM``) while it ran, in bytes.  Free memory is
+    returned to the system first, where the C library allows it, so
+    that the function's allocations must fault pages in; and the peak
+    is reset through ``/proc/self/clear_refs``.  Returns ``None`` if
+    the peak cannot be reset.
+    """
+
+    # Start from a clean slate
+    gc.collect()
+    if _libc is not None:
+        _libc.malloc_trim(0)
+
+    # Reset the peak to the current resident set size
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except (IOError, OSError):
+        return None
+
+    base = _proc_status('VmHWM')
+    if base is None:
+        return None
+
+    func()
+
+    return max(_proc_status('VmHWM') - base, 0)
+
+
+def cpu_time():
+    """
+    Return the processor time, user and system, consumed by this
+    process so far, in seconds.
+    """
+
+    times = os.times()
+    return times[0] + times[1]
+
+
+def rss():
+    """
+    Return the resident set size of this process, in bytes.  Falls
+    back to the peak resident set size where the current size is not
+    available.
+    """
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        pass
+
+    # ru_maxrss is in kilobytes on Linux, but bytes on Mac OS X
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def raise_fd_limit():
+    """
+    Raise the soft limit on open files to the hard limit.  Returns the
+    new limit.
+    """
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        soft = hard
+
+    return soft
+
+
+def free_port(host='127.0.0.1', kind=None):
+    """
+    Find a currently unused port on the given host.  Used to give
+    several managers distinct endpoints.
+    """
+
+    sock = socket.socket(socket.AF_INET, kind or socket.SOCK_DGRAM)
+    try:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def rate(count, elapsed):
+    """
+    Compute a per-second rate, avoiding division by zero.
+    """
+
+    return count / elapsed if elapsed > 0 else 0.0
+
+
+def compare(results, baseline, fields, tolerance, slack=None):
+    """
+    Compare benchmark results against a baseline.  Returns a list of
+    ``(key, field, baseline_value, value)`` tuples describing the
+    measurements which regressed by more than the tolerance.
+
+    :param results: The benchmark results.
+    :param baseline: The baseline results.
+    :param fields: A dictionary mapping the names of fields to
+                   compare to ``True`` if larger values are better
+                   or ``False`` if smaller values are better.
+    :param tolerance: The permissible fractional regression.
+    :param slack: An optional dictionary mapping the names of fields
+                  to an absolute regression which is always
+                  permissible, for measurements too coarse for the
+                  tolerance alone.
+    """
+
+    slack = slack or {}
+
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+
+        for field, larger_better in sorted(fields.items()):
+            value = result.get(field)
+            base_value = base.get(field)
+            if value is None or not base_value:
+                continue
+
+            allowed = max(abs(base_value) * tolerance,
+                          slack.get(field, 0))
+            if larger_better:
+                regressed = value < base_value - allowed
+            else:
+                regressed = value > base_value + allowed
+
+            if regressed:
+                regressions.append((key, field, base_value, value))
+
+    return regressions
+
+
+def get_parser(description):
+    """
+    Construct an argument parser containing the arguments common to
+    all benchmarks.
+    """
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output', '-o',
+                        help="Write the results as JSON to this file.")
+    parser.add_argument('--baseline', '-b',
+                        help="Compare the results against the JSON "
+                        "baseline in this file, exiting with a non-zero "
+                        "status if any measurement regressed.")
+    parser.add_argument('--tolerance', '-t', type=float, default=0.1,
+                        help="The permissible fractional regression when "
+                        "comparing against a baseline.  Default: "
+                        "%(default)s")
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help="The minimum time, in seconds, to spend on "
+                        "each timed measurement.  Default: %(default)s")
+
+    return parser
+
+
+def finish(args, name, results, fields, slack=None):
+    """
+    Write out the results of a benchmark run and compare them against
+    a baseline, as requested by the command line arguments.  Returns
+    the exit status for the benchmark.
+
+    :param args: The parsed command line arguments.
+    :param name: The name of the benchmark.
+    :param results: The benchmark results.
+    :param fields: A dictionary mapping the names of fields to
+                   compare to ``True`` if larger values are better
+                   or ``False`` if smaller values are better.
+    :param slack: An optional dictionary mapping the names of fields
+                  to an absolute regression which is always
+                  permissible.  See ``compare()``.
+    """
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'benchmark': name,
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline.get('results', {}), fields,
+                          args.tolerance, slack)
+    for key, field, base_value, value in regressions:
+        print("REGRESSION %s %s: %.6g -> %.6g" %
+              (key, field, base_value, value), file=sys.stderr)
+
+    return 1 if regressions else 0
@@ -50,10 +50,21 @@ setup(
     packages=['tendril'],
     install_requires=readreq('requirements.txt'),
     tests_require=readreq('test-requirements.txt'),
+    extras_require={
+        # Only needed on platforms lacking socket.inet_pton()
+        'netaddr': ['netaddr'],
+        # Only needed on Python 2, for zero-copy TCPTendril.send_file()
+        'sendfile': ['pysendfile'],
+        },
     entry_points={
         'tendril.manager': [
+            'memory = tendril.memory:MemoryTendrilManager',
+            'shm = tendril.shm:ShmTendrilManager',
             'tcp = tendril.tcp:TCPTendrilManager',
             'udp = tendril.udp:UDPTendrilManager',
+            'unix = tendril.unix:UnixStreamTendrilManager',
+            'unixdgram = tendril.unix:UnixDgramTendrilManager',
+            'unixseqpacket = tendril.unix:UnixSeqpacketTendrilManager',
             ],
         },
     )
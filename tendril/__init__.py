@@ -118,15 +118,21 @@ Extensibility
 -------------
 
 Careful readers may have noticed the use of the terms, "such as TCP"
-and "such as UDP."  Although Tendril only has built-in support for TCP
-and UDP connections, it is possible to extend Tendril to support other
-protocols.  All that is required is to create subclasses of
-``Tendril`` (representing an individual connection) and of
-``TendrilManager`` (which accepts and creates connections and manages
-any necessary socket data flows), and to register the
-``TendrilManager`` subclasses as ``pkg_resources`` entry points under
-the ``tendril.manager`` namespace.  See the ``setup.py`` for Tendril
-for an example of how this may be done.
+and "such as UDP."  Although Tendril only has built-in support for
+TCP, UDP, and UNIX domain connections (the ``unix``, ``unixdgram``,
+and ``unixseqpacket`` protocols, for stream, datagram, and sequenced
+packet sockets, whose endpoints are socket file names), it is possible
+to extend Tendril to support other protocols.  All that is required
+is to create subclasses of ``Tendril`` (representing an individual
+connection) and of ``TendrilManager`` (which accepts and creates
+connections and manages any necessary socket data flows), and to
+register the ``TendrilManager`` subclasses as ``pkg_resources`` entry
+points under the ``tendril.manager`` namespace.  See the ``setup.py``
+for Tendril for an example of how this may be done.  Alternatively, a
+``TendrilManager`` subclass may be registered directly by calling
+``register_manager()`` with the protocol name and the class; this
+avoids scanning the entry points, which can noticeably slow the
+startup of short-lived programs.
 
 In addition to allowing Tendril to support protocols other than TCP
 and UDP, it is also possible to implement new framers by subclassing
@@ -182,7 +188,24 @@ no arguments, then call the ``connect()`` method of the manager.  This
 method takes the *target* of the connection (i.e., the IP address and
 port number, as a tuple) and the *acceptor*.  (It also has an optional
 *wrapper*, which will be called with the outgoing socket just prior to
-initiating the connection.)
+initiating the connection.)  The TCP manager's ``connect()`` also
+accepts a *timeout*, and its ``connect_any()`` method races
+connections to several candidate targets, returning the first to
+succeed.  To initiate a connection without waiting for it, use the
+``connect_async()`` method, which returns a ``gevent.event.AsyncResult``.
+
+To stop a manager, call its ``shutdown()`` method, which immediately
+closes all its connections.  Alternatively, the ``drain()`` method
+stops accepting new connections and gives the existing ones time to
+send any buffered data before closing them; it returns a description
+of any data which had to be dropped.
+
+To send the same frame to many connections, use the manager's
+``broadcast()`` method, which sends a frame to all the manager's
+tendrils, or to a given subset of them.  For tendrils whose send
+framers produce output independent of framer state (``stateless_send``
+is True for all the framers provided by Tendril), the frame is
+converted to stream data only once per framer.
 
 Acceptors
 ---------
@@ -222,6 +245,18 @@ with ``TendrilPartial``, the ``ssl.wrap_socket()`` call can be used as
 a socket wrapper directly, enabling an SSL connection to be set up
 easily.
 
+However, ``ssl.wrap_socket()`` creates a new SSL context--loading the
+certificates again--for every connection it wraps.  Tendril's
+``TLSWrapper`` instead wraps every socket using a single
+``gevent.ssl.SSLContext``, which also retains the session cache
+needed to resume sessions.  For outgoing connections, it performs the
+handshake itself, recording how long each took in its
+``handshake_time`` histogram; the server's host name may be passed to
+the wrapper for each connection (e.g., using ``TendrilPartial``), so
+that connections to different servers share the context.  Its
+``stats`` attribute counts handshakes, failed handshakes, and session
+cache hits and misses.
+
 Of course, it may be necessary to perform multiple "wrapping"
 activities on a connection, such as setting socket options followed by
 wrapping the socket in an SSL connection.  For this case, Tendril
@@ -230,14 +265,133 @@ that ``TendrilPartial`` is, but additional wrappers can be added by
 calling the ``chain()`` method; when called, the ``WrapperChain``
 object will call each wrapper in the order defined, returning the
 final wrapped socket in the end.
+
+Sending Files
+-------------
+
+Stream tendrils provide a ``send_file()`` method, which sends the
+contents of an open file--optionally starting at a given *offset* and
+limited to a given *count* of bytes--in order with any frames sent
+before or after it.  The file data is not framed; applications using
+it will generally switch to a suitable framer, such as
+``ChunkFramer``, while the file is in flight.  On plain TCP and UNIX
+stream sockets, the file is sent using the ``sendfile()`` system call,
+so its contents are never copied into the process; on Python 2, this
+requires the optional ``pysendfile`` package.  Otherwise, the file is
+read and sent in blocks of ``file_bufsize`` bytes.
+
+Write Coalescing
+----------------
+
+By default, stream tendrils hand data to the network as soon as it
+is sent.  Streaming applications may prefer fewer, fuller segments:
+setting ``coalesce_delay`` on a tendril (or on its manager, to set the
+default for all its tendrils) delays each send by up to that many
+seconds, so that frames sent in the meantime are sent together; the
+delay is cut short once ``coalesce_bytes`` bytes are buffered, or
+when ``flush()`` is called.  A batch of frames may also be bracketed
+by calls to ``cork()`` and ``uncork()``, which hold the frames until
+the batch is complete, setting the ``TCP_CORK`` option where
+available.  Latency-sensitive request/response applications, on the
+other hand, will generally want to set the ``nodelay`` property,
+which disables Nagle's algorithm.
+
+Send Priorities
+---------------
+
+Frames are normally sent in the order ``send_frame()`` is called, so
+a small but urgent frame, such as a heartbeat, may wait behind a large
+response.  Stream tendrils therefore accept an optional *priority*
+argument to ``send_frame()`` (as does ``Application.send_frame()``).
+Frames sent with a priority above the default of 0 are sent as soon as
+the frame currently being sent is complete, ahead of any other
+buffered data, highest priority first; frames sent with a priority
+below 0 are held until nothing else is buffered, which suits bulk
+transfers.  Frames of the same priority are always sent in order.
+
+Offloading Frame Processing
+---------------------------
+
+The ``recv_frame()`` method of an application is called in the event
+loop, so an application which performs expensive processing on each
+frame delays every other connection.  Such applications may instead
+subclass ``OffloadApplication`` and implement ``process_frame()``,
+which is called in a thread pool; its return value is passed back to
+the event loop, in the order the frames were received, and by default
+sent as a response frame.
+
+Request/Response Correlation
+----------------------------
+
+Protocols which multiplex requests over a single connection may use
+``RPCApplication``.  Its ``call()`` method tags a request frame with a
+call ID, using a pluggable codec (by default, ``PrefixCodec``, which
+prefixes the frame with a 4-byte integer, whose top bit marks
+responses), sends it, and returns a ``gevent.event.AsyncResult``
+which will be set to the response frame bearing the same call ID.
+Calls may be given a timeout, after which the result is set to an
+``RPCTimeout`` exception; and the number of outstanding calls is
+capped by ``max_outstanding``.  Received requests are passed to
+``recv_request()``, which a server may override, responding with
+``reply()``.
+
+Connection Pooling
+------------------
+
+Clients which make many short requests to the same servers may use a
+``TendrilPool`` to reuse established connections rather than
+connecting anew for each request.  The pool is constructed with a
+running manager; connections are then obtained with the ``checkout()``
+method, which takes the same *target*, *acceptor*, and *wrapper* as
+the manager's ``connect()`` method, and are returned to the pool with
+``checkin()``.  The ``connection()`` method provides a context manager
+which does both.  Idle connections are closed after a configurable
+timeout, by a sweep scheduled on the manager's timer wheel, and an
+optional health check may be used to weed out stale connections
+before they are reused.
+
+In-Process Connections
+----------------------
+
+Components which would otherwise communicate over the network may be
+run in the same process using the ``memory`` protocol.  The endpoint
+of a ``memory`` manager is simply a name; connecting to that name from
+another ``memory`` manager creates a linked pair of tendrils, one
+passed to each manager's acceptor, and frames sent on one are handed
+directly to the receive framer of the other, without involving any
+sockets.  If the manager's ``skip_framing`` attribute is set, frames
+bypass the framers entirely and are passed as they are to the
+application on the other end.  Since ``flush()`` returns only once the
+other end has received the sent frames, the ``memory`` protocol is
+also useful for writing fast, deterministic tests of applications.
+
+Shared Memory Connections
+-------------------------
+
+Processes on the same host may exchange frames through shared memory
+using the ``shm`` protocol.  Its endpoints, like those of the
+``unix`` protocol, are UNIX domain socket file names, and connections
+are established over UNIX domain sockets; but the frame data itself
+is passed through a pair of ring buffers in a shared memory segment
+created by the connecting process, so it never passes through the
+kernel.  The socket is used only to signal the other end when data has
+been written or space has been made.  Both processes must run as the
+same user.  Applications need not change to use the ``shm`` protocol,
+other than passing it to ``get_manager()``.
 """
 
 from application import *
 from connection import *
 from framers import *
 from manager import *
+from offload import *
+from pool import *
+from rpc import *
+from stats import *
+from timers import *
 from utils import *
 
 
 __all__ = (application.__all__ + connection.__all__ + framers.__all__ +
-           manager.__all__ + utils.__all__)
+           manager.__all__ + offload.__all__ + pool.__all__ + rpc.__all__ +
+           stats.__all__ + timers.__all__ + utils.__all__)
@@ -17,7 +17,7 @@
 import abc
 
 
-__all__ = ["Application", "RejectConnection"]
+__all__ = ["Application", "RejectConnection", "IdleTimeout"]
 
 
 class RejectConnection(Exception):
@@ -29,6 +29,20 @@ class RejectConnection(Exception):
     pass
 
 
+class IdleTimeout(Exception):
+    """
+    Exception raised by the default ``Application.idle()`` method,
+    signaling that the connection has been idle for too long.  The
+    ``kind`` attribute identifies the timeout which expired: "read",
+    "write", or "idle".
+    """
+
+    def __init__(self, kind):
+        super(IdleTimeout, self).__init__("connection %s idle timeout "
+                                          "expired" % kind)
+        self.kind = kind
+
+
 class Application(object):
     """
     Base class for tracking application state.  Application classes
@@ -51,12 +65,40 @@ class Application(object):
 
         self.parent.close()
 
-    def send_frame(self, frame):
+    def send_frame(self, frame, priority=0):
         """
         Send a frame across a connection.
+
+        :param frame: The frame to send.
+        :param priority: The priority of the frame; see the
+                         ``send_frame()`` method of the tendril.
+        """
+
+        # Only pass the priority along if it's needed, for the sake
+        # of tendrils which don't take it
+        if priority:
+            self.parent.send_frame(frame, priority)
+        else:
+            self.parent.send_frame(frame)
+
+    def idle(self, kind):
+        """
+        Called to notify the application that an idle timeout on the
+        connection has expired.  The default implementation raises
+        ``IdleTimeout``; as with any exception raised by this method,
+        the connection will then be closed and the ``closed()`` method
+        will be called with the exception.  If this method returns
+        normally, the connection is left open, and the method will be
+        called again if the connection remains idle for another full
+        timeout period.
+
+        :param kind: The timeout which expired: "read" if nothing has
+                     been received, "write" if nothing has been sent,
+                     or "idle" if nothing has been either sent or
+                     received.
         """
 
-        self.parent.send_frame(frame)
+        raise IdleTimeout(kind)
 
     def closed(self, error):
         """
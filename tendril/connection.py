@@ -16,9 +16,11 @@
 
 import abc
 import collections
+import time
 
 from tendril import application
 from tendril import framers
+from tendril import stats
 
 
 __all__ = ["TendrilFramers", "TendrilFramerStates"]
@@ -66,6 +68,10 @@ class Tendril(object):
       An exception object describing the most recent error observed on
       the tendril.  Will be cleared once accessed.  Will be None in
       the event the connection was closed by the peer.
+
+    ``stats``
+      A ``tendril.TendrilStats`` object containing the traffic
+      counters for the tendril.
     """
 
     __metaclass__ = abc.ABCMeta
@@ -90,6 +96,9 @@ class Tendril(object):
 
         self._application = None
 
+        # Traffic counters
+        self.stats = stats.TendrilStats()
+
         # Set the initial framer
         f = self.default_framer()
         self._send_framer = f
@@ -111,6 +120,9 @@ class Tendril(object):
         # Reset the state as needed
         state._reset(framer)
 
+        # Count the frame
+        self.stats.frames_sent += 1
+
         # Now pass the frame through streamify() and return the result
         return framer.streamify(state, frame)
 
@@ -119,10 +131,17 @@ class Tendril(object):
         Helper method to frameify a stream.
         """
 
+        # Count the received data
+        self.stats.recv_calls += 1
+        self.stats.bytes_recv += len(data)
+
         # Get the state and framer
         state = self._recv_framer_state
         framer = None
 
+        # Latency instrumentation, if enabled on the manager
+        latency = getattr(self.manager, 'latency', None)
+
         # Grab off as many frames as we can
         frameify = None
         while True:
@@ -149,7 +168,22 @@ class Tendril(object):
                 break
 
             # OK, send the frame to the application
-            if self._application:
+            self._recv_frame(frame, latency)
+
+    def _recv_frame(self, frame, latency=None):
+        """
+        Helper method to pass a received frame to the application.
+        """
+
+        # Count the frame
+        self.stats.frames_recv += 1
+
+        if self._application:
+            if latency:
+                start = time.time()
+                self._application.recv_frame(frame)
+                latency.recv_frame.record(time.time() - start)
+            else:
                 self._application.recv_frame(frame)
 
     def wrap(self, wrapper):
@@ -175,6 +209,15 @@ class Tendril(object):
                       due to an EOF, pass ``None``.
         """
 
+        # Count the error
+        if error is not None:
+            self.stats.errors += 1
+
+            # If close() has already untracked us, our counters have
+            # been retired without this error; count it there, too
+            if self.manager.tendrils.get(self._tendril_key) is not self:
+                self.manager.stats.retired.errors += 1
+
         if self._application:
             try:
                 self._application.closed(error)
@@ -210,6 +253,7 @@ class Tendril(object):
             raise ValueError("framer must be an instance of tendril.Framer")
 
         self._send_framer = value
+        self.stats.framer_switches += 1
 
     @send_framer.deleter
     def send_framer(self):
@@ -220,6 +264,7 @@ class Tendril(object):
         """
 
         self._send_framer = self.default_framer()
+        self.stats.framer_switches += 1
 
     @property
     def send_framer_state(self):
@@ -251,6 +296,7 @@ class Tendril(object):
             raise ValueError("framer must be an instance of tendril.Framer")
 
         self._recv_framer = value
+        self.stats.framer_switches += 1
 
     @recv_framer.deleter
     def recv_framer(self):
@@ -261,6 +307,7 @@ class Tendril(object):
         """
 
         self._recv_framer = self.default_framer()
+        self.stats.framer_switches += 1
 
     @property
     def recv_framer_state(self):
@@ -306,6 +353,8 @@ class Tendril(object):
             self._send_framer = value
             self._recv_framer = value
 
+        self.stats.framer_switches += 1
+
     @framers.deleter
     def framers(self):
         """
@@ -317,6 +366,7 @@ class Tendril(object):
         f = self.default_framer()
         self._send_framer = f
         self._recv_framer = f
+        self.stats.framer_switches += 1
 
     @property
     def framer_states(self):
@@ -356,11 +406,56 @@ class Tendril(object):
         self._application = None
 
     @abc.abstractmethod
-    def send_frame(self, frame):
-        """Send a frame on the connection."""
+    def send_frame(self, frame, priority=0):
+        """
+        Send a frame on the connection.
+
+        :param frame: The frame to send.
+        :param priority: The priority of the frame.  Tendrils which
+                         buffer sent data may send frames with a
+                         higher priority ahead of those with a lower
+                         priority; others ignore it.
+        """
 
         pass  # Pragma: nocover
 
+    def _send_stream(self, data, priority=0):
+        """
+        Send data which has already been streamified.  Used by
+        ``TendrilManager.broadcast()`` to send the same data on
+        several connections.  Not implemented by all Tendril
+        subclasses.
+
+        :param data: The stream data to send.
+        :param priority: The priority of the data.
+        """
+
+        raise NotImplementedError("Cannot send stream data on this "
+                                  "connection")
+
+    def flush(self, timeout=None):
+        """
+        Wait until all sent frames have been handed to the network.
+        Returns True if no data remains buffered, or False if the
+        timeout expired first.  The default implementation returns
+        True immediately; subclasses which buffer sent data must
+        override it.
+
+        :param timeout: The maximum number of seconds to wait.  If
+                        not given, waits indefinitely.
+        """
+
+        return True
+
+    @property
+    def send_pending(self):
+        """
+        Retrieve the number of bytes of sent data which have been
+        buffered but not yet handed to the network.
+        """
+
+        return 0
+
     @abc.abstractmethod
     def close(self):
         """
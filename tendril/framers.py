@@ -129,6 +129,25 @@ class Framer(object):
 
     __metaclass__ = abc.ABCMeta
 
+    # Set to True if the output of streamify() depends only on the
+    # frame, and not on the framer state; allows
+    # TendrilManager.broadcast() to streamify a frame once for all
+    # tendrils sharing the framer
+    stateless_send = False
+
+    def send_key(self):
+        """
+        Return a hashable key identifying the output of
+        ``streamify()``.  Framers with ``stateless_send`` set must
+        return equal keys whenever they would produce the same stream
+        data for the same frame, so that
+        ``TendrilManager.broadcast()`` can share the stream data among
+        tendrils with distinct but equivalent framers.  The default
+        implementation returns the framer itself.
+        """
+
+        return self
+
     def init_state(self, state):
         """Initialize the framer state."""
 
@@ -164,6 +183,16 @@ class IdentityFramer(Framer):
     A framer for datagram transports, such as UDP.
     """
 
+    stateless_send = True
+
+    def send_key(self):
+        """
+        Return a hashable key identifying the output of
+        ``streamify()``.  The data is passed through unchanged.
+        """
+
+        return (type(self),)
+
     def frameify(self, state, data):
         """Yield the data as a single frame."""
 
@@ -241,6 +270,8 @@ class LineFramer(Framer):
     carriage return/newline pairs.  The line endings are stripped off.
     """
 
+    stateless_send = True
+
     def __init__(self, carriage_return=True):
         """
         Initialize the LineFramer.
@@ -258,26 +289,39 @@ class LineFramer(Framer):
         self.carriage_return = carriage_return
         self.line_end = '\r\n' if carriage_return else '\n'
 
+    def send_key(self):
+        """
+        Return a hashable key identifying the output of
+        ``streamify()``, which depends only on the line ending.
+        """
+
+        return (type(self), self.line_end)
+
     def frameify(self, state, data):
         """Split data into a sequence of lines."""
 
         # Pull in any partially-processed data
         data = state.recv_buf + data
 
-        # Loop over the data
-        while data:
-            line, sep, rest = data.partition('\n')
+        # Loop over the data; start is the offset of the unprocessed
+        # data, so the rest of the data is not copied for each line
+        start = 0
+        while True:
+            end = data.find('\n', start)
 
             # Did we have a whole line?
-            if sep != '\n':
+            if end < 0:
                 break
 
-            # OK, update the data...
-            data = rest
-
             # Now, strip off carriage return, if there is one
-            if self.carriage_return and line[-1] == '\r':
-                line = line[:-1]
+            line_end = end
+            if (self.carriage_return and line_end > start and
+                    data[line_end - 1] == '\r'):
+                line_end -= 1
+
+            # OK, extract the line and update the offset...
+            line = data[start:line_end]
+            start = end + 1
 
             # Yield the line
             try:
@@ -286,7 +330,7 @@ class LineFramer(Framer):
                 break
 
         # Put any remaining data back into the buffer
-        state.recv_buf = data
+        state.recv_buf = data[start:]
 
     def streamify(self, state, frame):
         """Prepare frame for output as line-oriented data."""
@@ -304,6 +348,8 @@ class StructFramer(Framer):
     followed by the frame itself.
     """
 
+    stateless_send = True
+
     def __init__(self, fmt):
         """
         Initialize the StructFramer.
@@ -335,6 +381,14 @@ class StructFramer(Framer):
 
         self.fmt = struct.Struct(fmt)
 
+    def send_key(self):
+        """
+        Return a hashable key identifying the output of
+        ``streamify()``, which depends only on the length format.
+        """
+
+        return (type(self), self.fmt.format)
+
     def init_state(self, state):
         """Initialize the framer state."""
 
@@ -346,26 +400,29 @@ class StructFramer(Framer):
         # Pull in any partially-processed data
         data = state.recv_buf + data
 
-        # Loop over the data
-        while data:
+        # Loop over the data; start is the offset of the unprocessed
+        # data, so the rest of the data is not copied for each frame
+        start = 0
+        while start < len(data):
             if state.frame_len is None:
                 # Try to grab a frame length from the data
-                if len(data) < self.fmt.size:
+                if len(data) - start < self.fmt.size:
                     # Not enough data; try back later
                     break
 
                 # Extract the length
-                state.frame_len = self.fmt.unpack(data[:self.fmt.size])[0]
-                data = data[self.fmt.size:]
+                state.frame_len = self.fmt.unpack_from(data, start)[0]
+                start += self.fmt.size
 
             # Now that we have the frame length, extract the frame
-            if len(data) < state.frame_len:
+            end = start + state.frame_len
+            if len(data) < end:
                 # Not enough data; try back later
                 break
 
             # OK, we have a full frame...
-            frame = data[:state.frame_len]
-            data = data[state.frame_len:]
+            frame = data[start:end]
+            start = end
             state.frame_len = None
 
             # Yield the frame
@@ -375,7 +432,7 @@ class StructFramer(Framer):
                 break
 
         # Put any remaining data back into the buffer
-        state.recv_buf = data
+        state.recv_buf = data[start:]
 
     def streamify(self, state, frame):
         """Prepare frame for output as a length/frame stream."""
@@ -396,6 +453,8 @@ class StuffingFramer(Framer):
     synchronization is momentarily lost.
     """
 
+    stateless_send = True
+
     def __init__(self, prefix='\xff' * 4, begin='\xff', end='\xfe', nop='\0'):
         """
         Initialize the StuffingFramer.
@@ -428,6 +487,14 @@ class StuffingFramer(Framer):
         self.end = end
         self.nop = nop
 
+    def send_key(self):
+        """
+        Return a hashable key identifying the output of
+        ``streamify()``, which depends only on the marker bytes.
+        """
+
+        return (type(self), self.prefix, self.begin, self.end, self.nop)
+
     def init_state(self, state):
         """Initialize the framer state."""
 
@@ -439,31 +506,31 @@ class StuffingFramer(Framer):
         # Pull in any partially-processed data
         data = state.recv_buf + data
 
-        # Loop over the data
-        while data:
+        # Loop over the data; start is the offset of the unprocessed
+        # data, so the rest of the data is not copied for each frame
+        start = 0
+        while start < len(data):
             if not state.frame_start:
-                try:
-                    idx = data.index(self.prefix + self.begin)
-                except ValueError:
+                idx = data.find(self.prefix + self.begin, start)
+                if idx < 0:
                     # Can't find the start of a frame...
                     break
 
-                # Advance data to the beginning of the frame (just
-                # after the marker)
-                data = data[idx + len(self.prefix) + 1:]
+                # Advance to the beginning of the frame (just after
+                # the marker)
+                start = idx + len(self.prefix) + 1
                 state.frame_start = True
 
-            # Now that data is sitting at the frame start, let's find
+            # Now that we're sitting at the frame start, let's find
             # the frame ending
-            try:
-                idx = data.index(self.prefix + self.end)
-            except ValueError:
+            idx = data.find(self.prefix + self.end, start)
+            if idx < 0:
                 # Can't find the end of the frame...
                 break
 
-            # OK, extract the frame and advance the data
-            frame = data[:idx]
-            data = data[idx + len(self.prefix) + 1:]
+            # OK, extract the frame and advance the offset
+            frame = data[start:idx]
+            start = idx + len(self.prefix) + 1
             state.frame_start = (self.begin == self.end)
 
             # Now we need to unstuff the frame
@@ -476,7 +543,7 @@ class StuffingFramer(Framer):
                 break
 
         # Put any remaining data back into the buffer
-        state.recv_buf = data
+        state.recv_buf = data[start:]
 
     def streamify(self, state, frame):
         """Prepare frame for output as a byte-stuffed stream."""
@@ -500,6 +567,8 @@ class COBSFramer(Framer):
     elimination (the ``zpe`` parameter to the constructor).
     """
 
+    stateless_send = True
+
     _tabs = dict(enc_cobs={}, enc_cobs_zpe={},
                  dec_cobs={}, dec_cobs_zpe={})
 
@@ -549,11 +618,12 @@ class COBSFramer(Framer):
 
         blocks = []
 
-        # Decode each block
-        while frame:
-            length, endseq = tab[frame[0]]
-            blocks.extend([frame[1:length], endseq])
-            frame = frame[length:]
+        # Decode each block; pos is the offset of the block code
+        pos = 0
+        while pos < len(frame):
+            length, endseq = tab[frame[pos]]
+            blocks.extend([frame[pos + 1:pos + length], endseq])
+            pos += length
 
         # Remove one (and only one) trailing '\0' as necessary
         if blocks and len(blocks[-1]) > 0:
@@ -574,22 +644,33 @@ class COBSFramer(Framer):
 
         self.zpe = zpe
 
+    def send_key(self):
+        """
+        Return a hashable key identifying the output of
+        ``streamify()``, which depends only on the encoding variant.
+        """
+
+        return (type(self), self.zpe)
+
     def frameify(self, state, data):
         """Split data into a sequence of frames."""
 
         # Pull in any partially-processed data
         data = state.recv_buf + data
 
-        # Loop over the data
-        while data:
-            frame, sep, rest = data.partition('\0')
+        # Loop over the data; start is the offset of the unprocessed
+        # data, so the rest of the data is not copied for each frame
+        start = 0
+        while True:
+            end = data.find('\0', start)
 
             # Did we have a whole frame?
-            if sep != '\0':
+            if end < 0:
                 break
 
-            # OK, update the data...
-            data = rest
+            # OK, extract the frame and update the offset...
+            frame = data[start:end]
+            start = end + 1
 
             # Now, decode the frame and yield it
             try:
@@ -598,7 +679,7 @@ class COBSFramer(Framer):
                 break
 
         # Put any remaining data back into the buffer
-        state.recv_buf = data
+        state.recv_buf = data[start:]
 
     def streamify(self, state, frame):
         """Prepare frame for output as a COBS-encoded stream."""
@@ -627,9 +708,12 @@ class COBSFramer(Framer):
             blk = blocks[i]
 
             # Encode un-trailed blocks
-            while len(blk) >= untrail_len - 1:
-                result.append(untrail_code + blk[:untrail_len - 1])
-                blk = blk[untrail_len - 1:]
+            pos = 0
+            while len(blk) - pos >= untrail_len - 1:
+                result.append(untrail_code +
+                              blk[pos:pos + untrail_len - 1])
+                pos += untrail_len - 1
+            blk = blk[pos:]
 
             # Do we care about look-ahead?
             if (len(enc_tab) > 1 and i + 1 < len(blocks) and
@@ -15,16 +15,20 @@
 ## <http://www.gnu.org/licenses/>.
 
 import abc
+import time
 import weakref
 
 import gevent
 from gevent import event
-import pkg_resources
 
+from tendril import application
+from tendril import connection
+from tendril import stats
+from tendril import timers
 from tendril import utils
 
 
-__all__ = ["get_manager", "find_tendril"]
+__all__ = ["get_manager", "find_tendril", "register_manager"]
 
 
 class TendrilManager(object):
@@ -40,6 +44,26 @@ class TendrilManager(object):
     which provides the necessary information to maintain state for the
     connection--including application-provided state.  Application
     state should subclass the tendril.ApplicationState class.
+
+    Connection counters are available in the ``stats`` attribute, a
+    ``tendril.ManagerStats`` object; see the ``get_stats()`` method
+    for a snapshot which also includes the traffic counters of the
+    tendrils.  Latency histograms may be enabled with the
+    ``enable_latency()`` method, after which they are available in the
+    ``latency`` attribute.
+
+    Incoming connections may be limited by setting the
+    ``max_tendrils`` attribute, which caps the number of tendrils
+    tracked by the manager; the ``max_per_source`` attribute, which
+    caps the number of tendrils with the same remote host (connections
+    from unbound UNIX domain sockets have no remote address, and are
+    not subject to this limit); and the ``accept_rate`` attribute,
+    which limits the rate at which new connections are accepted, in
+    connections per second.  The rate limit is a token bucket,
+    allowing bursts of up to ``accept_burst`` connections (by default,
+    ``accept_rate``, but never fewer than 1).  Connections exceeding
+    these limits are dropped before a tendril is created for them,
+    and are counted in the ``throttled`` statistic.
     """
 
     __metaclass__ = abc.ABCMeta
@@ -48,14 +72,45 @@ class TendrilManager(object):
     _tendrils = {}
     _running_managers = {}
 
+    # Manager classes by protocol, and the entry points discovered
+    # for each protocol; entry points are only scanned once, and only
+    # when a protocol is neither registered nor built in
+    _protocols = {}
+    _entry_points = None
+
+    # The built-in protocols, imported on first use; these mirror the
+    # entry points in setup.py, but resolving them doesn't require
+    # pkg_resources
+    _builtin_protocols = {
+        'memory': 'tendril.memory:MemoryTendrilManager',
+        'shm': 'tendril.shm:ShmTendrilManager',
+        'tcp': 'tendril.tcp:TCPTendrilManager',
+        'udp': 'tendril.udp:UDPTendrilManager',
+        'unix': 'tendril.unix:UnixStreamTendrilManager',
+        'unixdgram': 'tendril.unix:UnixDgramTendrilManager',
+        'unixseqpacket': 'tendril.unix:UnixSeqpacketTendrilManager',
+    }
+
+    latency = None
+
+    # Resolution of the timer wheel, in seconds
+    timer_resolution = 1.0
+
+    # Admission control for incoming connections
+    max_tendrils = None
+    max_per_source = None
+    accept_rate = None
+    accept_burst = None
+
     @classmethod
     def get_manager(cls, proto, endpoint=None):
         """
         Find a manager matching the given protocol and endpoint.  If
         no matching manager currently exists, creates a new one.
-        (Manager classes are looked up using the ``tendril.manager``
+        (Manager classes are looked up among those registered with
+        ``register_manager()``, then using the ``tendril.manager``
         entrypoint, and the name of the entrypoint corresponds to the
-        ``proto``.  This method makes no guarantees about whether the
+        ``proto``.)  This method makes no guarantees about whether the
         manager is running; make sure to check the ``running``
         attribute and call the ``start()`` method if necessary.
 
@@ -83,8 +138,45 @@ class TendrilManager(object):
         if (proto, endpoint) in cls._managers:
             return cls._managers[(proto, endpoint)]
 
-        # OK, need to create a new one; use pkg_resources
-        for ep in pkg_resources.iter_entry_points('tendril.manager', proto):
+        # OK, need to create a new one
+        return cls._lookup_manager(proto)(endpoint)
+
+    @classmethod
+    def _lookup_manager(cls, proto):
+        """
+        Find the manager class for the given, normalized protocol.
+        Classes registered with ``register_manager()`` take
+        precedence, followed by the built-in protocols; otherwise, the
+        ``tendril.manager`` entry points are consulted, and the class
+        loaded from the first usable entry point is cached.  Raises
+        ValueError if no manager class can be found.
+        """
+
+        # Use the registered class, if any
+        if proto in TendrilManager._protocols:
+            return TendrilManager._protocols[proto]
+
+        # Import the built-in protocols directly
+        if proto in TendrilManager._builtin_protocols:
+            modname, _sep, clsname = \
+                TendrilManager._builtin_protocols[proto].partition(':')
+            module = __import__(modname, fromlist=[clsname])
+            manager_cls = getattr(module, clsname)
+            TendrilManager._protocols[proto] = manager_cls
+            return manager_cls
+
+        # Importing pkg_resources is expensive, so only do it if we
+        # have to
+        import pkg_resources
+
+        # Discover all the entry points at once
+        if TendrilManager._entry_points is None:
+            entry_points = {}
+            for ep in pkg_resources.iter_entry_points('tendril.manager'):
+                entry_points.setdefault(ep.name, []).append(ep)
+            TendrilManager._entry_points = entry_points
+
+        for ep in TendrilManager._entry_points.get(proto, []):
             try:
                 manager_cls = ep.load()
                 break
@@ -93,7 +185,26 @@ class TendrilManager(object):
         else:
             raise ValueError("unknown protocol %r" % proto)
 
-        return manager_cls(endpoint)
+        # Cache the class for next time
+        TendrilManager._protocols[proto] = manager_cls
+
+        return manager_cls
+
+    @classmethod
+    def register_manager(cls, proto, manager_cls):
+        """
+        Register a manager class for the given protocol.  Registered
+        classes take precedence over classes advertised through the
+        ``tendril.manager`` entry point, and using them avoids the
+        cost of scanning the entry points.
+
+        :param proto: The underlying network protocol, such as "tcp"
+                      or "udp".
+        :param manager_cls: The ``TendrilManager`` subclass
+                            implementing the protocol.
+        """
+
+        TendrilManager._protocols[proto.lower()] = manager_cls
 
     @classmethod
     def find_tendril(cls, proto, addr):
@@ -139,6 +250,16 @@ class TendrilManager(object):
         self._local_addr_event.clear()
 
         self._listen_thread = None
+        self._timers = None
+
+        # Tendril counts by remote host, and the token bucket for
+        # accept_rate
+        self._sources = {}
+        self._accept_tokens = None
+        self._accept_stamp = None
+
+        # Connection counters
+        self.stats = stats.ManagerStats()
 
         # Make sure we don't already exist...
         if self._manager_key in self._managers:
@@ -175,7 +296,12 @@ class TendrilManager(object):
         Adds the tendril to the set of tracked tendrils.
         """
 
-        self.tendrils[tendril._tendril_key] = tendril
+        key = tendril._tendril_key
+        if key not in self.tendrils:
+            source = self._source(key[1])
+            if source:
+                self._sources[source] = self._sources.get(source, 0) + 1
+        self.tendrils[key] = tendril
 
         # Also add to _tendrils
         self._tendrils.setdefault(tendril.proto, weakref.WeakValueDictionary())
@@ -190,6 +316,17 @@ class TendrilManager(object):
             del self.tendrils[tendril._tendril_key]
         except KeyError:
             pass
+        else:
+            # Keep the tendril's counters for the aggregate statistics
+            self.stats.retired.add(tendril.stats, gauges=False)
+
+            source = self._source(tendril._tendril_key[1])
+            if not source:
+                pass
+            elif self._sources.get(source, 0) > 1:
+                self._sources[source] -= 1
+            else:
+                self._sources.pop(source, None)
 
         # Also remove from _tendrils
         try:
@@ -197,6 +334,81 @@ class TendrilManager(object):
         except KeyError:
             pass
 
+    @staticmethod
+    def _source(addr):
+        """
+        Returns the host portion of a remote address, for the purposes
+        of the ``max_per_source`` limit.  Unbound UNIX domain sockets
+        all have the empty string as their address, so the result is
+        empty for them, and such connections are not counted per
+        source; otherwise, the limit would cap all of them together.
+        """
+
+        return addr[0] if isinstance(addr, tuple) else addr
+
+    def _admit(self, addr):
+        """
+        Applies the admission limits to a new incoming connection.
+        Returns True if the connection may be accepted, or False if it
+        must be dropped.  Called by ``listener()`` before a tendril is
+        created for the connection.
+
+        :param addr: The remote address of the connection.
+        """
+
+        if (self.max_tendrils is not None and
+                len(self.tendrils) >= self.max_tendrils):
+            self.stats.throttled += 1
+            return False
+
+        source = self._source(addr)
+        if (self.max_per_source is not None and source and
+                self._sources.get(source, 0) >= self.max_per_source):
+            self.stats.throttled += 1
+            return False
+
+        if self.accept_rate is not None:
+            # Refill the token bucket; it must be able to hold at
+            # least one token, or nothing would ever be accepted
+            burst = max(1, self.accept_burst or self.accept_rate)
+            now = time.time()
+            if self._accept_tokens is None:
+                self._accept_tokens = burst
+            else:
+                self._accept_tokens = min(
+                    burst, self._accept_tokens +
+                    (now - self._accept_stamp) * self.accept_rate)
+            self._accept_stamp = now
+
+            if self._accept_tokens < 1:
+                self.stats.throttled += 1
+                return False
+
+            self._accept_tokens -= 1
+
+        return True
+
+    def _call_acceptor(self, acceptor, tendril):
+        """
+        Calls the acceptor for a new tendril, counting connections
+        rejected by the acceptor.  Returns the application returned by
+        the acceptor.
+        """
+
+        try:
+            return acceptor(tendril)
+        except application.RejectConnection:
+            self.stats.rejects += 1
+            raise
+
+    def _closer_tripped(self, closer):
+        """
+        Called when the error threshold of a ``SocketCloser`` guarding
+        the manager's socket is exceeded.
+        """
+
+        self.stats.closer_trips += 1
+
     def start(self, acceptor=None, wrapper=None):
         """
         Starts the TendrilManager.
@@ -281,13 +493,138 @@ class TendrilManager(object):
         for conn in self.tendrils.values():
             conn.close()
 
+        # Cancel any timers
+        if self._timers:
+            self._timers.stop()
+
         # Ensure all data is appropriately reset
         self.tendrils = {}
+        self._sources = {}
         self.running = False
         self._local_addr = None
         self._local_addr_event.clear()
         self._listen_thread = None
 
+    def drain(self, timeout=None):
+        """
+        Gracefully shuts the TendrilManager down.  Stops accepting new
+        connections, then gives each tendril up to ``timeout`` seconds
+        to hand its buffered data to the network before closing it;
+        corked tendrils are uncorked first.  The tendrils are drained
+        concurrently.  Finally, shuts the
+        manager down as with ``shutdown()``.  Returns a dictionary
+        mapping the address tuple of each tendril which still had
+        unsent data when it was closed to the number of bytes
+        dropped.
+
+        :param timeout: The maximum number of seconds to wait for the
+                        tendrils to drain.  If not given, waits
+                        indefinitely.
+        """
+
+        # Remove ourself from the dictionary of running managers
+        try:
+            del self._running_managers[self._manager_key]
+        except KeyError:
+            pass
+
+        # Stop accepting connections
+        if self._listen_thread:
+            self._listen_thread.kill()
+
+        dropped = {}
+
+        def drain_tendril(tend):
+            # A corked tendril holds its data until it's uncorked, so
+            # flush() would never return
+            if getattr(tend, 'corked', False):
+                tend.uncork()
+
+            tend.flush(timeout)
+
+            # Record what we're about to drop
+            if tend.send_pending:
+                dropped[tend._tendril_key] = tend.send_pending
+
+            tend.close()
+
+        # Drain the tendrils concurrently
+        gevent.joinall([gevent.spawn(drain_tendril, tend)
+                        for tend in self.tendrils.values()])
+
+        # Take care of everything else
+        self.shutdown()
+
+        return dropped
+
+    def broadcast(self, frame, tendrils=None, predicate=None):
+        """
+        Sends a frame on several tendrils.  For tendrils whose send
+        framer has ``stateless_send`` set, and which can send
+        streamified data (see ``Tendril._send_stream()``), the frame
+        is streamified only once for each distinct framer
+        configuration, as identified by the framer's ``send_key()``,
+        and the result is shared by all the tendrils using an
+        equivalent framer; this is considerably cheaper than calling
+        ``send_frame()`` on each tendril when the number of tendrils
+        is large.  As with any best-effort fan-out, errors sending to
+        one tendril do not prevent sending to the others; they are
+        counted in the ``errors`` statistic of the tendril.  Returns
+        the number of tendrils the frame was sent to.
+
+        :param frame: The frame to send.
+        :param tendrils: An optional iterable of the tendrils to send
+                         the frame to.  If not given, the frame is sent
+                         to all tendrils tracked by the manager.
+        :param predicate: An optional callable.  If given, it will be
+                          called with each tendril, and the frame will
+                          only be sent to those tendrils for which it
+                          returns True.
+        """
+
+        if tendrils is None:
+            tendrils = self.tendrils.values()
+
+        count = 0
+        streams = {}
+        for tend in tendrils:
+            if predicate and not predicate(tend):
+                continue
+
+            try:
+                framer = tend.send_framer
+                if not (framer.stateless_send and
+                        self._sends_stream(tend)):
+                    tend.send_frame(frame)
+                else:
+                    # Streamify once per framer configuration
+                    key = framer.send_key()
+                    if key not in streams:
+                        streams[key] = tend._send_streamify(frame)
+                    else:
+                        tend.stats.frames_sent += 1
+                    tend._send_stream(streams[key])
+            except Exception:
+                tend.stats.errors += 1
+                continue
+
+            count += 1
+
+        return count
+
+    @staticmethod
+    def _sends_stream(tend):
+        """
+        Determine whether a tendril can send streamified data; that
+        is, whether its class overrides ``Tendril._send_stream()``.
+        Tendrils which do not must be sent each frame with
+        ``send_frame()``.
+        """
+
+        method = getattr(tend.__class__, '_send_stream', None)
+        return (getattr(method, '__func__', method) is not
+                connection.Tendril._send_stream.__func__)
+
     def get_local_addr(self, timeout=None):
         """
         Retrieve the current local address.
@@ -311,6 +648,55 @@ class TendrilManager(object):
         # We have a local address!
         return self._local_addr
 
+    def enable_latency(self, sub_bits=5):
+        """
+        Enable latency instrumentation for the tendrils of this
+        manager.  Any previously recorded latencies are discarded.
+        Returns the ``tendril.LatencyStats`` object, which is also
+        available in the ``latency`` attribute.
+
+        :param sub_bits: The number of significant bits to retain for
+                         each recorded latency.
+        """
+
+        self.latency = stats.LatencyStats(sub_bits)
+        return self.latency
+
+    def disable_latency(self):
+        """
+        Disable latency instrumentation for the tendrils of this
+        manager.
+        """
+
+        self.latency = None
+
+    def get_stats(self):
+        """
+        Retrieve a snapshot of the manager's statistics.  Returns a
+        dictionary containing the manager's connection counters, the
+        number of currently tracked tendrils (as ``tendrils``), and the
+        traffic counters summed over all tendrils ever tracked by the
+        manager.  If latency instrumentation is enabled, the summaries
+        of the latency histograms are included as ``latency``.
+        """
+
+        # Sum up the tendril statistics
+        totals = stats.TendrilStats()
+        totals.add(self.stats.retired)
+        for tend in self.tendrils.values():
+            totals.add(tend.stats)
+
+        # Build the snapshot
+        result = totals.snapshot()
+        result.update(self.stats.snapshot())
+        result['tendrils'] = len(self.tendrils)
+
+        # Include the latency histograms, if enabled
+        if self.latency:
+            result['latency'] = self.latency.snapshot()
+
+        return result
+
     @property
     def _manager_key(self):
         """
@@ -319,6 +705,18 @@ class TendrilManager(object):
 
         return (self.proto, self.endpoint)
 
+    @property
+    def timers(self):
+        """
+        Retrieve the ``TimerWheel`` shared by the manager's tendrils,
+        creating it if necessary.  The wheel's resolution is given by
+        the ``timer_resolution`` attribute.
+        """
+
+        if self._timers is None:
+            self._timers = timers.TimerWheel(self.timer_resolution)
+        return self._timers
+
     @property
     def local_addr(self):
         """
@@ -368,6 +766,35 @@ class TendrilManager(object):
         if self.addr_family != fam:
             raise ValueError("address family mismatch")
 
+    def connect_async(self, target, acceptor, *args, **kwargs):
+        """
+        Initiate a connection from the tendril manager's endpoint
+        without waiting for it to complete.  Takes the same arguments
+        as the ``connect()`` method, which is called in a separate
+        thread.  Returns a ``gevent.event.AsyncResult``, which will
+        receive the result of ``connect()``--the Tendril object, or
+        ``None`` if the acceptor rejected the connection--or the
+        exception it raised.
+        """
+
+        result = event.AsyncResult()
+        gevent.spawn(self._connect_async, result, target, acceptor,
+                     *args, **kwargs)
+        return result
+
+    def _connect_async(self, result, target, acceptor, *args, **kwargs):
+        """
+        Implementation of the ``connect_async()`` thread.  Calls
+        ``connect()``, setting the result, or the exception it
+        raised, on the ``AsyncResult``; catching the exception keeps
+        gevent from reporting it as a failed thread.
+        """
+
+        try:
+            result.set(self.connect(target, acceptor, *args, **kwargs))
+        except Exception as exc:
+            result.set_exception(exc)
+
     @abc.abstractmethod
     def listener(self, acceptor, wrapper):
         """
@@ -403,3 +830,4 @@ class TendrilManager(object):
 
 get_manager = TendrilManager.get_manager
 find_tendril = TendrilManager.find_tendril
+register_manager = TendrilManager.register_manager
@@ -0,0 +1,429 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import collections
+import errno
+import itertools
+import os
+
+import gevent
+from gevent import event
+from gevent import socket
+
+from tendril import application
+from tendril import connection
+from tendril import manager
+
+
+def _refused(target):
+    """
+    Construct the exception raised when a connection to an in-process
+    endpoint is refused.
+    """
+
+    return socket.error(errno.ECONNREFUSED, '%s: %r' %
+                        (os.strerror(errno.ECONNREFUSED), target))
+
+
+class MemoryTendril(connection.Tendril):
+    """
+    Manages state associated with one end of an in-process
+    connection.  The two ends of the connection are linked directly:
+    data sent on one end is passed to the receive framer of the other,
+    without involving any sockets.  Sent data is delivered by a send
+    thread, so, as with a network connection, the application on the
+    other end never receives a frame from within ``send_frame()``.
+    The send thread only runs while there is data to deliver.
+
+    If the ``skip_framing`` attribute is set (it defaults to the
+    value of the same attribute on the manager), sent frames bypass
+    the framers entirely, and are passed as they are to the
+    application on the other end.  The frames need not be strings in
+    that case; no bytes are counted in the traffic counters, and
+    ``send_pending`` counts frames rather than bytes.
+    """
+
+    proto = 'memory'
+
+    _conn_ids = itertools.count()
+
+    def __init__(self, manager, local_addr, remote_addr):
+        """
+        Initialize a MemoryTendril.
+
+        :param manager: The MemoryTendrilManager responsible for the
+                        Tendril.
+        :param local_addr: The name of the local endpoint.
+        :param remote_addr: The name of the remote endpoint.
+        """
+
+        super(MemoryTendril, self).__init__(manager, local_addr,
+                                            remote_addr)
+
+        self.skip_framing = getattr(manager, 'skip_framing', False)
+
+        # Several connections may share the same endpoint names
+        self._conn_id = next(self._conn_ids)
+
+        # The other end of the connection
+        self._peer = None
+
+        # Data waiting to be delivered, as tuples of a flag indicating
+        # whether the data is an unframed frame and the data itself,
+        # and the amount of data waiting; _flush_event is set whenever
+        # the queue is empty or the connection is closed
+        self._sendq = collections.deque()
+        self._sendq_len = 0
+        self._flush_event = event.Event()
+        self._flush_event.set()
+
+        self._started = False
+        self._send_thread = None
+
+    def _start(self):
+        """
+        Starts delivering data to the other end of the connection,
+        including any data the acceptor has already sent.
+        """
+
+        self._started = True
+        self._wake_send()
+
+    def _wake_send(self):
+        """
+        Starts the send thread, unless it is already running or the
+        tendril has not been started.
+        """
+
+        if self._started and self._sendq and not self._send_thread:
+            self._send_thread = gevent.spawn(self._send)
+
+    def _send(self):
+        """
+        Implementation of the send thread.  Delivers all the queued
+        data to the other end of the connection, then exits.
+        """
+
+        while self._sendq and self._peer:
+            peer = self._peer
+            raw, data = self._sendq.popleft()
+            if raw:
+                self._sendq_len -= 1
+            else:
+                self._sendq_len -= len(data)
+                self.stats.bytes_sent += len(data)
+            self.stats.send_buffered = self._sendq_len
+
+            try:
+                if raw:
+                    peer._recv_frame(data, getattr(peer.manager,
+                                                   'latency', None))
+                else:
+                    peer._recv_frameify(data)
+            except Exception as exc:
+                # The receiving end failed; close it and notify its
+                # application, just as the receive thread of a
+                # network connection would
+                peer.close()
+                peer.closed(exc)
+
+        # OK, the queue is empty or the connection has been closed;
+        # _wake_send() will start a new thread when there's more
+        self._send_thread = None
+        self._flush_event.set()
+
+    def _enqueue(self, raw, data, size):
+        """
+        Queues data to be delivered to the other end of the
+        connection.
+
+        :param raw: If True, ``data`` is a frame to pass directly to
+                    the application; otherwise, it is stream data to
+                    pass to the receive framer.
+        :param data: The data to deliver.
+        :param size: The amount of data, for ``send_pending``.
+        """
+
+        if not self._peer:
+            raise ValueError("connection closed")
+
+        self._sendq.append((raw, data))
+        self._sendq_len += size
+        self.stats.send_buffered = self._sendq_len
+        self._flush_event.clear()
+        self._wake_send()
+
+    def send_frame(self, frame, priority=0):
+        """
+        Sends a frame to the other end of the connection.  Frames are
+        handed to the other end in the order they are sent, so
+        *priority* is ignored.
+        """
+
+        if self.skip_framing:
+            self.stats.frames_sent += 1
+            self._enqueue(True, frame, 1)
+        else:
+            self._send_stream(self._send_streamify(frame))
+
+    def _send_stream(self, data, priority=0):
+        """
+        Sends streamified data to the other end of the connection.
+        """
+
+        self._enqueue(False, data, len(data))
+
+    def flush(self, timeout=None):
+        """
+        Wait until all sent frames have been delivered to the other
+        end of the connection, or the connection is closed.  Returns
+        True if no data remains queued, or False if the timeout
+        expired first or data was left undelivered when the connection
+        closed.
+
+        :param timeout: The maximum number of seconds to wait.  If
+                        not given, waits indefinitely.
+        """
+
+        self._flush_event.wait(timeout)
+        return not self._sendq
+
+    @property
+    def send_pending(self):
+        """
+        Retrieve the number of bytes of sent data which have not yet
+        been delivered to the other end of the connection.
+        """
+
+        return self._sendq_len
+
+    def _remote_closed(self):
+        """
+        Called when the other end of the connection is closed.  Closes
+        this end and notifies the application.
+        """
+
+        # Don't notify the other end back
+        self._peer = None
+
+        self.close()
+        self.closed()
+
+    def close(self):
+        """
+        Close the connection.  Kills the send thread and closes the
+        other end of the connection.
+        """
+
+        # The send thread may be closing us because the other end
+        # failed; it will exit on its own
+        thread = self._send_thread
+        if thread and thread is not gevent.getcurrent():
+            thread.kill()
+        self._send_thread = None
+        self._flush_event.set()
+
+        peer = self._peer
+        self._peer = None
+
+        # Make sure to notify the manager we're closed
+        super(MemoryTendril, self).close()
+
+        # The other end sees the connection closed by its peer
+        if peer:
+            peer._remote_closed()
+
+    @property
+    def _tendril_key(self):
+        """
+        Retrieve a key which can be used to look up this tendril.
+        """
+
+        return self.local_addr, self.remote_addr, self._conn_id
+
+
+class MemoryTendrilManager(manager.TendrilManager):
+    """
+    Manages in-process connections through a named endpoint.  The
+    endpoint is an arbitrary string naming the manager within the
+    process; connecting to that name from another memory manager
+    creates a linked pair of MemoryTendril objects, one passed to the
+    acceptor of each manager, without involving any sockets or system
+    calls.  This is useful for running components which would
+    otherwise communicate over the network in the same process, and
+    for testing them deterministically: once ``flush()`` on a
+    MemoryTendril returns, the frames sent have been received by the
+    application on the other end.
+
+    A manager without an endpoint may initiate connections, but
+    cannot accept them.  Connections to a name for which no manager
+    is running with an acceptor raise ``socket.error`` with
+    ``errno.ECONNREFUSED``, as do connections which the other end's
+    acceptor rejects or which exceed its admission limits.  Setting
+    the ``skip_framing`` attribute causes frames sent on the manager's
+    tendrils to bypass the framers; see ``MemoryTendril``.
+    """
+
+    proto = 'memory'
+
+    # Pass frames between applications without framing them
+    skip_framing = False
+
+    def __init__(self, endpoint=None):
+        """
+        Initialize a MemoryTendrilManager.
+
+        :param endpoint: The name of the endpoint, which other memory
+                         managers may connect to.  If not given, the
+                         manager cannot accept connections.
+        """
+
+        # get_manager() passes the default TCP endpoint when none is
+        # given
+        if endpoint == ('', 0):
+            endpoint = None
+        elif endpoint and not isinstance(endpoint, basestring):
+            raise ValueError("memory endpoint must be a string")
+
+        super(MemoryTendrilManager, self).__init__(endpoint)
+
+        # There are no sockets and so no address family
+        self.addr_family = None
+
+        self._acceptor = None
+
+    @property
+    def _name(self):
+        """
+        Retrieve the name of the manager's endpoint, or the empty
+        string if the manager has none.
+        """
+
+        if isinstance(self.endpoint, basestring):
+            return self.endpoint
+        return ''
+
+    def _make_tendril(self, local_addr, remote_addr):
+        """
+        Construct a tendril.  Subclasses may override this method to
+        use a different tendril class.
+
+        :param local_addr: The local address of the tendril.
+        :param remote_addr: The remote address of the tendril.
+        """
+
+        return MemoryTendril(self, local_addr, remote_addr)
+
+    def connect(self, target, acceptor, wrapper=None):
+        """
+        Initiate a connection from the tendril manager's endpoint.
+        The other end of the connection is accepted by the manager
+        running on the target endpoint, then a MemoryTendril object
+        is created and passed to the given acceptor.
+
+        :param target: The name of the endpoint to connect to.
+        :param acceptor: A callable which will initialize the state of
+                         the new MemoryTendril object.
+        :param wrapper: Not supported, since there is no socket to
+                        wrap; must be ``None``.
+        """
+
+        if not self.running:
+            raise ValueError("TendrilManager not running")
+
+        if not isinstance(target, basestring):
+            raise ValueError("memory endpoint must be a string")
+
+        if wrapper:
+            raise ValueError("cannot wrap in-process connections")
+
+        # Find the manager accepting connections on the target
+        server = self._running_managers.get((self.proto, target))
+        if not server:
+            raise _refused(target)
+
+        # Wait for its listener to start
+        server.get_local_addr()
+        if not server._acceptor:
+            raise _refused(target)
+
+        # Let the server admit the connection
+        if not server._admit(self._name):
+            raise _refused(target)
+
+        # Construct and link the two ends
+        local = self._name
+        tend = self._make_tendril(local, target)
+        remote = server._make_tendril(target, local)
+        tend._peer = remote
+        remote._peer = tend
+
+        # The server end is accepted first, as by a listening socket
+        try:
+            remote.application = server._call_acceptor(server._acceptor,
+                                                       remote)
+        except application.RejectConnection:
+            raise _refused(target)
+
+        server._track_tendril(remote)
+        server.stats.accepts += 1
+
+        try:
+            # Set up the application
+            tend.application = self._call_acceptor(acceptor, tend)
+        except application.RejectConnection:
+            # The acceptor raised a RejectConnection; the server end
+            # sees the connection closed
+            tend.close()
+            return None
+
+        # OK, let's track the tendril
+        self._track_tendril(tend)
+        self.stats.connects += 1
+
+        # Start both ends
+        remote._start()
+        tend._start()
+
+        # Might as well return the tendril, too
+        return tend
+
+    def listener(self, acceptor, wrapper):
+        """
+        Accepts connections to the manager's endpoint while the
+        manager is running.  Connections are made directly by the
+        ``connect()`` method of the connecting manager, so there is
+        nothing to do but wait.
+
+        :param acceptor: If given, specifies a callable that will be
+                         called with each newly received
+                         MemoryTendril; that callable is responsible
+                         for initial acceptance of the connection and
+                         for setting up the initial state of the
+                         connection.  If not given, no new connections
+                         will be accepted by the MemoryTendrilManager.
+        :param wrapper: Ignored, since there are no sockets to wrap.
+        """
+
+        self._acceptor = acceptor
+        self.local_addr = self._name
+
+        try:
+            # Just sleep in a loop
+            while True:
+                gevent.sleep(600)
+        finally:
+            self._acceptor = None
@@ -0,0 +1,190 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import abc
+import collections
+
+import gevent
+from gevent import coros
+
+from tendril import application
+
+
+__all__ = ["OffloadApplication"]
+
+
+class OffloadApplication(application.Application):
+    """
+    Base class for applications whose frame processing is too
+    expensive to perform in the event loop.  Rather than implementing
+    ``recv_frame()``, subclasses implement ``process_frame()``, which
+    is called in a worker thread of a thread pool, leaving the event
+    loop free to service other connections.  The value returned by
+    ``process_frame()`` is passed to ``frame_processed()``, which is
+    called back in the event loop in the order the frames were
+    received; by default, it sends the value as a frame, unless it is
+    ``None``.
+
+    Frames from a single connection are processed concurrently, up
+    to ``max_pending`` at a time; once that many are in progress,
+    reception on the connection is suspended until the oldest
+    completes.  Set ``max_pending`` to 1 to process a connection's
+    frames strictly one at a time.
+
+    Note that ``process_frame()`` must not call ``send_frame()`` or
+    any other method interacting with the connection, since it runs
+    outside the event loop; to send a frame from a worker thread, use
+    ``send_frame_threadsafe()``.  If ``process_frame()`` raises an
+    exception, the connection is closed, and ``closed()`` is called
+    with the exception.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    # The maximum number of frames from each connection to process
+    # concurrently
+    max_pending = 16
+
+    def __init__(self, parent, threadpool=None, max_pending=None):
+        """
+        Initialize the OffloadApplication.
+
+        :param parent: The tendril.
+        :param threadpool: The pool in which to process frames.  Must
+                           have a ``spawn()`` method compatible with
+                           that of ``gevent.threadpool.ThreadPool``.
+                           Defaults to the thread pool of the gevent
+                           hub.
+        :param max_pending: If given, overrides the ``max_pending``
+                            class attribute.
+        """
+
+        super(OffloadApplication, self).__init__(parent)
+
+        hub = gevent.get_hub()
+
+        self.threadpool = threadpool or hub.threadpool
+        if max_pending is not None:
+            self.max_pending = max_pending
+
+        # Frames in progress, in order of receipt, and a slot for
+        # each
+        self._pending = collections.deque()
+        self._slots = coros.Semaphore(self.max_pending)
+        self._deliver_thread = None
+
+        # Frames sent from worker threads; the watcher wakes the
+        # event loop to send them
+        self._outgoing = collections.deque()
+        self._outgoing_watcher = getattr(hub.loop, 'async')(ref=False)
+        self._outgoing_watcher.start(self._send_outgoing)
+
+    def recv_frame(self, frame):
+        """
+        Hands a received frame to the thread pool.  Blocks if
+        ``max_pending`` frames are already being processed.
+        """
+
+        self._slots.acquire()
+        self._pending.append(self.threadpool.spawn(self.process_frame,
+                                                   frame))
+
+        # Make sure the results get delivered
+        if not self._deliver_thread:
+            self._deliver_thread = gevent.spawn(self._deliver)
+
+    def _deliver(self):
+        """
+        Implementation of the delivery thread.  Waits for the frames
+        to be processed, and passes the results to
+        ``frame_processed()`` in order.
+        """
+
+        try:
+            while self._pending:
+                try:
+                    result = self._pending[0].get()
+                    self.frame_processed(result)
+                except Exception as exc:
+                    self._pending.clear()
+                    self.parent.close()
+                    self.parent.closed(exc)
+                    return
+
+                self._pending.popleft()
+                self._slots.release()
+        finally:
+            self._deliver_thread = None
+
+    def _send_outgoing(self):
+        """
+        Sends the frames queued by ``send_frame_threadsafe()``.  Called
+        in the event loop.
+        """
+
+        while self._outgoing:
+            self.send_frame(self._outgoing.popleft())
+
+    def send_frame_threadsafe(self, frame):
+        """
+        Send a frame across a connection.  Unlike ``send_frame()``,
+        may be called from a worker thread.
+        """
+
+        self._outgoing.append(frame)
+        self._outgoing_watcher.send()
+
+    def frame_processed(self, result):
+        """
+        Called in the event loop with the result of each call to
+        ``process_frame()``, in the order the frames were received.
+        The default implementation sends the result as a frame, unless
+        it is ``None``.
+
+        :param result: The value returned by ``process_frame()``.
+        """
+
+        if result is not None:
+            self.send_frame(result)
+
+    def close(self):
+        """
+        Close the connection.
+        """
+
+        self._outgoing_watcher.stop()
+        super(OffloadApplication, self).close()
+
+    def closed(self, error):
+        """
+        Called to notify the application that the connection has been
+        closed.  Subclasses overriding this method must call the
+        superclass method.
+        """
+
+        self._outgoing_watcher.stop()
+
+    @abc.abstractmethod
+    def process_frame(self, frame):
+        """
+        Called in a worker thread to process each received frame.  The
+        return value is passed to ``frame_processed()``.
+
+        Note: this method must not interact with the connection, other
+        than through ``send_frame_threadsafe()``.
+        """
+
+        pass  # Pragma: nocover
@@ -0,0 +1,344 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import collections
+import contextlib
+import time
+
+from gevent import coros
+
+
+__all__ = ["TendrilPool", "PoolExhausted"]
+
+
+class PoolExhausted(Exception):
+    """
+    Exception raised by ``TendrilPool.checkout()`` when no connection
+    to the target became available before the timeout expired.
+    """
+
+    pass
+
+
+class _PoolEntry(object):
+    """
+    Tracks the connections for a single pool key.
+    """
+
+    def __init__(self, max_size):
+        """
+        Initialize a _PoolEntry.
+
+        :param max_size: The maximum number of connections, idle or
+                         checked out.
+        """
+
+        # Idle connections, as (tendril, checkin time) tuples; the
+        # most recently checked in is on the right
+        self.idle = collections.deque()
+
+        # One slot for each checked out connection; new connections
+        # are only made when there are no idle ones, so this also
+        # bounds the total number of connections
+        self.slots = coros.Semaphore(max_size)
+
+        # The number of checkouts waiting for a slot; a woken waiter
+        # may not yet have taken its slot
+        self.waiting = 0
+
+
+class TendrilPool(object):
+    """
+    Pools outgoing connections created through a TendrilManager, so
+    that request/response clients may reuse established connections
+    instead of connecting anew for each request.  Connections are
+    keyed by the target address, the acceptor, and the wrapper; note
+    that the same acceptor and wrapper objects must be passed to
+    ``checkout()`` for a connection to be reused.
+
+    Connections are checked out with ``checkout()`` and returned with
+    ``checkin()``; a connection which should not be reused should be
+    passed to ``discard()`` instead.  The ``connection()`` context
+    manager takes care of this automatically.  Idle connections are
+    closed once they have been idle for longer than ``idle_timeout``
+    seconds; a sweep of all targets is scheduled on the manager's
+    timer wheel whenever connections are idle, so this happens even
+    for targets which are no longer used, and so is only accurate to
+    within the resolution of the wheel.  ``evict_idle()`` may also be
+    called to sweep immediately.  Targets with no connections, idle
+    or checked out, are forgotten.
+    """
+
+    def __init__(self, manager, max_size=10, idle_timeout=60.0,
+                 health_check=None):
+        """
+        Initialize a TendrilPool.
+
+        :param manager: The TendrilManager through which connections
+                        are made.  The manager must be running.
+        :param max_size: The maximum number of connections to each
+                         target, idle or checked out.
+        :param idle_timeout: The number of seconds after which an idle
+                             connection is closed.  If ``None``, idle
+                             connections are kept indefinitely.
+        :param health_check: If given, a callable which will be
+                             called with an idle tendril before it is
+                             checked out.  If it returns a false
+                             value, the tendril is closed and another
+                             is used instead.
+        """
+
+        self.manager = manager
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+
+        self._entries = {}
+        self._checked_out = {}
+        self._closed = False
+        self._sweep_timer = None
+
+    def _get_entry(self, key):
+        """
+        Retrieve the pool entry for the key, creating it if needed.
+        """
+
+        if key not in self._entries:
+            self._entries[key] = _PoolEntry(self.max_size)
+        return self._entries[key]
+
+    def _release(self, key, entry):
+        """
+        Free a slot of the pool entry, forgetting the entry if it has
+        no connections left.
+        """
+
+        entry.slots.release()
+
+        if self._unused(entry):
+            self._entries.pop(key, None)
+
+    def _unused(self, entry):
+        """
+        Determine whether a pool entry has no connections, idle or
+        checked out, and no checkouts waiting for one.
+        """
+
+        return (not entry.idle and not entry.waiting and
+                entry.slots.counter == self.max_size)
+
+    def _schedule_sweep(self):
+        """
+        Schedule a sweep of the idle connections on the manager's
+        timer wheel, for when the longest idle connection expires.
+        Does nothing if a sweep is already scheduled, or if idle
+        connections never expire.
+        """
+
+        if self._sweep_timer or self._closed or self.idle_timeout is None:
+            return
+
+        # The oldest idle connection of each entry is on the left
+        checkins = [entry.idle[0][1] for entry in self._entries.values()
+                    if entry.idle]
+        if checkins:
+            self._sweep_timer = self.manager.timers.schedule(
+                min(checkins) + self.idle_timeout - time.time(),
+                self._sweep)
+
+    def _sweep(self):
+        """
+        Close expired idle connections, then schedule the next sweep.
+        Called from the manager's timer wheel.
+        """
+
+        self._sweep_timer = None
+        self.evict_idle()
+        self._schedule_sweep()
+
+    def _alive(self, tend):
+        """
+        Determine whether a tendril is still open.
+        """
+
+        return self.manager.tendrils.get(tend._tendril_key) is tend
+
+    def _evict(self, entry, now):
+        """
+        Drop idle connections which have expired or been closed.
+        """
+
+        keep = collections.deque()
+        for tend, checkin in entry.idle:
+            if not self._alive(tend):
+                continue
+            elif (self.idle_timeout is not None and
+                  now - checkin > self.idle_timeout):
+                tend.close()
+            else:
+                keep.append((tend, checkin))
+
+        entry.idle = keep
+
+    def checkout(self, target, acceptor, wrapper=None, timeout=None):
+        """
+        Check out a connection to the target.  An idle connection is
+        reused if one is available; otherwise, a new connection is
+        initiated through the manager.  Returns the tendril, or
+        ``None`` if the acceptor rejected a new connection.
+
+        :param target: The target of the connection.
+        :param acceptor: A callable which will initialize the state of
+                         a new tendril.  See the manager's
+                         ``connect()`` method.
+        :param wrapper: A callable which will wrap the socket of a
+                        new tendril.  See the manager's ``connect()``
+                        method.
+        :param timeout: If given, the maximum number of seconds to
+                        wait for a connection to become available if
+                        the maximum number of connections to the
+                        target are already checked out.  If the
+                        timeout expires, ``PoolExhausted`` is raised.
+        """
+
+        key = (target, acceptor, wrapper)
+        entry = self._get_entry(key)
+
+        # Wait for a free slot
+        entry.waiting += 1
+        try:
+            acquired = entry.slots.acquire(timeout=timeout)
+        finally:
+            entry.waiting -= 1
+        if not acquired:
+            raise PoolExhausted("no connection to %r available" % (target,))
+
+        # Close expired idle connections
+        self._evict(entry, time.time())
+
+        # Look for a healthy idle connection, most recent first
+        while entry.idle:
+            tend, _checkin = entry.idle.pop()
+            if self.health_check and not self.health_check(tend):
+                tend.close()
+                continue
+
+            self._checked_out[tend] = key
+            return tend
+
+        # Need a new connection
+        try:
+            tend = self.manager.connect(target, acceptor, wrapper)
+        except Exception:
+            self._release(key, entry)
+            raise
+
+        # Acceptor rejected the connection
+        if tend is None:
+            self._release(key, entry)
+            return None
+
+        self._checked_out[tend] = key
+        return tend
+
+    def checkin(self, tend):
+        """
+        Return a checked out connection to the pool.  If the
+        connection has been closed, its slot is simply freed.
+
+        :param tend: The tendril to return.
+        """
+
+        key = self._checked_out.pop(tend)
+        entry = self._entries[key]
+        now = time.time()
+
+        if self._closed:
+            tend.close()
+        elif self._alive(tend):
+            entry.idle.append((tend, now))
+
+        self._evict(entry, now)
+        self._release(key, entry)
+
+        # Make sure the connection is closed once it expires
+        self._schedule_sweep()
+
+    def discard(self, tend):
+        """
+        Close a checked out connection rather than returning it to the
+        pool.
+
+        :param tend: The tendril to discard.
+        """
+
+        key = self._checked_out.pop(tend)
+
+        tend.close()
+        self._release(key, self._entries[key])
+
+    @contextlib.contextmanager
+    def connection(self, target, acceptor, wrapper=None, timeout=None):
+        """
+        A context manager which checks out a connection to the target
+        and returns it to the pool on exit.  If the block raises an
+        exception, the connection is discarded instead.  Takes the
+        same arguments as ``checkout()``.
+        """
+
+        tend = self.checkout(target, acceptor, wrapper, timeout)
+        if tend is None:
+            yield None
+            return
+
+        try:
+            yield tend
+        except Exception:
+            self.discard(tend)
+            raise
+        else:
+            self.checkin(tend)
+
+    def evict_idle(self):
+        """
+        Close idle connections to all targets which have exceeded the
+        idle timeout or have been closed.
+        """
+
+        now = time.time()
+        for key, entry in self._entries.items():
+            self._evict(entry, now)
+
+            # Forget about targets with no connections
+            if self._unused(entry):
+                del self._entries[key]
+
+    def close(self):
+        """
+        Close all idle connections.  Checked out connections are not
+        affected, but will be closed when they are returned.
+        """
+
+        self._closed = True
+
+        if self._sweep_timer:
+            self.manager.timers.cancel(self._sweep_timer)
+            self._sweep_timer = None
+
+        for entry in self._entries.values():
+            while entry.idle:
+                tend, _checkin = entry.idle.pop()
+                tend.close()
@@ -0,0 +1,346 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import abc
+import struct
+
+from gevent import coros
+from gevent import event
+
+from tendril import application
+
+
+__all__ = ["RPCApplication", "RPCCodec", "PrefixCodec", "RPCTimeout",
+           "RPCClosed"]
+
+
+class RPCTimeout(Exception):
+    """
+    Exception set on the result of an ``RPCApplication.call()`` if no
+    response was received before the call timed out.
+    """
+
+    pass
+
+
+class RPCClosed(Exception):
+    """
+    Exception set on the result of an ``RPCApplication.call()`` if the
+    connection was closed before a response was received.  The
+    ``error`` attribute contains the exception which caused the
+    connection to close, or ``None``.
+    """
+
+    def __init__(self, error=None):
+        super(RPCClosed, self).__init__("connection closed")
+        self.error = error
+
+
+class RPCCodec(object):
+    """
+    Base class for codecs used by ``RPCApplication`` to tag frames
+    with call IDs.  Call IDs are non-negative integers less than
+    ``id_limit``.  Frames are also tagged as requests or responses,
+    so that a request from the other end is never mistaken for the
+    response to a call bearing the same ID.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    # The number of distinct call IDs the codec can represent
+    id_limit = 2 ** 31
+
+    @abc.abstractmethod
+    def encode(self, call_id, frame, response=False):
+        """
+        Tag a frame with a call ID.  Returns the tagged frame.
+
+        :param call_id: The call ID.
+        :param frame: The frame to tag.
+        :param response: If True, the frame is a response; otherwise,
+                         it is a request.
+        """
+
+        pass  # Pragma: nocover
+
+    @abc.abstractmethod
+    def decode(self, frame):
+        """
+        Extract the call ID from a tagged frame.  Returns a tuple of
+        the call ID, a boolean indicating whether the frame is a
+        response, and the untagged frame.
+
+        :param frame: The tagged frame.
+        """
+
+        pass  # Pragma: nocover
+
+
+class PrefixCodec(RPCCodec):
+    """
+    Tags frames by prefixing them with the call ID, packed with
+    ``struct`` using the given format.  The default format is a 4-byte
+    unsigned integer in network byte order.  The most significant bit
+    of the prefix is set on responses, so call IDs have one bit fewer
+    than the format.
+    """
+
+    def __init__(self, fmt='!I'):
+        """
+        Initialize a PrefixCodec.
+
+        :param fmt: The ``struct`` format of the call ID prefix.  Must
+                    describe a single unsigned integer.
+        """
+
+        self.fmt = struct.Struct(fmt)
+        self.id_limit = 2 ** (self.fmt.size * 8 - 1)
+
+    def encode(self, call_id, frame, response=False):
+        """
+        Tag a frame with a call ID.  Returns the tagged frame.
+
+        :param call_id: The call ID.
+        :param frame: The frame to tag.
+        :param response: If True, the frame is a response; otherwise,
+                         it is a request.
+        """
+
+        if response:
+            call_id |= self.id_limit
+        return self.fmt.pack(call_id) + frame
+
+    def decode(self, frame):
+        """
+        Extract the call ID from a tagged frame.  Returns a tuple of
+        the call ID, a boolean indicating whether the frame is a
+        response, and the untagged frame.
+
+        :param frame: The tagged frame.
+        """
+
+        size = self.fmt.size
+        if len(frame) < size:
+            raise ValueError("frame too short to contain a call ID")
+
+        tag = self.fmt.unpack(frame[:size])[0]
+        return (tag & (self.id_limit - 1), bool(tag & self.id_limit),
+                frame[size:])
+
+
+class _Call(object):
+    """
+    Tracks an outstanding call.
+    """
+
+    __slots__ = ('result', 'timer')
+
+    def __init__(self):
+        """
+        Initialize a _Call.
+        """
+
+        self.result = event.AsyncResult()
+        self.timer = None
+
+
+class RPCApplication(application.Application):
+    """
+    Application for multiplexing requests over a single connection.
+    ``call()`` tags a request frame with a call ID, using a pluggable
+    codec, and sends it; the response bearing the same call ID is set
+    as the value of the ``AsyncResult`` returned by ``call()``.  Many
+    calls may be outstanding at once, so requests are pipelined over
+    the connection rather than each requiring a connection of its own;
+    once ``max_outstanding`` calls are outstanding, ``call()`` blocks
+    until one completes.
+
+    Received requests are passed to ``recv_request()``, which a server
+    may override to process them and respond with ``reply()``.  Late
+    responses, to calls which have already timed out, are discarded.
+
+    Call timeouts are implemented using the manager's timer wheel, and
+    so are only accurate to within the resolution of the wheel.
+    """
+
+    # The maximum number of outstanding calls
+    max_outstanding = 64
+
+    # The default call timeout, in seconds
+    call_timeout = None
+
+    def __init__(self, parent, codec=None, max_outstanding=None,
+                 call_timeout=None):
+        """
+        Initialize the RPCApplication.
+
+        :param parent: The tendril.
+        :param codec: The ``RPCCodec`` used to tag frames with call
+                      IDs.  Defaults to a ``PrefixCodec``.
+        :param max_outstanding: If given, overrides the
+                                ``max_outstanding`` class attribute.
+        :param call_timeout: If given, overrides the ``call_timeout``
+                             class attribute.
+        """
+
+        super(RPCApplication, self).__init__(parent)
+
+        self.codec = codec or PrefixCodec()
+        if max_outstanding is not None:
+            self.max_outstanding = max_outstanding
+        if call_timeout is not None:
+            self.call_timeout = call_timeout
+
+        self._calls = {}
+        self._next_id = 0
+        self._slots = coros.Semaphore(self.max_outstanding)
+
+    def _allocate_id(self):
+        """
+        Allocate an unused call ID.
+        """
+
+        while True:
+            call_id = self._next_id
+            self._next_id = (call_id + 1) % self.codec.id_limit
+            if call_id not in self._calls:
+                return call_id
+
+    def call(self, frame, timeout=None):
+        """
+        Send a request frame.  Returns an ``AsyncResult``, which will
+        be set to the response frame, or to an ``RPCTimeout`` or
+        ``RPCClosed`` exception.  Blocks while ``max_outstanding``
+        calls are outstanding.
+
+        :param frame: The request frame.
+        :param timeout: The time to wait for a response, in seconds.
+                        Defaults to the ``call_timeout`` attribute.
+                        If ``None``, the call never times out.
+        """
+
+        if timeout is None:
+            timeout = self.call_timeout
+
+        self._slots.acquire()
+
+        call = _Call()
+        call_id = self._allocate_id()
+        self._calls[call_id] = call
+
+        if timeout is not None:
+            call.timer = self.parent.manager.timers.schedule(
+                timeout, self._expire, call_id, call)
+
+        try:
+            self.send_frame(self.codec.encode(call_id, frame))
+        except Exception as exc:
+            self._complete(call_id, exception=exc)
+
+        return call.result
+
+    def _complete(self, call_id, value=None, exception=None):
+        """
+        Complete an outstanding call, setting its result.  Returns
+        ``False`` if the call is not outstanding.
+        """
+
+        call = self._calls.pop(call_id, None)
+        if call is None:
+            return False
+
+        if call.timer:
+            self.parent.manager.timers.cancel(call.timer)
+        self._slots.release()
+
+        if exception is not None:
+            call.result.set_exception(exception)
+        else:
+            call.result.set(value)
+
+        return True
+
+    def _expire(self, call_id, call):
+        """
+        Times out an outstanding call.  Called from the manager's
+        timer wheel.
+        """
+
+        # Make sure the ID hasn't been reused by a later call
+        if self._calls.get(call_id) is call:
+            call.timer = None
+            self._complete(call_id, exception=RPCTimeout())
+
+    def _fail_all(self, error):
+        """
+        Fail all outstanding calls with ``RPCClosed``.
+        """
+
+        for call_id in self._calls.keys():
+            self._complete(call_id, exception=RPCClosed(error))
+
+    def recv_frame(self, frame):
+        """
+        Matches a received response to an outstanding call, setting
+        the call's result.  Requests are passed to ``recv_request()``.
+        """
+
+        call_id, response, frame = self.codec.decode(frame)
+        if response:
+            self._complete(call_id, frame)
+        else:
+            self.recv_request(call_id, frame)
+
+    def recv_request(self, call_id, frame):
+        """
+        Called with received request frames.  The default
+        implementation ignores them.
+
+        :param call_id: The call ID of the frame.
+        :param frame: The untagged frame.
+        """
+
+        pass
+
+    def reply(self, call_id, frame):
+        """
+        Send a response frame to a request.
+
+        :param call_id: The call ID of the request, as passed to
+                        ``recv_request()``.
+        :param frame: The response frame.
+        """
+
+        self.send_frame(self.codec.encode(call_id, frame, True))
+
+    def close(self):
+        """
+        Close the connection.  Outstanding calls fail with
+        ``RPCClosed``.
+        """
+
+        super(RPCApplication, self).close()
+        self._fail_all(None)
+
+    def closed(self, error):
+        """
+        Called to notify the application that the connection has been
+        closed.  Outstanding calls fail with ``RPCClosed``.
+        Subclasses overriding this method must call the superclass
+        method.
+        """
+
+        self._fail_all(error)
@@ -0,0 +1,581 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import time
+
+from gevent import event
+
+from tendril import unix
+
+
+# Each ring begins with a header containing the total number of bytes
+# ever written to the ring (the head), the total number of bytes ever
+# read from it (the tail), and a flag set by the producer when it is
+# waiting for space, each in its own cache line
+_HEADER = 192
+_counter = struct.Struct('=Q')
+
+# Shared memory segment files are created with this prefix
+_PREFIX = 'tendril-shm-'
+
+# The byte sent over the socket to signal the other end
+_DOORBELL = '\x01'
+
+
+def _shm_dir(directory=None):
+    """
+    Returns the directory in which to create shared memory segment
+    files.  Defaults to ``/dev/shm``, if it exists, so that the
+    segments are never written to disk.
+
+    :param directory: The directory configured on the manager, if
+                      any.
+    """
+
+    if directory:
+        return directory
+    elif os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+class _Ring(object):
+    """
+    A single-producer, single-consumer ring buffer occupying a region
+    of a shared memory mapping.  The producer only ever advances the
+    head, and the consumer only ever advances the tail; each publishes
+    the new value only after copying the data, so no locking is
+    required.
+    """
+
+    def __init__(self, buf, offset, size):
+        """
+        Initialize a _Ring.
+
+        :param buf: The shared memory mapping.
+        :param offset: The offset of the ring within the mapping.
+        :param size: The size of the ring's data area.
+        """
+
+        self._buf = buf
+        self._head_off = offset
+        self._tail_off = offset + 64
+        self._wait_off = offset + 128
+        self._data_off = offset + _HEADER
+        self.size = size
+
+    def _get(self, offset):
+        """
+        Read a counter from the header.
+        """
+
+        return _counter.unpack_from(self._buf, offset)[0]
+
+    def _put(self, offset, value):
+        """
+        Write a counter to the header.
+        """
+
+        _counter.pack_into(self._buf, offset, value)
+
+    @property
+    def waiting(self):
+        """
+        Retrieve the flag indicating that the producer is waiting for
+        space in the ring.
+        """
+
+        return bool(self._get(self._wait_off))
+
+    @waiting.setter
+    def waiting(self, value):
+        """
+        Set or clear the flag indicating that the producer is waiting
+        for space in the ring.
+        """
+
+        self._put(self._wait_off, 1 if value else 0)
+
+    def free(self):
+        """
+        Returns the number of bytes which may be written to the ring.
+        """
+
+        return self.size - (self._get(self._head_off) -
+                            self._get(self._tail_off))
+
+    def write(self, data):
+        """
+        Write as much of the data as fits to the ring.  Returns the
+        number of bytes written.  Must only be called by the producer.
+
+        :param data: The data to write; may be a string or any object
+                     supporting the buffer interface, such as a
+                     bytearray.
+        """
+
+        head = self._get(self._head_off)
+        count = min(len(data),
+                    self.size - (head - self._get(self._tail_off)))
+        if not count:
+            return 0
+
+        # Copy the data, wrapping around the end of the ring
+        start = self._data_off
+        pos = head % self.size
+        first = min(count, self.size - pos)
+        self._buf[start + pos:start + pos + first] = str(
+            buffer(data, 0, first))
+        if count > first:
+            self._buf[start:start + count - first] = str(
+                buffer(data, first, count - first))
+
+        # Publish the data only once it has been copied
+        self._put(self._head_off, head + count)
+
+        return count
+
+    def read(self, limit):
+        """
+        Read up to ``limit`` bytes from the ring.  Returns the data
+        read, or the empty string if the ring is empty.  Must only be
+        called by the consumer.
+
+        :param limit: The maximum number of bytes to read.
+        """
+
+        tail = self._get(self._tail_off)
+        count = min(limit, self._get(self._head_off) - tail)
+        if not count:
+            return ''
+
+        # Copy the data, wrapping around the end of the ring
+        start = self._data_off
+        pos = tail % self.size
+        first = min(count, self.size - pos)
+        data = self._buf[start + pos:start + pos + first]
+        if count > first:
+            data += self._buf[start:start + count - first]
+
+        # Release the space only once the data has been copied
+        self._put(self._tail_off, tail + count)
+
+        return data
+
+
+class _Segment(object):
+    """
+    A shared memory segment, backed by a file, containing the two
+    rings of a connection: the first carries data from the connecting
+    end to the accepting end, and the second carries data the other
+    way.
+    """
+
+    def __init__(self, path, buf, ring_size):
+        """
+        Initialize a _Segment.
+
+        :param path: The name of the file backing the segment, or
+                     ``None`` if it has been removed.
+        :param buf: The shared memory mapping.
+        :param ring_size: The size of the data area of each ring.
+        """
+
+        self.path = path
+        self.buf = buf
+        self.rings = (_Ring(buf, 0, ring_size),
+                      _Ring(buf, _HEADER + ring_size, ring_size))
+
+    @classmethod
+    def create(cls, directory, ring_size):
+        """
+        Create a new segment.  The file backing the segment is only
+        accessible to the current user.
+
+        :param directory: The directory in which to create the file.
+        :param ring_size: The size of the data area of each ring.
+        """
+
+        length = 2 * (_HEADER + ring_size)
+        fd, path = tempfile.mkstemp(prefix=_PREFIX, dir=directory)
+        try:
+            os.ftruncate(fd, length)
+            buf = mmap.mmap(fd, length)
+        except Exception:
+            os.unlink(path)
+            raise
+        finally:
+            os.close(fd)
+
+        return cls(path, buf, ring_size)
+
+    @classmethod
+    def attach(cls, path, directory, max_ring_size, uid=None):
+        """
+        Attach to a segment created by the other end of a connection.
+        Since the name of the file comes from the other end, it is
+        checked carefully: it must be a regular file created by
+        ``create()`` in the expected directory, of a plausible size,
+        and, if ``uid`` is given, owned by that user.  Once attached,
+        the file is removed.  Raises ValueError if the file is not
+        acceptable.
+
+        :param path: The name of the file backing the segment.
+        :param directory: The directory in which the file must be.
+        :param max_ring_size: The maximum acceptable ring size.
+        :param uid: If given, the user who must own the file.
+        """
+
+        if (os.path.dirname(os.path.abspath(path)) !=
+                os.path.abspath(directory) or
+                not os.path.basename(path).startswith(_PREFIX)):
+            raise ValueError("invalid shared memory segment %r" % path)
+
+        fd = os.open(path, os.O_RDWR | getattr(os, 'O_NOFOLLOW', 0))
+        try:
+            st = os.fstat(fd)
+            ring_size = st.st_size // 2 - _HEADER
+            if (not stat.S_ISREG(st.st_mode) or
+                    (uid is not None and st.st_uid != uid) or
+                    st.st_size % 2 or
+                    not 0 < ring_size <= max_ring_size):
+                raise ValueError("invalid shared memory segment %r" % path)
+
+            buf = mmap.mmap(fd, st.st_size)
+        finally:
+            os.close(fd)
+
+        # Both ends have the segment mapped; the file is no longer
+        # needed
+        segment = cls(path, buf, ring_size)
+        segment.unlink()
+
+        return segment
+
+    def unlink(self):
+        """
+        Remove the file backing the segment, if it has not already
+        been removed.
+        """
+
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def close(self):
+        """
+        Release the segment.
+        """
+
+        self.unlink()
+        self.buf.close()
+
+
+class ShmTendril(unix.UnixStreamTendril):
+    """
+    Manages state associated with a single shared memory connection.
+    Frames are exchanged through a pair of ring buffers in a shared
+    memory segment, so the data never passes through the kernel; the
+    connection's UNIX domain socket is used only to set up the
+    segment, to signal the other end that data or space is available,
+    and to detect the other end closing the connection; in particular,
+    ``send_file()`` reads the file into the ring rather than using
+    ``sendfile()``.  Apart from that, behaves identically to
+    ``UnixStreamTendril``.
+
+    The connecting end creates the segment, in the directory given by
+    the manager's ``shm_dir`` attribute, and sends its name to the
+    accepting end, which verifies that it is owned by the user at the
+    other end of the socket before attaching to it.  Both processes
+    must therefore run as the same user.
+
+    Sent data is buffered, as with a TCP connection, until there is
+    space for it in the ring; ``flush()`` returns once the data is in
+    the ring.  When the ring is full, the sending end waits for the
+    other end to signal that it has made space, checking again at
+    least every ``full_retry`` seconds.
+    """
+
+    proto = 'shm'
+    recv_bufsize = 65536
+
+    # The longest time to wait for space in a full ring before
+    # checking again
+    full_retry = 0.05
+
+    def __init__(self, manager, sock, remote_addr=None, initiate=False):
+        """
+        Initialize a ShmTendril.
+
+        :param manager: The ShmTendrilManager responsible for the
+                        Tendril.
+        :param sock: The socket for the underlying connection.
+        :param remote_addr: The address of the remote end of the
+                            connection represented by the Tendril.
+                            If not provided, will be derived by
+                            calling the ``getpeername()`` method on
+                            the socket.
+        :param initiate: If True, this is the connecting end, which
+                         creates the shared memory segment and sends
+                         its name to the other end.
+        """
+
+        super(ShmTendril, self).__init__(manager, sock, remote_addr)
+
+        # The shared memory segment and the rings in each direction
+        self._segment = None
+        self._tx = None
+        self._rx = None
+        self._attached_event = event.Event()
+
+        # The accepting end buffers the name of the segment until it
+        # has been received
+        self._handshake = ''
+
+        # Set when the other end must be signaled, and when it has
+        # signaled us
+        self._doorbell_pending = False
+        self._space_event = event.Event()
+
+        if initiate:
+            segment = _Segment.create(
+                _shm_dir(getattr(manager, 'shm_dir', None)),
+                getattr(manager, 'ring_size', ShmTendrilManager.ring_size))
+            try:
+                sock.sendall(segment.path + '\n')
+            except Exception:
+                segment.close()
+                raise
+
+            self._attach(segment, 0)
+
+    def _attach(self, segment, side):
+        """
+        Start using a shared memory segment.
+
+        :param segment: The segment.
+        :param side: The index of the ring to send on.
+        """
+
+        self._segment = segment
+        self._tx = segment.rings[side]
+        self._rx = segment.rings[1 - side]
+        self._attached_event.set()
+
+    def _detach(self):
+        """
+        Release the shared memory segment.
+        """
+
+        if self._segment:
+            self._segment.close()
+            self._segment = None
+            self._tx = None
+            self._rx = None
+
+    def _ring_doorbell(self):
+        """
+        Signal the other end.  The signal is sent by the send thread,
+        which is the only thread writing to the socket.
+        """
+
+        self._doorbell_pending = True
+        self._wake_send()
+
+    def _recv_frameify(self, data):
+        """
+        Handle data received on the socket.  The first data received
+        by the accepting end names the shared memory segment; apart
+        from that, data received on the socket only signals that the
+        other end has written data to the ring or made space in it.
+        Drains the receiving ring, passing the data through the
+        receive framer.
+        """
+
+        if not self._segment:
+            self._handshake += data
+            if '\n' not in self._handshake:
+                if len(self._handshake) > 4096:
+                    raise ValueError("shared memory handshake too long")
+                return
+
+            path = self._handshake.partition('\n')[0]
+            self._handshake = ''
+
+            creds = self.peer_credentials
+            segment = _Segment.attach(
+                path, _shm_dir(getattr(self.manager, 'shm_dir', None)),
+                getattr(self.manager, 'max_ring_size',
+                        ShmTendrilManager.max_ring_size),
+                creds[1] if creds else None)
+            self._attach(segment, 1)
+
+        # The send thread may be waiting for space
+        self._space_event.set()
+
+        # Drain the receiving ring
+        while True:
+            chunk = self._rx.read(self.recv_bufsize)
+            if not chunk:
+                break
+
+            # Let the other end know we've made space
+            if self._rx.waiting:
+                self._rx.waiting = False
+                self._ring_doorbell()
+
+            super(ShmTendril, self)._recv_frameify(chunk)
+
+    def _send(self):
+        """
+        Implementation of the send thread.  Writes as much of the
+        buffered data to the sending ring as fits, signaling the
+        other end, until all the buffered data has been written; then
+        exits.
+        """
+
+        # Nothing can be sent until the segment is attached
+        self._attached_event.wait()
+        self._coalesce()
+
+        with self._send_lock:
+            # The other end is signaled even while we're corked
+            while self._doorbell_pending or self._send_ready():
+                # Frames with other priorities join the send buffer
+                # between frames
+                if (self._send_ready() and self._at_boundary() and
+                        self._lanes):
+                    self._splice()
+
+                # Data from files passes through the ring like any
+                # other data
+                if self._send_ready() and self._file_due():
+                    self._read_file()
+
+                if self._send_ready() and self._sendbuf:
+                    data = self._send_data()
+
+                    self._space_event.clear()
+                    sent = self._tx.write(data)
+                    if sent:
+                        self._last_send = time.time()
+
+                        # Count what was sent
+                        self.stats.bytes_sent += sent
+                        if sent < len(data):
+                            self.stats.partial_sends += 1
+
+                        # Trim that much data off the send buffer
+                        del self._sendbuf[:sent]
+                        self.stats.send_buffered = (len(self._sendbuf) +
+                                                    self._lanes_len)
+
+                        # Record the queue times of frames fully sent
+                        if self._send_times:
+                            self._record_send_times()
+
+                        self._doorbell_pending = True
+
+                # Signal the other end
+                if self._doorbell_pending:
+                    self._doorbell_pending = False
+                    self._sock.send(_DOORBELL)
+
+                # If the ring is full, ask the other end to signal
+                # when it has made space, and wait for it
+                if self._send_ready() and self._sendbuf:
+                    self._tx.waiting = True
+                    if not self._tx.free():
+                        self._space_event.wait(self.full_retry)
+
+        # OK, _sendbuf is empty, or we've been corked; _wake_send()
+        # will start a new thread when there's more
+        self._send_thread = None
+        self._sent()
+
+    def close(self):
+        """
+        Close the connection.  Kills the send and receive threads,
+        closes the underlying socket, and releases the shared memory
+        segment.
+        """
+
+        super(ShmTendril, self).close()
+        self._detach()
+
+    def closed(self, error=None):
+        """
+        Notify the application that the connection has been closed.
+        Releases the shared memory segment, if it has not already been
+        released.
+
+        :param error: The exception which has caused the connection to
+                      be closed.  If the connection has been closed
+                      due to an EOF, pass ``None``.
+        """
+
+        self._detach()
+        super(ShmTendril, self).closed(error)
+
+
+class ShmTendrilManager(unix.UnixStreamTendrilManager):
+    """
+    Manages shared memory connections through a particular endpoint,
+    which, as for ``UnixStreamTendrilManager``, names the UNIX domain
+    socket used to establish the connections.  The tendrils exchange
+    data through shared memory rings rather than through the socket;
+    see ``ShmTendril``.  Applications may switch between this and
+    other protocols simply by changing the protocol passed to
+    ``get_manager()``.
+
+    The size of each ring is given by the ``ring_size`` attribute of
+    the connecting manager; rings larger than ``max_ring_size`` are
+    refused by the accepting manager.  Shared memory segment files are
+    created in the directory given by ``shm_dir``, which defaults to
+    ``/dev/shm``, if it exists, or the system temporary directory
+    otherwise; it must be the same for both ends of a connection.
+    """
+
+    proto = 'shm'
+
+    # Sizes of the rings
+    ring_size = 1 << 20
+    max_ring_size = 1 << 28
+
+    # The directory for shared memory segment files
+    shm_dir = None
+
+    def _make_tendril(self, sock, *args):
+        """
+        Construct a tendril for a connected socket.  Tendrils for
+        outgoing connections, which are constructed without a remote
+        address, create the shared memory segment.
+
+        :param sock: The connected socket.
+
+        Additional positional arguments are passed to the tendril
+        class.
+        """
+
+        return ShmTendril(self, sock, *args, initiate=not args)
@@ -0,0 +1,341 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+__all__ = ["TendrilStats", "ManagerStats", "TLSStats", "LatencyHistogram",
+           "LatencyStats"]
+
+
+class _Stats(object):
+    """
+    Base class for fixed-layout statistics records.  Subclasses list
+    their fields in ``_fields`` (and in ``__slots__``); all fields are
+    initialized to 0.  Fields listed in ``_gauges`` describe current
+    state rather than accumulated counts.
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _gauges = ()
+
+    def __init__(self):
+        """
+        Initialize the statistics record.  All fields are set to 0.
+        """
+
+        for name in self._fields:
+            setattr(self, name, 0)
+
+    def add(self, other, gauges=True):
+        """
+        Add the fields of another statistics record of the same type
+        to this one.
+
+        :param other: The statistics record to add.
+        :param gauges: If ``False``, gauge fields will not be added.
+        """
+
+        for name in self._fields:
+            if not gauges and name in self._gauges:
+                continue
+
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def snapshot(self):
+        """
+        Return the current values of all fields as a dictionary.
+        """
+
+        return dict((name, getattr(self, name)) for name in self._fields)
+
+
+class TendrilStats(_Stats):
+    """
+    Traffic counters for a single tendril.  The following fields are
+    available::
+
+    ``bytes_sent``
+      The number of bytes handed to the network.
+
+    ``bytes_recv``
+      The number of bytes received from the network.
+
+    ``frames_sent``
+      The number of frames passed to ``send_frame()``.
+
+    ``frames_recv``
+      The number of frames passed to the application.
+
+    ``partial_sends``
+      The number of socket sends which did not consume all buffered
+      data.
+
+    ``recv_calls``
+      The number of socket receives which returned data.
+
+    ``send_buffered``
+      The number of bytes currently waiting in the send buffer.  This
+      is a gauge, not a counter.
+
+    ``framer_switches``
+      The number of times the send or receive framer was changed.
+
+    ``errors``
+      The number of errors observed on the tendril.
+    """
+
+    _fields = ('bytes_sent', 'bytes_recv', 'frames_sent', 'frames_recv',
+               'partial_sends', 'recv_calls', 'send_buffered',
+               'framer_switches', 'errors')
+    __slots__ = _fields
+    _gauges = ('send_buffered',)
+
+
+class ManagerStats(_Stats):
+    """
+    Connection counters for a tendril manager.  The following fields
+    are available::
+
+    ``accepts``
+      The number of incoming connections accepted.
+
+    ``connects``
+      The number of outgoing connections established.
+
+    ``rejects``
+      The number of connections rejected by the acceptor raising
+      ``RejectConnection``.
+
+    ``closer_trips``
+      The number of times a ``SocketCloser`` error threshold was
+      exceeded, closing the listening socket.
+
+    ``throttled``
+      The number of incoming connections dropped by the manager's
+      admission limits.
+
+    In addition, the ``retired`` attribute contains the accumulated
+    ``TendrilStats`` counters of all tendrils which are no longer
+    tracked by the manager.
+    """
+
+    _fields = ('accepts', 'connects', 'rejects', 'closer_trips',
+               'throttled')
+    __slots__ = _fields + ('retired',)
+
+    def __init__(self):
+        """
+        Initialize the statistics record.  All fields are set to 0,
+        and the ``retired`` statistics are empty.
+        """
+
+        super(ManagerStats, self).__init__()
+
+        self.retired = TendrilStats()
+
+
+class TLSStats(_Stats):
+    """
+    Handshake counters for a ``TLSWrapper``.  The following fields
+    are available::
+
+    ``handshakes``
+      The number of TLS handshakes completed by the wrapper.
+
+    ``handshake_errors``
+      The number of outgoing connections the wrapper failed to
+      establish TLS on, whether the handshake itself or setting it up
+      failed.
+
+    ``session_hits``
+      The number of handshakes which resumed a session from the SSL
+      context's session cache, as counted by the SSL library.
+
+    ``session_misses``
+      The number of sessions offered by the other end which could not
+      be found in the session cache, as counted by the SSL library.
+    """
+
+    _fields = ('handshakes', 'handshake_errors', 'session_hits',
+               'session_misses')
+    __slots__ = _fields
+
+
+class LatencyHistogram(object):
+    """
+    A log-bucketed latency histogram, in the style of HdrHistogram.
+    Latencies are recorded in seconds and stored as integral
+    microseconds.  Values below ``2 ** sub_bits`` microseconds are
+    recorded exactly; larger values are recorded in buckets whose
+    width is a fixed fraction of the value, so that the relative error
+    of any reported value is bounded by ``2 ** (1 - sub_bits)``.
+    """
+
+    def __init__(self, sub_bits=5):
+        """
+        Initialize the LatencyHistogram.
+
+        :param sub_bits: The number of significant bits to retain for
+                         each recorded value.  Determines the
+                         precision of the histogram.
+        """
+
+        self.sub_bits = sub_bits
+        self._sub_count = 1 << sub_bits
+        self._half_count = self._sub_count >> 1
+
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all recorded values.
+        """
+
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        """
+        Compute the bucket index for a value in microseconds.
+        """
+
+        # Small values are recorded exactly
+        if value < self._sub_count:
+            return value
+
+        # Keep only the significant bits of the value
+        shift = value.bit_length() - self.sub_bits
+        return shift * self._half_count + (value >> shift)
+
+    def _value(self, index):
+        """
+        Compute the highest value, in microseconds, which would be
+        recorded in the bucket with the given index.
+        """
+
+        if index < self._sub_count:
+            return index
+
+        shift = index // self._half_count - 1
+        mantissa = index - shift * self._half_count
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, latency):
+        """
+        Record a latency.
+
+        :param latency: The latency to record, in seconds.
+        """
+
+        value = max(int(latency * 1000000), 0)
+        idx = self._index(value)
+
+        # Grow the bucket list as needed
+        if idx >= len(self.counts):
+            self.counts.extend([0] * (idx + 1 - len(self.counts)))
+
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        """
+        Retrieve the latency, in seconds, at or below which the given
+        percentage of recorded values fall.  Returns ``None`` if no
+        values have been recorded.
+
+        :param pct: The desired percentile, from 0 to 100.
+        """
+
+        if not self.count:
+            return None
+
+        # Determine how many values must be at or below the result
+        target = max(int(self.count * pct / 100.0 + 0.5), 1)
+
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value(idx), self.max) / 1000000.0
+
+        return self.max / 1000000.0  # Pragma: nocover
+
+    def snapshot(self):
+        """
+        Return a summary of the recorded latencies as a dictionary.
+        All latencies are given in seconds.
+        """
+
+        if not self.count:
+            return dict(count=0, min=None, max=None, mean=None,
+                        p50=None, p90=None, p99=None, p999=None)
+
+        return dict(
+            count=self.count,
+            min=self.min / 1000000.0,
+            max=self.max / 1000000.0,
+            mean=self.total / 1000000.0 / self.count,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            p999=self.percentile(99.9),
+        )
+
+
+class LatencyStats(object):
+    """
+    The latency histograms maintained by a tendril manager when
+    latency instrumentation is enabled.  The following histograms are
+    available::
+
+    ``recv_frame``
+      The time spent in each call to the application's
+      ``recv_frame()`` method.
+
+    ``send_queue``
+      The time each frame spent in the send buffer, from the call to
+      ``send_frame()`` until its last byte was handed to the network.
+      Only maintained by transports which buffer outgoing data, such
+      as TCP.
+    """
+
+    __slots__ = ('recv_frame', 'send_queue')
+
+    def __init__(self, sub_bits=5):
+        """
+        Initialize the LatencyStats.
+
+        :param sub_bits: The number of significant bits to retain for
+                         each recorded value.
+        """
+
+        self.recv_frame = LatencyHistogram(sub_bits)
+        self.send_queue = LatencyHistogram(sub_bits)
+
+    def snapshot(self):
+        """
+        Return a summary of all histograms as a dictionary.
+        """
+
+        return dict((name, getattr(self, name).snapshot())
+                    for name in self.__slots__)
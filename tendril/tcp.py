@@ -14,9 +14,15 @@
 ## along with this program.  If not, see
 ## <http://www.gnu.org/licenses/>.
 
+import collections
+import errno
+import os
+import time
+
 import gevent
 from gevent import coros
 from gevent import event
+from gevent import queue
 from gevent import socket
 
 from tendril import application
@@ -25,6 +31,15 @@ from tendril import framers
 from tendril import manager
 from tendril import utils
 
+try:
+    from os import sendfile
+except ImportError:
+    try:
+        # Only needed on Python 2, for zero-copy send_file()
+        from sendfile import sendfile
+    except ImportError:
+        sendfile = None
+
 
 class TCPTendril(connection.Tendril):
     """
@@ -34,12 +49,47 @@ class TCPTendril(connection.Tendril):
     of the amount of data requested from the system for each call to
     the socket ``recv()`` method.  This class also provides the
     property ``sock``, allowing access to the underlying ``socket``
-    object (or its wrapper).
+    object (or its wrapper).  The contents of files may be sent with
+    ``send_file()``; when the data has to be read from the file, it is
+    read in chunks of ``file_bufsize`` bytes.
+
+    Idle timeouts may be set using the ``read_idle_timeout``,
+    ``write_idle_timeout``, and ``idle_timeout`` attributes, which
+    default to the values of the same attributes on the manager.  If
+    nothing has been received, nothing has been sent, or nothing has
+    been either sent or received, respectively, for the given number
+    of seconds, the application's ``idle()`` method is called; by
+    default, this closes the connection.  Idle timeouts are checked
+    using the manager's timer wheel, and so are only accurate to
+    within the wheel's resolution.  Timeouts should be set by the
+    acceptor; changes made after the acceptor returns only take effect
+    when the next idle check is made.
+
+    Sends may be coalesced, trading latency for fewer, fuller
+    segments.  If ``coalesce_delay`` is set, the send thread waits up
+    to that many seconds for more data before sending, unless
+    ``coalesce_bytes`` bytes are already buffered or ``flush()`` is
+    called.  A batch of frames may also be sent between calls to
+    ``cork()`` and ``uncork()``; frames sent while the tendril is
+    corked are held until it is uncorked, and where available, the
+    ``TCP_CORK`` option is set, so that the kernel sends only full
+    segments until the batch has been sent.  Latency-sensitive
+    connections may instead set the ``nodelay`` property, which sets
+    the ``TCP_NODELAY`` option, disabling Nagle's algorithm.  The
+    defaults for ``coalesce_delay``, ``coalesce_bytes``, and
+    ``nodelay`` are taken from the manager.
+
+    Frames may be sent with a *priority*; see ``send_frame()``.  Frames
+    sent with a higher priority than the default of 0 are sent as soon
+    as the frame currently being sent is complete, ahead of any other
+    buffered data, while frames sent with a lower priority are only
+    sent once nothing else is buffered.
     """
 
     default_framer = framers.LineFramer
     proto = 'tcp'
     recv_bufsize = 4096
+    file_bufsize = 65536
 
     def __init__(self, manager, sock, remote_addr=None):
         """
@@ -61,9 +111,60 @@ class TCPTendril(connection.Tendril):
 
         self._sock = sock
 
-        # Send buffer and support
-        self._sendbuf_event = event.Event()
-        self._sendbuf = ''
+        # Idle timeouts, and the times of the last activity
+        self.read_idle_timeout = getattr(manager, 'read_idle_timeout', None)
+        self.write_idle_timeout = getattr(manager, 'write_idle_timeout',
+                                          None)
+        self.idle_timeout = getattr(manager, 'idle_timeout', None)
+        self._last_recv = None
+        self._last_send = None
+        self._idle_timer = None
+
+        # Write coalescing policy; _coalesce_event is set to cut short
+        # the coalescing delay
+        self.coalesce_delay = getattr(manager, 'coalesce_delay', None)
+        self.coalesce_bytes = getattr(manager, 'coalesce_bytes', None)
+        self._coalesce_event = event.Event()
+        self._corked = False
+        self._tcp_corked = False
+        self._nodelay = None
+        nodelay = getattr(manager, 'nodelay', None)
+        if nodelay is not None:
+            self.nodelay = nodelay
+
+        # Send buffer and support; the buffer is a bytearray so that
+        # appending to it is amortized constant time and it can be
+        # passed to send() without copying it into a string.  Note
+        # that on Python 2, trimming the sent data from the front, or
+        # inserting data there (see _splice() and _read_file()),
+        # moves all of the remaining data.  _flush_event is set
+        # whenever the send buffer is empty or the connection is
+        # closed
+        self._sendbuf = bytearray()
+        self._flush_event = event.Event()
+        self._flush_event.set()
+
+        # Stream offsets and queue times of buffered frames, for
+        # latency instrumentation
+        self._send_times = collections.deque()
+
+        # Frames sent with a priority other than the default wait in
+        # lanes, keyed by priority, as tuples of the data and the time
+        # it was queued, until they can join the send buffer at a
+        # frame boundary; _frame_ends tracks the stream offsets of
+        # the ends of buffered frames and files, and _boundary is the
+        # offset of the last boundary passed
+        self._lanes = {}
+        self._lanes_len = 0
+        self._frame_ends = collections.deque()
+        self._boundary = 0
+
+        # Regions of files to send, as lists of the stream offset at
+        # which the region begins, the file, and the file offset and
+        # number of bytes left to send; and the total number of bytes
+        # left to send from files
+        self._sendfiles = collections.deque()
+        self._sendfiles_len = 0
 
         # Thread objects for the send and receive threads
         self._recv_thread = None
@@ -75,21 +176,96 @@ class TCPTendril(connection.Tendril):
 
     def _start(self):
         """
-        Starts the underlying send and receive threads.
+        Starts the underlying receive thread, and the send thread if
+        any data has already been sent.  The send thread only runs
+        while there is buffered data to send; see ``_wake_send()``.
         """
 
-        # Initialize the locks
+        # Initialize the locks; the send lock is held by the send
+        # thread only while it is sending
         self._recv_lock = coros.Semaphore(0)
-        self._send_lock = coros.Semaphore(0)
+        self._send_lock = coros.Semaphore(1)
 
-        # Boot the threads
+        # Boot the receive thread, and link it such that we get
+        # notified if it exits
         self._recv_thread = gevent.spawn(self._recv)
-        self._send_thread = gevent.spawn(self._send)
-
-        # Link the threads such that we get notified if one or the
-        # other exits
         self._recv_thread.link(self._thread_error)
-        self._send_thread.link(self._thread_error)
+
+        # The acceptor may already have sent some frames
+        if self.send_pending and not self._corked:
+            self._wake_send()
+
+        # Start watching for idleness
+        self._last_recv = self._last_send = time.time()
+        self._schedule_idle()
+
+    def _schedule_idle(self):
+        """
+        Schedules the next idle check on the manager's timer wheel, if
+        any idle timeouts are set.
+        """
+
+        deadlines = []
+        if self.read_idle_timeout:
+            deadlines.append(self._last_recv + self.read_idle_timeout)
+        if self.write_idle_timeout:
+            deadlines.append(self._last_send + self.write_idle_timeout)
+        if self.idle_timeout:
+            deadlines.append(max(self._last_recv, self._last_send) +
+                             self.idle_timeout)
+
+        if deadlines:
+            self._idle_timer = self.manager.timers.schedule(
+                min(deadlines) - time.time(), self._check_idle)
+
+    def _cancel_idle(self):
+        """
+        Cancels any scheduled idle check.
+        """
+
+        if self._idle_timer:
+            self.manager.timers.cancel(self._idle_timer)
+            self._idle_timer = None
+
+    def _check_idle(self):
+        """
+        Checks whether any idle timeouts have expired, notifying the
+        application if so, then schedules the next check.  Called from
+        the manager's timer wheel.
+        """
+
+        self._idle_timer = None
+
+        # Nothing to do if the connection has been closed
+        if not self._sock:
+            return
+
+        now = time.time()
+        last_active = max(self._last_recv, self._last_send)
+        for kind, timeout, last in (
+                ('idle', self.idle_timeout, last_active),
+                ('read', self.read_idle_timeout, self._last_recv),
+                ('write', self.write_idle_timeout, self._last_send)):
+            if not timeout or now - last < timeout:
+                continue
+
+            try:
+                self.application.idle(kind)
+            except Exception as exc:
+                # Close the connection and notify the application
+                self.close()
+                self.closed(exc)
+                return
+
+            # The application kept the connection; restart the
+            # timeout
+            if kind != 'write':
+                self._last_recv = now
+            if kind != 'read':
+                self._last_send = now
+            break
+
+        self._schedule_idle()
 
     def _recv(self):
         """
@@ -121,6 +297,8 @@ class TCPTendril(connection.Tendril):
                 # Manually close the socket
                 self._sock.close()
                 self._sock = None
+                self._cancel_idle()
+                self._flush_event.set()
 
                 # Make sure the manager knows we're closed
                 super(TCPTendril, self).close()
@@ -134,33 +312,341 @@ class TCPTendril(connection.Tendril):
                 raise gevent.GreenletExit()
 
             # Process the received data
+            self._last_recv = time.time()
             self._recv_frameify(recv_buf)
 
+    def _wake_send(self):
+        """
+        Starts the send thread, unless it is already running.  Does
+        nothing if the tendril has not been started or has been
+        closed.  The send thread exits once it has sent all the
+        buffered data, so an idle connection needs only its receive
+        thread; frames sent while the send thread is waiting to run
+        are sent together.
+        """
+
+        if self._send_lock is None or not self._sock or self._send_thread:
+            return
+
+        # Only an unexpected exit needs handling; the send thread
+        # exits normally whenever it runs out of data
+        self._send_thread = gevent.spawn(self._send)
+        self._send_thread.link_exception(self._thread_error)
+
     def _send(self):
         """
-        Implementation of the send thread.  Waits for data to be added
-        to the send buffer, then passes as much of the buffered data
-        to the socket ``send()`` method as possible.
+        Implementation of the send thread.  Passes as much of the
+        buffered data to the socket ``send()`` method as possible,
+        then exits.
+        """
+
+        self._coalesce()
+
+        with self._send_lock:
+            while self._send_ready():
+                # Frames with other priorities join the send buffer
+                # between frames
+                if self._at_boundary() and self._lanes:
+                    self._splice()
+
+                if self._file_due():
+                    # Send the file region, or read some of it into
+                    # the send buffer if it can't be sent directly
+                    if not self._can_sendfile():
+                        self._read_file()
+                        continue
+                    sent = self._sendfile()
+                else:
+                    data = self._send_data()
+                    sent = self._sock.send(data)
+                    if sent < len(data):
+                        self.stats.partial_sends += 1
+
+                    # Trim that much data off the send buffer, so we
+                    # don't accidentally re-send anything
+                    del self._sendbuf[:sent]
+                    self.stats.send_buffered = (len(self._sendbuf) +
+                                                self._lanes_len)
+
+                # Count what was sent
+                self._last_send = time.time()
+                self.stats.bytes_sent += sent
+
+                # Record the queue times of frames fully sent
+                if self._send_times:
+                    self._record_send_times()
+
+        # OK, _sendbuf is empty, or we've been corked; _wake_send()
+        # will start a new thread when there's more
+        self._send_thread = None
+        self._sent()
+
+    def _send_ready(self):
+        """
+        Determine whether there is buffered data which may be sent
+        now; that is, whether the tendril has data to send and is not
+        corked.
+        """
+
+        return (bool(self._sendbuf or self._sendfiles or self._lanes) and
+                not self._corked)
+
+    def _send_data(self):
+        """
+        Retrieve the buffered data to pass to the next send.  This is
+        the data preceding the next file region, and, if frames with a
+        higher priority than the default are waiting, the end of the
+        frame being sent, so that they may be sent next.
+        """
+
+        ends = []
+        if self._sendfiles:
+            ends.append(self._sendfiles[0][0])
+        if self._frame_ends and self._lanes and max(self._lanes) > 0:
+            ends.append(self._frame_ends[0])
+
+        if not ends:
+            return self._sendbuf
+        return buffer(self._sendbuf, 0, min(ends) - self.stats.bytes_sent)
+
+    def _at_boundary(self):
+        """
+        Determine whether the data sent so far ends on a frame
+        boundary, where frames from the priority lanes may be
+        inserted.  Also discards the ends of frames already sent.
+        """
+
+        bytes_sent = self.stats.bytes_sent
+        while self._frame_ends and self._frame_ends[0] <= bytes_sent:
+            self._boundary = self._frame_ends.popleft()
+
+        return self._boundary == bytes_sent
+
+    def _take_lanes(self, empty):
+        """
+        Remove the frames which should be sent next from the priority
+        lanes: all frames with a priority above the default, in order
+        of priority, or, if nothing else is buffered, the first frame
+        of the highest priority below the default.  Returns a list of
+        tuples of the frame data and the time it was queued.
+
+        :param empty: True if nothing else is buffered.
+        """
+
+        frames = []
+        while self._lanes:
+            priority = max(self._lanes)
+            if priority < 0 and (frames or not empty):
+                break
+
+            lane = self._lanes[priority]
+            frames.append(lane.popleft())
+            self._lanes_len -= len(frames[-1][0])
+            if not lane:
+                del self._lanes[priority]
+
+        return frames
+
+    def _shift_offsets(self, frames):
+        """
+        Account for frames inserted into the stream at the current
+        position: moves the stream offsets of all the buffered data
+        past them, and records the ends of the inserted frames.
+
+        :param frames: A list of tuples of the data of the inserted
+                       frames and the time it was queued, or
+                       ``None``.
+        """
+
+        size = sum(len(data) for data, _queued in frames)
+
+        for region in self._sendfiles:
+            region[0] += size
+        self._frame_ends = collections.deque(
+            end + size for end in self._frame_ends)
+        self._send_times = collections.deque(
+            (end + size, queued) for end, queued in self._send_times)
+
+        # Work backwards, so the ends can be prepended
+        end = self.stats.bytes_sent + size
+        for data, queued in reversed(frames):
+            self._frame_ends.appendleft(end)
+            if queued is not None:
+                self._send_times.appendleft((end, queued))
+            end -= len(data)
+
+    def _splice(self):
+        """
+        Move the frames which should be sent next from the priority
+        lanes to the front of the send buffer.  Must only be called at
+        a frame boundary.
+        """
+
+        frames = self._take_lanes(not (self._sendbuf or self._sendfiles))
+        if not frames:
+            return
+
+        self._shift_offsets(frames)
+        self._sendbuf[0:0] = ''.join(data for data, _queued in frames)
+
+    def _coalesce(self):
+        """
+        Wait up to ``coalesce_delay`` seconds for more data to be
+        sent, so that it may be sent together.  The wait is cut short
+        once ``coalesce_bytes`` bytes are buffered, or when the data
+        is flushed or uncorked.
+        """
+
+        if self.coalesce_delay:
+            self._coalesce_event.wait(self.coalesce_delay)
+
+    def _sent(self):
+        """
+        Called when the send thread exits.  If all the buffered data
+        has been sent, lifts any ``TCP_CORK`` left over from an
+        uncorked batch, pushing out the final partial segment, and
+        wakes up any waiting ``flush()`` calls.
+        """
+
+        self._coalesce_event.clear()
+
+        if self.send_pending:
+            return
+
+        if self._tcp_corked:
+            self._tcp_corked = False
+            self._set_tcp_option('TCP_CORK', 0)
+        self._flush_event.set()
+
+    def _queued(self):
+        """
+        Called when data has been buffered to be sent.  Starts the
+        send thread, unless the tendril is corked, and cuts short the
+        coalescing delay if ``coalesce_bytes`` bytes are buffered.
+        """
+
+        if (self.coalesce_bytes is not None and
+                self.send_pending >= self.coalesce_bytes):
+            self._coalesce_event.set()
+
+        if not self._corked:
+            self._wake_send()
+
+    def _set_tcp_option(self, name, value):
+        """
+        Set a TCP-level socket option.  Returns True if the option was
+        set, or False if the platform does not support it.
+
+        :param name: The name of the option in the ``socket`` module,
+                     e.g., "TCP_NODELAY".
+        :param value: The value of the option.
+        """
+
+        if not self._sock or not hasattr(socket, name):
+            return False
+
+        self._sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name),
+                              value)
+        return True
+
+    def _file_due(self):
+        """
+        Determine whether the next data to send comes from a file;
+        that is, whether all the data buffered before the next file
+        region has been sent.
+        """
+
+        return bool(self._sendfiles and
+                    self._sendfiles[0][0] == self.stats.bytes_sent)
+
+    def _can_sendfile(self):
+        """
+        Determine whether file data may be sent using ``sendfile()``.
+        This requires that ``sendfile()`` be available and that the
+        socket not be wrapped, since a wrapper such as an SSL
+        connection must see the data to be sent.
+        """
+
+        return sendfile is not None and type(self._sock) is socket.socket
+
+    def _advance_file(self, count):
+        """
+        Account for data taken from the next file region.
+
+        :param count: The number of bytes taken from the region.
         """
 
-        # Outer loop: wait for data to send
+        region = self._sendfiles[0]
+        region[0] += count
+        region[2] += count
+        region[3] -= count
+        self._sendfiles_len -= count
+
+        if not region[3]:
+            self._sendfiles.popleft()
+
+    def _sendfile(self):
+        """
+        Send data from the next file region using ``sendfile()``.
+        Returns the number of bytes sent.
+        """
+
+        _start, fileobj, offset, count = self._sendfiles[0]
+        fd = self._sock.fileno()
+
         while True:
-            # Release the send lock and wait for data, then reacquire
-            # the send lock
-            self._send_lock.release()
-            self._sendbuf_event.wait()
-            self._send_lock.acquire()
+            try:
+                sent = sendfile(fd, fileobj.fileno(), offset, count)
+                break
+            except OSError as exc:
+                if exc.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
 
-            # Inner loop: send as much data as we can
-            while self._sendbuf:
-                sent = self._sock.send(self._sendbuf)
+            # Wait for the socket to become writable
+            socket.wait_write(fd)
 
-                # Trim that much data off the send buffer, so we don't
-                # accidentally re-send anything
-                self._sendbuf = self._sendbuf[sent:]
+        if not sent:
+            raise EOFError("end of file with %d bytes left to send" %
+                           count)
 
-            # OK, _sendbuf is empty; clear the event so we'll sleep
-            self._sendbuf_event.clear()
+        self._advance_file(sent)
+
+        return sent
+
+    def _read_file(self):
+        """
+        Read up to ``file_bufsize`` bytes from the next file region
+        into the front of the send buffer.
+        """
+
+        _start, fileobj, offset, count = self._sendfiles[0]
+
+        fileobj.seek(offset)
+        data = fileobj.read(min(count, self.file_bufsize))
+        if not data:
+            raise EOFError("end of file with %d bytes left to send" %
+                           count)
+
+        self._sendbuf[0:0] = data
+        self.stats.send_buffered = len(self._sendbuf) + self._lanes_len
+        self._advance_file(len(data))
+
+    def _record_send_times(self):
+        """
+        Records the send queue latency of each buffered frame which
+        has now been completely handed to the network.
+        """
+
+        latency = getattr(self.manager, 'latency', None)
+        now = time.time()
+
+        while (self._send_times and
+               self._send_times[0][0] <= self.stats.bytes_sent):
+            _end, queued = self._send_times.popleft()
+
+            # Instrumentation may have been disabled in the meantime
+            if latency:
+                latency.send_queue.record(now - queued)
 
     def _thread_error(self, thread):
         """
@@ -174,13 +660,16 @@ class TCPTendril(connection.Tendril):
         if thread == self._recv_thread:
             self._recv_thread = None
 
-        # Figure out why the thread exited
-        if thread.successful():
-            exception = socket.error('thread exited prematurely')
-        elif isinstance(thread.exception, gevent.GreenletExit):
+        # Figure out why the thread exited; note that, depending on
+        # the version of gevent, a killed thread may be considered
+        # successful, with the GreenletExit as its value
+        if (isinstance(thread.exception, gevent.GreenletExit) or
+                isinstance(thread.value, gevent.GreenletExit)):
             # Thread was killed; don't do anything but close
             self.close()
             return
+        elif thread.successful():
+            exception = socket.error('thread exited prematurely')
         else:
             exception = thread.exception
 
@@ -209,7 +698,7 @@ class TCPTendril(connection.Tendril):
         stopping points.
         """
 
-        if self._recv_thread and self._send_thread:
+        if self._recv_thread:
             # Have to suspend the send/recv threads
             self._recv_lock.acquire()
             self._send_lock.acquire()
@@ -218,7 +707,7 @@ class TCPTendril(connection.Tendril):
         self._sock = wrapper(self._sock)
 
         # OK, restart the send/recv threads
-        if self._recv_thread and self._send_thread:
+        if self._recv_thread:
             # Release our locks
             self._send_lock.release()
             self._recv_lock.release()
@@ -231,13 +720,192 @@ class TCPTendril(connection.Tendril):
 
         return self._sock
 
-    def send_frame(self, frame):
+    def send_frame(self, frame, priority=0):
         """
         Sends a frame to the other end of the connection.
+
+        :param frame: The frame to send.
+        :param priority: The priority of the frame.  Frames are sent
+                         in the order they are sent with the same
+                         priority.  A frame with a higher priority
+                         than the default of 0 is sent as soon as the
+                         frame currently being sent is complete, so
+                         that, for instance, a heartbeat need not wait
+                         behind a large response; a frame with a lower
+                         priority is sent only once no other data is
+                         buffered.
+        """
+
+        self._send_stream(self._send_streamify(frame), priority)
+
+    def _send_stream(self, data, priority=0):
+        """
+        Sends streamified data to the other end of the connection.
+        """
+
+        queued = time.time() if getattr(self.manager, 'latency',
+                                        None) else None
+
+        if priority:
+            # Wait in a lane until it can be sent
+            self._lanes.setdefault(priority, collections.deque()).append(
+                (data, queued))
+            self._lanes_len += len(data)
+        else:
+            self._sendbuf += data
+
+            # Remember where the frame ends, and when it was queued
+            end = self.stats.bytes_sent + self._stream_pending
+            self._frame_ends.append(end)
+            if queued is not None:
+                self._send_times.append((end, queued))
+
+        self.stats.send_buffered = len(self._sendbuf) + self._lanes_len
+
+        # Once closed, nothing will be sent, so flush() must not wait
+        if self._sock:
+            self._flush_event.clear()
+
+        self._queued()
+
+    def send_file(self, fileobj, offset=0, count=None):
+        """
+        Sends the contents of a file to the other end of the
+        connection, following any frames already sent.  The data is
+        sent as it is, without passing through the send framer; the
+        other end would typically receive it using a
+        ``ChunkFramer``.  If the socket has not been wrapped, and
+        ``os.sendfile()`` is available (or, on Python 2, the
+        ``pysendfile`` package is installed), the data is copied to
+        the socket by the kernel, without being read into memory;
+        otherwise, it is read from the file as it is sent.
+
+        The file is read only when its data is sent, so it must not be
+        closed or truncated until ``flush()`` returns.  Reading the
+        file may change its current position.
+
+        :param fileobj: The file to send.  Must have a ``fileno()``
+                        method.
+        :param offset: The offset in the file of the first byte to
+                       send.  Defaults to the beginning of the file.
+        :param count: The number of bytes to send.  If not given,
+                      sends the remainder of the file.
+        """
+
+        if count is None:
+            count = os.fstat(fileobj.fileno()).st_size - offset
+        if count <= 0:
+            return
+
+        start = self.stats.bytes_sent + self._stream_pending
+        self._sendfiles.append([start, fileobj, offset, count])
+        self._sendfiles_len += count
+        self._frame_ends.append(start + count)
+        if self._sock:
+            self._flush_event.clear()
+
+        self._queued()
+
+    def cork(self):
+        """
+        Start a batch of frames.  Frames sent until ``uncork()`` is
+        called are buffered, and then sent together.  Where available,
+        the ``TCP_CORK`` option is also set on the socket, so that the
+        kernel sends only full segments until the batch has been
+        sent.  Note that ``flush()`` does not return while the tendril
+        is corked, unless nothing is buffered.
+        """
+
+        self._corked = True
+        if not self._tcp_corked:
+            self._tcp_corked = self._set_tcp_option('TCP_CORK', 1)
+
+    def uncork(self):
+        """
+        End a batch of frames started by ``cork()``, sending the
+        buffered data immediately, without waiting for the coalescing
+        delay.  Once the batch has been sent, any ``TCP_CORK`` option
+        is cleared.
+        """
+
+        if not self._corked:
+            return
+
+        self._corked = False
+        self._coalesce_event.set()
+
+        if self._send_thread or self.send_pending:
+            self._wake_send()
+        else:
+            self._sent()
+
+    @property
+    def corked(self):
         """
+        Determine whether the tendril has been corked.  Read-only.
+        """
+
+        return self._corked
+
+    @property
+    def nodelay(self):
+        """
+        Retrieve the state of the ``TCP_NODELAY`` option, which
+        disables Nagle's algorithm, so that small frames are sent
+        immediately rather than waiting for the acknowledgement of
+        previously sent data.  ``None`` if the option has not been
+        set, or is not supported by the connection.
+        """
+
+        return self._nodelay
+
+    @nodelay.setter
+    def nodelay(self, value):
+        """
+        Set the ``TCP_NODELAY`` option.
+        """
+
+        value = bool(value)
+        if self._set_tcp_option('TCP_NODELAY', int(value)):
+            self._nodelay = value
 
-        self._sendbuf += self._send_streamify(frame)
-        self._sendbuf_event.set()
+    def flush(self, timeout=None):
+        """
+        Wait until all sent frames have been handed to the network, or
+        the connection is closed.  Returns True if no data remains
+        buffered, or False if the timeout expired first or data was
+        left unsent when the connection closed.
+
+        :param timeout: The maximum number of seconds to wait.  If
+                        not given, waits indefinitely.
+        """
+
+        # Don't wait for more data to coalesce with
+        if self.send_pending:
+            self._coalesce_event.set()
+
+        self._flush_event.wait(timeout)
+        return not self.send_pending
+
+    @property
+    def send_pending(self):
+        """
+        Retrieve the number of bytes of sent data which have been
+        buffered but not yet handed to the network, including data
+        remaining to be sent from files and frames waiting to be sent
+        with other priorities.
+        """
+
+        return len(self._sendbuf) + self._sendfiles_len + self._lanes_len
+
+    @property
+    def _stream_pending(self):
+        """
+        Retrieve the number of bytes buffered to be sent in order,
+        excluding frames waiting in the priority lanes.
+        """
+
+        return len(self._sendbuf) + self._sendfiles_len
 
     def close(self):
         """
@@ -257,6 +925,9 @@ class TCPTendril(connection.Tendril):
             self._sock.close()
             self._sock = None
 
+        self._cancel_idle()
+        self._flush_event.set()
+
         # Make sure to notify the manager we're closed
         super(TCPTendril, self).close()
 
@@ -268,12 +939,50 @@ class TCPTendrilManager(manager.TendrilManager):
     This class includes the attribute ``backlog``, which allows tuning
     of the size of the backlog passed to the socket ``listen()``
     method.
+
+    The ``read_idle_timeout``, ``write_idle_timeout``, and
+    ``idle_timeout`` attributes provide the default idle timeouts for
+    the manager's tendrils; see ``TCPTendril``.  TCP keepalives may be
+    enabled on all the manager's connections by setting the
+    ``keepalive`` attribute; the ``keepalive_idle``,
+    ``keepalive_interval``, and ``keepalive_count`` attributes, if
+    set, override the system defaults for the time before the first
+    keepalive probe is sent, the time between probes, and the number
+    of unanswered probes after which the connection is dropped.  (The
+    latter options are not supported on all platforms, and are ignored
+    where not supported.)
+
+    The ``nodelay``, ``coalesce_delay``, and ``coalesce_bytes``
+    attributes provide the defaults for the write coalescing policy
+    of the manager's tendrils; see ``TCPTendril``.  By default, the
+    ``TCP_NODELAY`` option is left at the system default, and data is
+    sent as soon as possible.
     """
 
     proto = 'tcp'
     backlog = 1024
 
-    def connect(self, target, acceptor, wrapper=None):
+    # Default idle timeouts for tendrils
+    read_idle_timeout = None
+    write_idle_timeout = None
+    idle_timeout = None
+
+    # TCP keepalive options
+    keepalive = False
+    keepalive_idle = None
+    keepalive_interval = None
+    keepalive_count = None
+
+    # Default write coalescing options for tendrils
+    nodelay = None
+    coalesce_delay = None
+    coalesce_bytes = None
+
+    # Default delay before starting the next connection attempt in
+    # connect_any()
+    attempt_delay = 0.25
+
+    def connect(self, target, acceptor, wrapper=None, timeout=None):
         """
         Initiate a connection from the tendril manager's endpoint.
         Once the connection is completed, a TCPTendril object will be
@@ -287,6 +996,10 @@ class TCPTendrilManager(manager.TendrilManager):
                         return a valid proxy for the socket.socket
                         object, which will subsequently be used to
                         communicate on the connection.
+        :param timeout: If given, the maximum number of seconds to
+                        wait for the connection to be established.
+                        If the timeout expires, ``socket.timeout`` is
+                        raised.
 
         For passing extra arguments to the acceptor or the wrapper,
         see the ``TendrilPartial`` class; for chaining together
@@ -296,28 +1009,203 @@ class TCPTendrilManager(manager.TendrilManager):
         # Call some common sanity-checks
         super(TCPTendrilManager, self).connect(target, acceptor, wrapper)
 
-        # Set up the socket
+        # Set up the socket and connect to our target
+        sock = self._connect_sock(target, timeout)
+
+        return self._connected(sock, acceptor, wrapper)
+
+    def connect_any(self, targets, acceptor, wrapper=None, timeout=None,
+                    delay=None):
+        """
+        Initiate a connection from the tendril manager's endpoint to
+        the first of several candidate targets to respond, as when a
+        host name resolves to several addresses.  Connection attempts
+        are started in the order given, staggered by ``delay``
+        seconds; an attempt which fails immediately starts the next.
+        The first attempt to succeed wins, and the rest are cancelled.
+        Once the connection is completed, a TCPTendril object will be
+        created and passed to the given acceptor.
+
+        :param targets: A sequence of candidate targets.  All targets
+                        must be in the same address family as the
+                        manager's endpoint.
+        :param acceptor: A callable which will initialize the state of
+                         the new TCPTendril object.
+        :param wrapper: A callable taking, as its first argument, a
+                        socket.socket object.  The callable must
+                        return a valid proxy for the socket.socket
+                        object, which will subsequently be used to
+                        communicate on the connection.
+        :param timeout: If given, the maximum number of seconds to
+                        wait for any connection to be established.  If
+                        the timeout expires, ``socket.timeout`` is
+                        raised.
+        :param delay: The number of seconds to wait for an attempt to
+                      complete before starting the next one.  Defaults
+                      to the ``attempt_delay`` attribute.
+
+        If all the attempts fail, the exception raised by the last
+        attempt to fail is re-raised.
+        """
+
+        if not targets:
+            raise ValueError("no targets given")
+
+        # Call some common sanity-checks on each target
+        for target in targets:
+            super(TCPTendrilManager, self).connect(target, acceptor, wrapper)
+
+        if delay is None:
+            delay = self.attempt_delay
+        deadline = None if timeout is None else time.time() + timeout
+
+        remaining = collections.deque(targets)
+        results = queue.Queue()
+        attempts = []
+        pending = 0
+        error = None
+        sock = None
+
+        try:
+            while remaining or pending:
+                # Start the next attempt
+                wait = None
+                if remaining:
+                    attempts.append(gevent.spawn(self._connect_attempt,
+                                                 remaining.popleft(),
+                                                 results))
+                    pending += 1
+                    if remaining:
+                        wait = delay
+
+                # Don't wait beyond the deadline
+                if deadline is not None:
+                    left = deadline - time.time()
+                    if left <= 0:
+                        raise socket.timeout('timed out')
+                    wait = left if wait is None else min(wait, left)
+
+                try:
+                    sock, exc = results.get(timeout=wait)
+                except queue.Empty:
+                    # Delay elapsed; start another attempt
+                    continue
+
+                pending -= 1
+                if sock:
+                    break
+                error = exc
+            else:
+                # All the attempts failed
+                raise error
+        finally:
+            # Cancel the outstanding attempts, closing any sockets
+            # which connected in the meantime
+            gevent.killall(attempts)
+            while not results.empty():
+                other, _exc = results.get_nowait()
+                if other:
+                    other.close()
+
+        return self._connected(sock, acceptor, wrapper)
+
+    def _connect_attempt(self, target, results):
+        """
+        Make a single connection attempt for ``connect_any()``.  Puts
+        a tuple of the connected socket and ``None``, or of ``None``
+        and the exception raised, on the results queue.
+        """
+
+        try:
+            sock = self._connect_sock(target)
+        except Exception as exc:
+            results.put((None, exc))
+        else:
+            results.put((sock, None))
+
+    def _connect_sock(self, target, timeout=None):
+        """
+        Create a socket bound to the manager's endpoint and connect it
+        to the target.  Returns the connected socket.
+
+        :param target: The target of the connection attempt.
+        :param timeout: If given, the maximum number of seconds to
+                        wait for the connection to be established.
+        """
+
         sock = socket.socket(self.addr_family, socket.SOCK_STREAM)
 
-        with utils.SocketCloser(sock, ignore=[application.RejectConnection]):
+        with utils.SocketCloser(sock):
             # Bind to our endpoint
             sock.bind(self.endpoint)
+            self._set_keepalive(sock)
 
-            # Connect to our target
+            # Connect to our target, waiting only as long as requested
+            if timeout is not None:
+                sock.settimeout(timeout)
             sock.connect(target)
+            if timeout is not None:
+                sock.settimeout(None)
+
+            return sock
+
+    def _set_keepalive(self, sock):
+        """
+        Set the TCP keepalive options on a socket, if enabled.
+        """
+
+        if not self.keepalive:
+            return
+
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        for opt, value in (('TCP_KEEPIDLE', self.keepalive_idle),
+                           ('TCP_KEEPINTVL', self.keepalive_interval),
+                           ('TCP_KEEPCNT', self.keepalive_count)):
+            if value is not None and hasattr(socket, opt):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt),
+                                value)
+
+    def _make_tendril(self, sock, *args):
+        """
+        Construct a tendril for a connected socket.  Subclasses may
+        override this method to use a different tendril class.
+
+        :param sock: The connected socket.
+
+        Additional positional arguments are passed to the tendril
+        class.
+        """
+
+        return TCPTendril(self, sock, *args)
+
+    def _connected(self, sock, acceptor, wrapper):
+        """
+        Set up a TCPTendril for a newly connected socket.  Returns the
+        TCPTendril, or ``None`` if the acceptor rejected the
+        connection.
+
+        :param sock: The connected socket.
+        :param acceptor: A callable which will initialize the state of
+                         the new TCPTendril object.
+        :param wrapper: A callable which will wrap the socket, or
+                        ``None``.
+        """
 
+        with utils.SocketCloser(sock, ignore=[application.RejectConnection]):
             # Call any wrappers
             if wrapper:
                 sock = wrapper(sock)
 
             # Now, construct a Tendril
-            tend = TCPTendril(self, sock)
+            tend = self._make_tendril(sock)
 
             # Finally, set up the application
-            tend.application = acceptor(tend)
+            tend.application = self._call_acceptor(acceptor, tend)
 
             # OK, let's track the tendril
             self._track_tendril(tend)
+            self.stats.connects += 1
 
             # Start the tendril
             tend._start()
@@ -329,6 +1217,37 @@ class TCPTendrilManager(manager.TendrilManager):
         sock.close()
         return None
 
+    def _listen_sock(self, wrapper):
+        """
+        Create the listening socket, bound to the manager's endpoint,
+        and set the manager's local address.  Returns the listening
+        socket.
+
+        :param wrapper: A callable which will wrap the socket, or
+                        ``None``.
+        """
+
+        sock = socket.socket(self.addr_family, socket.SOCK_STREAM)
+
+        with utils.SocketCloser(sock):
+            # Set up SO_REUSEADDR
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+            # Bind to our endpoint
+            sock.bind(self.endpoint)
+
+            # Get the assigned port number
+            self.local_addr = sock.getsockname()
+
+            # Call any wrappers
+            if wrapper:
+                sock = wrapper(sock)
+
+            # Initiate listening
+            sock.listen(self.backlog)
+
+            return sock
+
     def listener(self, acceptor, wrapper):
         """
         Listens for new connections to the manager's endpoint.  Once a
@@ -362,43 +1281,35 @@ class TCPTendrilManager(manager.TendrilManager):
             return  # Pragma: nocover
 
         # OK, set up the socket
-        sock = socket.socket(self.addr_family, socket.SOCK_STREAM)
-
-        with utils.SocketCloser(sock):
-            # Set up SO_REUSEADDR
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-            # Bind to our endpoint
-            sock.bind(self.endpoint)
-
-            # Get the assigned port number
-            self.local_addr = sock.getsockname()
-
-            # Call any wrappers
-            if wrapper:
-                sock = wrapper(sock)
-
-            # Initiate listening
-            sock.listen(self.backlog)
+        sock = self._listen_sock(wrapper)
 
         # OK, now go into an accept loop with an error threshold of 10
         closer = utils.SocketCloser(sock, 10,
-                                    ignore=[application.RejectConnection])
+                                    ignore=[application.RejectConnection],
+                                    on_trip=self._closer_tripped)
         while True:
             with closer:
                 cli, addr = sock.accept()
 
+                # Drop the connection if it exceeds the admission
+                # limits
+                if not self._admit(addr):
+                    cli.close()
+                    continue
+
                 # OK, the connection has been accepted; construct a
                 # Tendril for it
-                tend = TCPTendril(self, cli, addr)
+                tend = self._make_tendril(cli, addr)
 
                 # Set up the application
                 with utils.SocketCloser(cli):
-                    tend.application = acceptor(tend)
+                    self._set_keepalive(cli)
+                    tend.application = self._call_acceptor(acceptor, tend)
 
                     # Make sure we track the new tendril, but only if
                     # the acceptor doesn't throw any exceptions
                     self._track_tendril(tend)
+                    self.stats.accepts += 1
 
                     # Start the tendril
                     tend._start()
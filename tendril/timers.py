@@ -0,0 +1,179 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import time
+
+import gevent
+
+
+__all__ = ["TimerWheel"]
+
+
+class Timer(object):
+    """
+    A timer scheduled on a ``TimerWheel``.  Returned by
+    ``TimerWheel.schedule()``, and may be passed to
+    ``TimerWheel.cancel()``.
+    """
+
+    __slots__ = ('tick', 'callback', 'args')
+
+    def __init__(self, tick, callback, args):
+        """
+        Initialize a Timer.
+
+        :param tick: The wheel tick at which the timer expires.
+        :param callback: The callable to call when the timer expires.
+        :param args: A tuple of positional arguments for the
+                     callback.
+        """
+
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+
+
+class TimerWheel(object):
+    """
+    A hashed timer wheel.  Allows large numbers of coarse timers to
+    share a single thread, rather than each timer requiring its own
+    event loop timer.  Timers are hashed into slots by the tick at
+    which they expire; a thread, running only while timers are
+    scheduled, advances the wheel once per tick and expires the timers
+    in the slot.  Timers are accurate to within the resolution of the
+    wheel, and are never expired early.
+
+    Callbacks are called in their own threads, so they may block
+    without delaying the expiration of other timers.
+    """
+
+    def __init__(self, resolution=1.0, slots=512):
+        """
+        Initialize a TimerWheel.
+
+        :param resolution: The length of a tick, in seconds.
+        :param slots: The number of slots in the wheel.  Timers
+                      expiring more than ``resolution * slots``
+                      seconds in the future share slots with earlier
+                      timers, and are passed over until their tick
+                      arrives.
+        """
+
+        self.resolution = resolution
+        self.slots = slots
+
+        self._wheel = [set() for _i in range(slots)]
+        self._epoch = time.time()
+        self._tick = 0
+        self._count = 0
+        self._thread = None
+
+    def __len__(self):
+        """Return the number of scheduled timers."""
+
+        return self._count
+
+    def _now_tick(self):
+        """Return the current tick."""
+
+        return int((time.time() - self._epoch) / self.resolution)
+
+    def schedule(self, delay, callback, *args):
+        """
+        Schedule a callback to be called after a delay.  Returns a
+        ``Timer`` object, which may be passed to ``cancel()``.
+
+        :param delay: The delay, in seconds.
+        :param callback: The callable to call once the delay has
+                         elapsed.  Additional positional arguments
+                         are passed to the callable.
+        """
+
+        # Round up, so the timer never expires early
+        ticks = max(int(-(-delay // self.resolution)), 1)
+        timer = Timer(self._now_tick() + ticks, callback, args)
+
+        self._wheel[timer.tick % self.slots].add(timer)
+        self._count += 1
+
+        # Make sure the wheel is turning
+        if not self._thread:
+            self._tick = self._now_tick()
+            self._thread = gevent.spawn(self._run)
+
+        return timer
+
+    def cancel(self, timer):
+        """
+        Cancel a scheduled timer.  Does nothing if the timer has
+        already expired or been cancelled.
+
+        :param timer: A ``Timer`` returned by ``schedule()``.
+        """
+
+        slot = self._wheel[timer.tick % self.slots]
+        if timer in slot:
+            slot.remove(timer)
+            self._count -= 1
+
+    def _advance(self, now_tick):
+        """
+        Advance the wheel to the given tick, expiring all timers due
+        at or before it.
+        """
+
+        # After a full turn, every slot has been visited
+        steps = min(now_tick - self._tick, self.slots)
+
+        for step in range(1, steps + 1):
+            slot = self._wheel[(self._tick + step) % self.slots]
+            expired = [timer for timer in slot if timer.tick <= now_tick]
+
+            for timer in expired:
+                slot.remove(timer)
+                self._count -= 1
+                gevent.spawn(timer.callback, *timer.args)
+
+        self._tick = max(self._tick, now_tick)
+
+    def _run(self):
+        """
+        Implementation of the wheel thread.  Advances the wheel once
+        per tick until no timers remain.
+        """
+
+        try:
+            while self._count:
+                # Sleep until the start of the next tick
+                next_tick = self._epoch + (self._tick + 1) * self.resolution
+                gevent.sleep(max(next_tick - time.time(), 0))
+
+                self._advance(self._now_tick())
+        finally:
+            self._thread = None
+
+    def stop(self):
+        """
+        Cancel all scheduled timers and stop the wheel thread.
+        """
+
+        if self._thread:
+            self._thread.kill()
+            self._thread = None
+
+        for slot in self._wheel:
+            slot.clear()
+        self._count = 0
@@ -32,9 +32,20 @@ class UDPTendril(connection.Tendril):
 
     proto = 'udp'
 
-    def send_frame(self, frame):
+    def send_frame(self, frame, priority=0):
         """
-        Sends a frame to the other end of the connection.
+        Sends a frame to the other end of the connection.  Frames are
+        sent immediately, so *priority* is ignored.
+        """
+
+        if not self.manager.sock:
+            raise ValueError("UDPTendrilManager not running")
+
+        self._send_stream(self._send_streamify(frame))
+
+    def _send_stream(self, data, priority=0):
+        """
+        Sends a streamified packet to the other end of the connection.
         """
 
         # Get the socket
@@ -45,10 +56,12 @@ class UDPTendril(connection.Tendril):
 
         # Send the packet
         try:
-            sock.sendto(self._send_streamify(frame), self.remote_addr)
+            sock.sendto(data, self.remote_addr)
         except Exception:
             # We're a best-effort service anyway, so ignore exceptions
-            pass
+            self.stats.errors += 1
+        else:
+            self.stats.bytes_sent += len(data)
 
     def close(self):
         """
@@ -169,21 +182,57 @@ class UDPTendrilManager(manager.TendrilManager):
         super(UDPTendrilManager, self).connect(target, acceptor, None)
 
         # Construct the Tendril
-        tend = UDPTendril(self, self.local_addr, target)
+        tend = self._make_tendril(self.local_addr, target)
 
         try:
             # Set up the application
-            tend.application = acceptor(tend)
+            tend.application = self._call_acceptor(acceptor, tend)
         except application.RejectConnection:
             # The acceptor raised a RejectConnection
             return None
 
         # OK, let's track the tendril
         self._track_tendril(tend)
+        self.stats.connects += 1
 
         # Might as well return the tendril, too
         return tend
 
+    def _make_tendril(self, local_addr, remote_addr):
+        """
+        Construct a tendril for a remote address.  Subclasses may
+        override this method to use a different tendril class.
+
+        :param local_addr: The local address of the tendril.
+        :param remote_addr: The remote address of the tendril.
+        """
+
+        return UDPTendril(self, local_addr, remote_addr)
+
+    def _listen_sock(self, wrapper):
+        """
+        Create the socket, bound to the manager's endpoint, and set
+        the manager's local address.  Returns the socket.
+
+        :param wrapper: A callable which will wrap the socket, or
+                        ``None``.
+        """
+
+        sock = socket.socket(self.addr_family, socket.SOCK_DGRAM)
+
+        with utils.SocketCloser(sock):
+            # Bind to our endpoint
+            sock.bind(self.endpoint)
+
+            # Get the assigned port number
+            self.local_addr = sock.getsockname()
+
+            # Call any wrappers
+            if wrapper:
+                sock = wrapper(sock)
+
+            return sock
+
     def listener(self, acceptor, wrapper):
         """
         Listens for new connections to the manager's endpoint.  Once a
@@ -207,18 +256,7 @@ class UDPTendrilManager(manager.TendrilManager):
         """
 
         # OK, set up the socket
-        sock = socket.socket(self.addr_family, socket.SOCK_DGRAM)
-
-        with utils.SocketCloser(sock):
-            # Bind to our endpoint
-            sock.bind(self.endpoint)
-
-            # Get the assigned port number
-            self.local_addr = sock.getsockname()
-
-            # Call any wrappers
-            if wrapper:
-                sock = wrapper(sock)
+        sock = self._listen_sock(wrapper)
 
         # Senders need the socket, too...
         self._sock = sock
@@ -227,7 +265,8 @@ class UDPTendrilManager(manager.TendrilManager):
         # OK, now go into the listening loop with an error threshold
         # of 10
         closer = utils.SocketCloser(sock, 10,
-                                    ignore=[application.RejectConnection])
+                                    ignore=[application.RejectConnection],
+                                    on_trip=self._closer_tripped)
         while True:
             with closer:
                 data, addr = sock.recvfrom(self.recv_bufsize)
@@ -236,18 +275,20 @@ class UDPTendrilManager(manager.TendrilManager):
                 try:
                     tend = self[(self.local_addr, addr)]
                 except KeyError:
-                    if not acceptor:
-                        # Can't accept new connections
+                    if not acceptor or not self._admit(addr):
+                        # Can't accept new connections, or this one
+                        # exceeds the admission limits
                         continue
 
                     # Construct a Tendril
-                    tend = UDPTendril(self, self.local_addr, addr)
+                    tend = self._make_tendril(self.local_addr, addr)
 
                     # Set up the application
-                    tend.application = acceptor(tend)
+                    tend.application = self._call_acceptor(acceptor, tend)
 
                     # OK, let's track the tendril
                     self._track_tendril(tend)
+                    self.stats.accepts += 1
 
                 # We now have a tendril; process the received data
                 try:
@@ -0,0 +1,644 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import collections
+import errno
+import itertools
+import os
+import stat
+import struct
+import sys
+import time
+
+from gevent import socket
+
+from tendril import framers
+from tendril import tcp
+from tendril import udp
+from tendril import utils
+
+
+# Not all versions of Python expose SO_PEERCRED; it has the same
+# value on all Linux platforms
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED',
+                      17 if sys.platform.startswith('linux') else None)
+_ucred = struct.Struct('3i')
+
+
+def _is_abstract(addr):
+    """
+    Returns True if the address is in the Linux abstract namespace,
+    rather than naming a socket file.
+    """
+
+    return addr.startswith('\0')
+
+
+def _remove_stale(path, sock_type):
+    """
+    Remove a socket file left behind by a process which is no longer
+    using it.  Does nothing if the file does not exist, is not a
+    socket, or is still in use.
+
+    :param path: The name of the socket file.
+    :param sock_type: The type of the socket, such as
+                      ``socket.SOCK_STREAM``.
+    """
+
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except OSError:
+        return
+
+    # Only a socket nothing is bound to is stale
+    probe = socket.socket(socket.AF_UNIX, sock_type)
+    try:
+        probe.connect(path)
+    except socket.error as exc:
+        if exc.errno == errno.ECONNREFUSED:
+            os.unlink(path)
+    finally:
+        probe.close()
+
+
+class UnixStreamTendril(tcp.TCPTendril):
+    """
+    Manages state associated with a single UNIX domain stream
+    connection.  Apart from the addressing, behaves identically to
+    ``TCPTendril``.
+
+    The local and remote addresses of a UNIX domain connection are
+    socket file names, or names in the Linux abstract namespace,
+    beginning with a NUL character; an unbound socket has the empty
+    string as its address.  Since several connections may share the
+    same addresses, the key of a UnixStreamTendril also includes a
+    connection number.  The ``peer_credentials`` property provides the
+    credentials of the process at the other end of the connection.
+    """
+
+    proto = 'unix'
+
+    _conn_ids = itertools.count()
+
+    def __init__(self, manager, sock, remote_addr=None):
+        """
+        Initialize a UnixStreamTendril.
+
+        :param manager: The UnixStreamTendrilManager responsible for
+                        the Tendril.
+        :param sock: The socket for the underlying connection.
+        :param remote_addr: The address of the remote end of the
+                            connection represented by the Tendril.
+                            If not provided, will be derived by
+                            calling the ``getpeername()`` method on
+                            the socket.
+        """
+
+        super(UnixStreamTendril, self).__init__(manager, sock, remote_addr)
+
+        self._conn_id = next(self._conn_ids)
+        self._peer_credentials = None
+
+    @property
+    def _tendril_key(self):
+        """
+        Retrieve a key which can be used to look up this tendril.
+        """
+
+        return self.local_addr, self.remote_addr, self._conn_id
+
+    def _set_tcp_option(self, name, value):
+        """
+        UNIX domain sockets have no TCP-level options, so the
+        ``nodelay`` property and the ``TCP_CORK`` option are not
+        supported.  Returns False.
+        """
+
+        return False
+
+    @property
+    def peer_credentials(self):
+        """
+        Retrieve the credentials of the peer process, as a tuple of
+        the process ID, user ID, and group ID.  Returns ``None`` if
+        the platform does not support retrieving peer credentials.
+        """
+
+        if self._peer_credentials is None and SO_PEERCRED is not None:
+            self._peer_credentials = _ucred.unpack(self._sock.getsockopt(
+                socket.SOL_SOCKET, SO_PEERCRED, _ucred.size))
+
+        return self._peer_credentials
+
+
+class UnixSeqpacketTendril(UnixStreamTendril):
+    """
+    Manages state associated with a single UNIX domain sequenced
+    packet connection.  Like a stream connection, delivery is reliable
+    and in order; unlike a stream connection, each frame is sent as a
+    single message, and each message received is passed to the receive
+    framer as it is, so no framing is needed.  The default framer is
+    therefore the ``IdentityFramer``.
+
+    Messages longer than ``recv_bufsize`` are truncated on receipt,
+    and empty messages cannot be distinguished from the connection
+    being closed.
+    """
+
+    default_framer = framers.IdentityFramer
+    proto = 'unixseqpacket'
+    recv_bufsize = 65536
+
+    def __init__(self, manager, sock, remote_addr=None):
+        """
+        Initialize a UnixSeqpacketTendril.
+
+        :param manager: The UnixSeqpacketTendrilManager responsible for
+                        the Tendril.
+        :param sock: The socket for the underlying connection.
+        :param remote_addr: The address of the remote end of the
+                            connection represented by the Tendril.
+                            If not provided, will be derived by
+                            calling the ``getpeername()`` method on
+                            the socket.
+        """
+
+        super(UnixSeqpacketTendril, self).__init__(manager, sock,
+                                                   remote_addr)
+
+        # Messages waiting to be sent, and their total length
+        self._sendq = collections.deque()
+        self._sendq_len = 0
+
+    def _send(self):
+        """
+        Implementation of the send thread.  Sends each queued message
+        in turn, then exits.
+        """
+
+        self._coalesce()
+
+        with self._send_lock:
+            while self._send_ready():
+                # Every message ends on a frame boundary
+                if self._lanes:
+                    self._splice()
+
+                msg = self._sendq[0]
+                self._sock.send(msg)
+                self._last_send = time.time()
+
+                # Count what was sent; messages are sent whole
+                self._sendq.popleft()
+                self._sendq_len -= len(msg)
+                self.stats.bytes_sent += len(msg)
+                self.stats.send_buffered = self._sendq_len + self._lanes_len
+
+                # Record the queue times of messages sent
+                if self._send_times:
+                    self._record_send_times()
+
+        # OK, _sendq is empty, or we've been corked; _wake_send()
+        # will start a new thread when there's more
+        self._send_thread = None
+        self._sent()
+
+    def _send_ready(self):
+        """
+        Determine whether there are queued messages which may be sent
+        now; that is, whether the tendril has messages to send and is
+        not corked.
+        """
+
+        return bool(self._sendq or self._lanes) and not self._corked
+
+    def _shift_offsets(self, frames):
+        """
+        Account for messages inserted at the front of the message
+        queue.  Every message ends on a frame boundary, so there are
+        no frame ends to track; only the ends recorded for the send
+        queue latency need to be moved.
+
+        :param frames: A list of tuples of the data of the inserted
+                       messages and the time it was queued, or
+                       ``None``.
+        """
+
+        if not self._send_times and all(queued is None
+                                        for _data, queued in frames):
+            return
+
+        size = sum(len(data) for data, _queued in frames)
+        self._send_times = collections.deque(
+            (end + size, queued) for end, queued in self._send_times)
+
+        # Work backwards, so the ends can be prepended
+        end = self.stats.bytes_sent + size
+        for data, queued in reversed(frames):
+            if queued is not None:
+                self._send_times.appendleft((end, queued))
+            end -= len(data)
+
+    def _splice(self):
+        """
+        Move the messages which should be sent next from the priority
+        lanes to the front of the message queue.
+        """
+
+        frames = self._take_lanes(not self._sendq)
+        if not frames:
+            return
+
+        self._shift_offsets(frames)
+        self._sendq.extendleft(data for data, _queued in reversed(frames))
+        self._sendq_len += sum(len(data) for data, _queued in frames)
+
+    def _send_stream(self, data, priority=0):
+        """
+        Queues a message to be sent to the other end of the
+        connection.
+        """
+
+        queued = time.time() if getattr(self.manager, 'latency',
+                                        None) else None
+
+        if priority:
+            # Wait in a lane until it can be sent
+            self._lanes.setdefault(priority, collections.deque()).append(
+                (data, queued))
+            self._lanes_len += len(data)
+        else:
+            self._sendq.append(data)
+            self._sendq_len += len(data)
+
+            # Remember where the message ends and when it was queued
+            if queued is not None:
+                self._send_times.append(
+                    (self.stats.bytes_sent + self._sendq_len, queued))
+
+        self.stats.send_buffered = self._sendq_len + self._lanes_len
+
+        # Once closed, nothing will be sent, so flush() must not wait
+        if self._sock:
+            self._flush_event.clear()
+
+        self._queued()
+
+    def flush(self, timeout=None):
+        """
+        Wait until all sent frames have been handed to the network, or
+        the connection is closed.  Returns True if no messages remain
+        queued, or False if the timeout expired first or messages were
+        left unsent when the connection closed.
+
+        :param timeout: The maximum number of seconds to wait.  If
+                        not given, waits indefinitely.
+        """
+
+        # Don't wait for more messages to coalesce with
+        if self.send_pending:
+            self._coalesce_event.set()
+
+        self._flush_event.wait(timeout)
+        return not self.send_pending
+
+    def send_file(self, fileobj, offset=0, count=None):
+        """
+        Not supported, since the contents of a file cannot be sent as
+        part of a message.
+        """
+
+        raise ValueError("cannot send files on sequenced packet "
+                         "connections")
+
+    @property
+    def send_pending(self):
+        """
+        Retrieve the number of bytes of sent data which have been
+        queued but not yet handed to the network.
+        """
+
+        return self._sendq_len + self._lanes_len
+
+
+class UnixDgramTendril(udp.UDPTendril):
+    """
+    Manages state associated with a single UNIX domain datagram
+    "connection".  The remote address is that of the peer socket; a
+    peer whose socket is not bound has the address ``None``, and all
+    such peers share a single tendril, which cannot be sent to.
+    """
+
+    proto = 'unixdgram'
+
+
+class _UnixManagerMixin(object):
+    """
+    Support for managers of UNIX domain sockets.  The endpoint must be
+    the name of a socket file or, on Linux, a name in the abstract
+    namespace, beginning with a NUL character.
+    """
+
+    # The socket type, for stale socket detection
+    sock_type = socket.SOCK_STREAM
+
+    def __init__(self, endpoint=None):
+        """
+        Initialize the manager.
+
+        :param endpoint: The name of the socket file to bind to.
+                         Names beginning with a NUL character are in
+                         the Linux abstract namespace.
+        """
+
+        # get_manager() passes the default TCP endpoint when none is
+        # given
+        if endpoint == ('', 0):
+            endpoint = None
+        elif endpoint and not isinstance(endpoint, basestring):
+            raise ValueError("UNIX socket endpoint must be a string")
+
+        super(_UnixManagerMixin, self).__init__(endpoint)
+
+        # The default endpoint is a TCP address; override the family
+        self.addr_family = socket.AF_UNIX
+
+    @property
+    def _bind_addr(self):
+        """
+        Retrieve the address to bind sockets to, or ``None`` if sockets
+        should be left unbound.
+        """
+
+        if isinstance(self.endpoint, basestring):
+            return self.endpoint
+        return None
+
+    def _bind(self, sock, path):
+        """
+        Bind a socket to a path, first removing any stale socket file,
+        and set the manager's local address.
+
+        :param sock: The socket to bind.
+        :param path: The address to bind to.
+        """
+
+        if path and not _is_abstract(path):
+            _remove_stale(path, self.sock_type)
+
+        sock.bind(path)
+
+        # Get the bound address
+        self.local_addr = sock.getsockname()
+
+    def _unlink(self):
+        """
+        Remove the socket file, if the manager created one.
+        """
+
+        path = self._bind_addr
+        if path and not _is_abstract(path) and self._local_addr == path:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+class UnixStreamTendrilManager(_UnixManagerMixin, tcp.TCPTendrilManager):
+    """
+    Manages UNIX domain stream connections through a particular
+    endpoint, which must be the name of a socket file or, on Linux, a
+    name in the abstract namespace, beginning with a NUL character.
+    If no endpoint is given, the manager can only initiate connections.
+    Outgoing connections are always made from unbound sockets, since
+    the endpoint is the listening socket's name, and only one socket
+    may be bound to it.
+
+    Connections are handled by the ``TCPTendrilManager`` machinery,
+    including idle timeouts and admission control; TCP keepalives are
+    not applicable, and are ignored.  When listening, a stale socket
+    file left behind by a previous process is removed, provided no
+    process is accepting connections on it; and the socket file is
+    removed when the manager stops listening.
+    """
+
+    proto = 'unix'
+
+    def _make_tendril(self, sock, *args):
+        """
+        Construct a tendril for a connected socket.
+
+        :param sock: The connected socket.
+
+        Additional positional arguments are passed to the tendril
+        class.
+        """
+
+        return UnixStreamTendril(self, sock, *args)
+
+    def _connect_sock(self, target, timeout=None):
+        """
+        Create an unbound socket and connect it to the target.
+        Returns the connected socket.
+
+        :param target: The target of the connection attempt.
+        :param timeout: If given, the maximum number of seconds to
+                        wait for the connection to be established.
+        """
+
+        sock = socket.socket(socket.AF_UNIX, self.sock_type)
+
+        with utils.SocketCloser(sock):
+            # Connect to our target, waiting only as long as requested
+            if timeout is not None:
+                sock.settimeout(timeout)
+            sock.connect(target)
+            if timeout is not None:
+                sock.settimeout(None)
+
+            return sock
+
+    def _set_keepalive(self, sock):
+        """
+        TCP keepalives do not apply to UNIX domain sockets.
+        """
+
+        pass
+
+    def _listen_sock(self, wrapper):
+        """
+        Create the listening socket, bound to the manager's endpoint,
+        and set the manager's local address.  Returns the listening
+        socket.
+
+        :param wrapper: A callable which will wrap the socket, or
+                        ``None``.
+        """
+
+        if not self._bind_addr:
+            raise ValueError("%s has no endpoint to listen on" %
+                             self.__class__.__name__)
+
+        sock = socket.socket(socket.AF_UNIX, self.sock_type)
+
+        with utils.SocketCloser(sock):
+            # Bind to our endpoint
+            self._bind(sock, self._bind_addr)
+
+            # Call any wrappers
+            if wrapper:
+                sock = wrapper(sock)
+
+            # Initiate listening
+            sock.listen(self.backlog)
+
+            return sock
+
+    def listener(self, acceptor, wrapper):
+        """
+        Listens for new connections to the manager's endpoint.  Once a
+        new connection is received, a tendril is generated for it and
+        it is passed to the acceptor, which must initialize the state
+        of the connection.  If no acceptor is given, no new
+        connections can be initialized.  The socket file is removed
+        when the listener exits.
+
+        :param acceptor: If given, specifies a callable that will be
+                         called with each newly received tendril; that
+                         callable is responsible for initial
+                         acceptance of the connection and for setting
+                         up the initial state of the connection.  If
+                         not given, no new connections will be
+                         accepted by the manager.
+        :param wrapper: A callable taking, as its first argument, a
+                        socket.socket object.  The callable must
+                        return a valid proxy for the socket.socket
+                        object, which will subsequently be used to
+                        communicate on the connection.
+        """
+
+        try:
+            super(UnixStreamTendrilManager, self).listener(acceptor, wrapper)
+        finally:
+            self._unlink()
+
+
+class UnixSeqpacketTendrilManager(UnixStreamTendrilManager):
+    """
+    Manages UNIX domain sequenced packet connections through a
+    particular endpoint.  Sequenced packet sockets are connection
+    oriented, like stream sockets, but preserve message boundaries;
+    each frame is sent as a single message.  Otherwise identical to
+    ``UnixStreamTendrilManager``.  Not supported on all platforms.
+    """
+
+    proto = 'unixseqpacket'
+    sock_type = getattr(socket, 'SOCK_SEQPACKET', None)
+
+    def _make_tendril(self, sock, *args):
+        """
+        Construct a tendril for a connected socket.
+
+        :param sock: The connected socket.
+
+        Additional positional arguments are passed to the tendril
+        class.
+        """
+
+        return UnixSeqpacketTendril(self, sock, *args)
+
+
+class UnixDgramTendrilManager(_UnixManagerMixin, udp.UDPTendrilManager):
+    """
+    Manages UNIX domain datagram "connections" through a particular
+    endpoint, which must be the name of a socket file or, on Linux, a
+    name in the abstract namespace, beginning with a NUL character.
+    Unlike UDP, delivery on a UNIX domain datagram socket is reliable
+    and in order.  Otherwise, behaves identically to
+    ``UDPTendrilManager``.
+
+    If no endpoint is given, the socket is bound to an address chosen
+    by the kernel in the abstract namespace, so that peers can reply
+    to it; this is only supported on Linux.  When binding to a socket
+    file, a stale file left behind by a previous process is removed,
+    and the socket file is removed when the manager stops.
+    """
+
+    proto = 'unixdgram'
+    sock_type = socket.SOCK_DGRAM
+    recv_bufsize = 65536
+
+    def _make_tendril(self, local_addr, remote_addr):
+        """
+        Construct a tendril for a remote address.
+
+        :param local_addr: The local address of the tendril.
+        :param remote_addr: The remote address of the tendril.
+        """
+
+        return UnixDgramTendril(self, local_addr, remote_addr)
+
+    def _listen_sock(self, wrapper):
+        """
+        Create the socket, bound to the manager's endpoint, and set
+        the manager's local address.  Returns the socket.
+
+        :param wrapper: A callable which will wrap the socket, or
+                        ``None``.
+        """
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+        with utils.SocketCloser(sock):
+            # Bind to our endpoint; the empty string asks the kernel
+            # to choose an address
+            self._bind(sock, self._bind_addr or '')
+
+            # Call any wrappers
+            if wrapper:
+                sock = wrapper(sock)
+
+            return sock
+
+    def listener(self, acceptor, wrapper):
+        """
+        Listens for new connections to the manager's endpoint.  Once a
+        datagram is received from a new remote address, a
+        UnixDgramTendril object is generated for it and it is passed
+        to the acceptor, which must initialize the state of the
+        connection.  If no acceptor is given, no new connections can
+        be initialized.  The socket file is removed when the listener
+        exits.
+
+        :param acceptor: If given, specifies a callable that will be
+                         called with each newly received
+                         UnixDgramTendril; that callable is responsible
+                         for initial acceptance of the connection and
+                         for setting up the initial state of the
+                         connection.  If not given, no new connections
+                         will be accepted by the UnixDgramTendrilManager.
+        :param wrapper: A callable taking, as its first argument, a
+                        socket.socket object.  The callable must
+                        return a valid proxy for the socket.socket
+                        object, which will subsequently be used to
+                        communicate on the connection.
+        """
+
+        try:
+            super(UnixDgramTendrilManager, self).listener(acceptor, wrapper)
+        finally:
+            self._unlink()
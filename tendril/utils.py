@@ -15,13 +15,16 @@
 ## <http://www.gnu.org/licenses/>.
 
 import collections
+import time
 
 from gevent import socket
+from gevent import ssl
 
-import netaddr
+from tendril import stats
 
 
-__all__ = ["TendrilPartial", "WrapperChain", "addr_info", "SocketCloser"]
+__all__ = ["TendrilPartial", "WrapperChain", "TLSWrapper", "addr_info",
+           "SocketCloser"]
 
 
 class TendrilPartial(object):
@@ -110,6 +113,106 @@ class WrapperChain(object):
         return self
 
 
+class TLSWrapper(object):
+    """
+    A socket wrapper which establishes TLS on the sockets it wraps,
+    using a single SSL context for all of them.  Wrapping each socket
+    with ``ssl.wrap_socket()`` creates a new context for every
+    connection, which discards the session cache and the session
+    ticket keys along with it, so that every handshake is a full
+    handshake; sharing the context allows the server end to resume
+    sessions offered by clients reconnecting to it.  (The Python 2
+    ``ssl`` module provides no way for the client end to offer a
+    previous session, so resumption depends on the client's TLS
+    implementation.)
+
+    When wrapping an outgoing connection, the handshake is performed
+    by the wrapper, and the time it takes is recorded in the
+    ``handshake_time`` histogram.  The default context checks the
+    server's host name, which may be given when the wrapper is
+    created or, so that connections to different servers may share
+    the wrapper and its context, for each connection; for instance,
+    pass ``TendrilPartial(wrapper, server_hostname='example.com')``
+    as the wrapper to ``connect()``.  When wrapping a listening
+    socket, by passing ``server_side=True``, each connection's
+    handshake is performed as it is accepted.  Handshake and session
+    counters are available through the ``stats`` attribute; see
+    ``TLSStats``.
+    """
+
+    def __init__(self, context=None, server_side=False,
+                 server_hostname=None):
+        """
+        Initialize a TLSWrapper.
+
+        :param context: The SSL context to use.  Must be a
+                        ``gevent.ssl.SSLContext``, so that the wrapped
+                        sockets cooperate with other threads.  If not
+                        given, a context with the default settings
+                        from ``ssl.create_default_context()`` is
+                        created.
+        :param server_side: If ``True``, the wrapper is to be used for
+                            the listening socket of a server.
+        :param server_hostname: The default host name of the server,
+                                for server name indication and host
+                                name checking on outgoing connections.
+        """
+
+        if context is None:
+            context = ssl.create_default_context(
+                ssl.Purpose.CLIENT_AUTH if server_side else
+                ssl.Purpose.SERVER_AUTH)
+
+        self.context = context
+        self.server_side = server_side
+        self.server_hostname = server_hostname
+
+        self.handshake_time = stats.LatencyHistogram()
+        self._stats = stats.TLSStats()
+
+    def __call__(self, sock, server_hostname=None):
+        """
+        Wrap a socket.  For outgoing connections, performs the TLS
+        handshake before returning the wrapped socket.
+
+        :param sock: The socket to wrap.
+        :param server_hostname: The host name of the server, for
+                                outgoing connections.  Defaults to
+                                the ``server_hostname`` attribute.
+        """
+
+        if self.server_side:
+            return self.context.wrap_socket(sock, server_side=True)
+
+        start = time.time()
+        try:
+            sock = self.context.wrap_socket(
+                sock, do_handshake_on_connect=False,
+                server_hostname=server_hostname or self.server_hostname)
+            sock.do_handshake()
+        except Exception:
+            self._stats.handshake_errors += 1
+            raise
+
+        self.handshake_time.record(time.time() - start)
+        self._stats.handshakes += 1
+
+        return sock
+
+    @property
+    def stats(self):
+        """
+        Retrieve the handshake counters.  The session counters are
+        updated from the SSL context.
+        """
+
+        session = self.context.session_stats()
+        self._stats.session_hits = int(session['hits'])
+        self._stats.session_misses = int(session['misses'])
+
+        return self._stats
+
+
 def addr_info(addr):
     """
     Interprets an address in standard tuple format to determine if it
@@ -144,12 +247,13 @@ def addr_info(addr):
         return socket.AF_INET
 
     # See if it's valid...
-    if netaddr.valid_ipv6(ipaddr):
+    family = _ip_family(ipaddr)
+    if family == socket.AF_INET6:
         if len(addr) > 4:
             raise ValueError("cannot understand address")
 
         return socket.AF_INET6
-    elif netaddr.valid_ipv4(ipaddr):
+    elif family == socket.AF_INET:
         if len(addr) != 2:
             raise ValueError("cannot understand address")
 
@@ -158,12 +262,78 @@ def addr_info(addr):
     raise ValueError("cannot understand address")
 
 
+# The maximum number of IP addresses for which _ip_family() caches
+# the result
+ADDR_CACHE_SIZE = 1024
+
+_addr_cache = {}
+
+
+def _ip_family(ipaddr):
+    """
+    Determines the socket family of an IP address given as a string.
+    Returns ``socket.AF_INET6`` or ``socket.AF_INET``, or ``None`` if
+    the string is not a valid IP address.  Results are cached; the
+    cache is simply emptied once it holds ``ADDR_CACHE_SIZE`` entries,
+    keeping a cache hit as cheap as a dictionary lookup.
+    """
+
+    try:
+        return _addr_cache[ipaddr]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable, so certainly not an IP address
+        return None
+
+    family = _classify_ip(ipaddr)
+
+    if len(_addr_cache) >= ADDR_CACHE_SIZE:
+        _addr_cache.clear()
+    _addr_cache[ipaddr] = family
+
+    return family
+
+
+def _classify_ip(ipaddr):
+    """
+    Determines the socket family of an IP address given as a string,
+    without consulting the cache.  Uses ``socket.inet_pton()`` where
+    available, and otherwise falls back to ``netaddr``, which is only
+    imported when needed.
+    """
+
+    if not hasattr(socket, 'inet_pton'):
+        try:
+            import netaddr
+        except ImportError:
+            raise RuntimeError("netaddr is required on platforms without "
+                               "inet_pton()")
+
+        if netaddr.valid_ipv6(ipaddr):
+            return socket.AF_INET6
+        elif netaddr.valid_ipv4(ipaddr):
+            return socket.AF_INET
+        return None
+
+    # IPv4 addresses are the most common, so try them first
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, ipaddr)
+        except (socket.error, TypeError, ValueError):
+            continue
+
+        return family
+
+    return None
+
+
 class SocketCloser(object):
     """
     Context manager that ensures a socket is closed.
     """
 
-    def __init__(self, sock, err_thresh=0, ignore=None):
+    def __init__(self, sock, err_thresh=0, ignore=None, on_trip=None):
         """
         Initialize the SocketCloser.
 
@@ -172,12 +342,20 @@ class SocketCloser(object):
                            before the socket is closed.  If not given
                            or given as 0, no error counting behavior
                            will be used.
+        :param ignore: A list of exception classes which will be
+                       ignored entirely.
+        :param on_trip: If given, a callable which will be called
+                        with the SocketCloser when the socket is
+                        closed because the error threshold has been
+                        exceeded.  Only used if err_thresh is
+                        non-zero.
         """
 
         self.sock = sock
         self.err_thresh = err_thresh
         self.errors = 0 if err_thresh > 0 else None
         self.ignore = frozenset(ignore) if ignore else frozenset()
+        self.on_trip = on_trip
 
     def __enter__(self):
         """Enter the context.  Returns the SocketCloser."""
@@ -218,6 +396,11 @@ class SocketCloser(object):
                 self.sock.close()
             except Exception:
                 pass
+
+            # Report exceeding the error threshold
+            if (self.on_trip and self.errors is not None and
+                    issubclass(exc_type, Exception)):
+                self.on_trip(self)
         elif self.errors:
             # No error occurred, so decrement the error count
             self.errors -= 1
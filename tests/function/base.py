@@ -48,13 +48,15 @@ class EchoApplicationServer(tendril.Application):
         self.send_frame(frame)
 
 
-def start_server(proto):
-    manager = tendril.get_manager(proto, ('127.0.0.1', 0))
+def start_server(proto, endpoint):
+    manager = tendril.get_manager(proto, endpoint)
     manager.start(EchoApplicationServer)
     return manager
 
 
 class TestBasicFunction(unittest.TestCase):
+    endpoint = ('127.0.0.1', 0)
+
     def setUp(self):
         self.p_managers = mock.patch.object(manager.TendrilManager,
                                             '_managers', {})
@@ -67,7 +69,7 @@ class TestBasicFunction(unittest.TestCase):
         self.p_tendrils.start()
         self.p_running_managers.start()
 
-        self.serv = start_server(self.proto)
+        self.serv = start_server(self.proto, self.endpoint)
         self.cli, self.app = start_client(self.proto, self.serv.local_addr)
 
     def tearDown(self):
@@ -0,0 +1,50 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+from tests.function import base
+
+
+class TestMemoryFunction(base.TestBasicFunction):
+    proto = 'memory'
+    endpoint = 'echo'
+
+    def test_proto_flush(self):
+        tend = self.app.parent
+        tend.send_frame('frame1')
+        tend.send_frame('frame2')
+        tend.send_frame('frame3')
+
+        # Once both ends are flushed, the frames are back; no need to
+        # wait
+        tend.flush()
+        for serv_tend in self.serv.tendrils.values():
+            serv_tend.flush()
+
+        self.assertEqual(self.app.received_frames,
+                         ['frame1', 'frame2', 'frame3'])
+
+    def test_skip_framing(self):
+        self.serv.skip_framing = True
+        self.cli.skip_framing = True
+        tend = self.cli.connect(self.serv.local_addr,
+                                base.EchoApplicationClient)
+
+        tend.send_frame({'frame': 1})
+        tend.flush()
+        for serv_tend in self.serv.tendrils.values():
+            serv_tend.flush()
+
+        self.assertEqual(tend.application.received_frames, [{'frame': 1}])
@@ -14,8 +14,24 @@
 ## along with this program.  If not, see
 ## <http://www.gnu.org/licenses/>.
 
+import gevent
+
+import tendril
 from tests.function import base
 
 
 class TestTCPFunction(base.TestBasicFunction):
     proto = 'tcp'
+
+    def test_drain_corked(self):
+        cli = tendril.get_manager(self.proto, ('0.0.0.0', 0))
+        cli.start()
+        tend = cli.connect(self.serv.local_addr, base.EchoApplicationClient)
+        tend.cork()
+        tend.send_frame('frame1')
+
+        with gevent.Timeout(5):
+            dropped = cli.drain()
+
+        self.assertEqual(dropped, {})
+        self.assertEqual(tend.send_pending, 0)
@@ -0,0 +1,72 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import time
+
+import gevent
+
+from tests.function import base
+
+
+class UnixFunctionMixin(object):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.endpoint = os.path.join(self.tmpdir, 'echo')
+
+        super(UnixFunctionMixin, self).setUp()
+
+    def tearDown(self):
+        super(UnixFunctionMixin, self).tearDown()
+
+        shutil.rmtree(self.tmpdir)
+
+    def test_connect_from_endpoint(self):
+        # A manager listening on its own endpoint can connect
+        # repeatedly, without binding to its endpoint to do so
+        peer = base.start_server(self.proto,
+                                 os.path.join(self.tmpdir, 'peer'))
+        try:
+            apps = [peer.connect(self.serv.local_addr,
+                                 base.EchoApplicationClient).application
+                    for i in range(2)]
+            for i, app in enumerate(apps):
+                app.send_frame('frame%d' % i)
+
+            # Give the server a chance to echo them
+            end = time.time() + 10
+            while (time.time() < end and
+                   not all(app.received_frames for app in apps)):
+                gevent.sleep(0.1)
+
+            self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                             ['echo', 'peer'])
+        finally:
+            peer.shutdown()
+
+        self.assertEqual([app.received_frames for app in apps],
+                         [['frame0'], ['frame1']])
+        self.assertEqual(os.listdir(self.tmpdir), ['echo'])
+
+
+class TestUnixFunction(UnixFunctionMixin, base.TestBasicFunction):
+    proto = 'unix'
+
+
+class TestUnixSeqpacketFunction(UnixFunctionMixin, base.TestBasicFunction):
+    proto = 'unixseqpacket'
@@ -43,3 +43,20 @@ class TestApplication(unittest.TestCase):
         app.send_frame('frame')
 
         app.parent.send_frame.assert_called_once_with('frame')
+
+    def test_send_frame_priority(self):
+        app = ApplicationForTest(mock.Mock())
+        app.send_frame('frame', 5)
+
+        app.parent.send_frame.assert_called_once_with('frame', 5)
+
+    def test_idle(self):
+        app = ApplicationForTest(mock.Mock())
+
+        with self.assertRaises(application.IdleTimeout) as cm:
+            app.idle('read')
+
+        self.assertEqual(cm.exception.kind, 'read')
+        self.assertEqual(str(cm.exception),
+                         'connection read idle timeout expired')
+        self.assertFalse(app.parent.close.called)
@@ -21,6 +21,7 @@ import mock
 from tendril import application
 from tendril import connection
 from tendril import framers
+from tendril import stats
 
 
 class TestException(Exception):
@@ -43,6 +44,17 @@ class ApplicationForTest(application.Application):
 
 
 class TestTendril(unittest.TestCase):
+    def test_flush(self):
+        tend = TendrilForTest('manager', 'local', 'remote')
+
+        self.assertEqual(tend.flush(), True)
+        self.assertEqual(tend.flush(1.0), True)
+
+    def test_send_pending(self):
+        tend = TendrilForTest('manager', 'local', 'remote')
+
+        self.assertEqual(tend.send_pending, 0)
+
     def test_init(self):
         tend = TendrilForTest('manager', 'local', 'remote')
 
@@ -55,6 +67,7 @@ class TestTendril(unittest.TestCase):
         self.assertEqual(id(tend._send_framer), id(tend._recv_framer))
         self.assertIsInstance(tend._send_framer_state, framers.FrameState)
         self.assertIsInstance(tend._recv_framer_state, framers.FrameState)
+        self.assertIsInstance(tend.stats, stats.TendrilStats)
 
     @mock.patch.object(TendrilForTest, 'default_framer',
                        new=framers.LineFramer)
@@ -76,23 +89,54 @@ class TestTendril(unittest.TestCase):
 
         self.assertRaises(NotImplementedError, tend.wrap, 'wrapper')
 
-    def test_closed_noapp(self):
+    def test_send_stream(self):
         tend = TendrilForTest('manager', 'local', 'remote')
 
+        self.assertRaises(NotImplementedError, tend._send_stream, 'data')
+
+    def test_closed_noapp(self):
+        manager = mock.Mock(tendrils={}, stats=stats.ManagerStats())
+        tend = TendrilForTest(manager, 'local', 'remote')
+
         tend.closed('error')
 
         # Verifying that it doesn't raise an exception
 
     def test_closed_withapp(self):
-        tend = TendrilForTest('manager', 'local', 'remote')
+        manager = mock.Mock(stats=stats.ManagerStats())
+        tend = TendrilForTest(manager, 'local', 'remote')
+        manager.tendrils = {('local', 'remote'): tend}
         tend._application = mock.Mock()
 
         tend.closed('error')
 
         tend._application.closed.assert_called_once_with('error')
+        self.assertEqual(tend.stats.errors, 1)
+        self.assertEqual(manager.stats.retired.errors, 0)
 
-    def test_closed_witherrorapp(self):
+    def test_closed_untracked(self):
+        manager = mock.Mock(tendrils={}, stats=stats.ManagerStats())
+        tend = TendrilForTest(manager, 'local', 'remote')
+        tend._application = mock.Mock()
+
+        tend.closed('error')
+
+        tend._application.closed.assert_called_once_with('error')
+        self.assertEqual(tend.stats.errors, 1)
+        self.assertEqual(manager.stats.retired.errors, 1)
+
+    def test_closed_eof(self):
         tend = TendrilForTest('manager', 'local', 'remote')
+        tend._application = mock.Mock()
+
+        tend.closed()
+
+        tend._application.closed.assert_called_once_with(None)
+        self.assertEqual(tend.stats.errors, 0)
+
+    def test_closed_witherrorapp(self):
+        manager = mock.Mock(tendrils={}, stats=stats.ManagerStats())
+        tend = TendrilForTest(manager, 'local', 'remote')
         tend._application = mock.Mock(**{
             'closed.side_effect': TestException()
         })
@@ -127,6 +171,7 @@ class TestTendril(unittest.TestCase):
         tend.send_framer = sub_framer
 
         self.assertEqual(id(sub_framer), id(tend._send_framer))
+        self.assertEqual(tend.stats.framer_switches, 1)
 
     def test_send_framer_deleter(self):
         tend = TendrilForTest('manager', 'local', 'remote')
@@ -173,6 +218,7 @@ class TestTendril(unittest.TestCase):
         tend.recv_framer = sub_framer
 
         self.assertEqual(id(sub_framer), id(tend._recv_framer))
+        self.assertEqual(tend.stats.framer_switches, 1)
 
     def test_recv_framer_deleter(self):
         tend = TendrilForTest('manager', 'local', 'remote')
@@ -271,6 +317,7 @@ class TestTendril(unittest.TestCase):
         self.assertIsInstance(tend._send_framer, framers.IdentityFramer)
         self.assertIsInstance(tend._recv_framer, framers.IdentityFramer)
         self.assertEqual(id(tend._send_framer), id(tend._recv_framer))
+        self.assertEqual(tend.stats.framer_switches, 1)
 
     @mock.patch.object(TendrilForTest, 'default_framer',
                        new=framers.LineFramer)
@@ -345,6 +392,7 @@ class TestTendril(unittest.TestCase):
         tend._send_framer.streamify.assert_called_once_with(
             tend._send_framer_state, 'frame')
         self.assertEqual(result, 'streamified')
+        self.assertEqual(tend.stats.frames_sent, 1)
 
     def test_recv_frameify(self):
         generator = mock.Mock(**{'next.side_effect': ['frame1', 'frame2',
@@ -368,6 +416,29 @@ class TestTendril(unittest.TestCase):
             mock.call('frame3'),
             mock.call('frame4'),
         ])
+        self.assertEqual(tend.stats.recv_calls, 1)
+        self.assertEqual(tend.stats.bytes_recv, 14)
+        self.assertEqual(tend.stats.frames_recv, 4)
+
+    @mock.patch('time.time', side_effect=[1.0, 1.5, 2.0, 2.25])
+    def test_recv_frameify_latency(self, mock_time):
+        generator = mock.Mock(**{'next.side_effect': ['frame1', 'frame2',
+                                                      StopIteration]})
+        latency = stats.LatencyStats()
+        tend = TendrilForTest(mock.Mock(latency=latency), 'local', 'remote')
+        tend._recv_framer_state = mock.Mock()
+        tend._recv_framer = mock.Mock(**{'frameify.return_value': generator})
+        tend._application = mock.Mock()
+
+        tend._recv_frameify("this is a test")
+
+        tend._application.recv_frame.assert_has_calls([
+            mock.call('frame1'),
+            mock.call('frame2'),
+        ])
+        self.assertEqual(latency.recv_frame.count, 2)
+        self.assertEqual(latency.recv_frame.min, 250000)
+        self.assertEqual(latency.recv_frame.max, 500000)
 
     def test_recv_frameify_noapplication(self):
         generator = mock.Mock(**{'next.side_effect': ['frame1', 'frame2',
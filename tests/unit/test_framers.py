@@ -105,6 +105,7 @@ class TestFrameState(unittest.TestCase):
 class TestFramer(unittest.TestCase):
     framer_class = framers.Framer
     clear_state = {}
+    stateless_send = False
 
     def test_has_all_methods(self):
         self.assertTrue(hasattr(self.framer_class, 'init_state'))
@@ -118,6 +119,10 @@ class TestFramer(unittest.TestCase):
         self.assertTrue(inspect.isgeneratorfunction(
             self.framer_class.frameify))
 
+    def test_stateless_send(self):
+        self.assertEqual(self.framer_class.stateless_send,
+                         self.stateless_send)
+
     def check_init_state(self, *args, **kwargs):
         # Instantiate the framer...
         f = self.framer_class(*args, **kwargs)
@@ -180,6 +185,7 @@ class TestFramer(unittest.TestCase):
 
 class TestIdentityFramer(TestFramer):
     framer_class = framers.IdentityFramer
+    stateless_send = True
 
     def test_init_state(self):
         self.check_init_state()
@@ -215,12 +221,19 @@ class TestIdentityFramer(TestFramer):
 
         self.assertEqual(result, 'this is a test')
 
+    def test_send_key(self):
+        self.assertEqual(self.framer_class().send_key(),
+                         self.framer_class().send_key())
+        self.assertNotEqual(self.framer_class().send_key(),
+                            framers.ChunkFramer(5).send_key())
+
     def test_composition(self):
         self.check_composition(['this is a test'])
 
 
 class TestChunkFramer(TestFramer):
     framer_class = framers.ChunkFramer
+    stateless_send = True
     clear_state = dict(chunk_remaining=20)
 
     def test_init(self):
@@ -288,6 +301,7 @@ class TestChunkFramer(TestFramer):
 
 class TestLineFramer(TestFramer):
     framer_class = framers.LineFramer
+    stateless_send = True
 
     def test_init(self):
         f1 = self.framer_class()
@@ -318,6 +332,16 @@ class TestLineFramer(TestFramer):
         self.assertEqual(list(result), ['frame1', 'frame2\r'])
         self.assertEqual(s.recv_buf, '')
 
+    def test_frameify_empty(self):
+        f = self.framer_class()
+        s = framers.FrameState()
+        s._reset(f)
+
+        result = f.frameify(s, '\n\r\nframe1\n')
+
+        self.assertEqual(list(result), ['', '', 'frame1'])
+        self.assertEqual(s.recv_buf, '')
+
     def test_frameify_buffered(self):
         f = self.framer_class()
         s = framers.FrameState()
@@ -346,6 +370,12 @@ class TestLineFramer(TestFramer):
 
         self.assertEqual(result, 'this is a test\n')
 
+    def test_send_key(self):
+        self.assertEqual(self.framer_class().send_key(),
+                         self.framer_class(True).send_key())
+        self.assertNotEqual(self.framer_class().send_key(),
+                            self.framer_class(False).send_key())
+
     def test_composition(self):
         self.check_composition(['frame1', 'frame2', 'frame3', 'frame4'])
 
@@ -355,6 +385,7 @@ class TestLineFramer(TestFramer):
 
 class TestStructFramer(TestFramer):
     framer_class = framers.StructFramer
+    stateless_send = True
     clear_state = dict(frame_len=None)
 
     def make_frame(self, text, length=None):
@@ -442,12 +473,19 @@ class TestStructFramer(TestFramer):
 
         self.assertEqual(result, '\0\0\0' + self.make_frame('this is a test'))
 
+    def test_send_key(self):
+        self.assertEqual(self.framer_class('!B').send_key(),
+                         self.framer_class('!B').send_key())
+        self.assertNotEqual(self.framer_class('!B').send_key(),
+                            self.framer_class('>i').send_key())
+
     def test_composition(self):
         self.check_composition(['frame1', 'frame2', 'frame3', 'frame4'], '!B')
 
 
 class TestStuffingFramer(TestFramer):
     framer_class = framers.StuffingFramer
+    stateless_send = True
     clear_state = dict(frame_start=False)
 
     def test_init(self):
@@ -539,6 +577,12 @@ class TestStuffingFramer(TestFramer):
         self.assertEqual(result, 'zzzzthis is a zzzaz so I wonder '
                          'zzzazzzazzzazz if it workedzzzw')
 
+    def test_send_key(self):
+        self.assertEqual(self.framer_class().send_key(),
+                         self.framer_class().send_key())
+        self.assertNotEqual(self.framer_class().send_key(),
+                            self.framer_class(prefix='zzz').send_key())
+
     def test_composition(self):
         self.check_composition([
             'test one',
@@ -549,6 +593,7 @@ class TestStuffingFramer(TestFramer):
 
 class TestCOBSFramer(TestFramer):
     framer_class = framers.COBSFramer
+    stateless_send = True
 
     def test_init(self):
         f1 = self.framer_class()
@@ -678,6 +723,12 @@ class TestCOBSFramer(TestFramer):
                          ''.join(chr(i) for i in range(1, 224)) + '\x21' +
                          ''.join(chr(i) for i in range(224, 256)) + '\x00')
 
+    def test_send_key(self):
+        self.assertEqual(self.framer_class().send_key(),
+                         self.framer_class(False).send_key())
+        self.assertNotEqual(self.framer_class().send_key(),
+                            self.framer_class(True).send_key())
+
     def test_composition(self):
         self.check_composition([
             '\x00',
@@ -21,7 +21,16 @@ from gevent import event
 import mock
 import pkg_resources
 
+from tendril import application
+from tendril import connection
+from tendril import framers
 from tendril import manager
+from tendril import stats
+from tendril import timers
+
+
+class TestException(Exception):
+    pass
 
 
 class ManagerForTest(manager.TendrilManager):
@@ -34,9 +43,17 @@ class ManagerForTest(manager.TendrilManager):
         pass
 
 
+def entry_point(name, **kwargs):
+    ep = mock.Mock(**kwargs)
+    ep.name = name
+    return ep
+
+
 @mock.patch.dict(manager.TendrilManager._managers)
 @mock.patch.dict(manager.TendrilManager._tendrils)
 @mock.patch.dict(manager.TendrilManager._running_managers)
+@mock.patch.dict(manager.TendrilManager._protocols, clear=True)
+@mock.patch.object(manager.TendrilManager, '_entry_points', None)
 class TestTendrilManager(unittest.TestCase):
     def test_init(self):
         tm = ManagerForTest()
@@ -48,6 +65,10 @@ class TestTendrilManager(unittest.TestCase):
         self.assertIsInstance(tm._local_addr_event, event.Event)
         self.assertFalse(tm._local_addr_event.is_set())
         self.assertEqual(tm._listen_thread, None)
+        self.assertEqual(tm._timers, None)
+        self.assertEqual(tm._sources, {})
+        self.assertEqual(tm._accept_tokens, None)
+        self.assertEqual(tm._accept_stamp, None)
         self.assertEqual(tm._manager_key, ('test', ('', 0)))
         self.assertEqual(dict(manager.TendrilManager._managers), {
             ('test', ('', 0)): tm,
@@ -88,54 +109,135 @@ class TestTendrilManager(unittest.TestCase):
         self.assertEqual(id(result), id(mock_manager))
         self.assertFalse(mock_iter_entry_points.called)
 
-    @mock.patch.object(pkg_resources, 'iter_entry_points')
+    @mock.patch.object(pkg_resources, 'iter_entry_points', return_value=[])
     def test_get_manager_noloader(self, mock_iter_entry_points):
         self.assertRaises(ValueError, manager.get_manager, 'test')
-        mock_iter_entry_points.assert_called_once_with('tendril.manager',
-                                                       'test')
+        mock_iter_entry_points.assert_called_once_with('tendril.manager')
+        self.assertEqual(manager.TendrilManager._entry_points, {})
+        self.assertEqual(manager.TendrilManager._protocols, {})
 
     @mock.patch.object(pkg_resources, 'iter_entry_points')
     def test_get_manager_failedload(self, mock_iter_entry_points):
         mock_iter_entry_points.return_value = [
-            mock.Mock(**{"load.side_effect": TypeError}),
+            entry_point('test', **{"load.side_effect": TypeError}),
         ]
 
         self.assertRaises(TypeError, manager.get_manager, 'test')
-        mock_iter_entry_points.assert_called_once_with('tendril.manager',
-                                                       'test')
+        mock_iter_entry_points.assert_called_once_with('tendril.manager')
+        self.assertEqual(manager.TendrilManager._protocols, {})
 
     @mock.patch.object(pkg_resources, 'iter_entry_points')
     def test_get_manager(self, mock_iter_entry_points):
         loader = mock.Mock()
         mock_iter_entry_points.return_value = [
-            mock.Mock(**{"load.side_effect": ImportError}),
-            mock.Mock(**{"load.side_effect": pkg_resources.UnknownExtra}),
-            mock.Mock(**{"load.return_value": loader}),
+            entry_point('test', **{"load.side_effect": ImportError}),
+            entry_point('other'),
+            entry_point('test', **{
+                "load.side_effect": pkg_resources.UnknownExtra,
+            }),
+            entry_point('test', **{"load.return_value": loader}),
         ]
 
         manager.get_manager('test')
 
-        mock_iter_entry_points.assert_called_once_with('tendril.manager',
-                                                       'test')
+        mock_iter_entry_points.assert_called_once_with('tendril.manager')
         for m in mock_iter_entry_points.return_value:
-            m.load.assert_called_once_with()
+            if m.name == 'test':
+                m.load.assert_called_once_with()
+            else:
+                self.assertFalse(m.load.called)
         loader.assert_called_once_with(('', 0))
+        self.assertEqual(manager.TendrilManager._protocols, {
+            'test': loader,
+        })
 
     @mock.patch.object(pkg_resources, 'iter_entry_points')
     def test_get_manager_endpoint(self, mock_iter_entry_points):
         loader = mock.Mock()
         mock_iter_entry_points.return_value = [
-            mock.Mock(**{"load.return_value": loader}),
+            entry_point('test', **{"load.return_value": loader}),
         ]
 
         manager.get_manager('test', ('127.0.0.1', 8080))
 
-        mock_iter_entry_points.assert_called_once_with('tendril.manager',
-                                                       'test')
+        mock_iter_entry_points.assert_called_once_with('tendril.manager')
         for m in mock_iter_entry_points.return_value:
             m.load.assert_called_once_with()
         loader.assert_called_once_with(('127.0.0.1', 8080))
 
+    @mock.patch.object(pkg_resources, 'iter_entry_points')
+    def test_get_manager_cached(self, mock_iter_entry_points):
+        loader = mock.Mock()
+        mock_iter_entry_points.return_value = [
+            entry_point('test', **{"load.return_value": loader}),
+        ]
+
+        manager.get_manager('test', ('127.0.0.1', 8080))
+        manager.get_manager('test', ('127.0.0.1', 8081))
+
+        mock_iter_entry_points.assert_called_once_with('tendril.manager')
+        mock_iter_entry_points.return_value[0].load.assert_called_once_with()
+        loader.assert_has_calls([
+            mock.call(('127.0.0.1', 8080)),
+            mock.call(('127.0.0.1', 8081)),
+        ])
+
+    @mock.patch.object(pkg_resources, 'iter_entry_points')
+    def test_get_manager_discovered_once(self, mock_iter_entry_points):
+        manager.TendrilManager._entry_points = {}
+
+        self.assertRaises(ValueError, manager.get_manager, 'test')
+        self.assertFalse(mock_iter_entry_points.called)
+
+    @mock.patch.object(pkg_resources, 'iter_entry_points')
+    def test_get_manager_registered(self, mock_iter_entry_points):
+        loader = mock.Mock()
+        manager.register_manager('TEST', loader)
+
+        manager.get_manager('test')
+
+        self.assertFalse(mock_iter_entry_points.called)
+        loader.assert_called_once_with(('', 0))
+
+    @mock.patch.object(pkg_resources, 'iter_entry_points')
+    def test_get_manager_builtin(self, mock_iter_entry_points):
+        from tendril import tcp
+
+        with mock.patch.object(tcp, 'TCPTendrilManager') as mock_tcp:
+            result = manager.get_manager('TCP')
+
+        self.assertEqual(result, mock_tcp.return_value)
+        self.assertFalse(mock_iter_entry_points.called)
+        mock_tcp.assert_called_once_with(('', 0))
+        self.assertEqual(manager.TendrilManager._protocols, {
+            'tcp': mock_tcp,
+        })
+
+    @mock.patch.object(pkg_resources, 'iter_entry_points')
+    def test_get_manager_builtin_registered(self, mock_iter_entry_points):
+        loader = mock.Mock()
+        manager.register_manager('tcp', loader)
+
+        manager.get_manager('tcp')
+
+        self.assertFalse(mock_iter_entry_points.called)
+        loader.assert_called_once_with(('', 0))
+
+    def test_builtin_protocols(self):
+        for proto, target in manager.TendrilManager._builtin_protocols.items():
+            modname, _sep, clsname = target.partition(':')
+            module = __import__(modname, fromlist=[clsname])
+            manager_cls = getattr(module, clsname)
+
+            self.assertEqual(manager_cls.proto, proto)
+
+    def test_register_manager(self):
+        manager.register_manager('TEST', 'cls')
+
+        self.assertEqual(manager.TendrilManager._protocols, {
+            'test': 'cls',
+        })
+
     def test_track_tendril(self):
         tm = ManagerForTest()
         tendril = mock.Mock(proto='test',
@@ -151,12 +253,158 @@ class TestTendrilManager(unittest.TestCase):
         self.assertEqual(dict(manager.TendrilManager._tendrils['test']), {
             (('127.0.0.1', 8080), ('127.0.0.2', 8880)): tendril,
         })
+        self.assertEqual(tm._sources, {'127.0.0.2': 1})
+
+    def test_track_tendril_sources(self):
+        tm = ManagerForTest()
+        tendrils = [
+            mock.Mock(proto='test', stats=stats.TendrilStats(),
+                      _tendril_key=(('127.0.0.1', 8080),
+                                    ('127.0.0.2', 8880 + i)))
+            for i in range(2)
+        ]
+
+        tm._track_tendril(tendrils[0])
+        tm._track_tendril(tendrils[1])
+        tm._track_tendril(tendrils[1])
+
+        self.assertEqual(tm._sources, {'127.0.0.2': 2})
+
+        tm._untrack_tendril(tendrils[0])
+
+        self.assertEqual(tm._sources, {'127.0.0.2': 1})
+
+        tm._untrack_tendril(tendrils[1])
+        tm._untrack_tendril(tendrils[1])
+
+        self.assertEqual(tm._sources, {})
+
+    def test_track_tendril_unbound_source(self):
+        tm = ManagerForTest()
+        tendril = mock.Mock(proto='test', stats=stats.TendrilStats(),
+                            _tendril_key=('/tmp/sock', ('', 1)))
+
+        tm._track_tendril(tendril)
+
+        self.assertEqual(tm._sources, {})
+
+        tm._untrack_tendril(tendril)
+
+        self.assertEqual(tm._sources, {})
+
+    def test_source(self):
+        self.assertEqual(manager.TendrilManager._source(('127.0.0.2', 80)),
+                         '127.0.0.2')
+        self.assertEqual(manager.TendrilManager._source('/tmp/sock'),
+                         '/tmp/sock')
+
+    def test_admit(self):
+        tm = ManagerForTest()
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm.stats.throttled, 0)
+
+    def test_admit_max_tendrils(self):
+        tm = ManagerForTest()
+        tm.max_tendrils = 2
+        tm.tendrils = {'a': 'tendril'}
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+
+        tm.tendrils['b'] = 'tendril'
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+        self.assertEqual(tm.stats.throttled, 1)
+
+    def test_admit_max_per_source(self):
+        tm = ManagerForTest()
+        tm.max_per_source = 2
+        tm._sources = {'127.0.0.2': 2, '127.0.0.3': 1}
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+        self.assertEqual(tm._admit(('127.0.0.3', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.4', 8880)), True)
+        self.assertEqual(tm.stats.throttled, 1)
+
+    def test_admit_max_per_source_unbound(self):
+        tm = ManagerForTest()
+        tm.max_per_source = 1
+        tm._sources = {'/tmp/peer': 1}
+
+        self.assertEqual(tm._admit(''), True)
+        self.assertEqual(tm._admit('/tmp/peer'), False)
+        self.assertEqual(tm.stats.throttled, 1)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_admit_accept_rate(self, mock_time):
+        tm = ManagerForTest()
+        tm.accept_rate = 2.0
+
+        # Burst defaults to the rate
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+        self.assertEqual(tm.stats.throttled, 1)
+
+        # Refills at the rate
+        mock_time.return_value = 1000.5
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+
+        # But never beyond the burst
+        mock_time.return_value = 2000.0
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+        self.assertEqual(tm.stats.throttled, 3)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_admit_accept_burst(self, mock_time):
+        tm = ManagerForTest()
+        tm.accept_rate = 1.0
+        tm.accept_burst = 3
+
+        for i in range(3):
+            self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_admit_accept_rate_slow(self, mock_time):
+        tm = ManagerForTest()
+        tm.accept_rate = 0.5
+
+        # The burst is at least one connection
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+
+        mock_time.return_value = 1001.0
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+
+        mock_time.return_value = 1002.0
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), True)
+        self.assertEqual(tm.stats.throttled, 2)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_admit_limits_before_rate(self, mock_time):
+        tm = ManagerForTest()
+        tm.max_tendrils = 0
+        tm.accept_rate = 1.0
+
+        self.assertEqual(tm._admit(('127.0.0.2', 8880)), False)
+        self.assertEqual(tm._accept_tokens, None)
 
     def test_untrack_tendril(self):
         tm = ManagerForTest()
         tendril = mock.Mock(proto='test',
                             _tendril_key=(('127.0.0.1', 8080),
-                                          ('127.0.0.2', 8880)))
+                                          ('127.0.0.2', 8880)),
+                            stats=stats.TendrilStats())
+        tendril.stats.bytes_sent = 10
+        tendril.stats.send_buffered = 5
         tm.tendrils[tendril._tendril_key] = tendril
         manager.TendrilManager._tendrils['test'] = {
             tendril._tendril_key: tendril,
@@ -167,6 +415,8 @@ class TestTendrilManager(unittest.TestCase):
         self.assertEqual(tm.tendrils, {})
         self.assertTrue('test' in manager.TendrilManager._tendrils)
         self.assertEqual(manager.TendrilManager._tendrils['test'], {})
+        self.assertEqual(tm.stats.retired.bytes_sent, 10)
+        self.assertEqual(tm.stats.retired.send_buffered, 0)
 
     def test_untrack_tendril_ignores_keyerror(self):
         tm = ManagerForTest()
@@ -179,6 +429,89 @@ class TestTendrilManager(unittest.TestCase):
         self.assertEqual(tm.tendrils, {})
         self.assertFalse('test' in manager.TendrilManager._tendrils)
 
+    def test_call_acceptor(self):
+        tm = ManagerForTest()
+        acceptor = mock.Mock(return_value='app')
+
+        result = tm._call_acceptor(acceptor, 'tendril')
+
+        self.assertEqual(result, 'app')
+        acceptor.assert_called_once_with('tendril')
+        self.assertEqual(tm.stats.rejects, 0)
+
+    def test_call_acceptor_reject(self):
+        tm = ManagerForTest()
+        acceptor = mock.Mock(side_effect=application.RejectConnection())
+
+        self.assertRaises(application.RejectConnection, tm._call_acceptor,
+                          acceptor, 'tendril')
+        acceptor.assert_called_once_with('tendril')
+        self.assertEqual(tm.stats.rejects, 1)
+
+    def test_closer_tripped(self):
+        tm = ManagerForTest()
+
+        tm._closer_tripped('closer')
+
+        self.assertEqual(tm.stats.closer_trips, 1)
+
+    def test_get_stats(self):
+        tm = ManagerForTest()
+        tm.stats.accepts = 3
+        tm.stats.rejects = 1
+        tm.stats.retired.bytes_sent = 10
+        tendril = mock.Mock(stats=stats.TendrilStats())
+        tendril.stats.bytes_sent = 5
+        tendril.stats.send_buffered = 2
+        tm.tendrils['key'] = tendril
+
+        result = tm.get_stats()
+
+        self.assertEqual(result, {
+            'accepts': 3,
+            'connects': 0,
+            'rejects': 1,
+            'closer_trips': 0,
+            'throttled': 0,
+            'tendrils': 1,
+            'bytes_sent': 15,
+            'bytes_recv': 0,
+            'frames_sent': 0,
+            'frames_recv': 0,
+            'partial_sends': 0,
+            'recv_calls': 0,
+            'send_buffered': 2,
+            'framer_switches': 0,
+            'errors': 0,
+        })
+
+    def test_enable_latency(self):
+        tm = ManagerForTest()
+
+        result = tm.enable_latency(4)
+
+        self.assertIsInstance(result, stats.LatencyStats)
+        self.assertEqual(id(result), id(tm.latency))
+        self.assertEqual(result.recv_frame.sub_bits, 4)
+
+    def test_disable_latency(self):
+        tm = ManagerForTest()
+        tm.latency = 'latency'
+
+        tm.disable_latency()
+
+        self.assertEqual(tm.latency, None)
+
+    def test_get_stats_latency(self):
+        tm = ManagerForTest()
+        tm.enable_latency()
+        tm.latency.recv_frame.record(0.00001)
+
+        result = tm.get_stats()
+
+        self.assertEqual(result['latency'], tm.latency.snapshot())
+        self.assertEqual(result['latency']['recv_frame']['count'], 1)
+
     def test_contains(self):
         tm = ManagerForTest()
         tendril = mock.Mock(proto='test',
@@ -232,6 +565,41 @@ class TestTendrilManager(unittest.TestCase):
 
         # Note: verifying that an exception is not raised
 
+    def test_timers(self):
+        tm = ManagerForTest()
+        tm.timer_resolution = 0.5
+
+        result = tm.timers
+
+        self.assertIsInstance(result, timers.TimerWheel)
+        self.assertEqual(result.resolution, 0.5)
+        self.assertEqual(id(tm.timers), id(result))
+
+    @mock.patch.object(ManagerForTest, 'connect', return_value='tendril')
+    def test_connect_async(self, mock_connect):
+        tm = ManagerForTest()
+
+        result = tm.connect_async(('127.0.0.1', 8080), 'acceptor',
+                                  'wrapper', timeout=5)
+
+        self.assertIsInstance(result, event.AsyncResult)
+        self.assertEqual(result.get(timeout=1), 'tendril')
+        mock_connect.assert_called_once_with(('127.0.0.1', 8080), 'acceptor',
+                                             'wrapper', timeout=5)
+
+    @mock.patch.object(ManagerForTest, 'connect', side_effect=ValueError())
+    def test_connect_async_error(self, mock_connect):
+        tm = ManagerForTest()
+
+        result = tm.connect_async(('127.0.0.1', 8080), 'acceptor')
+
+        with mock.patch.object(gevent.get_hub(),
+                               'print_exception') as mock_print:
+            self.assertRaises(ValueError, result.get, timeout=1)
+
+        mock_connect.assert_called_once_with(('127.0.0.1', 8080), 'acceptor')
+        self.assertFalse(mock_print.called)
+
     @mock.patch.object(gevent, 'spawn')
     def test_start_running(self, mock_spawn):
         tm = ManagerForTest()
@@ -315,6 +683,86 @@ class TestTendrilManager(unittest.TestCase):
         self.assertEqual(tm._listen_thread, None)
         listen_thread.kill.assert_called_once_with()
 
+    def test_shutdown_timers(self):
+        tm = ManagerForTest()
+        tm._listen_thread = mock.Mock()
+        tm._timers = mock.Mock()
+
+        tm.shutdown()
+
+        tm._timers.stop.assert_called_once_with()
+
+    def test_drain(self):
+        listen_thread = mock.Mock()
+        tendrils = [
+            mock.Mock(proto='test', send_pending=0,
+                      _tendril_key=(('127.0.0.1', 8080),
+                                    ('127.0.0.2', 8880))),
+            mock.Mock(proto='test', send_pending=42,
+                      _tendril_key=(('127.0.0.1', 8080),
+                                    ('127.0.0.3', 8880))),
+        ]
+        tm = ManagerForTest()
+        tm.running = True
+        tm._listen_thread = listen_thread
+        manager.TendrilManager._running_managers[tm._manager_key] = tm
+        for tend in tendrils:
+            tm._track_tendril(tend)
+
+        with mock.patch.object(tm, 'shutdown') as mock_shutdown:
+            result = tm.drain(5.0)
+
+        self.assertEqual(result, {
+            (('127.0.0.1', 8080), ('127.0.0.3', 8880)): 42,
+        })
+        self.assertFalse(tm._manager_key in
+                         manager.TendrilManager._running_managers)
+        listen_thread.kill.assert_called_once_with()
+        for tend in tendrils:
+            tend.flush.assert_called_once_with(5.0)
+            tend.close.assert_called_once_with()
+        mock_shutdown.assert_called_once_with()
+
+    def test_drain_corked(self):
+        tm = ManagerForTest()
+        tendrils = [
+            mock.Mock(proto='test', send_pending=0, corked=corked,
+                      _tendril_key=(('127.0.0.1', 8080),
+                                    ('127.0.0.%d' % i, 8880)))
+            for i, corked in enumerate((True, False), 2)
+        ]
+        for tend in tendrils:
+            tm._track_tendril(tend)
+
+        with mock.patch.object(tm, 'shutdown'):
+            tm.drain()
+
+        self.assertEqual(tendrils[0].method_calls[:2], [
+            mock.call.uncork(),
+            mock.call.flush(None),
+        ])
+        self.assertFalse(tendrils[1].uncork.called)
+        tendrils[1].flush.assert_called_once_with(None)
+
+    def test_drain_concurrent(self):
+        tm = ManagerForTest()
+        tm._listen_thread = mock.Mock()
+        tendrils = [
+            mock.Mock(proto='test', send_pending=0,
+                      _tendril_key=(('127.0.0.1', 8080),
+                                    ('127.0.0.%d' % i, 8880)),
+                      **{'flush.side_effect': lambda t: gevent.sleep(0.05)})
+            for i in range(2, 6)
+        ]
+        for tend in tendrils:
+            tm._track_tendril(tend)
+
+        with mock.patch.object(tm, 'shutdown'):
+            with gevent.Timeout(0.15):
+                result = tm.drain(1.0)
+
+        self.assertEqual(result, {})
+
     def test_shutdown_desync(self):
         listen_thread = mock.Mock()
         tm = ManagerForTest()
@@ -388,6 +836,129 @@ class TestTendrilManager(unittest.TestCase):
         self.assertEqual(result, None)
         tm._local_addr_event.wait.assert_called_once_with('timeout')
 
+    def make_tendrils(self, *framers):
+        tendrils = []
+        for i, framer in enumerate(framers):
+            tend = mock.Mock(proto='test', send_framer=framer,
+                             stats=stats.TendrilStats(),
+                             _tendril_key=(('127.0.0.1', 8080),
+                                           ('127.0.0.%d' % (i + 2), 8880)))
+            tend._send_streamify.return_value = '<frame>'
+            tendrils.append(tend)
+        return tendrils
+
+    def test_broadcast(self):
+        framer1 = mock.Mock(stateless_send=True)
+        framer2 = mock.Mock(stateless_send=True)
+        tendrils = self.make_tendrils(framer1, framer2, framer1, framer1)
+        tm = ManagerForTest()
+        for tend in tendrils:
+            tm._track_tendril(tend)
+
+        result = tm.broadcast('frame')
+
+        self.assertEqual(result, 4)
+        self.assertEqual(sum(tend._send_streamify.call_count
+                             for tend in tendrils), 2)
+        for tend in tendrils:
+            tend._send_stream.assert_called_once_with('<frame>')
+            self.assertFalse(tend.send_frame.called)
+
+            # Counted by _send_streamify() if called, or else directly
+            self.assertEqual(tend.stats.frames_sent,
+                             0 if tend._send_streamify.called else 1)
+
+    def test_broadcast_equivalent_framers(self):
+        # Each tendril has its own framer, as with default framers
+        tendrils = self.make_tendrils(framers.LineFramer(),
+                                      framers.LineFramer(),
+                                      framers.LineFramer(False),
+                                      framers.LineFramer())
+        tm = ManagerForTest()
+
+        result = tm.broadcast('frame', tendrils)
+
+        self.assertEqual(result, 4)
+        self.assertEqual([tend._send_streamify.call_count
+                          for tend in tendrils], [1, 0, 1, 0])
+
+    def test_broadcast_stateful(self):
+        framer = mock.Mock(stateless_send=False)
+        tendrils = self.make_tendrils(framer, framer)
+        tm = ManagerForTest()
+
+        result = tm.broadcast('frame', tendrils)
+
+        self.assertEqual(result, 2)
+        for tend in tendrils:
+            tend.send_frame.assert_called_once_with('frame')
+            self.assertFalse(tend._send_stream.called)
+
+    def test_broadcast_no_send_stream(self):
+        class TendrilForTest(connection.Tendril):
+            proto = 'test'
+            send_frame = mock.Mock()
+
+            def close(self):
+                pass
+
+        tend = TendrilForTest(mock.Mock(), 'local', 'remote')
+        tm = ManagerForTest()
+
+        result = tm.broadcast('frame', [tend])
+
+        self.assertEqual(result, 1)
+        tend.send_frame.assert_called_once_with('frame')
+        self.assertEqual(tend.stats.errors, 0)
+
+    def test_sends_stream(self):
+        from tendril import tcp
+
+        self.assertTrue(manager.TendrilManager._sends_stream(
+            mock.Mock(spec=tcp.TCPTendril)))
+        self.assertFalse(manager.TendrilManager._sends_stream(
+            mock.Mock(spec=connection.Tendril)))
+
+    def test_broadcast_tendrils(self):
+        framer = mock.Mock(stateless_send=True)
+        tendrils = self.make_tendrils(framer, framer, framer)
+        tm = ManagerForTest()
+        for tend in tendrils:
+            tm._track_tendril(tend)
+
+        result = tm.broadcast('frame', tendrils[1:])
+
+        self.assertEqual(result, 2)
+        self.assertFalse(tendrils[0]._send_stream.called)
+        tendrils[1]._send_stream.assert_called_once_with('<frame>')
+        tendrils[2]._send_stream.assert_called_once_with('<frame>')
+
+    def test_broadcast_predicate(self):
+        framer = mock.Mock(stateless_send=True)
+        tendrils = self.make_tendrils(framer, framer, framer)
+        predicate = mock.Mock(side_effect=lambda t: t is not tendrils[1])
+        tm = ManagerForTest()
+
+        result = tm.broadcast('frame', tendrils, predicate)
+
+        self.assertEqual(result, 2)
+        predicate.assert_has_calls([mock.call(tend) for tend in tendrils])
+        self.assertTrue(tendrils[0]._send_stream.called)
+        self.assertFalse(tendrils[1]._send_stream.called)
+        self.assertTrue(tendrils[2]._send_stream.called)
+
+    def test_broadcast_error(self):
+        framer = mock.Mock(stateless_send=True)
+        tendrils = self.make_tendrils(framer, framer, framer)
+        tendrils[1]._send_stream.side_effect = TestException()
+        tm = ManagerForTest()
+
+        result = tm.broadcast('frame', tendrils)
+
+        self.assertEqual(result, 2)
+        self.assertEqual(tendrils[1].stats.errors, 1)
+        self.assertTrue(tendrils[2]._send_stream.called)
+
     def test_get_local_addr(self):
         tm = ManagerForTest()
         tm.running = True
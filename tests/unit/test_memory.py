@@ -0,0 +1,492 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import errno
+import unittest
+
+import gevent
+from gevent import socket
+import mock
+
+from tendril import application
+from tendril import connection
+from tendril import framers
+from tendril import manager
+from tendril import memory
+
+
+class TestException(Exception):
+    pass
+
+
+class TestRefused(unittest.TestCase):
+    def test_refused(self):
+        exc = memory._refused('target')
+
+        self.assertIsInstance(exc, socket.error)
+        self.assertEqual(exc.errno, errno.ECONNREFUSED)
+
+
+class TestMemoryTendril(unittest.TestCase):
+    def make_pair(self, mgr='manager'):
+        tend = memory.MemoryTendril(mgr, 'local', 'remote')
+        peer = mock.Mock(manager=mock.Mock(latency=None))
+        tend._peer = peer
+        return tend, peer
+
+    def test_init(self):
+        tend = memory.MemoryTendril('manager', 'local', 'remote')
+
+        self.assertEqual(tend.local_addr, 'local')
+        self.assertEqual(tend.remote_addr, 'remote')
+        self.assertEqual(tend.proto, 'memory')
+        self.assertEqual(tend.skip_framing, False)
+        self.assertEqual(tend._peer, None)
+        self.assertEqual(tend._send_thread, None)
+        self.assertEqual(tend.send_pending, 0)
+        self.assertIsInstance(tend.recv_framer, framers.IdentityFramer)
+
+    def test_init_skip_framing(self):
+        tend = memory.MemoryTendril(mock.Mock(skip_framing=True), 'local',
+                                    'remote')
+
+        self.assertEqual(tend.skip_framing, True)
+
+    def test_tendril_key(self):
+        tend1 = memory.MemoryTendril('manager', 'local', 'remote')
+        tend2 = memory.MemoryTendril('manager', 'local', 'remote')
+
+        self.assertEqual(tend1._tendril_key,
+                         ('local', 'remote', tend1._conn_id))
+        self.assertNotEqual(tend1._tendril_key, tend2._tendril_key)
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_start(self, mock_spawn):
+        tend, peer = self.make_pair()
+
+        tend._start()
+
+        self.assertEqual(tend._started, True)
+        self.assertFalse(mock_spawn.called)
+        self.assertEqual(tend._send_thread, None)
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_start_pending(self, mock_spawn):
+        tend, peer = self.make_pair()
+        tend._send_stream('stream')
+
+        self.assertFalse(mock_spawn.called)
+
+        tend._start()
+
+        mock_spawn.assert_called_once_with(tend._send)
+        self.assertEqual(tend._send_thread, 'thread')
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_wake_send_running(self, mock_spawn):
+        tend, peer = self.make_pair()
+        tend._start()
+
+        tend._send_stream('stream1')
+        tend._send_stream('stream2')
+
+        mock_spawn.assert_called_once_with(tend._send)
+        self.assertEqual(tend._send_thread, 'thread')
+
+    @mock.patch.object(connection.Tendril, '_send_streamify',
+                       return_value='stream')
+    def test_send_frame(self, mock_send_streamify):
+        tend, peer = self.make_pair()
+
+        tend.send_frame('frame')
+
+        mock_send_streamify.assert_called_once_with('frame')
+        self.assertEqual(list(tend._sendq), [(False, 'stream')])
+        self.assertEqual(tend.send_pending, 6)
+        self.assertEqual(tend.stats.send_buffered, 6)
+        self.assertFalse(tend._flush_event.is_set())
+
+    @mock.patch.object(connection.Tendril, '_send_streamify')
+    def test_send_frame_skip_framing(self, mock_send_streamify):
+        tend, peer = self.make_pair()
+        tend.skip_framing = True
+        frame = {'frame': 1}
+
+        tend.send_frame(frame)
+
+        self.assertFalse(mock_send_streamify.called)
+        self.assertEqual(list(tend._sendq), [(True, frame)])
+        self.assertEqual(tend.send_pending, 1)
+        self.assertEqual(tend.stats.frames_sent, 1)
+
+    def test_send_frame_closed(self):
+        tend = memory.MemoryTendril('manager', 'local', 'remote')
+
+        self.assertRaises(ValueError, tend.send_frame, 'frame')
+        self.assertEqual(tend.send_pending, 0)
+
+    @mock.patch.object(connection.Tendril, '_send_streamify')
+    def test_send_stream(self, mock_send_streamify):
+        tend, peer = self.make_pair()
+
+        tend._send_stream('stream')
+
+        self.assertFalse(mock_send_streamify.called)
+        self.assertEqual(list(tend._sendq), [(False, 'stream')])
+        self.assertEqual(tend.send_pending, 6)
+
+    def test_send(self):
+        tend, peer = self.make_pair()
+        tend._send_stream('stream')
+        tend._enqueue(True, 'frame', 1)
+        tend._send_thread = 'thread'
+
+        tend._send()
+
+        peer._recv_frameify.assert_called_once_with('stream')
+        peer._recv_frame.assert_called_once_with('frame', None)
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 6)
+        self.assertEqual(tend.stats.send_buffered, 0)
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertEqual(tend._send_thread, None)
+
+    def test_send_latency(self):
+        tend, peer = self.make_pair()
+        peer.manager.latency = 'latency'
+        tend._enqueue(True, 'frame', 1)
+
+        tend._send()
+
+        peer._recv_frame.assert_called_once_with('frame', 'latency')
+
+    def test_send_error(self):
+        tend, peer = self.make_pair()
+        exc = TestException()
+        peer._recv_frameify.side_effect = exc
+        tend._send_stream('stream1')
+        tend._send_stream('stream2')
+
+        def close():
+            # Closing the other end closes this one
+            tend._peer = None
+        peer.close.side_effect = close
+
+        tend._send()
+
+        peer._recv_frameify.assert_called_once_with('stream1')
+        peer.close.assert_called_once_with()
+        peer.closed.assert_called_once_with(exc)
+        self.assertEqual(list(tend._sendq), [(False, 'stream2')])
+
+    def test_send_peer_closed(self):
+        tend, peer = self.make_pair()
+        tend._send_stream('stream1')
+        tend._send_stream('stream2')
+
+        def recv_frameify(data):
+            # Simulate the other end closing the connection
+            tend._peer = None
+        peer._recv_frameify.side_effect = recv_frameify
+
+        tend._send()
+
+        peer._recv_frameify.assert_called_once_with('stream1')
+        self.assertEqual(list(tend._sendq), [(False, 'stream2')])
+
+    def test_flush(self):
+        tend, peer = self.make_pair()
+
+        self.assertEqual(tend.flush(), True)
+
+    def test_flush_timeout(self):
+        tend, peer = self.make_pair()
+        tend._send_stream('stream')
+
+        self.assertEqual(tend.flush(0.01), False)
+
+    @mock.patch.object(memory.MemoryTendril, 'close')
+    @mock.patch.object(memory.MemoryTendril, 'closed')
+    def test_remote_closed(self, mock_closed, mock_close):
+        tend, peer = self.make_pair()
+
+        tend._remote_closed()
+
+        self.assertEqual(tend._peer, None)
+        mock_close.assert_called_once_with()
+        mock_closed.assert_called_once_with()
+
+    def test_close(self):
+        mgr = mock.Mock()
+        tend, peer = self.make_pair(mgr)
+        thread = mock.Mock()
+        tend._send_thread = thread
+        tend._send_stream('stream')
+
+        tend.close()
+
+        thread.kill.assert_called_once_with()
+        self.assertEqual(tend._send_thread, None)
+        self.assertEqual(tend._peer, None)
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertEqual(tend.send_pending, 6)
+        mgr._untrack_tendril.assert_called_once_with(tend)
+        peer._remote_closed.assert_called_once_with()
+
+    def test_close_closed(self):
+        mgr = mock.Mock()
+        tend = memory.MemoryTendril(mgr, 'local', 'remote')
+
+        tend.close()
+
+        mgr._untrack_tendril.assert_called_once_with(tend)
+
+    @mock.patch.object(gevent, 'getcurrent')
+    def test_close_from_send_thread(self, mock_getcurrent):
+        tend, peer = self.make_pair(mock.Mock())
+        thread = mock.Mock()
+        tend._send_thread = thread
+        mock_getcurrent.return_value = thread
+
+        tend.close()
+
+        self.assertFalse(thread.kill.called)
+        self.assertEqual(tend._send_thread, None)
+        peer._remote_closed.assert_called_once_with()
+
+    def test_linked_pair(self):
+        mgr = mock.Mock(latency=None)
+        tend1 = memory.MemoryTendril(mgr, 'a', 'b')
+        tend2 = memory.MemoryTendril(mgr, 'b', 'a')
+        tend1._peer = tend2
+        tend2._peer = tend1
+        app1 = mock.Mock(spec=application.Application)
+        app2 = mock.Mock(spec=application.Application)
+        tend1.application = app1
+        tend2.application = app2
+        tend1._start()
+        tend2._start()
+
+        tend1.send_frame('frame1')
+        tend2.send_frame('frame2')
+        tend1.flush()
+        tend2.flush()
+
+        app1.recv_frame.assert_called_once_with('frame2')
+        app2.recv_frame.assert_called_once_with('frame1')
+
+        tend1.close()
+
+        self.assertEqual(tend2._peer, None)
+        self.assertEqual(tend2._send_thread, None)
+        self.assertFalse(app1.closed.called)
+        app2.closed.assert_called_once_with(None)
+
+
+class TestMemoryTendrilManager(unittest.TestCase):
+    def setUp(self):
+        self.running = {}
+        self.p_managers = mock.patch.object(manager.TendrilManager,
+                                            '_managers', {})
+        self.p_tendrils = mock.patch.object(manager.TendrilManager,
+                                            '_tendrils', {})
+        self.p_running_managers = mock.patch.object(
+            manager.TendrilManager, '_running_managers', self.running)
+
+        self.p_managers.start()
+        self.p_tendrils.start()
+        self.p_running_managers.start()
+
+    def tearDown(self):
+        self.p_running_managers.stop()
+        self.p_tendrils.stop()
+        self.p_managers.stop()
+
+    def make_server(self, acceptor):
+        serv = memory.MemoryTendrilManager('server')
+        serv.running = True
+        serv.local_addr = 'server'
+        serv._acceptor = acceptor
+        self.running[serv._manager_key] = serv
+        return serv
+
+    def make_client(self):
+        cli = memory.MemoryTendrilManager()
+        cli.running = True
+        return cli
+
+    def test_init(self):
+        mgr = memory.MemoryTendrilManager('server')
+
+        self.assertEqual(mgr.endpoint, 'server')
+        self.assertEqual(mgr.addr_family, None)
+        self.assertEqual(mgr.proto, 'memory')
+        self.assertEqual(mgr._name, 'server')
+        self.assertEqual(mgr._acceptor, None)
+
+    def test_init_noendpoint(self):
+        mgr = memory.MemoryTendrilManager()
+
+        self.assertEqual(mgr._name, '')
+
+    def test_init_default_endpoint(self):
+        mgr = memory.MemoryTendrilManager(('', 0))
+
+        self.assertEqual(mgr._name, '')
+
+    def test_init_badendpoint(self):
+        self.assertRaises(ValueError, memory.MemoryTendrilManager,
+                          ('127.0.0.1', 8080))
+
+    @mock.patch.object(memory, 'MemoryTendril', return_value='tendril')
+    def test_make_tendril(self, mock_MemoryTendril):
+        mgr = memory.MemoryTendrilManager()
+
+        result = mgr._make_tendril('local', 'remote')
+
+        self.assertEqual(result, 'tendril')
+        mock_MemoryTendril.assert_called_once_with(mgr, 'local', 'remote')
+
+    def test_connect_not_running(self):
+        mgr = memory.MemoryTendrilManager()
+
+        self.assertRaises(ValueError, mgr.connect, 'server', 'acceptor')
+
+    def test_connect_bad_target(self):
+        cli = self.make_client()
+
+        self.assertRaises(ValueError, cli.connect, ('127.0.0.1', 8080),
+                          'acceptor')
+
+    def test_connect_wrapper(self):
+        cli = self.make_client()
+
+        self.assertRaises(ValueError, cli.connect, 'server', 'acceptor',
+                          'wrapper')
+
+    def test_connect_no_server(self):
+        cli = self.make_client()
+
+        self.assertRaises(socket.error, cli.connect, 'server', 'acceptor')
+
+    def test_connect_no_acceptor(self):
+        self.make_server(None)
+        cli = self.make_client()
+
+        self.assertRaises(socket.error, cli.connect, 'server', 'acceptor')
+
+    def test_connect_not_admitted(self):
+        serv_acceptor = mock.Mock()
+        serv = self.make_server(serv_acceptor)
+        serv.max_tendrils = 0
+        cli = self.make_client()
+
+        self.assertRaises(socket.error, cli.connect, 'server', 'acceptor')
+        self.assertFalse(serv_acceptor.called)
+        self.assertEqual(serv.stats.throttled, 1)
+
+    @mock.patch.object(memory.MemoryTendril, '_start')
+    def test_connect(self, mock_start):
+        serv_app = mock.Mock(spec=application.Application)
+        serv_acceptor = mock.Mock(return_value=serv_app)
+        serv = self.make_server(serv_acceptor)
+        cli_app = mock.Mock(spec=application.Application)
+        cli_acceptor = mock.Mock(return_value=cli_app)
+        cli = self.make_client()
+
+        tend = cli.connect('server', cli_acceptor)
+
+        remote = serv.tendrils.values()[0]
+        serv_acceptor.assert_called_once_with(remote)
+        cli_acceptor.assert_called_once_with(tend)
+        self.assertEqual(tend.local_addr, '')
+        self.assertEqual(tend.remote_addr, 'server')
+        self.assertEqual(remote.local_addr, 'server')
+        self.assertEqual(remote.remote_addr, '')
+        self.assertEqual(tend._peer, remote)
+        self.assertEqual(remote._peer, tend)
+        self.assertEqual(tend.application, cli_app)
+        self.assertEqual(remote.application, serv_app)
+        self.assertEqual(cli.tendrils, {tend._tendril_key: tend})
+        self.assertEqual(serv.stats.accepts, 1)
+        self.assertEqual(cli.stats.connects, 1)
+        self.assertEqual(mock_start.call_count, 2)
+
+    @mock.patch.object(memory.MemoryTendril, '_start')
+    def test_connect_server_rejected(self, mock_start):
+        serv_acceptor = mock.Mock(
+            side_effect=application.RejectConnection())
+        serv = self.make_server(serv_acceptor)
+        cli_acceptor = mock.Mock()
+        cli = self.make_client()
+
+        self.assertRaises(socket.error, cli.connect, 'server',
+                          cli_acceptor)
+        self.assertFalse(cli_acceptor.called)
+        self.assertEqual(serv.tendrils, {})
+        self.assertEqual(serv.stats.rejects, 1)
+        self.assertFalse(mock_start.called)
+
+    @mock.patch.object(memory.MemoryTendril, '_start')
+    def test_connect_client_rejected(self, mock_start):
+        serv_app = mock.Mock(spec=application.Application)
+        serv_acceptor = mock.Mock(return_value=serv_app)
+        serv = self.make_server(serv_acceptor)
+        cli_acceptor = mock.Mock(
+            side_effect=application.RejectConnection())
+        cli = self.make_client()
+
+        result = cli.connect('server', cli_acceptor)
+
+        self.assertEqual(result, None)
+        self.assertEqual(cli.tendrils, {})
+        self.assertEqual(serv.tendrils, {})
+        self.assertEqual(cli.stats.rejects, 1)
+        serv_app.closed.assert_called_once_with(None)
+        self.assertFalse(mock_start.called)
+
+    def test_recv_error_retired(self):
+        exc = TestException()
+        serv_app = mock.Mock(spec=application.Application, **{
+            'recv_frame.side_effect': exc,
+        })
+        serv = self.make_server(mock.Mock(return_value=serv_app))
+        cli_app = mock.Mock(spec=application.Application)
+        cli = self.make_client()
+
+        tend = cli.connect('server', mock.Mock(return_value=cli_app))
+        tend.send_frame('frame')
+        tend.flush()
+
+        serv_app.closed.assert_called_once_with(exc)
+        self.assertEqual(serv.tendrils, {})
+        self.assertEqual(serv.get_stats()['errors'], 1)
+
+    @mock.patch.object(gevent, 'sleep')
+    def test_listener(self, mock_sleep):
+        mgr = memory.MemoryTendrilManager('server')
+        mgr.running = True
+        acceptors = []
+
+        def sleep(secs):
+            acceptors.append(mgr._acceptor)
+            raise TestException()
+        mock_sleep.side_effect = sleep
+
+        self.assertRaises(TestException, mgr.listener, 'acceptor', None)
+        self.assertEqual(acceptors, ['acceptor'])
+        self.assertEqual(mgr._acceptor, None)
+        self.assertEqual(mgr.local_addr, 'server')
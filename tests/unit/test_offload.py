@@ -0,0 +1,199 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import gevent
+from gevent import event
+from gevent import threadpool
+import mock
+
+from tendril import offload
+
+
+class TestException(Exception):
+    pass
+
+
+class OffloadApplicationForTest(offload.OffloadApplication):
+    def process_frame(self, frame):
+        return frame.upper()
+
+
+class FakeThreadPool(object):
+    def __init__(self):
+        self.results = []
+
+    def spawn(self, func, *args):
+        result = event.AsyncResult()
+        self.results.append((result, func, args))
+        return result
+
+    def run(self, idx):
+        result, func, args = self.results[idx]
+        try:
+            result.set(func(*args))
+        except Exception as exc:
+            result.set_exception(exc)
+
+
+class TestOffloadApplication(unittest.TestCase):
+    def test_init(self):
+        app = OffloadApplicationForTest('parent')
+
+        self.assertEqual(app.parent, 'parent')
+        self.assertEqual(id(app.threadpool), id(gevent.get_hub().threadpool))
+        self.assertEqual(app.max_pending, 16)
+        self.assertEqual(len(app._pending), 0)
+        self.assertEqual(app._slots.counter, 16)
+        self.assertEqual(app._deliver_thread, None)
+        self.assertEqual(len(app._outgoing), 0)
+        self.assertTrue(app._outgoing_watcher.active)
+
+        app._outgoing_watcher.stop()
+
+    def test_init_args(self):
+        app = OffloadApplicationForTest('parent', 'pool', 2)
+
+        self.assertEqual(app.threadpool, 'pool')
+        self.assertEqual(app.max_pending, 2)
+        self.assertEqual(app._slots.counter, 2)
+
+        app._outgoing_watcher.stop()
+
+    def test_in_order(self):
+        pool = FakeThreadPool()
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent, pool)
+
+        app.recv_frame('one')
+        app.recv_frame('two')
+        app.recv_frame('three')
+
+        self.assertEqual(app._slots.counter, 13)
+
+        # Complete out of order
+        pool.run(2)
+        pool.run(1)
+        gevent.sleep()
+
+        self.assertFalse(parent.send_frame.called)
+
+        pool.run(0)
+        gevent.sleep()
+
+        parent.send_frame.assert_has_calls([
+            mock.call('ONE'), mock.call('TWO'), mock.call('THREE'),
+        ])
+        self.assertEqual(parent.send_frame.call_count, 3)
+        self.assertEqual(len(app._pending), 0)
+        self.assertEqual(app._slots.counter, 16)
+        self.assertEqual(app._deliver_thread, None)
+
+        app._outgoing_watcher.stop()
+
+    def test_max_pending(self):
+        pool = FakeThreadPool()
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent, pool, 1)
+
+        app.recv_frame('one')
+        second = gevent.spawn(app.recv_frame, 'two')
+        gevent.sleep()
+
+        self.assertEqual(len(pool.results), 1)
+
+        pool.run(0)
+        second.join(timeout=1)
+
+        self.assertEqual(len(pool.results), 2)
+
+        app._outgoing_watcher.stop()
+
+    def test_frame_processed_none(self):
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent)
+
+        app.frame_processed(None)
+
+        self.assertFalse(parent.send_frame.called)
+
+        app._outgoing_watcher.stop()
+
+    def test_process_error(self):
+        pool = FakeThreadPool()
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent, pool)
+        app.recv_frame('one')
+        app.recv_frame('two')
+        exc = TestException()
+        pool.results[0][0].set_exception(exc)
+
+        gevent.sleep()
+
+        parent.close.assert_called_once_with()
+        parent.closed.assert_called_once_with(exc)
+        self.assertFalse(parent.send_frame.called)
+        self.assertEqual(len(app._pending), 0)
+        self.assertEqual(app._deliver_thread, None)
+
+        app._outgoing_watcher.stop()
+
+    def test_send_frame_threadsafe(self):
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent)
+        pool = threadpool.ThreadPool(1)
+
+        pool.spawn(app.send_frame_threadsafe, 'frame').get(timeout=1)
+        gevent.sleep(0.01)
+
+        parent.send_frame.assert_called_once_with('frame')
+        self.assertEqual(len(app._outgoing), 0)
+
+        app._outgoing_watcher.stop()
+        pool.kill()
+
+    def test_threadpool(self):
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent, threadpool.ThreadPool(2))
+
+        app.recv_frame('one')
+        app.recv_frame('two')
+        app._deliver_thread.join(timeout=1)
+
+        parent.send_frame.assert_has_calls([
+            mock.call('ONE'), mock.call('TWO'),
+        ])
+
+        app._outgoing_watcher.stop()
+        app.threadpool.kill()
+
+    def test_close(self):
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent)
+
+        app.close()
+
+        parent.close.assert_called_once_with()
+        self.assertFalse(app._outgoing_watcher.active)
+
+    def test_closed(self):
+        parent = mock.Mock()
+        app = OffloadApplicationForTest(parent)
+
+        app.closed(None)
+
+        self.assertFalse(app._outgoing_watcher.active)
@@ -0,0 +1,388 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import gevent
+import mock
+
+from tendril import pool
+
+
+class TestException(Exception):
+    pass
+
+
+def make_manager():
+    mgr = mock.Mock(tendrils={})
+
+    def connect(target, acceptor, wrapper=None):
+        key = (('127.0.0.1', 10000 + len(mgr.tendrils)), target)
+        tend = mock.Mock(_tendril_key=key)
+        tend.close.side_effect = lambda: mgr.tendrils.pop(key, None)
+        mgr.tendrils[key] = tend
+        return tend
+
+    mgr.connect.side_effect = connect
+    return mgr
+
+
+class TestPoolEntry(unittest.TestCase):
+    def test_init(self):
+        entry = pool._PoolEntry(5)
+
+        self.assertEqual(len(entry.idle), 0)
+        self.assertEqual(entry.slots.counter, 5)
+        self.assertEqual(entry.waiting, 0)
+
+
+@mock.patch('time.time', return_value=1000.0)
+class TestTendrilPool(unittest.TestCase):
+    def setUp(self):
+        self.manager = make_manager()
+        self.target = ('127.0.0.2', 8080)
+
+    def test_init(self, mock_time):
+        tp = pool.TendrilPool('manager')
+
+        self.assertEqual(tp.manager, 'manager')
+        self.assertEqual(tp.max_size, 10)
+        self.assertEqual(tp.idle_timeout, 60.0)
+        self.assertEqual(tp.health_check, None)
+        self.assertEqual(tp._entries, {})
+        self.assertEqual(tp._checked_out, {})
+        self.assertEqual(tp._closed, False)
+        self.assertEqual(tp._sweep_timer, None)
+
+    def test_checkout_new(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+
+        tend = tp.checkout(self.target, 'acceptor', 'wrapper')
+
+        self.manager.connect.assert_called_once_with(
+            self.target, 'acceptor', 'wrapper')
+        self.assertEqual(tp._checked_out, {
+            tend: (self.target, 'acceptor', 'wrapper'),
+        })
+        entry = tp._entries[(self.target, 'acceptor', 'wrapper')]
+        self.assertEqual(entry.slots.counter, 9)
+
+    def test_checkout_reuse(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+
+        tend2 = tp.checkout(self.target, 'acceptor')
+
+        self.assertEqual(id(tend2), id(tend1))
+        self.assertEqual(self.manager.connect.call_count, 1)
+
+    def test_checkout_key(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+
+        tend2 = tp.checkout(self.target, 'other')
+
+        self.assertNotEqual(id(tend2), id(tend1))
+        self.assertEqual(self.manager.connect.call_count, 2)
+
+    def test_checkout_most_recent(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tend2 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+        tp.checkin(tend2)
+
+        result = tp.checkout(self.target, 'acceptor')
+
+        self.assertEqual(id(result), id(tend2))
+
+    def test_checkout_expired(self, mock_time):
+        tp = pool.TendrilPool(self.manager, idle_timeout=10.0)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+        mock_time.return_value = 1011.0
+
+        tend2 = tp.checkout(self.target, 'acceptor')
+
+        self.assertNotEqual(id(tend2), id(tend1))
+        tend1.close.assert_called_once_with()
+
+    def test_checkout_no_idle_timeout(self, mock_time):
+        tp = pool.TendrilPool(self.manager, idle_timeout=None)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+        mock_time.return_value = 100000.0
+
+        tend2 = tp.checkout(self.target, 'acceptor')
+
+        self.assertEqual(id(tend2), id(tend1))
+
+    def test_checkout_closed_idle(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+        del self.manager.tendrils[tend1._tendril_key]
+
+        tend2 = tp.checkout(self.target, 'acceptor')
+
+        self.assertNotEqual(id(tend2), id(tend1))
+        self.assertFalse(tend1.close.called)
+
+    def test_checkout_unhealthy(self, mock_time):
+        health_check = mock.Mock(return_value=False)
+        tp = pool.TendrilPool(self.manager, health_check=health_check)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+
+        tend2 = tp.checkout(self.target, 'acceptor')
+
+        self.assertNotEqual(id(tend2), id(tend1))
+        health_check.assert_called_once_with(tend1)
+        tend1.close.assert_called_once_with()
+
+    def test_checkout_healthy(self, mock_time):
+        health_check = mock.Mock(return_value=True)
+        tp = pool.TendrilPool(self.manager, health_check=health_check)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+
+        tend2 = tp.checkout(self.target, 'acceptor')
+
+        self.assertEqual(id(tend2), id(tend1))
+        health_check.assert_called_once_with(tend1)
+
+    def test_checkout_rejected(self, mock_time):
+        self.manager.connect.side_effect = None
+        self.manager.connect.return_value = None
+        tp = pool.TendrilPool(self.manager)
+
+        result = tp.checkout(self.target, 'acceptor')
+
+        self.assertEqual(result, None)
+        self.assertEqual(tp._checked_out, {})
+        self.assertEqual(tp._entries, {})
+
+    def test_checkout_error(self, mock_time):
+        self.manager.connect.side_effect = TestException()
+        tp = pool.TendrilPool(self.manager)
+
+        self.assertRaises(TestException, tp.checkout, self.target,
+                          'acceptor')
+
+        self.assertEqual(tp._entries, {})
+
+    def test_checkout_exhausted(self, mock_time):
+        tp = pool.TendrilPool(self.manager, max_size=1)
+        tp.checkout(self.target, 'acceptor')
+
+        self.assertRaises(pool.PoolExhausted, tp.checkout, self.target,
+                          'acceptor', timeout=0.01)
+        self.assertEqual(self.manager.connect.call_count, 1)
+
+    def test_checkout_wait(self, mock_time):
+        tp = pool.TendrilPool(self.manager, max_size=1)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        waiter = gevent.spawn(tp.checkout, self.target, 'acceptor')
+        gevent.sleep()
+
+        tp.checkin(tend1)
+        tend2 = waiter.get(timeout=1)
+
+        self.assertEqual(id(tend2), id(tend1))
+        self.assertEqual(self.manager.connect.call_count, 1)
+
+    def test_checkin_closed(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend = tp.checkout(self.target, 'acceptor')
+        entry = tp._entries[(self.target, 'acceptor', None)]
+        del self.manager.tendrils[tend._tendril_key]
+
+        tp.checkin(tend)
+
+        self.assertEqual(len(entry.idle), 0)
+        self.assertEqual(entry.slots.counter, 10)
+        self.assertEqual(tp._checked_out, {})
+        self.assertEqual(tp._entries, {})
+        self.assertFalse(self.manager.timers.schedule.called)
+
+    def test_checkin_pool_closed(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend = tp.checkout(self.target, 'acceptor')
+        entry = tp._entries[(self.target, 'acceptor', None)]
+        tp.close()
+
+        tp.checkin(tend)
+
+        self.assertEqual(len(entry.idle), 0)
+        self.assertEqual(entry.slots.counter, 10)
+        self.assertEqual(tp._entries, {})
+        tend.close.assert_called_once_with()
+        self.assertFalse(self.manager.timers.schedule.called)
+
+    def test_discard(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend = tp.checkout(self.target, 'acceptor')
+        entry = tp._entries[(self.target, 'acceptor', None)]
+
+        tp.discard(tend)
+
+        tend.close.assert_called_once_with()
+        self.assertEqual(len(entry.idle), 0)
+        self.assertEqual(entry.slots.counter, 10)
+        self.assertEqual(tp._checked_out, {})
+        self.assertEqual(tp._entries, {})
+
+    def test_connection(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+
+        with tp.connection(self.target, 'acceptor') as tend:
+            self.assertEqual(tp._checked_out.keys(), [tend])
+
+        self.assertEqual(tp._checked_out, {})
+        entry = tp._entries[(self.target, 'acceptor', None)]
+        self.assertEqual(list(entry.idle), [(tend, 1000.0)])
+        self.assertFalse(tend.close.called)
+
+    def test_connection_error(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+
+        def test_func():
+            with tp.connection(self.target, 'acceptor') as tend:
+                result.append(tend)
+                raise TestException()
+
+        result = []
+        self.assertRaises(TestException, test_func)
+
+        self.assertEqual(tp._checked_out, {})
+        result[0].close.assert_called_once_with()
+
+    def test_connection_rejected(self, mock_time):
+        self.manager.connect.side_effect = None
+        self.manager.connect.return_value = None
+        tp = pool.TendrilPool(self.manager)
+
+        with tp.connection(self.target, 'acceptor') as tend:
+            self.assertEqual(tend, None)
+
+    def test_evict_idle(self, mock_time):
+        tp = pool.TendrilPool(self.manager, idle_timeout=10.0)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tend2 = tp.checkout(('127.0.0.3', 8080), 'acceptor')
+        tend3 = tp.checkout(('127.0.0.4', 8080), 'acceptor')
+        tp.checkin(tend1)
+        tp.checkin(tend2)
+        mock_time.return_value = 1011.0
+
+        tp.evict_idle()
+
+        tend1.close.assert_called_once_with()
+        tend2.close.assert_called_once_with()
+        self.assertFalse(tend3.close.called)
+        self.assertEqual(tp._entries.keys(),
+                         [(('127.0.0.4', 8080), 'acceptor', None)])
+
+    def test_checkin_schedules_sweep(self, mock_time):
+        tp = pool.TendrilPool(self.manager, idle_timeout=10.0)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tend2 = tp.checkout(('127.0.0.3', 8080), 'acceptor')
+        tp.checkin(tend1)
+        mock_time.return_value = 1004.0
+
+        tp.checkin(tend2)
+
+        self.manager.timers.schedule.assert_called_once_with(
+            10.0, tp._sweep)
+        self.assertEqual(tp._sweep_timer,
+                         self.manager.timers.schedule.return_value)
+
+    def test_checkin_no_idle_timeout(self, mock_time):
+        tp = pool.TendrilPool(self.manager, idle_timeout=None)
+        tend = tp.checkout(self.target, 'acceptor')
+
+        tp.checkin(tend)
+
+        self.assertFalse(self.manager.timers.schedule.called)
+        self.assertEqual(tp._sweep_timer, None)
+
+    def test_sweep(self, mock_time):
+        tp = pool.TendrilPool(self.manager, idle_timeout=10.0)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tend2 = tp.checkout(('127.0.0.3', 8080), 'acceptor')
+        tp.checkin(tend1)
+        mock_time.return_value = 1004.0
+        tp.checkin(tend2)
+        self.manager.timers.schedule.reset_mock()
+        mock_time.return_value = 1011.0
+
+        tp._sweep()
+
+        # The unused target is closed and forgotten
+        tend1.close.assert_called_once_with()
+        self.assertFalse(tend2.close.called)
+        self.assertEqual(tp._entries.keys(),
+                         [(('127.0.0.3', 8080), 'acceptor', None)])
+        self.manager.timers.schedule.assert_called_once_with(
+            3.0, tp._sweep)
+
+    def test_sweep_empty(self, mock_time):
+        tp = pool.TendrilPool(self.manager, idle_timeout=10.0)
+        tend = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend)
+        self.manager.timers.schedule.reset_mock()
+        mock_time.return_value = 1011.0
+
+        tp._sweep()
+
+        tend.close.assert_called_once_with()
+        self.assertEqual(tp._entries, {})
+        self.assertFalse(self.manager.timers.schedule.called)
+        self.assertEqual(tp._sweep_timer, None)
+
+    def test_checkout_waiting_entry_kept(self, mock_time):
+        tp = pool.TendrilPool(self.manager, max_size=1)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        waiter = gevent.spawn(tp.checkout, self.target, 'acceptor')
+        gevent.sleep()
+        del self.manager.tendrils[tend1._tendril_key]
+
+        tp.checkin(tend1)
+        tend2 = waiter.get(timeout=1)
+
+        self.assertNotEqual(id(tend2), id(tend1))
+        tp.checkin(tend2)
+        self.assertEqual(list(tp._entries[(self.target, 'acceptor',
+                                           None)].idle),
+                         [(tend2, 1000.0)])
+
+    def test_close(self, mock_time):
+        tp = pool.TendrilPool(self.manager)
+        tend1 = tp.checkout(self.target, 'acceptor')
+        tend2 = tp.checkout(self.target, 'acceptor')
+        tp.checkin(tend1)
+
+        tp.close()
+
+        self.assertEqual(tp._closed, True)
+        self.manager.timers.cancel.assert_called_once_with(
+            self.manager.timers.schedule.return_value)
+        self.assertEqual(tp._sweep_timer, None)
+        tend1.close.assert_called_once_with()
+        self.assertFalse(tend2.close.called)
+        entry = tp._entries[(self.target, 'acceptor', None)]
+        self.assertEqual(len(entry.idle), 0)
@@ -0,0 +1,277 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import gevent
+import mock
+
+from tendril import rpc
+
+
+class TestException(Exception):
+    pass
+
+
+class TestRPCClosed(unittest.TestCase):
+    def test_init(self):
+        exc = rpc.RPCClosed('error')
+
+        self.assertEqual(exc.error, 'error')
+        self.assertEqual(str(exc), 'connection closed')
+
+
+class TestPrefixCodec(unittest.TestCase):
+    def test_init(self):
+        codec = rpc.PrefixCodec()
+
+        self.assertEqual(codec.fmt.format, '!I')
+        self.assertEqual(codec.id_limit, 2 ** 31)
+
+    def test_init_fmt(self):
+        codec = rpc.PrefixCodec('!H')
+
+        self.assertEqual(codec.id_limit, 2 ** 15)
+
+    def test_encode(self):
+        codec = rpc.PrefixCodec()
+
+        self.assertEqual(codec.encode(258, 'frame'), '\0\0\1\2frame')
+
+    def test_encode_response(self):
+        codec = rpc.PrefixCodec()
+
+        self.assertEqual(codec.encode(258, 'frame', True),
+                         '\x80\0\1\2frame')
+
+    def test_decode(self):
+        codec = rpc.PrefixCodec()
+
+        self.assertEqual(codec.decode('\0\0\1\2frame'),
+                         (258, False, 'frame'))
+
+    def test_decode_response(self):
+        codec = rpc.PrefixCodec()
+
+        self.assertEqual(codec.decode('\x80\0\1\2frame'),
+                         (258, True, 'frame'))
+
+    def test_decode_short(self):
+        codec = rpc.PrefixCodec()
+
+        self.assertRaises(ValueError, codec.decode, '\0\0\1')
+
+
+def make_parent():
+    parent = mock.Mock()
+    parent.manager.timers.schedule.side_effect = (
+        lambda delay, cb, *args: ('timer', delay, cb, args))
+    return parent
+
+
+class TestRPCApplication(unittest.TestCase):
+    def test_init(self):
+        app = rpc.RPCApplication('parent')
+
+        self.assertEqual(app.parent, 'parent')
+        self.assertIsInstance(app.codec, rpc.PrefixCodec)
+        self.assertEqual(app.max_outstanding, 64)
+        self.assertEqual(app.call_timeout, None)
+        self.assertEqual(app._calls, {})
+        self.assertEqual(app._next_id, 0)
+        self.assertEqual(app._slots.counter, 64)
+
+    def test_init_args(self):
+        app = rpc.RPCApplication('parent', 'codec', 2, 5.0)
+
+        self.assertEqual(app.codec, 'codec')
+        self.assertEqual(app.max_outstanding, 2)
+        self.assertEqual(app.call_timeout, 5.0)
+        self.assertEqual(app._slots.counter, 2)
+
+    def test_allocate_id(self):
+        app = rpc.RPCApplication('parent', rpc.PrefixCodec('!B'))
+        app._next_id = 126
+        app._calls = {127: 'call', 0: 'call'}
+
+        self.assertEqual(app._allocate_id(), 126)
+        self.assertEqual(app._allocate_id(), 1)
+        self.assertEqual(app._next_id, 2)
+
+    def test_call(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+
+        result = app.call('request')
+
+        parent.send_frame.assert_called_once_with('\0\0\0\0request')
+        self.assertFalse(parent.manager.timers.schedule.called)
+        self.assertEqual(app._calls.keys(), [0])
+        self.assertEqual(id(app._calls[0].result), id(result))
+        self.assertEqual(app._slots.counter, 63)
+        self.assertFalse(result.ready())
+
+    def test_call_response(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+        result1 = app.call('request1')
+        result2 = app.call('request2')
+
+        app.recv_frame('\x80\0\0\1response2')
+        app.recv_frame('\x80\0\0\0response1')
+
+        self.assertEqual(result1.get(timeout=0), 'response1')
+        self.assertEqual(result2.get(timeout=0), 'response2')
+        self.assertEqual(app._calls, {})
+        self.assertEqual(app._slots.counter, 64)
+
+    def test_call_timeout(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent, call_timeout=5.0)
+
+        app.call('request', 2.0)
+        call = app._calls[0]
+
+        parent.manager.timers.schedule.assert_called_once_with(
+            2.0, app._expire, 0, call)
+        self.assertEqual(call.timer, ('timer', 2.0, app._expire, (0, call)))
+
+    def test_call_default_timeout(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent, call_timeout=5.0)
+
+        app.call('request')
+
+        parent.manager.timers.schedule.assert_called_once_with(
+            5.0, app._expire, 0, app._calls[0])
+
+    def test_call_response_cancels_timer(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+        app.call('request', 2.0)
+        timer = app._calls[0].timer
+
+        app.recv_frame('\x80\0\0\0response')
+
+        parent.manager.timers.cancel.assert_called_once_with(timer)
+
+    def test_call_send_error(self):
+        parent = make_parent()
+        exc = TestException()
+        parent.send_frame.side_effect = exc
+        app = rpc.RPCApplication(parent)
+
+        result = app.call('request', 2.0)
+
+        self.assertRaises(TestException, result.get, timeout=0)
+        self.assertEqual(app._calls, {})
+        self.assertEqual(app._slots.counter, 64)
+        self.assertTrue(parent.manager.timers.cancel.called)
+
+    def test_call_max_outstanding(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent, max_outstanding=1)
+        app.call('request1')
+        waiter = gevent.spawn(app.call, 'request2')
+        gevent.sleep()
+
+        self.assertEqual(parent.send_frame.call_count, 1)
+
+        app.recv_frame('\x80\0\0\0response1')
+        waiter.join(timeout=1)
+
+        self.assertEqual(parent.send_frame.call_count, 2)
+        parent.send_frame.assert_called_with('\0\0\0\1request2')
+
+    def test_expire(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+        result = app.call('request', 2.0)
+        call = app._calls[0]
+
+        app._expire(0, call)
+
+        self.assertRaises(rpc.RPCTimeout, result.get, timeout=0)
+        self.assertEqual(app._calls, {})
+        self.assertEqual(app._slots.counter, 64)
+        self.assertFalse(parent.manager.timers.cancel.called)
+
+    def test_expire_reused(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+        result = app.call('request')
+
+        app._expire(0, 'other')
+
+        self.assertFalse(result.ready())
+        self.assertEqual(app._calls.keys(), [0])
+
+    def test_recv_frame_request(self):
+        app = rpc.RPCApplication(make_parent())
+        result = app.call('request')
+
+        with mock.patch.object(app, 'recv_request') as mock_recv_request:
+            app.recv_frame('\0\0\0\0request')
+
+        mock_recv_request.assert_called_once_with(0, 'request')
+        self.assertFalse(result.ready())
+        self.assertEqual(app._calls.keys(), [0])
+
+    def test_recv_frame_late_response(self):
+        app = rpc.RPCApplication(make_parent())
+
+        with mock.patch.object(app, 'recv_request') as mock_recv_request:
+            app.recv_frame('\x80\0\0\5response')
+
+        self.assertFalse(mock_recv_request.called)
+
+    def test_recv_request(self):
+        app = rpc.RPCApplication(make_parent())
+
+        # Should do nothing
+        app.recv_request(5, 'request')
+
+    def test_reply(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+
+        app.reply(5, 'response')
+
+        parent.send_frame.assert_called_once_with('\x80\0\0\5response')
+
+    def test_close(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+        result = app.call('request')
+
+        app.close()
+
+        parent.close.assert_called_once_with()
+        self.assertRaises(rpc.RPCClosed, result.get, timeout=0)
+        self.assertEqual(result.exception.error, None)
+        self.assertEqual(app._calls, {})
+
+    def test_closed(self):
+        parent = make_parent()
+        app = rpc.RPCApplication(parent)
+        result = app.call('request')
+
+        app.closed('error')
+
+        self.assertFalse(parent.close.called)
+        self.assertRaises(rpc.RPCClosed, result.get, timeout=0)
+        self.assertEqual(result.exception.error, 'error')
+        self.assertEqual(app._slots.counter, 64)
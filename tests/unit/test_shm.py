@@ -0,0 +1,504 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import mmap
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import mock
+
+from tendril import connection
+from tendril import manager
+from tendril import shm
+from tendril import unix
+
+
+class TestException(Exception):
+    pass
+
+
+def make_ring(size=16):
+    buf = mmap.mmap(-1, shm._HEADER + size)
+    return shm._Ring(buf, 0, size)
+
+
+class TestShmDir(unittest.TestCase):
+    def test_configured(self):
+        self.assertEqual(shm._shm_dir('/some/dir'), '/some/dir')
+
+    @mock.patch('os.path.isdir', return_value=True)
+    def test_dev_shm(self, mock_isdir):
+        self.assertEqual(shm._shm_dir(), '/dev/shm')
+        mock_isdir.assert_called_once_with('/dev/shm')
+
+    @mock.patch('os.path.isdir', return_value=False)
+    @mock.patch.object(tempfile, 'gettempdir', return_value='/tmp')
+    def test_tempdir(self, mock_gettempdir, mock_isdir):
+        self.assertEqual(shm._shm_dir(), '/tmp')
+
+
+class TestRing(unittest.TestCase):
+    def test_init(self):
+        ring = make_ring()
+
+        self.assertEqual(ring.size, 16)
+        self.assertEqual(ring.free(), 16)
+        self.assertEqual(ring.waiting, False)
+        self.assertEqual(ring.read(16), '')
+
+    def test_waiting(self):
+        ring = make_ring()
+
+        ring.waiting = True
+        self.assertEqual(ring.waiting, True)
+
+        ring.waiting = False
+        self.assertEqual(ring.waiting, False)
+
+    def test_write_read(self):
+        ring = make_ring()
+
+        self.assertEqual(ring.write('0123456789'), 10)
+        self.assertEqual(ring.free(), 6)
+        self.assertEqual(ring.read(4), '0123')
+        self.assertEqual(ring.free(), 10)
+        self.assertEqual(ring.read(16), '456789')
+        self.assertEqual(ring.read(16), '')
+        self.assertEqual(ring.free(), 16)
+
+    def test_write_full(self):
+        ring = make_ring()
+
+        self.assertEqual(ring.write('0123456789abcdefghij'), 16)
+        self.assertEqual(ring.free(), 0)
+        self.assertEqual(ring.write('klm'), 0)
+        self.assertEqual(ring.read(32), '0123456789abcdef')
+
+    def test_wrap(self):
+        ring = make_ring()
+        ring.write('0123456789')
+        ring.read(10)
+
+        # Wraps around the end of the ring
+        self.assertEqual(ring.write('abcdefghijklmnop'), 16)
+        self.assertEqual(ring.free(), 0)
+        self.assertEqual(ring.read(32), 'abcdefghijklmnop')
+
+    def test_write_bytearray(self):
+        ring = make_ring()
+        ring.write('0123456789')
+        ring.read(10)
+
+        self.assertEqual(ring.write(bytearray('abcdefghijklmnopq')), 16)
+        self.assertEqual(ring.read(32), 'abcdefghijklmnop')
+
+    def test_shared(self):
+        buf = mmap.mmap(-1, 2 * (shm._HEADER + 16))
+        ring1 = shm._Ring(buf, 0, 16)
+        ring2 = shm._Ring(buf, shm._HEADER + 16, 16)
+        consumer = shm._Ring(buf, 0, 16)
+
+        ring1.write('ring1')
+        ring2.write('ring2')
+
+        self.assertEqual(consumer.read(16), 'ring1')
+        self.assertEqual(ring1.free(), 16)
+        self.assertEqual(ring2.read(16), 'ring2')
+
+
+class TestSegment(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_create(self):
+        segment = shm._Segment.create(self.dir, 16)
+
+        self.assertEqual(os.path.dirname(segment.path), self.dir)
+        self.assertTrue(os.path.basename(segment.path).startswith(
+            shm._PREFIX))
+        self.assertEqual(os.path.getsize(segment.path),
+                         2 * (shm._HEADER + 16))
+        self.assertEqual(os.stat(segment.path).st_mode & 0o777, 0o600)
+        self.assertEqual(segment.rings[0].size, 16)
+        self.assertEqual(segment.rings[1].size, 16)
+
+        path = segment.path
+        segment.close()
+
+        self.assertEqual(segment.path, None)
+        self.assertFalse(os.path.exists(path))
+
+    def test_attach(self):
+        segment = shm._Segment.create(self.dir, 16)
+        path = segment.path
+        segment.rings[0].write('to server')
+
+        other = shm._Segment.attach(path, self.dir, 16, os.getuid())
+
+        self.assertEqual(other.path, None)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(other.rings[0].read(16), 'to server')
+        other.rings[1].write('to client')
+        self.assertEqual(segment.rings[1].read(16), 'to client')
+
+        # The file is already gone
+        segment.close()
+        other.close()
+
+    def test_attach_wrong_dir(self):
+        segment = shm._Segment.create(self.dir, 16)
+
+        self.assertRaises(ValueError, shm._Segment.attach, segment.path,
+                          '/some/dir', 16)
+        self.assertTrue(os.path.exists(segment.path))
+
+        segment.close()
+
+    def test_attach_wrong_name(self):
+        path = os.path.join(self.dir, 'victim')
+        with open(path, 'w') as f:
+            f.write('x' * (2 * (shm._HEADER + 16)))
+
+        self.assertRaises(ValueError, shm._Segment.attach, path, self.dir,
+                          16)
+        self.assertTrue(os.path.exists(path))
+
+    def test_attach_wrong_owner(self):
+        segment = shm._Segment.create(self.dir, 16)
+
+        self.assertRaises(ValueError, shm._Segment.attach, segment.path,
+                          self.dir, 16, os.getuid() + 1)
+        self.assertTrue(os.path.exists(segment.path))
+
+        segment.close()
+
+    def test_attach_too_big(self):
+        segment = shm._Segment.create(self.dir, 32)
+
+        self.assertRaises(ValueError, shm._Segment.attach, segment.path,
+                          self.dir, 16)
+        self.assertTrue(os.path.exists(segment.path))
+
+        segment.close()
+
+    def test_attach_bad_size(self):
+        path = os.path.join(self.dir, shm._PREFIX + 'odd')
+        with open(path, 'w') as f:
+            f.write('x' * (2 * (shm._HEADER + 16) + 1))
+
+        self.assertRaises(ValueError, shm._Segment.attach, path, self.dir,
+                          16)
+
+    def test_attach_symlink(self):
+        target = os.path.join(self.dir, 'victim')
+        with open(target, 'w') as f:
+            f.write('x' * (2 * (shm._HEADER + 16)))
+        path = os.path.join(self.dir, shm._PREFIX + 'link')
+        os.symlink(target, path)
+
+        self.assertRaises(OSError, shm._Segment.attach, path, self.dir, 16)
+
+
+class TestShmTendril(unittest.TestCase):
+    def setUp(self):
+        self.sock = mock.Mock(**{
+            'getsockname.return_value': '/tmp/sock',
+            'getpeername.return_value': '',
+        })
+
+    def make_tendril(self, side=1, mgr='manager'):
+        tend = shm.ShmTendril(mgr, self.sock)
+        buf = mmap.mmap(-1, 2 * (shm._HEADER + 16))
+        segment = shm._Segment(None, buf, 16)
+        tend._attach(segment, side)
+        return tend, segment
+
+    def test_init(self):
+        tend = shm.ShmTendril('manager', self.sock)
+
+        self.assertEqual(tend.proto, 'shm')
+        self.assertEqual(tend.recv_bufsize, 65536)
+        self.assertEqual(tend._segment, None)
+        self.assertFalse(tend._attached_event.is_set())
+        self.assertIsInstance(tend, unix.UnixStreamTendril)
+        self.assertFalse(self.sock.sendall.called)
+
+    @mock.patch.object(shm._Segment, 'create')
+    def test_init_initiate(self, mock_create):
+        segment = mock.Mock(rings=(mock.Mock(), mock.Mock()))
+        mock_create.return_value = segment
+        segment.path = '/dev/shm/tendril-shm-abc'
+        mgr = mock.Mock(shm_dir='/dir', ring_size=1024)
+
+        tend = shm.ShmTendril(mgr, self.sock, initiate=True)
+
+        mock_create.assert_called_once_with('/dir', 1024)
+        self.sock.sendall.assert_called_once_with(
+            '/dev/shm/tendril-shm-abc\n')
+        self.assertEqual(tend._segment, segment)
+        self.assertEqual(tend._tx, segment.rings[0])
+        self.assertEqual(tend._rx, segment.rings[1])
+        self.assertTrue(tend._attached_event.is_set())
+
+    @mock.patch.object(shm._Segment, 'create')
+    @mock.patch.object(shm, '_shm_dir', return_value='/dev/shm')
+    def test_init_initiate_defaults(self, mock_shm_dir, mock_create):
+        shm.ShmTendril('manager', self.sock, initiate=True)
+
+        mock_shm_dir.assert_called_once_with(None)
+        mock_create.assert_called_once_with(
+            '/dev/shm', shm.ShmTendrilManager.ring_size)
+
+    @mock.patch.object(shm._Segment, 'create')
+    def test_init_initiate_error(self, mock_create):
+        segment = mock_create.return_value
+        segment.path = '/dev/shm/tendril-shm-abc'
+        self.sock.sendall.side_effect = TestException()
+
+        self.assertRaises(TestException, shm.ShmTendril, 'manager',
+                          self.sock, initiate=True)
+        segment.close.assert_called_once_with()
+
+    def test_detach(self):
+        segment = mock.Mock(rings=(mock.Mock(), mock.Mock()))
+        tend = shm.ShmTendril('manager', self.sock)
+        tend._attach(segment, 0)
+
+        tend._detach()
+        tend._detach()
+
+        segment.close.assert_called_once_with()
+        self.assertEqual(tend._segment, None)
+        self.assertEqual(tend._tx, None)
+        self.assertEqual(tend._rx, None)
+
+    @mock.patch.object(unix.UnixStreamTendril, 'peer_credentials',
+                       (123, 456, 789))
+    @mock.patch.object(shm._Segment, 'attach')
+    @mock.patch.object(connection.Tendril, '_recv_frameify')
+    def test_recv_frameify_handshake(self, mock_recv_frameify,
+                                     mock_attach):
+        segment = mock.Mock(rings=(mock.Mock(), mock.Mock()))
+        segment.rings[0].read.return_value = ''
+        mock_attach.return_value = segment
+        mgr = mock.Mock(shm_dir='/dir', max_ring_size=4096)
+        tend = shm.ShmTendril(mgr, self.sock)
+
+        tend._recv_frameify('/dir/tendril-')
+        self.assertFalse(mock_attach.called)
+
+        tend._recv_frameify('shm-abc\n\x01')
+
+        mock_attach.assert_called_once_with('/dir/tendril-shm-abc', '/dir',
+                                            4096, 456)
+        self.assertEqual(tend._segment, segment)
+        self.assertEqual(tend._tx, segment.rings[1])
+        self.assertEqual(tend._rx, segment.rings[0])
+        self.assertEqual(tend._handshake, '')
+        self.assertFalse(mock_recv_frameify.called)
+
+    def test_recv_frameify_handshake_too_long(self):
+        tend = shm.ShmTendril('manager', self.sock)
+
+        self.assertRaises(ValueError, tend._recv_frameify, 'x' * 4097)
+
+    @mock.patch.object(connection.Tendril, '_recv_frameify')
+    def test_recv_frameify(self, mock_recv_frameify):
+        tend, segment = self.make_tendril()
+        tend.recv_bufsize = 8
+        segment.rings[0].write('0123456789')
+
+        tend._recv_frameify('\x01\x01')
+
+        mock_recv_frameify.assert_has_calls([
+            mock.call('01234567'),
+            mock.call('89'),
+        ])
+        self.assertEqual(segment.rings[0].free(), 16)
+        self.assertTrue(tend._space_event.is_set())
+        self.assertEqual(tend._doorbell_pending, False)
+
+    @mock.patch.object(connection.Tendril, '_recv_frameify')
+    def test_recv_frameify_waiting(self, mock_recv_frameify):
+        tend, segment = self.make_tendril()
+        tend._wake_send = mock.Mock()
+        segment.rings[0].write('0123456789')
+        segment.rings[0].waiting = True
+
+        tend._recv_frameify('\x01')
+
+        mock_recv_frameify.assert_called_once_with('0123456789')
+        self.assertEqual(segment.rings[0].waiting, False)
+        self.assertEqual(tend._doorbell_pending, True)
+        tend._wake_send.assert_called_once_with()
+
+    def test_send(self):
+        tend, segment = self.make_tendril(0)
+        tend._send_stream('frame 1')
+        tend._send_stream('frame 2')
+        tend._send_lock = mock.MagicMock()
+        tend._send_thread = mock.Mock()
+
+        tend._send()
+
+        self.assertEqual(tend._send_thread, None)
+
+        self.sock.send.assert_called_once_with(shm._DOORBELL)
+        self.assertEqual(segment.rings[0].read(32), 'frame 1frame 2')
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 14)
+        self.assertEqual(tend.stats.partial_sends, 0)
+        self.assertEqual(tend.stats.send_buffered, 0)
+        self.assertTrue(tend._flush_event.is_set())
+
+    def test_send_doorbell(self):
+        tend, segment = self.make_tendril(0)
+        tend._send_lock = mock.MagicMock()
+        tend._doorbell_pending = True
+
+        tend._send()
+
+        self.sock.send.assert_called_once_with(shm._DOORBELL)
+        self.assertEqual(tend._doorbell_pending, False)
+        self.assertEqual(tend.stats.bytes_sent, 0)
+
+    def test_send_full(self):
+        tend, segment = self.make_tendril(0)
+        tend._space_event = mock.Mock()
+        tend._send_stream('0123456789abcdefghij')
+        tend._send_lock = mock.MagicMock()
+
+        # The other end makes space while we wait
+        def wait(timeout):
+            self.assertTrue(segment.rings[0].waiting)
+            segment.rings[0].read(16)
+        tend._space_event.wait.side_effect = wait
+
+        tend._send()
+
+        tend._space_event.wait.assert_called_once_with(tend.full_retry)
+        self.assertEqual(self.sock.send.call_count, 2)
+        self.assertEqual(segment.rings[0].read(16), 'ghij')
+        self.assertEqual(tend.stats.bytes_sent, 20)
+        self.assertEqual(tend.stats.partial_sends, 1)
+        self.assertEqual(tend.send_pending, 0)
+
+    def test_send_file(self):
+        tend, segment = self.make_tendril(0)
+        tend.file_bufsize = 4
+        tend._send_stream('f1')
+        tend._sendfiles.append([2, StringIO.StringIO('0123456789'), 2, 6])
+        tend._sendfiles_len = 6
+        tend._send_stream('f2')
+        tend._send_lock = mock.MagicMock()
+
+        tend._send()
+
+        self.assertEqual(segment.rings[0].read(32), 'f1234567f2')
+        self.assertEqual(len(tend._sendfiles), 0)
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 10)
+        self.assertEqual(tend.stats.partial_sends, 0)
+
+    def test_send_priority(self):
+        tend, segment = self.make_tendril(0)
+        tend._send_stream('bulk', -1)
+        tend._send_stream('frame 1')
+        tend._send_stream('ping', 1)
+        tend._send_lock = mock.MagicMock()
+
+        tend._send()
+
+        self.assertEqual(segment.rings[0].read(32), 'pingframe 1bulk')
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 15)
+        self.assertEqual(tend.stats.send_buffered, 0)
+
+    def test_send_corked(self):
+        tend, segment = self.make_tendril(0)
+        tend.cork()
+        tend._send_stream('frame 1')
+        tend._send_lock = mock.MagicMock()
+        tend._doorbell_pending = True
+
+        tend._send()
+
+        self.sock.send.assert_called_once_with(shm._DOORBELL)
+        self.assertEqual(segment.rings[0].read(32), '')
+        self.assertEqual(tend.send_pending, 7)
+        self.assertFalse(tend._flush_event.is_set())
+        self.assertFalse(self.sock.setsockopt.called)
+
+    def test_send_waits_for_segment(self):
+        tend = shm.ShmTendril('manager', self.sock)
+        tend._attached_event = mock.Mock(**{
+            'wait.side_effect': TestException(),
+        })
+
+        self.assertRaises(TestException, tend._send)
+
+    @mock.patch.object(unix.UnixStreamTendril, 'close')
+    def test_close(self, mock_close):
+        tend, segment = self.make_tendril()
+
+        tend.close()
+
+        mock_close.assert_called_once_with()
+        self.assertEqual(tend._segment, None)
+
+    @mock.patch.object(unix.UnixStreamTendril, 'closed')
+    def test_closed(self, mock_closed):
+        tend, segment = self.make_tendril()
+
+        tend.closed('error')
+
+        mock_closed.assert_called_once_with('error')
+        self.assertEqual(tend._segment, None)
+
+
+@mock.patch.dict(manager.TendrilManager._managers)
+class TestShmTendrilManager(unittest.TestCase):
+    def test_init(self):
+        mgr = shm.ShmTendrilManager('/tmp/sock')
+
+        self.assertEqual(mgr.proto, 'shm')
+        self.assertEqual(mgr._bind_addr, '/tmp/sock')
+        self.assertIsInstance(mgr, unix.UnixStreamTendrilManager)
+
+    @mock.patch.object(shm, 'ShmTendril', return_value='tendril')
+    def test_make_tendril_connect(self, mock_ShmTendril):
+        mgr = shm.ShmTendrilManager()
+
+        result = mgr._make_tendril('sock')
+
+        self.assertEqual(result, 'tendril')
+        mock_ShmTendril.assert_called_once_with(mgr, 'sock', initiate=True)
+
+    @mock.patch.object(shm, 'ShmTendril', return_value='tendril')
+    def test_make_tendril_accept(self, mock_ShmTendril):
+        mgr = shm.ShmTendrilManager('/tmp/sock')
+
+        result = mgr._make_tendril('sock', '')
+
+        self.assertEqual(result, 'tendril')
+        mock_ShmTendril.assert_called_once_with(mgr, 'sock', '',
+                                                initiate=False)
@@ -0,0 +1,233 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from tendril import stats
+
+
+class TestTendrilStats(unittest.TestCase):
+    def test_init(self):
+        st = stats.TendrilStats()
+
+        for name in stats.TendrilStats._fields:
+            self.assertEqual(getattr(st, name), 0)
+
+    def test_fixed_layout(self):
+        st = stats.TendrilStats()
+
+        with self.assertRaises(AttributeError):
+            st.spam = 1
+
+    def test_add(self):
+        st1 = stats.TendrilStats()
+        st1.bytes_sent = 5
+        st1.send_buffered = 3
+        st2 = stats.TendrilStats()
+        st2.bytes_sent = 10
+        st2.errors = 1
+        st2.send_buffered = 4
+
+        st1.add(st2)
+
+        self.assertEqual(st1.bytes_sent, 15)
+        self.assertEqual(st1.errors, 1)
+        self.assertEqual(st1.send_buffered, 7)
+
+    def test_add_nogauges(self):
+        st1 = stats.TendrilStats()
+        st1.send_buffered = 3
+        st2 = stats.TendrilStats()
+        st2.bytes_sent = 10
+        st2.send_buffered = 4
+
+        st1.add(st2, gauges=False)
+
+        self.assertEqual(st1.bytes_sent, 10)
+        self.assertEqual(st1.send_buffered, 3)
+
+    def test_snapshot(self):
+        st = stats.TendrilStats()
+        st.frames_recv = 7
+
+        result = st.snapshot()
+
+        self.assertEqual(result, {
+            'bytes_sent': 0,
+            'bytes_recv': 0,
+            'frames_sent': 0,
+            'frames_recv': 7,
+            'partial_sends': 0,
+            'recv_calls': 0,
+            'send_buffered': 0,
+            'framer_switches': 0,
+            'errors': 0,
+        })
+
+
+class TestManagerStats(unittest.TestCase):
+    def test_init(self):
+        st = stats.ManagerStats()
+
+        self.assertEqual(st.accepts, 0)
+        self.assertEqual(st.connects, 0)
+        self.assertEqual(st.rejects, 0)
+        self.assertEqual(st.closer_trips, 0)
+        self.assertEqual(st.throttled, 0)
+        self.assertIsInstance(st.retired, stats.TendrilStats)
+
+    def test_snapshot(self):
+        st = stats.ManagerStats()
+        st.accepts = 2
+        st.retired.bytes_sent = 10
+
+        result = st.snapshot()
+
+        self.assertEqual(result, {
+            'accepts': 2,
+            'connects': 0,
+            'rejects': 0,
+            'closer_trips': 0,
+            'throttled': 0,
+        })
+
+
+class TestTLSStats(unittest.TestCase):
+    def test_snapshot(self):
+        st = stats.TLSStats()
+        st.handshakes = 3
+
+        result = st.snapshot()
+
+        self.assertEqual(result, {
+            'handshakes': 3,
+            'handshake_errors': 0,
+            'session_hits': 0,
+            'session_misses': 0,
+        })
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_init(self):
+        hist = stats.LatencyHistogram()
+
+        self.assertEqual(hist.sub_bits, 5)
+        self.assertEqual(hist.counts, [])
+        self.assertEqual(hist.count, 0)
+        self.assertEqual(hist.total, 0)
+        self.assertEqual(hist.min, None)
+        self.assertEqual(hist.max, None)
+
+    def test_index_value(self):
+        hist = stats.LatencyHistogram(3)
+
+        # Indexes must be contiguous and the values monotonic
+        last_idx = 0
+        for value in range(1, 5000):
+            idx = hist._index(value)
+            self.assertTrue(idx in (last_idx, last_idx + 1))
+            self.assertTrue(value <= hist._value(idx))
+            self.assertTrue(hist._value(idx) - value < value / 4 + 1)
+            last_idx = idx
+
+    def test_record(self):
+        hist = stats.LatencyHistogram()
+
+        hist.record(0.000003)
+        hist.record(0.001)
+        hist.record(-1)
+
+        self.assertEqual(hist.count, 3)
+        self.assertEqual(hist.total, 1003)
+        self.assertEqual(hist.min, 0)
+        self.assertEqual(hist.max, 1000)
+        self.assertEqual(hist.counts[0], 1)
+        self.assertEqual(hist.counts[3], 1)
+        self.assertEqual(hist.counts[hist._index(1000)], 1)
+        self.assertEqual(sum(hist.counts), 3)
+
+    def test_reset(self):
+        hist = stats.LatencyHistogram()
+        hist.record(0.001)
+
+        hist.reset()
+
+        self.assertEqual(hist.counts, [])
+        self.assertEqual(hist.count, 0)
+        self.assertEqual(hist.max, None)
+
+    def test_percentile_empty(self):
+        hist = stats.LatencyHistogram()
+
+        self.assertEqual(hist.percentile(50), None)
+
+    def test_percentile(self):
+        hist = stats.LatencyHistogram()
+        for i in range(1, 101):
+            hist.record(i / 1000000.0)
+
+        self.assertEqual(hist.percentile(0), 0.000001)
+        self.assertEqual(hist.percentile(25), 0.000025)
+        self.assertEqual(hist.percentile(100), 0.0001)
+        self.assertTrue(0.00009 <= hist.percentile(90) <= 0.000095)
+
+    def test_snapshot_empty(self):
+        hist = stats.LatencyHistogram()
+
+        self.assertEqual(hist.snapshot(), {
+            'count': 0,
+            'min': None,
+            'max': None,
+            'mean': None,
+            'p50': None,
+            'p90': None,
+            'p99': None,
+            'p999': None,
+        })
+
+    def test_snapshot(self):
+        hist = stats.LatencyHistogram()
+        hist.record(0.000010)
+        hist.record(0.000020)
+
+        result = hist.snapshot()
+
+        self.assertEqual(result['count'], 2)
+        self.assertEqual(result['min'], 0.00001)
+        self.assertEqual(result['max'], 0.00002)
+        self.assertEqual(result['mean'], 0.000015)
+        self.assertEqual(result['p50'], 0.00001)
+        self.assertEqual(result['p999'], 0.00002)
+
+
+class TestLatencyStats(unittest.TestCase):
+    def test_init(self):
+        lat = stats.LatencyStats(4)
+
+        self.assertIsInstance(lat.recv_frame, stats.LatencyHistogram)
+        self.assertIsInstance(lat.send_queue, stats.LatencyHistogram)
+        self.assertEqual(lat.recv_frame.sub_bits, 4)
+        self.assertEqual(lat.send_queue.sub_bits, 4)
+
+    def test_snapshot(self):
+        lat = stats.LatencyStats()
+        lat.recv_frame.record(0.00001)
+
+        result = lat.snapshot()
+
+        self.assertEqual(set(result.keys()), set(['recv_frame', 'send_queue']))
+        self.assertEqual(result['recv_frame']['count'], 1)
+        self.assertEqual(result['send_queue']['count'], 0)
@@ -14,6 +14,9 @@
 ## along with this program.  If not, see
 ## <http://www.gnu.org/licenses/>.
 
+import collections
+import errno
+import StringIO
 import unittest
 
 import gevent
@@ -26,6 +29,7 @@ from tendril import application
 from tendril import connection
 from tendril import framers
 from tendril import manager
+from tendril import stats
 from tendril import tcp
 
 
@@ -48,7 +52,7 @@ class TestTCPTendril(unittest.TestCase):
         self.assertIsInstance(tend._recv_framer, framers.LineFramer)
         self.assertIsInstance(tend._send_framer, framers.LineFramer)
         self.assertEqual(id(tend._sock), id(self.sock))
-        self.assertIsInstance(tend._sendbuf_event, event.Event)
+        self.assertIsInstance(tend._sendbuf, bytearray)
         self.assertEqual(tend._sendbuf, '')
         self.assertEqual(tend._recv_thread, None)
         self.assertEqual(tend._send_thread, None)
@@ -65,32 +69,125 @@ class TestTCPTendril(unittest.TestCase):
         self.assertIsInstance(tend._recv_framer, framers.LineFramer)
         self.assertIsInstance(tend._send_framer, framers.LineFramer)
         self.assertEqual(id(tend._sock), id(self.sock))
-        self.assertIsInstance(tend._sendbuf_event, event.Event)
         self.assertEqual(tend._sendbuf, '')
         self.assertEqual(tend._recv_thread, None)
         self.assertEqual(tend._send_thread, None)
         self.assertEqual(tend._recv_lock, None)
         self.assertEqual(tend._send_lock, None)
+        self.assertEqual(tend.read_idle_timeout, None)
+        self.assertEqual(tend.write_idle_timeout, None)
+        self.assertEqual(tend.idle_timeout, None)
+        self.assertEqual(tend._idle_timer, None)
         self.sock.getsockname.assert_called_once_with()
         self.sock.getpeername.assert_called_once_with()
 
+    def test_init_idle_timeouts(self):
+        mgr = mock.Mock(read_idle_timeout=1, write_idle_timeout=2,
+                        idle_timeout=3)
+        tend = tcp.TCPTendril(mgr, self.sock)
+
+        self.assertEqual(tend.read_idle_timeout, 1)
+        self.assertEqual(tend.write_idle_timeout, 2)
+        self.assertEqual(tend.idle_timeout, 3)
+
+    def test_init_coalescing(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        self.assertEqual(tend.coalesce_delay, None)
+        self.assertEqual(tend.coalesce_bytes, None)
+        self.assertEqual(tend.corked, False)
+        self.assertEqual(tend.nodelay, None)
+        self.assertFalse(self.sock.setsockopt.called)
+
+    def test_init_coalescing_manager(self):
+        mgr = mock.Mock(coalesce_delay=0.01, coalesce_bytes=1400,
+                        nodelay=True)
+        tend = tcp.TCPTendril(mgr, self.sock)
+
+        self.assertEqual(tend.coalesce_delay, 0.01)
+        self.assertEqual(tend.coalesce_bytes, 1400)
+        self.assertEqual(tend.nodelay, True)
+        self.sock.setsockopt.assert_called_once_with(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
     @mock.patch.object(gevent, 'spawn')
     def test_start(self, mock_spawn):
         recv_thread = mock.Mock()
-        send_thread = mock.Mock()
-        mock_spawn.side_effect = [recv_thread, send_thread]
+        mock_spawn.return_value = recv_thread
 
         tend = tcp.TCPTendril('manager', self.sock)
         tend._start()
 
         self.assertIsInstance(tend._recv_lock, coros.Semaphore)
         self.assertIsInstance(tend._send_lock, coros.Semaphore)
+        self.assertFalse(tend._send_lock.locked())
+        mock_spawn.assert_called_once_with(tend._recv)
+        self.assertEqual(id(tend._recv_thread), id(recv_thread))
+        self.assertEqual(tend._send_thread, None)
+        recv_thread.link.assert_called_once_with(tend._thread_error)
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_start_pending(self, mock_spawn):
+        recv_thread = mock.Mock()
+        send_thread = mock.Mock()
+        mock_spawn.side_effect = [recv_thread, send_thread]
+
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('frame 1')
+        tend._start()
+
         mock_spawn.assert_has_calls([mock.call(tend._recv),
                                      mock.call(tend._send)])
-        self.assertEqual(id(tend._recv_thread), id(recv_thread))
         self.assertEqual(id(tend._send_thread), id(send_thread))
-        recv_thread.link.assert_called_once_with(tend._thread_error)
-        send_thread.link.assert_called_once_with(tend._thread_error)
+        send_thread.link_exception.assert_called_once_with(
+            tend._thread_error)
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_wake_send(self, mock_spawn):
+        send_thread = mock.Mock()
+        mock_spawn.return_value = send_thread
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_lock = mock.Mock()
+
+        tend._wake_send()
+
+        mock_spawn.assert_called_once_with(tend._send)
+        self.assertEqual(id(tend._send_thread), id(send_thread))
+        send_thread.link_exception.assert_called_once_with(
+            tend._thread_error)
+        self.assertFalse(send_thread.link.called)
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_wake_send_running(self, mock_spawn):
+        send_thread = mock.Mock()
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_lock = mock.Mock()
+        tend._send_thread = send_thread
+
+        tend._wake_send()
+
+        self.assertFalse(mock_spawn.called)
+        self.assertEqual(id(tend._send_thread), id(send_thread))
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_wake_send_unstarted(self, mock_spawn):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        tend._wake_send()
+
+        self.assertFalse(mock_spawn.called)
+        self.assertEqual(tend._send_thread, None)
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_wake_send_closed(self, mock_spawn):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_lock = mock.Mock()
+        tend._sock = None
+
+        tend._wake_send()
+
+        self.assertFalse(mock_spawn.called)
+        self.assertEqual(tend._send_thread, None)
 
     @mock.patch.object(connection.Tendril, 'close')
     @mock.patch.object(tcp.TCPTendril, '_recv_frameify')
@@ -158,27 +255,194 @@ class TestTCPTendril(unittest.TestCase):
                                              mock.call('frame 2')])
 
     def test_send(self):
-        self.sock.send.side_effect = [7, 7]
+        # The send buffer is trimmed in place, so record what was sent
+        sent = []
+
+        def send(data):
+            sent.append(str(data))
+            return 7
+        self.sock.send.side_effect = send
         tend = tcp.TCPTendril('manager', self.sock)
         self.sock.reset_mock()
-        tend._sendbuf = 'frame 1frame 2'
-        tend._send_lock = mock.Mock()
-        tend._sendbuf_event = mock.Mock(**{
-            'clear.side_effect': gevent.GreenletExit,
-        })
+        tend._sendbuf = bytearray('frame 1frame 2')
+        tend._send_lock = mock.MagicMock()
+        tend._send_thread = mock.Mock()
+        tend._flush_event.clear()
 
-        with self.assertRaises(gevent.GreenletExit):
-            tend._send()
+        tend._send()
 
-        self.assertEqual(tend._send_lock.method_calls, [
-            mock.call.release(), mock.call.acquire(),
-        ])
-        self.assertEqual(tend._sendbuf_event.method_calls, [
-            mock.call.wait(), mock.call.clear(),
+        self.assertEqual(tend._send_lock.mock_calls, [
+            mock.call.__enter__(), mock.call.__exit__(None, None, None),
         ])
+        self.assertEqual(tend._send_thread, None)
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertIsInstance(tend._sendbuf, bytearray)
         self.assertEqual(tend._sendbuf, '')
-        self.sock.send.assert_has_calls([mock.call('frame 1frame 2'),
-                                         mock.call('frame 2')])
+        self.assertEqual(sent, ['frame 1frame 2', 'frame 2'])
+        self.assertEqual(tend.stats.bytes_sent, 14)
+        self.assertEqual(tend.stats.partial_sends, 1)
+        self.assertEqual(tend.stats.send_buffered, 0)
+
+    def test_send_flushed(self):
+        self.sock.send.return_value = 7
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('frame 1')
+        tend._send_lock = mock.MagicMock()
+        tend._flush_event = mock.Mock()
+
+        tend._send()
+
+        tend._flush_event.set.assert_called_once_with()
+
+    def test_send_error(self):
+        self.sock.send.side_effect = socket.error('send failed')
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('frame 1')
+        tend._send_lock = mock.MagicMock()
+        send_thread = mock.Mock()
+        tend._send_thread = send_thread
+        tend._flush_event.clear()
+
+        self.assertRaises(socket.error, tend._send)
+
+        self.assertEqual(id(tend._send_thread), id(send_thread))
+        self.assertFalse(tend._flush_event.is_set())
+        self.assertEqual(tend._sendbuf, 'frame 1')
+
+    def test_send_file_fallback(self):
+        # The send buffer is trimmed in place, so record what was sent
+        sent = []
+
+        def send(data):
+            sent.append(str(data))
+            return len(data)
+        self.sock.send.side_effect = send
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend.file_bufsize = 4
+        tend._send_lock = mock.MagicMock()
+        tend._sendbuf = bytearray('frame 1')
+        tend._sendfiles.append([7, StringIO.StringIO('0123456789'), 2, 6])
+        tend._sendfiles_len = 6
+        tend._sendbuf += 'frame 2'
+
+        tend._send()
+
+        self.assertEqual(sent, ['frame 1', '2345', '67frame 2'])
+        self.assertEqual(len(tend._sendfiles), 0)
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 20)
+        self.assertEqual(tend.stats.partial_sends, 0)
+        self.assertTrue(tend._flush_event.is_set())
+
+    @mock.patch.object(socket, 'wait_write')
+    @mock.patch.object(tcp, 'sendfile')
+    @mock.patch.object(tcp.TCPTendril, '_can_sendfile', return_value=True)
+    def test_send_file_sendfile(self, mock_can_sendfile, mock_sendfile,
+                                mock_wait_write):
+        mock_sendfile.side_effect = [OSError(errno.EAGAIN, 'again'), 4, 2]
+        self.sock.send.side_effect = lambda data: len(data)
+        self.sock.fileno.return_value = 5
+        fileobj = mock.Mock(**{'fileno.return_value': 6})
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_lock = mock.MagicMock()
+        tend._sendbuf = bytearray('frame 1')
+        tend._sendfiles.append([7, fileobj, 2, 6])
+        tend._sendfiles_len = 6
+        tend._sendbuf += 'frame 2'
+
+        tend._send()
+
+        mock_sendfile.assert_has_calls([
+            mock.call(5, 6, 2, 6),
+            mock.call(5, 6, 2, 6),
+            mock.call(5, 6, 6, 2),
+        ])
+        mock_wait_write.assert_called_once_with(5)
+        self.assertEqual(self.sock.send.call_count, 2)
+        self.assertEqual(len(tend._sendfiles), 0)
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 20)
+
+    @mock.patch.object(tcp, 'sendfile', return_value=0)
+    @mock.patch.object(tcp.TCPTendril, '_can_sendfile', return_value=True)
+    def test_send_file_sendfile_eof(self, mock_can_sendfile, mock_sendfile):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_lock = mock.MagicMock()
+        tend._sendfiles.append([0, mock.Mock(), 2, 6])
+        tend._sendfiles_len = 6
+
+        self.assertRaises(EOFError, tend._send)
+        self.assertEqual(tend.send_pending, 6)
+
+    @mock.patch.object(tcp, 'sendfile')
+    @mock.patch.object(tcp.TCPTendril, '_can_sendfile', return_value=True)
+    def test_send_file_sendfile_error(self, mock_can_sendfile,
+                                      mock_sendfile):
+        mock_sendfile.side_effect = OSError(errno.EPIPE, 'broken pipe')
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_lock = mock.MagicMock()
+        tend._sendfiles.append([0, mock.Mock(), 2, 6])
+        tend._sendfiles_len = 6
+
+        self.assertRaises(OSError, tend._send)
+
+    def test_send_file_read_eof(self):
+        self.sock.send.side_effect = lambda data: len(data)
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_lock = mock.MagicMock()
+        tend._sendfiles.append([0, StringIO.StringIO('0123'), 2, 6])
+        tend._sendfiles_len = 6
+
+        self.assertRaises(EOFError, tend._send)
+        self.assertEqual(tend.send_pending, 4)
+
+    @mock.patch.object(tcp, 'sendfile', 'sendfile')
+    def test_can_sendfile(self):
+        sock = socket.socket()
+        self.addCleanup(sock.close)
+        tend = tcp.TCPTendril('manager', sock, ('127.0.0.2', 8880))
+
+        self.assertEqual(tend._can_sendfile(), True)
+
+    @mock.patch.object(tcp, 'sendfile', 'sendfile')
+    def test_can_sendfile_wrapped(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        self.assertEqual(tend._can_sendfile(), False)
+
+    @mock.patch.object(tcp, 'sendfile', None)
+    def test_can_sendfile_unavailable(self):
+        sock = socket.socket()
+        self.addCleanup(sock.close)
+        tend = tcp.TCPTendril('manager', sock, ('127.0.0.2', 8880))
+
+        self.assertEqual(tend._can_sendfile(), False)
+
+    def test_send_latency(self):
+        self.sock.send.side_effect = [7, 7]
+        latency = stats.LatencyStats()
+        tend = tcp.TCPTendril(mock.Mock(latency=latency, coalesce_delay=None),
+                              self.sock)
+        tend._sendbuf = bytearray('frame 1frame 2')
+        tend._send_times.extend([(7, 1.0), (14, 2.0)])
+        tend._send_lock = mock.MagicMock()
+
+        with mock.patch('time.time', return_value=3.0):
+            tend._send()
+
+        self.assertEqual(len(tend._send_times), 0)
+        self.assertEqual(latency.send_queue.count, 2)
+        self.assertEqual(latency.send_queue.min, 1000000)
+        self.assertEqual(latency.send_queue.max, 2000000)
+
+    def test_record_send_times_disabled(self):
+        tend = tcp.TCPTendril(mock.Mock(latency=None), self.sock)
+        tend.stats.bytes_sent = 10
+        tend._send_times.extend([(7, 1.0), (14, 2.0)])
+
+        tend._record_send_times()
+
+        self.assertEqual(list(tend._send_times), [(14, 2.0)])
 
     @mock.patch.object(tcp.TCPTendril, 'close')
     @mock.patch.object(tcp.TCPTendril, 'closed')
@@ -222,6 +486,23 @@ class TestTCPTendril(unittest.TestCase):
         self.assertNotEqual(tend._send_thread, None)
         self.assertNotEqual(tend._recv_thread, None)
 
+    @mock.patch.object(tcp.TCPTendril, 'close')
+    @mock.patch.object(tcp.TCPTendril, 'closed')
+    def test_thread_error_greenletexit_value(self, mock_closed, mock_close):
+        thread = mock.Mock(**{
+            'successful.return_value': True,
+            'exception': None,
+            'value': gevent.GreenletExit(),
+        })
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_thread = mock.Mock()
+        tend._recv_thread = mock.Mock()
+
+        tend._thread_error(thread)
+
+        mock_close.assert_called_once_with()
+        self.assertFalse(mock_closed.called)
+
     @mock.patch.object(tcp.TCPTendril, 'close')
     @mock.patch.object(tcp.TCPTendril, 'closed')
     def test_thread_error_exception(self, mock_closed, mock_close):
@@ -289,7 +570,6 @@ class TestTCPTendril(unittest.TestCase):
         wrapper = mock.Mock()
         tend = tcp.TCPTendril('manager', self.sock)
         tend._recv_thread = mock.Mock()
-        tend._send_thread = mock.Mock()
         tend._recv_lock = mock.Mock()
         tend._send_lock = mock.Mock()
 
@@ -311,12 +591,567 @@ class TestTCPTendril(unittest.TestCase):
                        return_value='frame1:frame2')
     def test_send_frame(self, mock_send_streamify):
         tend = tcp.TCPTendril('manager', self.sock)
-        tend._sendbuf_event = mock.Mock()
+        tend._wake_send = mock.Mock()
 
         tend.send_frame('a frame')
 
         mock_send_streamify.assert_called_once_with('a frame')
-        tend._sendbuf_event.assert_has_calls([mock.call.set()])
+        tend._wake_send.assert_called_once_with()
+        self.assertEqual(tend.stats.send_buffered, 13)
+        self.assertEqual(len(tend._send_times), 0)
+
+    @mock.patch.object(connection.Tendril, '_send_streamify')
+    def test_send_stream(self, mock_send_streamify):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('data:')
+        tend._wake_send = mock.Mock()
+
+        tend._send_stream('frame')
+
+        self.assertFalse(mock_send_streamify.called)
+        tend._wake_send.assert_called_once_with()
+        self.assertEqual(tend._sendbuf, 'data:frame')
+        self.assertEqual(tend.stats.send_buffered, 10)
+
+    @mock.patch.object(connection.Tendril, '_send_streamify',
+                       return_value='frame1:frame2')
+    def test_send_frame_unflushed(self, mock_send_streamify):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        self.assertTrue(tend._flush_event.is_set())
+
+        tend.send_frame('a frame')
+
+        self.assertFalse(tend._flush_event.is_set())
+        self.assertEqual(tend.send_pending, 13)
+
+    def test_send_file(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('data')
+        tend.stats.bytes_sent = 10
+        tend._wake_send = mock.Mock()
+
+        tend.send_file('file', 5, 20)
+        tend.send_file('file2', 0, 8)
+
+        self.assertEqual(list(tend._sendfiles), [
+            [14, 'file', 5, 20],
+            [34, 'file2', 0, 8],
+        ])
+        self.assertEqual(tend.send_pending, 32)
+        self.assertFalse(tend._flush_event.is_set())
+        self.assertEqual(tend._wake_send.call_count, 2)
+
+    @mock.patch('os.fstat', return_value=mock.Mock(st_size=100))
+    def test_send_file_remainder(self, mock_fstat):
+        fileobj = mock.Mock(**{'fileno.return_value': 5})
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+
+        tend.send_file(fileobj, 40)
+
+        mock_fstat.assert_called_once_with(5)
+        self.assertEqual(list(tend._sendfiles), [[0, fileobj, 40, 60]])
+        self.assertEqual(tend.send_pending, 60)
+
+    def test_send_file_empty(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+
+        tend.send_file('file', 5, 0)
+
+        self.assertEqual(len(tend._sendfiles), 0)
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertFalse(tend._wake_send.called)
+
+    @mock.patch('time.time', return_value=1.0)
+    def test_send_stream_after_file_latency(self, mock_time):
+        tend = tcp.TCPTendril(mock.Mock(latency=stats.LatencyStats()),
+                              self.sock)
+        tend._wake_send = mock.Mock()
+        tend.send_file('file', 0, 20)
+
+        tend._send_stream('frame')
+
+        self.assertEqual(list(tend._send_times), [(25, 1.0)])
+
+    def test_flush(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        self.assertEqual(tend.flush(), True)
+
+    def test_flush_file_pending(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendfiles_len = 10
+
+        self.assertEqual(tend.flush(), False)
+
+    def test_flush_timeout(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('data')
+        tend._flush_event.clear()
+
+        self.assertEqual(tend.flush(0.01), False)
+
+    def test_flush_wait(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('data')
+        tend._flush_event.clear()
+
+        def sent():
+            tend._sendbuf = bytearray('')
+            tend._flush_event.set()
+
+        gevent.spawn_later(0.01, sent)
+
+        self.assertEqual(tend.flush(1.0), True)
+
+    def test_flush_closed(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('data')
+        tend._flush_event.clear()
+
+        def closed():
+            tend._flush_event.set()
+
+        gevent.spawn_later(0.01, closed)
+
+        self.assertEqual(tend.flush(1.0), False)
+
+    def test_flush_after_close(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend._sock = None
+
+        tend._send_stream('frame')
+        tend.send_file('file', 0, 10)
+
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertEqual(tend.flush(), False)
+
+    def test_send_stream_priority(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+
+        tend._send_stream('frame 1')
+        tend._send_stream('ping', 5)
+        tend._send_stream('bulk', -1)
+        tend._send_stream('pong', 5)
+
+        self.assertEqual(tend._sendbuf, 'frame 1')
+        self.assertEqual(tend._lanes, {
+            5: collections.deque([('ping', None), ('pong', None)]),
+            -1: collections.deque([('bulk', None)]),
+        })
+        self.assertEqual(list(tend._frame_ends), [7])
+        self.assertEqual(tend.send_pending, 19)
+        self.assertEqual(tend.stats.send_buffered, 19)
+        self.assertEqual(tend._wake_send.call_count, 4)
+
+    @mock.patch('time.time', return_value=1.0)
+    def test_send_stream_priority_latency(self, mock_time):
+        tend = tcp.TCPTendril(mock.Mock(latency=stats.LatencyStats()),
+                              self.sock)
+        tend._wake_send = mock.Mock()
+
+        tend._send_stream('ping', 5)
+
+        self.assertEqual(tend._lanes, {
+            5: collections.deque([('ping', 1.0)]),
+        })
+        self.assertEqual(len(tend._send_times), 0)
+
+    @mock.patch.object(connection.Tendril, '_send_streamify',
+                       return_value='ping')
+    def test_send_frame_priority(self, mock_send_streamify):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._send_stream = mock.Mock()
+
+        tend.send_frame('frame', 3)
+
+        tend._send_stream.assert_called_once_with('ping', 3)
+
+    def test_send_file_frame_ends(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend._send_stream('ping', 5)
+
+        tend._send_stream('frame 1')
+        tend.send_file('file', 0, 10)
+        tend._send_stream('frame 2')
+
+        self.assertEqual(list(tend._frame_ends), [7, 17, 24])
+        self.assertEqual(tend._sendfiles[0][0], 7)
+
+    def test_at_boundary(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._frame_ends.extend([7, 14, 21])
+
+        self.assertEqual(tend._at_boundary(), True)
+
+        tend.stats.bytes_sent = 10
+        self.assertEqual(tend._at_boundary(), False)
+        self.assertEqual(list(tend._frame_ends), [14, 21])
+
+        tend.stats.bytes_sent = 14
+        self.assertEqual(tend._at_boundary(), True)
+        self.assertEqual(list(tend._frame_ends), [21])
+
+    def test_take_lanes(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend._send_stream('a', 1)
+        tend._send_stream('bulk', -2)
+        tend._send_stream('b', 3)
+        tend._send_stream('c', 1)
+        tend._send_stream('idle', -1)
+
+        self.assertEqual(tend._take_lanes(False),
+                         [('b', None), ('a', None), ('c', None)])
+        self.assertEqual(tend._take_lanes(False), [])
+        self.assertEqual(tend._take_lanes(True), [('idle', None)])
+        self.assertEqual(tend._take_lanes(True), [('bulk', None)])
+        self.assertEqual(tend._lanes, {})
+        self.assertEqual(tend._lanes_len, 0)
+
+    def test_splice(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.stats.bytes_sent = 10
+        tend._sendbuf = bytearray('frame 1')
+        tend._frame_ends.append(17)
+        tend._sendfiles.append([17, 'file', 0, 5])
+        tend._frame_ends.append(22)
+        tend._send_times.append((17, 1.0))
+        tend._send_stream('ping', 5)
+        tend._lanes[5][0] = ('ping', 2.0)
+        tend._send_stream('go', 1)
+
+        tend._splice()
+
+        self.assertEqual(tend._sendbuf, 'pinggoframe 1')
+        self.assertEqual(list(tend._frame_ends), [14, 16, 23, 28])
+        self.assertEqual(tend._sendfiles[0][0], 23)
+        self.assertEqual(list(tend._send_times), [(14, 2.0), (23, 1.0)])
+        self.assertEqual(tend._lanes, {})
+        self.assertEqual(tend.send_pending, 13)
+
+    def test_send_data(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend.stats.bytes_sent = 10
+        tend._sendbuf = bytearray('frame 1frame 2')
+        tend._frame_ends.extend([17, 24])
+
+        self.assertEqual(id(tend._send_data()), id(tend._sendbuf))
+
+        tend._lanes[-1] = collections.deque([('bulk', None)])
+        self.assertEqual(id(tend._send_data()), id(tend._sendbuf))
+
+        tend._lanes[1] = collections.deque([('ping', None)])
+        self.assertEqual(str(tend._send_data()), 'frame 1')
+
+        tend._sendfiles.append([15, 'file', 0, 5])
+        self.assertEqual(str(tend._send_data()), 'frame')
+
+    def test_send_priority(self):
+        # The send buffer is trimmed in place, so record what was sent
+        sent = []
+
+        def send(data):
+            sent.append(str(data))
+            # Partial send; the ping must wait for the end of the frame
+            if len(sent) == 1:
+                tend._send_stream('ping', 1)
+                return 3
+            return len(data)
+        self.sock.send.side_effect = send
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend._send_stream('bulk', -1)
+        tend._send_stream('frame 1')
+        tend._send_stream('frame 2')
+        tend._send_lock = mock.MagicMock()
+
+        tend._send()
+
+        self.assertEqual(sent, ['frame 1frame 2', 'me 1', 'pingframe 2',
+                                'bulk'])
+        self.assertEqual(tend.stats.bytes_sent, 22)
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend._at_boundary(), True)
+        self.assertEqual(len(tend._frame_ends), 0)
+        self.assertTrue(tend._flush_event.is_set())
+
+    def test_send_priority_file(self):
+        # The send buffer is trimmed in place, so record what was sent
+        sent = []
+
+        def send(data):
+            sent.append(str(data))
+            return len(data)
+        self.sock.send.side_effect = send
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend.file_bufsize = 4
+        tend._wake_send = mock.Mock()
+        tend.send_file(StringIO.StringIO('0123456789'), 2, 6)
+        tend._send_stream('frame 1')
+        tend._send_stream('ping', 1)
+        tend._send_lock = mock.MagicMock()
+
+        tend._send()
+
+        self.assertEqual(sent, ['ping', '2345', '67frame 1'])
+        self.assertEqual(tend.stats.bytes_sent, 17)
+
+    def test_flush_coalesce(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('data')
+        tend._flush_event.clear()
+
+        tend.flush(0.01)
+
+        self.assertTrue(tend._coalesce_event.is_set())
+
+    def test_flush_coalesce_empty(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        tend.flush()
+
+        self.assertFalse(tend._coalesce_event.is_set())
+
+    def test_coalesce(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._coalesce_event = mock.Mock()
+        tend.coalesce_delay = 0.5
+
+        tend._coalesce()
+
+        tend._coalesce_event.wait.assert_called_once_with(0.5)
+
+    def test_coalesce_disabled(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._coalesce_event = mock.Mock()
+
+        tend._coalesce()
+
+        self.assertFalse(tend._coalesce_event.wait.called)
+
+    def test_coalesce_wait(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.coalesce_delay = 1.0
+        tend.coalesce_bytes = 10
+
+        def send():
+            tend._send_stream('12345')
+            tend._send_stream('67890')
+
+        gevent.spawn_later(0.01, send)
+        with gevent.Timeout(0.5):
+            tend._coalesce()
+
+        self.assertEqual(tend.send_pending, 10)
+
+    def test_queued_coalesce_bytes(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.coalesce_bytes = 10
+
+        tend._send_stream('12345')
+
+        self.assertFalse(tend._coalesce_event.is_set())
+
+        tend._send_stream('67890')
+
+        self.assertTrue(tend._coalesce_event.is_set())
+        self.assertEqual(tend._wake_send.call_count, 2)
+
+    def test_queued_coalesce_file(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.coalesce_bytes = 10
+
+        tend.send_file('file', 0, 10)
+
+        self.assertTrue(tend._coalesce_event.is_set())
+
+    def test_send_coalesced(self):
+        self.sock.send.side_effect = lambda data: len(data)
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('frame 1')
+        tend._send_lock = mock.MagicMock()
+        tend._coalesce = mock.Mock()
+        tend._coalesce_event.set()
+
+        tend._send()
+
+        tend._coalesce.assert_called_once_with()
+        self.sock.send.assert_called_once_with(mock.ANY)
+        self.assertFalse(tend._coalesce_event.is_set())
+
+    def test_set_tcp_option(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        result = tend._set_tcp_option('TCP_NODELAY', 1)
+
+        self.assertEqual(result, True)
+        self.sock.setsockopt.assert_called_once_with(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def test_set_tcp_option_unsupported(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        result = tend._set_tcp_option('TCP_SPAM', 1)
+
+        self.assertEqual(result, False)
+        self.assertFalse(self.sock.setsockopt.called)
+
+    def test_set_tcp_option_closed(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sock = None
+
+        self.assertEqual(tend._set_tcp_option('TCP_NODELAY', 1), False)
+
+    def test_nodelay(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        tend.nodelay = False
+
+        self.assertEqual(tend.nodelay, False)
+        self.sock.setsockopt.assert_called_once_with(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+
+    @mock.patch.object(tcp.TCPTendril, '_set_tcp_option', return_value=False)
+    def test_nodelay_unsupported(self, mock_set_tcp_option):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        tend.nodelay = True
+
+        self.assertEqual(tend.nodelay, None)
+
+    def test_cork(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+
+        tend.cork()
+        tend.cork()
+        tend.send_frame('frame 1')
+
+        self.assertEqual(tend.corked, True)
+        self.assertEqual(tend._tcp_corked, True)
+        self.sock.setsockopt.assert_called_once_with(
+            socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        self.assertFalse(tend._wake_send.called)
+        self.assertEqual(tend.send_pending, 9)
+
+    @mock.patch.object(tcp.TCPTendril, '_set_tcp_option', return_value=False)
+    def test_cork_unsupported(self, mock_set_tcp_option):
+        tend = tcp.TCPTendril('manager', self.sock)
+
+        tend.cork()
+
+        self.assertEqual(tend.corked, True)
+        self.assertEqual(tend._tcp_corked, False)
+
+    def test_uncork(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.cork()
+        tend.send_frame('frame 1')
+        self.sock.reset_mock()
+
+        tend.uncork()
+
+        self.assertEqual(tend.corked, False)
+        self.assertTrue(tend._coalesce_event.is_set())
+        tend._wake_send.assert_called_once_with()
+
+        # TCP_CORK is cleared once the batch has been sent
+        self.assertEqual(tend._tcp_corked, True)
+        self.assertFalse(self.sock.setsockopt.called)
+
+    def test_uncork_empty(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.cork()
+        self.sock.reset_mock()
+        tend._flush_event.clear()
+
+        tend.uncork()
+
+        self.assertFalse(tend._wake_send.called)
+        self.assertEqual(tend._tcp_corked, False)
+        self.sock.setsockopt.assert_called_once_with(
+            socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+        self.assertTrue(tend._flush_event.is_set())
+
+    def test_uncork_uncorked(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+
+        tend.uncork()
+
+        self.assertFalse(tend._wake_send.called)
+        self.assertFalse(self.sock.setsockopt.called)
+
+    def test_send_corked(self):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.cork()
+        tend.send_frame('frame 1')
+        tend._send_lock = mock.MagicMock()
+        tend._send_thread = mock.Mock()
+
+        tend._send()
+
+        self.assertFalse(self.sock.send.called)
+        self.assertEqual(tend._send_thread, None)
+        self.assertFalse(tend._flush_event.is_set())
+        self.assertEqual(tend.flush(0.01), False)
+
+    def test_send_uncorked(self):
+        self.sock.send.side_effect = lambda data: len(data)
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.cork()
+        tend.send_frame('frame 1')
+        tend.send_frame('frame 2')
+        tend.uncork()
+        tend._send_lock = mock.MagicMock()
+        self.sock.reset_mock()
+
+        tend._send()
+
+        self.assertEqual(self.sock.method_calls, [
+            mock.call.send(mock.ANY),
+            mock.call.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0),
+        ])
+        self.assertEqual(tend.stats.bytes_sent, 18)
+        self.assertEqual(tend._tcp_corked, False)
+        self.assertTrue(tend._flush_event.is_set())
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_start_corked(self, mock_spawn):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend.cork()
+        tend.send_frame('frame 1')
+
+        tend._start()
+
+        mock_spawn.assert_called_once_with(tend._recv)
+
+    @mock.patch('time.time', return_value=1.0)
+    @mock.patch.object(connection.Tendril, '_send_streamify',
+                       return_value='frame1:frame2')
+    def test_send_frame_latency(self, mock_send_streamify, mock_time):
+        tend = tcp.TCPTendril(mock.Mock(latency=stats.LatencyStats()),
+                              self.sock)
+        tend._sendbuf = bytearray('xyz')
+        tend.stats.bytes_sent = 5
+
+        tend.send_frame('a frame')
+
+        self.assertEqual(list(tend._send_times), [(21, 1.0)])
 
     @mock.patch.object(connection.Tendril, 'close')
     def test_close_nothreads_nosock(self, mock_close):
@@ -337,6 +1172,196 @@ class TestTCPTendril(unittest.TestCase):
         self.assertEqual(tend._sock, None)
         self.sock.close.assert_called_once_with()
 
+    @mock.patch('time.time', return_value=1000.0)
+    @mock.patch.object(gevent, 'spawn')
+    def test_start_idle(self, mock_spawn, mock_time):
+        mgr = mock.Mock(read_idle_timeout=10, write_idle_timeout=None,
+                        idle_timeout=None)
+        tend = tcp.TCPTendril(mgr, self.sock)
+
+        tend._start()
+
+        self.assertEqual(tend._last_recv, 1000.0)
+        self.assertEqual(tend._last_send, 1000.0)
+        mgr.timers.schedule.assert_called_once_with(10.0, tend._check_idle)
+        self.assertEqual(tend._idle_timer, mgr.timers.schedule.return_value)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_schedule_idle_none(self, mock_time):
+        mgr = mock.Mock(read_idle_timeout=None, write_idle_timeout=None,
+                        idle_timeout=None)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._last_recv = tend._last_send = 990.0
+
+        tend._schedule_idle()
+
+        self.assertFalse(mgr.timers.schedule.called)
+        self.assertEqual(tend._idle_timer, None)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_schedule_idle_earliest(self, mock_time):
+        mgr = mock.Mock(read_idle_timeout=30, write_idle_timeout=20,
+                        idle_timeout=25)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._last_recv = 995.0
+        tend._last_send = 990.0
+
+        tend._schedule_idle()
+
+        mgr.timers.schedule.assert_called_once_with(10.0, tend._check_idle)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_schedule_idle_total(self, mock_time):
+        mgr = mock.Mock(read_idle_timeout=None, write_idle_timeout=None,
+                        idle_timeout=25)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._last_recv = 995.0
+        tend._last_send = 990.0
+
+        tend._schedule_idle()
+
+        mgr.timers.schedule.assert_called_once_with(20.0, tend._check_idle)
+
+    def test_cancel_idle(self):
+        mgr = mock.Mock()
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._idle_timer = 'timer'
+
+        tend._cancel_idle()
+
+        mgr.timers.cancel.assert_called_once_with('timer')
+        self.assertEqual(tend._idle_timer, None)
+
+    def test_cancel_idle_none(self):
+        mgr = mock.Mock()
+        tend = tcp.TCPTendril(mgr, self.sock)
+
+        tend._cancel_idle()
+
+        self.assertFalse(mgr.timers.cancel.called)
+
+    @mock.patch('time.time', return_value=1000.0)
+    @mock.patch.object(tcp.TCPTendril, '_schedule_idle')
+    def test_check_idle_active(self, mock_schedule_idle, mock_time):
+        mgr = mock.Mock(read_idle_timeout=10, write_idle_timeout=10,
+                        idle_timeout=10)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._application = mock.Mock()
+        tend._idle_timer = 'timer'
+        tend._last_recv = tend._last_send = 995.0
+
+        tend._check_idle()
+
+        self.assertFalse(tend._application.idle.called)
+        self.assertEqual(tend._idle_timer, None)
+        mock_schedule_idle.assert_called_once_with()
+
+    @mock.patch('time.time', return_value=1000.0)
+    @mock.patch.object(tcp.TCPTendril, '_schedule_idle')
+    def test_check_idle_closed(self, mock_schedule_idle, mock_time):
+        mgr = mock.Mock(read_idle_timeout=10)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._application = mock.Mock()
+        tend._sock = None
+        tend._last_recv = tend._last_send = 900.0
+
+        tend._check_idle()
+
+        self.assertFalse(tend._application.idle.called)
+        self.assertFalse(mock_schedule_idle.called)
+
+    @mock.patch('time.time', return_value=1000.0)
+    @mock.patch.object(tcp.TCPTendril, '_schedule_idle')
+    def test_check_idle_read(self, mock_schedule_idle, mock_time):
+        mgr = mock.Mock(read_idle_timeout=10, write_idle_timeout=10,
+                        idle_timeout=None)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._application = mock.Mock()
+        tend._last_recv = 985.0
+        tend._last_send = 995.0
+
+        tend._check_idle()
+
+        tend._application.idle.assert_called_once_with('read')
+        self.assertEqual(tend._last_recv, 1000.0)
+        self.assertEqual(tend._last_send, 995.0)
+        mock_schedule_idle.assert_called_once_with()
+
+    @mock.patch('time.time', return_value=1000.0)
+    @mock.patch.object(tcp.TCPTendril, '_schedule_idle')
+    def test_check_idle_write(self, mock_schedule_idle, mock_time):
+        mgr = mock.Mock(read_idle_timeout=10, write_idle_timeout=10,
+                        idle_timeout=None)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._application = mock.Mock()
+        tend._last_recv = 995.0
+        tend._last_send = 985.0
+
+        tend._check_idle()
+
+        tend._application.idle.assert_called_once_with('write')
+        self.assertEqual(tend._last_recv, 995.0)
+        self.assertEqual(tend._last_send, 1000.0)
+
+    @mock.patch('time.time', return_value=1000.0)
+    @mock.patch.object(tcp.TCPTendril, '_schedule_idle')
+    def test_check_idle_total(self, mock_schedule_idle, mock_time):
+        mgr = mock.Mock(read_idle_timeout=10, write_idle_timeout=10,
+                        idle_timeout=10)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._application = mock.Mock()
+        tend._last_recv = 985.0
+        tend._last_send = 980.0
+
+        tend._check_idle()
+
+        tend._application.idle.assert_called_once_with('idle')
+        self.assertEqual(tend._last_recv, 1000.0)
+        self.assertEqual(tend._last_send, 1000.0)
+
+    @mock.patch('time.time', return_value=1000.0)
+    @mock.patch.object(tcp.TCPTendril, '_schedule_idle')
+    @mock.patch.object(tcp.TCPTendril, 'close')
+    @mock.patch.object(tcp.TCPTendril, 'closed')
+    def test_check_idle_timeout(self, mock_closed, mock_close,
+                                mock_schedule_idle, mock_time):
+        exc = application.IdleTimeout('read')
+        mgr = mock.Mock(read_idle_timeout=10, write_idle_timeout=None,
+                        idle_timeout=None)
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._application = mock.Mock(**{'idle.side_effect': exc})
+        tend._last_recv = 985.0
+        tend._last_send = 995.0
+
+        tend._check_idle()
+
+        tend._application.idle.assert_called_once_with('read')
+        mock_close.assert_called_once_with()
+        mock_closed.assert_called_once_with(exc)
+        self.assertFalse(mock_schedule_idle.called)
+
+    @mock.patch.object(connection.Tendril, 'close')
+    def test_close_flush_event(self, mock_close):
+        tend = tcp.TCPTendril('manager', self.sock)
+        tend._sendbuf = bytearray('data')
+        tend._flush_event.clear()
+
+        tend.close()
+
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertEqual(tend.send_pending, 4)
+
+    @mock.patch.object(connection.Tendril, 'close')
+    def test_close_idle_timer(self, mock_close):
+        mgr = mock.Mock()
+        tend = tcp.TCPTendril(mgr, self.sock)
+        tend._idle_timer = 'timer'
+
+        tend.close()
+
+        mgr.timers.cancel.assert_called_once_with('timer')
+        self.assertEqual(tend._idle_timer, None)
+
     @mock.patch.object(connection.Tendril, 'close')
     def test_close_threads(self, mock_close):
         tend = tcp.TCPTendril('manager', self.sock)
@@ -383,6 +1408,7 @@ class TestTCPTendrilManager(unittest.TestCase):
             mock_TCPTendril.return_value)
         mock_TCPTendril.return_value._start.assert_called_once_with()
         self.assertEqual(id(tend), id(mock_TCPTendril.return_value))
+        self.assertEqual(manager.stats.connects, 1)
 
     @mock.patch.object(socket, 'socket', return_value=mock.Mock())
     @mock.patch.object(manager.TendrilManager, 'connect')
@@ -493,6 +1519,247 @@ class TestTCPTendrilManager(unittest.TestCase):
         acceptor.assert_called_once_with(mock_TCPTendril.return_value)
         self.assertFalse(mock_track_tendril.called)
         self.assertFalse(mock_TCPTendril.return_value._start.called)
+        self.assertEqual(manager.stats.connects, 0)
+        self.assertEqual(manager.stats.rejects, 1)
+
+    @mock.patch.object(socket, 'socket', return_value=mock.Mock())
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(manager.TendrilManager, '_track_tendril')
+    @mock.patch.object(tcp, 'TCPTendril', return_value=mock.Mock())
+    def test_connect_timeout(self, mock_TCPTendril, mock_track_tendril,
+                             mock_connect, mock_socket):
+        acceptor = mock.Mock()
+        manager = tcp.TCPTendrilManager()
+
+        tend = manager.connect(('127.0.0.1', 8080), acceptor, timeout=1.5)
+
+        mock_socket.return_value.assert_has_calls([
+            mock.call.bind(('', 0)),
+            mock.call.settimeout(1.5),
+            mock.call.connect(('127.0.0.1', 8080)),
+            mock.call.settimeout(None),
+        ])
+        self.assertEqual(id(tend), id(mock_TCPTendril.return_value))
+
+    @mock.patch.object(socket, 'socket', return_value=mock.Mock(**{
+        'connect.side_effect': socket.timeout(),
+    }))
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(manager.TendrilManager, '_track_tendril')
+    @mock.patch.object(tcp, 'TCPTendril', return_value=mock.Mock())
+    def test_connect_timeout_expired(self, mock_TCPTendril,
+                                     mock_track_tendril, mock_connect,
+                                     mock_socket):
+        acceptor = mock.Mock()
+        manager = tcp.TCPTendrilManager()
+
+        with self.assertRaises(socket.timeout):
+            manager.connect(('127.0.0.1', 8080), acceptor, timeout=1.5)
+
+        mock_socket.return_value.assert_has_calls([
+            mock.call.bind(('', 0)),
+            mock.call.settimeout(1.5),
+            mock.call.connect(('127.0.0.1', 8080)),
+            mock.call.close(),
+        ])
+        self.assertFalse(mock_TCPTendril.called)
+        self.assertFalse(acceptor.called)
+        self.assertEqual(manager.stats.connects, 0)
+
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(tcp.TCPTendrilManager, '_connected',
+                       return_value='tendril')
+    def test_connect_any_first(self, mock_connected, mock_connect):
+        manager = tcp.TCPTendrilManager()
+        targets = [('127.0.0.1', 8080), ('127.0.0.2', 8080)]
+
+        with mock.patch.object(manager, '_connect_sock',
+                               return_value='sock') as mock_connect_sock:
+            result = manager.connect_any(targets, 'acceptor', 'wrapper')
+
+        self.assertEqual(result, 'tendril')
+        mock_connect.assert_has_calls([
+            mock.call(('127.0.0.1', 8080), 'acceptor', 'wrapper'),
+            mock.call(('127.0.0.2', 8080), 'acceptor', 'wrapper'),
+        ])
+        mock_connect_sock.assert_called_once_with(('127.0.0.1', 8080))
+        mock_connected.assert_called_once_with('sock', 'acceptor', 'wrapper')
+
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(tcp.TCPTendrilManager, '_connected',
+                       return_value='tendril')
+    def test_connect_any_failover(self, mock_connected, mock_connect):
+        manager = tcp.TCPTendrilManager()
+        targets = [('127.0.0.1', 8080), ('127.0.0.2', 8080)]
+
+        with mock.patch.object(manager, '_connect_sock',
+                               side_effect=[socket.error(), 'sock']) as \
+                mock_connect_sock:
+            result = manager.connect_any(targets, 'acceptor', delay=10)
+
+        self.assertEqual(result, 'tendril')
+        mock_connect_sock.assert_has_calls([
+            mock.call(('127.0.0.1', 8080)),
+            mock.call(('127.0.0.2', 8080)),
+        ])
+        mock_connected.assert_called_once_with('sock', 'acceptor', None)
+
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(tcp.TCPTendrilManager, '_connected')
+    def test_connect_any_all_fail(self, mock_connected, mock_connect):
+        manager = tcp.TCPTendrilManager()
+        targets = [('127.0.0.1', 8080), ('127.0.0.2', 8080)]
+        errors = [socket.error('first'), socket.error('second')]
+
+        with mock.patch.object(manager, '_connect_sock',
+                               side_effect=errors):
+            with self.assertRaises(socket.error) as cm:
+                manager.connect_any(targets, 'acceptor')
+
+        self.assertEqual(id(cm.exception), id(errors[1]))
+        self.assertFalse(mock_connected.called)
+
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(tcp.TCPTendrilManager, '_connected',
+                       return_value='tendril')
+    def test_connect_any_staggered(self, mock_connected, mock_connect):
+        manager = tcp.TCPTendrilManager()
+        targets = [('127.0.0.1', 8080), ('127.0.0.2', 8080)]
+        slow_sock = mock.Mock()
+
+        def fake_connect_sock(target):
+            if target == ('127.0.0.1', 8080):
+                gevent.sleep(10)
+                return slow_sock
+            return 'sock'
+
+        with mock.patch.object(manager, '_connect_sock',
+                               side_effect=fake_connect_sock):
+            result = manager.connect_any(targets, 'acceptor', delay=0.01)
+
+        self.assertEqual(result, 'tendril')
+        mock_connected.assert_called_once_with('sock', 'acceptor', None)
+        self.assertFalse(slow_sock.close.called)
+
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(tcp.TCPTendrilManager, '_connected',
+                       return_value='tendril')
+    def test_connect_any_loser_closed(self, mock_connected, mock_connect):
+        manager = tcp.TCPTendrilManager()
+        targets = [('127.0.0.1', 8080), ('127.0.0.2', 8080)]
+        socks = [mock.Mock(), mock.Mock()]
+        gate = event.Event()
+
+        # The first attempt completes just after the second
+        def fake_connect_sock(target):
+            if target == ('127.0.0.1', 8080):
+                gate.wait()
+                return socks[0]
+            gate.set()
+            return socks[1]
+
+        with mock.patch.object(manager, '_connect_sock',
+                               side_effect=fake_connect_sock):
+            result = manager.connect_any(targets, 'acceptor', delay=0)
+
+        self.assertEqual(result, 'tendril')
+        mock_connected.assert_called_once_with(socks[1], 'acceptor', None)
+        socks[0].close.assert_called_once_with()
+        self.assertFalse(socks[1].close.called)
+
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    @mock.patch.object(tcp.TCPTendrilManager, '_connected')
+    def test_connect_any_timeout(self, mock_connected, mock_connect):
+        manager = tcp.TCPTendrilManager()
+        targets = [('127.0.0.1', 8080), ('127.0.0.2', 8080)]
+
+        def fake_connect_sock(target):
+            gevent.sleep(10)
+
+        with mock.patch.object(manager, '_connect_sock',
+                               side_effect=fake_connect_sock):
+            with self.assertRaises(socket.timeout):
+                manager.connect_any(targets, 'acceptor', timeout=0.05,
+                                    delay=0.01)
+
+        self.assertFalse(mock_connected.called)
+
+    @mock.patch.object(manager.TendrilManager, 'connect')
+    def test_connect_any_notargets(self, mock_connect):
+        manager = tcp.TCPTendrilManager()
+
+        self.assertRaises(ValueError, manager.connect_any, [], 'acceptor')
+        self.assertFalse(mock_connect.called)
+
+    def test_set_keepalive_disabled(self):
+        manager = tcp.TCPTendrilManager()
+        sock = mock.Mock()
+
+        manager._set_keepalive(sock)
+
+        self.assertFalse(sock.setsockopt.called)
+
+    def test_set_keepalive(self):
+        manager = tcp.TCPTendrilManager()
+        manager.keepalive = True
+        sock = mock.Mock()
+
+        manager._set_keepalive(sock)
+
+        sock.setsockopt.assert_called_once_with(
+            socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    def test_set_keepalive_options(self):
+        manager = tcp.TCPTendrilManager()
+        manager.keepalive = True
+        manager.keepalive_idle = 60
+        manager.keepalive_interval = 10
+        manager.keepalive_count = 5
+        sock = mock.Mock()
+
+        manager._set_keepalive(sock)
+
+        sock.setsockopt.assert_has_calls([
+            mock.call(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            mock.call(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+            mock.call(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),
+            mock.call(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 5),
+        ])
+
+    @mock.patch.object(socket, 'socket', return_value=mock.Mock())
+    def test_connect_sock_keepalive(self, mock_socket):
+        manager = tcp.TCPTendrilManager()
+        manager.keepalive = True
+
+        result = manager._connect_sock(('127.0.0.1', 8080))
+
+        self.assertEqual(id(result), id(mock_socket.return_value))
+        mock_socket.return_value.assert_has_calls([
+            mock.call.bind(('', 0)),
+            mock.call.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            mock.call.connect(('127.0.0.1', 8080)),
+        ])
+
+    def test_connect_attempt(self):
+        manager = tcp.TCPTendrilManager()
+        results = mock.Mock()
+
+        with mock.patch.object(manager, '_connect_sock',
+                               return_value='sock') as mock_connect_sock:
+            manager._connect_attempt(('127.0.0.1', 8080), results)
+
+        mock_connect_sock.assert_called_once_with(('127.0.0.1', 8080))
+        results.put.assert_called_once_with(('sock', None))
+
+    def test_connect_attempt_error(self):
+        manager = tcp.TCPTendrilManager()
+        results = mock.Mock()
+        exc = socket.error()
+
+        with mock.patch.object(manager, '_connect_sock', side_effect=exc):
+            manager._connect_attempt(('127.0.0.1', 8080), results)
+
+        results.put.assert_called_once_with((None, exc))
 
     @mock.patch.object(gevent, 'sleep', side_effect=TestException())
     @mock.patch.object(socket, 'socket', return_value=mock.Mock())
@@ -785,6 +2052,56 @@ class TestTCPTendrilManager(unittest.TestCase):
         tendrils[0]._start.assert_called_once_with()
         self.assertFalse(tendrils[1]._start.called)
         tendrils[2]._start.assert_called_once_with()
+        self.assertEqual(manager.stats.accepts, 2)
+        self.assertEqual(manager.stats.closer_trips, 1)
+
+    @mock.patch.object(gevent, 'sleep', side_effect=TestException())
+    @mock.patch.object(socket, 'socket', return_value=mock.Mock(**{
+        'getsockname.return_value': ('127.0.0.1', 8080),
+    }))
+    @mock.patch.object(manager.TendrilManager, '_admit',
+                       side_effect=[True, False, True])
+    @mock.patch.object(manager.TendrilManager, '_track_tendril')
+    @mock.patch.object(tcp, 'TCPTendril')
+    def test_listener_throttled(self, mock_TCPTendril, mock_track_tendril,
+                                mock_admit, mock_socket, mock_sleep):
+        clis = [mock.Mock(), mock.Mock(), mock.Mock()]
+        mock_socket.return_value.accept.side_effect = [
+            (clis[0], ('127.0.0.2', 8082)),
+            (clis[1], ('127.0.0.3', 8083)),
+            (clis[2], ('127.0.0.4', 8084)),
+        ] + [TestException()] * 11
+        tendrils = [mock.Mock(), mock.Mock()]
+        mock_TCPTendril.side_effect = tendrils[:]
+        acceptor = mock.Mock()
+        manager = tcp.TCPTendrilManager()
+        manager.running = True
+
+        with self.assertRaises(TestException):
+            manager.listener(acceptor, None)
+
+        mock_admit.assert_has_calls([
+            mock.call(('127.0.0.2', 8082)),
+            mock.call(('127.0.0.3', 8083)),
+            mock.call(('127.0.0.4', 8084)),
+        ])
+        mock_TCPTendril.assert_has_calls([
+            mock.call(manager, clis[0], ('127.0.0.2', 8082)),
+            mock.call(manager, clis[2], ('127.0.0.4', 8084)),
+        ])
+        self.assertEqual(mock_TCPTendril.call_count, 2)
+        self.assertFalse(clis[0].close.called)
+        clis[1].close.assert_called_once_with()
+        self.assertFalse(clis[2].close.called)
+        acceptor.assert_has_calls([
+            mock.call(tendrils[0]),
+            mock.call(tendrils[1]),
+        ])
+        mock_track_tendril.assert_has_calls([
+            mock.call(tendrils[0]),
+            mock.call(tendrils[1]),
+        ])
+        self.assertEqual(manager.stats.accepts, 2)
 
     @mock.patch.object(gevent, 'sleep', side_effect=TestException())
     @mock.patch.object(socket, 'socket', return_value=mock.Mock(**{
@@ -0,0 +1,204 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+
+import gevent
+import mock
+
+from tendril import timers
+
+
+class TestTimer(unittest.TestCase):
+    def test_init(self):
+        timer = timers.Timer(5, 'callback', ('a', 'b'))
+
+        self.assertEqual(timer.tick, 5)
+        self.assertEqual(timer.callback, 'callback')
+        self.assertEqual(timer.args, ('a', 'b'))
+
+
+@mock.patch.object(time, 'time', return_value=1000.0)
+class TestTimerWheel(unittest.TestCase):
+    def test_init(self, mock_time):
+        wheel = timers.TimerWheel()
+
+        self.assertEqual(wheel.resolution, 1.0)
+        self.assertEqual(wheel.slots, 512)
+        self.assertEqual(len(wheel._wheel), 512)
+        self.assertEqual(wheel._epoch, 1000.0)
+        self.assertEqual(wheel._tick, 0)
+        self.assertEqual(wheel._count, 0)
+        self.assertEqual(wheel._thread, None)
+        self.assertEqual(len(wheel), 0)
+
+    def test_init_args(self, mock_time):
+        wheel = timers.TimerWheel(0.5, 64)
+
+        self.assertEqual(wheel.resolution, 0.5)
+        self.assertEqual(wheel.slots, 64)
+        self.assertEqual(len(wheel._wheel), 64)
+
+    def test_now_tick(self, mock_time):
+        wheel = timers.TimerWheel(0.5)
+        mock_time.return_value = 1002.7
+
+        self.assertEqual(wheel._now_tick(), 5)
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_schedule(self, mock_spawn, mock_time):
+        wheel = timers.TimerWheel(0.5, 8)
+        mock_time.return_value = 1001.2
+
+        timer = wheel.schedule(1.2, 'callback', 'a', 'b')
+
+        self.assertIsInstance(timer, timers.Timer)
+        self.assertEqual(timer.tick, 5)
+        self.assertEqual(timer.callback, 'callback')
+        self.assertEqual(timer.args, ('a', 'b'))
+        self.assertEqual(wheel._wheel[5], set([timer]))
+        self.assertEqual(len(wheel), 1)
+        self.assertEqual(wheel._tick, 2)
+        self.assertEqual(wheel._thread, 'thread')
+        mock_spawn.assert_called_once_with(wheel._run)
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_schedule_wrap(self, mock_spawn, mock_time):
+        wheel = timers.TimerWheel(1.0, 8)
+
+        timer = wheel.schedule(10, 'callback')
+
+        self.assertEqual(timer.tick, 10)
+        self.assertEqual(wheel._wheel[2], set([timer]))
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_schedule_minimum(self, mock_spawn, mock_time):
+        wheel = timers.TimerWheel(1.0, 8)
+
+        timer = wheel.schedule(-5, 'callback')
+
+        self.assertEqual(timer.tick, 1)
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_schedule_running(self, mock_spawn, mock_time):
+        wheel = timers.TimerWheel(1.0, 8)
+        wheel._thread = 'thread'
+
+        wheel.schedule(1, 'callback')
+
+        self.assertFalse(mock_spawn.called)
+        self.assertEqual(wheel._thread, 'thread')
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_cancel(self, mock_spawn, mock_time):
+        wheel = timers.TimerWheel(1.0, 8)
+        timer = wheel.schedule(1, 'callback')
+
+        wheel.cancel(timer)
+
+        self.assertEqual(wheel._wheel[1], set())
+        self.assertEqual(len(wheel), 0)
+
+        # Cancelling again does nothing
+        wheel.cancel(timer)
+
+        self.assertEqual(len(wheel), 0)
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_advance(self, mock_spawn, mock_time):
+        wheel = timers.TimerWheel(1.0, 8)
+        timer1 = wheel.schedule(1, 'callback1', 'a')
+        timer2 = wheel.schedule(3, 'callback2')
+        timer3 = wheel.schedule(9, 'callback3')
+        mock_spawn.reset_mock()
+
+        wheel._advance(2)
+
+        mock_spawn.assert_called_once_with('callback1', 'a')
+        self.assertEqual(wheel._tick, 2)
+        self.assertEqual(len(wheel), 2)
+        self.assertEqual(wheel._wheel[1], set([timer3]))
+        self.assertEqual(wheel._wheel[3], set([timer2]))
+
+    @mock.patch.object(gevent, 'spawn', return_value='thread')
+    def test_advance_full_turn(self, mock_spawn, mock_time):
+        wheel = timers.TimerWheel(1.0, 8)
+        wheel.schedule(1, 'callback1')
+        wheel.schedule(7, 'callback2')
+        wheel.schedule(9, 'callback3')
+        wheel.schedule(30, 'callback4')
+        mock_spawn.reset_mock()
+
+        wheel._advance(20)
+
+        mock_spawn.assert_has_calls([
+            mock.call('callback3'),
+            mock.call('callback2'),
+        ], any_order=True)
+        self.assertEqual(mock_spawn.call_count, 3)
+        self.assertEqual(wheel._tick, 20)
+        self.assertEqual(len(wheel), 1)
+
+    @mock.patch.object(gevent, 'sleep')
+    @mock.patch.object(gevent, 'spawn')
+    def test_run(self, mock_spawn, mock_sleep, mock_time):
+        wheel = timers.TimerWheel(1.0, 8)
+        wheel.schedule(2, 'callback')
+        wheel._thread = 'thread'
+        mock_time.return_value = 1000.25
+
+        def fake_sleep(delay):
+            mock_time.return_value += delay
+
+        mock_sleep.side_effect = fake_sleep
+
+        wheel._run()
+
+        mock_sleep.assert_has_calls([mock.call(0.75), mock.call(1.0)])
+        mock_spawn.assert_called_with('callback')
+        self.assertEqual(wheel._tick, 2)
+        self.assertEqual(wheel._thread, None)
+
+    def test_expire(self, mock_time):
+        mock_time.side_effect = lambda: time_base[0]
+        time_base = [1000.0]
+        callback = mock.Mock()
+        wheel = timers.TimerWheel(0.01, 8)
+
+        wheel.schedule(0.01, callback, 'a')
+        time_base[0] += 0.02
+        gevent.sleep(0.05)
+
+        callback.assert_called_once_with('a')
+        self.assertEqual(len(wheel), 0)
+        self.assertEqual(wheel._thread, None)
+
+    @mock.patch.object(gevent, 'spawn')
+    def test_stop(self, mock_spawn, mock_time):
+        thread = mock.Mock()
+        mock_spawn.return_value = thread
+        wheel = timers.TimerWheel(1.0, 8)
+        wheel.schedule(1, 'callback1')
+        wheel.schedule(2, 'callback2')
+
+        wheel.stop()
+
+        thread.kill.assert_called_once_with()
+        self.assertEqual(wheel._thread, None)
+        self.assertEqual(len(wheel), 0)
+        for slot in wheel._wheel:
+            self.assertEqual(slot, set())
@@ -43,6 +43,8 @@ class TestUDPTendril(unittest.TestCase):
 
         mock_send_streamify.assert_called_once_with('a frame')
         sock.sendto.assert_called_once_with('frame', 'remote_addr')
+        self.assertEqual(tend.stats.bytes_sent, 5)
+        self.assertEqual(tend.stats.errors, 0)
 
     @mock.patch.object(connection.Tendril, '_send_streamify',
                        return_value='frame')
@@ -63,6 +65,26 @@ class TestUDPTendril(unittest.TestCase):
 
         mock_send_streamify.assert_called_once_with('a frame')
         sock.sendto.assert_called_once_with('frame', 'remote_addr')
+        self.assertEqual(tend.stats.bytes_sent, 0)
+        self.assertEqual(tend.stats.errors, 1)
+
+    @mock.patch.object(connection.Tendril, '_send_streamify')
+    def test_send_stream(self, mock_send_streamify):
+        sock = mock.Mock()
+        tend = udp.UDPTendril(mock.Mock(sock=sock), 'local_addr',
+                              'remote_addr')
+
+        tend._send_stream('frame')
+
+        self.assertFalse(mock_send_streamify.called)
+        sock.sendto.assert_called_once_with('frame', 'remote_addr')
+        self.assertEqual(tend.stats.bytes_sent, 5)
+
+    def test_send_stream_no_sock(self):
+        tend = udp.UDPTendril(mock.Mock(sock=None), 'local_addr',
+                              'remote_addr')
+
+        self.assertRaises(ValueError, tend._send_stream, 'frame')
 
     @mock.patch.object(connection.Tendril, 'close')
     def test_close(self, mock_super_close):
@@ -138,6 +160,7 @@ class TestUDPTendrilManager(unittest.TestCase):
         mock_track_tendril.assert_called_once_with(
             mock_UDPTendril.return_value)
         self.assertEqual(id(tend), id(mock_UDPTendril.return_value))
+        self.assertEqual(manager.stats.connects, 1)
 
     @mock.patch.object(manager.TendrilManager, 'connect')
     @mock.patch.object(manager.TendrilManager, '_track_tendril')
@@ -157,6 +180,8 @@ class TestUDPTendrilManager(unittest.TestCase):
         acceptor.assert_called_once_with(mock_UDPTendril.return_value)
         self.assertFalse(mock_track_tendril.called)
         self.assertEqual(tend, None)
+        self.assertEqual(manager.stats.connects, 0)
+        self.assertEqual(manager.stats.rejects, 1)
 
     @mock.patch.object(socket, 'socket', return_value=mock.Mock(**{
         'recvfrom.side_effect': TestException(),
@@ -362,6 +387,44 @@ class TestUDPTendrilManager(unittest.TestCase):
         self.assertFalse(mock_track_tendril.called)
         tend._recv_frameify.assert_called_once_with('msg2')
 
+    @mock.patch.object(socket, 'socket', return_value=mock.Mock(**{
+        'getsockname.return_value': ('127.0.0.1', 8080),
+    }))
+    @mock.patch.object(manager.TendrilManager, '_admit',
+                       side_effect=[False, True])
+    @mock.patch.object(manager.TendrilManager, '_track_tendril')
+    @mock.patch.object(udp, 'UDPTendril')
+    def test_listener_throttled(self, mock_UDPTendril, mock_track_tendril,
+                                mock_admit, mock_socket):
+        msgs = ['msg1', 'msg2', 'msg3']
+        mock_socket.return_value.recvfrom.side_effect = [
+            (msgs[0], ('127.0.0.2', 8082)),
+            (msgs[1], ('127.0.0.3', 8083)),
+            (msgs[2], ('127.0.0.4', 8084)),
+        ] + [TestException()] * 11
+        tend = mock.Mock()
+        mock_UDPTendril.return_value = tend
+        acceptor = mock.Mock()
+        manager = udp.UDPTendrilManager()
+        manager.running = True
+        manager.tendrils[(('127.0.0.1', 8080), ('127.0.0.3', 8083))] = \
+            mock.Mock()
+
+        with self.assertRaises(TestException):
+            manager.listener(acceptor, None)
+
+        mock_admit.assert_has_calls([
+            mock.call(('127.0.0.2', 8082)),
+            mock.call(('127.0.0.4', 8084)),
+        ])
+        self.assertEqual(mock_admit.call_count, 2)
+        mock_UDPTendril.assert_called_once_with(
+            manager, ('127.0.0.1', 8080), ('127.0.0.4', 8084))
+        acceptor.assert_called_once_with(tend)
+        mock_track_tendril.assert_called_once_with(tend)
+        tend._recv_frameify.assert_called_once_with('msg3')
+        self.assertEqual(manager.stats.accepts, 1)
+
     @mock.patch.object(socket, 'socket', return_value=mock.Mock(**{
         'getsockname.return_value': ('127.0.0.1', 8080),
     }))
@@ -491,6 +554,8 @@ class TestUDPTendrilManager(unittest.TestCase):
         tendrils[0]._recv_frameify.assert_called_once_with('msg1')
         tendrils[1]._recv_frameify.assert_called_once_with('msg2')
         tendrils[2]._recv_frameify.assert_called_once_with('msg3')
+        self.assertEqual(manager.stats.accepts, 2)
+        self.assertEqual(manager.stats.closer_trips, 1)
 
     @mock.patch.object(socket, 'socket', return_value=mock.Mock(**{
         'getsockname.return_value': ('127.0.0.1', 8080),
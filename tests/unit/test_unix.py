@@ -0,0 +1,624 @@
+## Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+##
+## This program is free software: you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see
+## <http://www.gnu.org/licenses/>.
+
+import errno
+import os
+import stat
+import unittest
+
+from gevent import socket
+import mock
+
+from tendril import framers
+from tendril import manager
+from tendril import stats
+from tendril import tcp
+from tendril import udp
+from tendril import unix
+
+
+class TestException(Exception):
+    pass
+
+
+class TestIsAbstract(unittest.TestCase):
+    def test_path(self):
+        self.assertEqual(unix._is_abstract('/tmp/sock'), False)
+
+    def test_abstract(self):
+        self.assertEqual(unix._is_abstract('\0sock'), True)
+
+
+class TestRemoveStale(unittest.TestCase):
+    @mock.patch.object(os, 'stat', side_effect=OSError())
+    @mock.patch.object(socket, 'socket')
+    def test_missing(self, mock_socket, mock_stat):
+        unix._remove_stale('/tmp/sock', socket.SOCK_STREAM)
+
+        self.assertFalse(mock_socket.called)
+
+    @mock.patch.object(os, 'stat', return_value=mock.Mock(
+        st_mode=stat.S_IFREG))
+    @mock.patch.object(socket, 'socket')
+    def test_not_socket(self, mock_socket, mock_stat):
+        unix._remove_stale('/tmp/sock', socket.SOCK_STREAM)
+
+        self.assertFalse(mock_socket.called)
+
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(os, 'stat', return_value=mock.Mock(
+        st_mode=stat.S_IFSOCK))
+    @mock.patch.object(socket, 'socket')
+    def test_in_use(self, mock_socket, mock_stat, mock_unlink):
+        unix._remove_stale('/tmp/sock', socket.SOCK_STREAM)
+
+        mock_socket.assert_called_once_with(socket.AF_UNIX,
+                                            socket.SOCK_STREAM)
+        mock_socket.return_value.assert_has_calls([
+            mock.call.connect('/tmp/sock'),
+            mock.call.close(),
+        ])
+        self.assertFalse(mock_unlink.called)
+
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(os, 'stat', return_value=mock.Mock(
+        st_mode=stat.S_IFSOCK))
+    @mock.patch.object(socket, 'socket')
+    def test_stale(self, mock_socket, mock_stat, mock_unlink):
+        mock_socket.return_value.connect.side_effect = socket.error(
+            errno.ECONNREFUSED, 'Connection refused')
+
+        unix._remove_stale('/tmp/sock', socket.SOCK_STREAM)
+
+        mock_unlink.assert_called_once_with('/tmp/sock')
+        mock_socket.return_value.close.assert_called_once_with()
+
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(os, 'stat', return_value=mock.Mock(
+        st_mode=stat.S_IFSOCK))
+    @mock.patch.object(socket, 'socket')
+    def test_other_error(self, mock_socket, mock_stat, mock_unlink):
+        mock_socket.return_value.connect.side_effect = socket.error(
+            errno.EACCES, 'Permission denied')
+
+        unix._remove_stale('/tmp/sock', socket.SOCK_STREAM)
+
+        self.assertFalse(mock_unlink.called)
+
+
+class TestUnixStreamTendril(unittest.TestCase):
+    def setUp(self):
+        self.sock = mock.Mock(**{
+            'getsockname.return_value': '/tmp/sock',
+            'getpeername.return_value': '',
+        })
+
+    def test_init(self):
+        tend = unix.UnixStreamTendril('manager', self.sock)
+
+        self.assertEqual(tend.local_addr, '/tmp/sock')
+        self.assertEqual(tend.remote_addr, '')
+        self.assertEqual(tend.proto, 'unix')
+        self.assertEqual(tend._peer_credentials, None)
+        self.assertIsInstance(tend, tcp.TCPTendril)
+
+    def test_tendril_key(self):
+        tend1 = unix.UnixStreamTendril('manager', self.sock)
+        tend2 = unix.UnixStreamTendril('manager', self.sock)
+
+        self.assertEqual(tend1._tendril_key,
+                         ('/tmp/sock', '', tend1._conn_id))
+        self.assertNotEqual(tend1._tendril_key, tend2._tendril_key)
+
+    def test_set_tcp_option(self):
+        tend = unix.UnixStreamTendril('manager', self.sock)
+
+        tend.nodelay = True
+        tend.cork()
+
+        self.assertEqual(tend.nodelay, None)
+        self.assertEqual(tend.corked, True)
+        self.assertFalse(self.sock.setsockopt.called)
+
+    @mock.patch.object(unix, 'SO_PEERCRED', 17)
+    def test_peer_credentials(self):
+        self.sock.getsockopt.return_value = unix._ucred.pack(123, 456, 789)
+        tend = unix.UnixStreamTendril('manager', self.sock)
+
+        self.assertEqual(tend.peer_credentials, (123, 456, 789))
+        self.assertEqual(tend.peer_credentials, (123, 456, 789))
+        self.sock.getsockopt.assert_called_once_with(
+            socket.SOL_SOCKET, 17, unix._ucred.size)
+
+    @mock.patch.object(unix, 'SO_PEERCRED', None)
+    def test_peer_credentials_unsupported(self):
+        tend = unix.UnixStreamTendril('manager', self.sock)
+
+        self.assertEqual(tend.peer_credentials, None)
+        self.assertFalse(self.sock.getsockopt.called)
+
+
+class TestUnixSeqpacketTendril(unittest.TestCase):
+    def setUp(self):
+        self.sock = mock.Mock(**{
+            'getsockname.return_value': '/tmp/sock',
+            'getpeername.return_value': '',
+        })
+
+    def test_init(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+
+        self.assertEqual(tend.proto, 'unixseqpacket')
+        self.assertEqual(tend.recv_bufsize, 65536)
+        self.assertIsInstance(tend._send_framer, framers.IdentityFramer)
+        self.assertEqual(len(tend._sendq), 0)
+        self.assertEqual(tend._sendq_len, 0)
+
+    def test_send_stream(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+
+        tend._send_stream('msg1')
+        tend._send_stream('message2')
+
+        self.assertEqual(list(tend._sendq), ['msg1', 'message2'])
+        self.assertEqual(tend.send_pending, 12)
+        self.assertEqual(tend.stats.send_buffered, 12)
+        self.assertFalse(tend._flush_event.is_set())
+        self.assertEqual(len(tend._send_times), 0)
+        self.assertEqual(tend._wake_send.call_count, 2)
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_send_stream_latency(self, mock_time):
+        tend = unix.UnixSeqpacketTendril(mock.Mock(), self.sock)
+        tend.stats.bytes_sent = 10
+
+        tend._send_stream('msg1')
+
+        self.assertEqual(list(tend._send_times), [(14, 1000.0)])
+
+    def test_send(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend._send_stream('msg1')
+        tend._send_stream('message2')
+        tend._send_lock = mock.MagicMock()
+        tend._send_thread = mock.Mock()
+
+        tend._send()
+
+        self.assertEqual(tend._send_thread, None)
+
+        self.sock.send.assert_has_calls([
+            mock.call('msg1'),
+            mock.call('message2'),
+        ])
+        self.assertEqual(len(tend._sendq), 0)
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 12)
+        self.assertEqual(tend.stats.partial_sends, 0)
+        self.assertEqual(tend.stats.send_buffered, 0)
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertEqual(tend.flush(), True)
+
+    def test_send_error(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        self.sock.send.side_effect = TestException()
+        tend._send_stream('msg1')
+        tend._send_lock = mock.MagicMock()
+
+        self.assertRaises(TestException, tend._send)
+
+        self.assertEqual(list(tend._sendq), ['msg1'])
+        self.assertEqual(tend.send_pending, 4)
+
+    def test_send_priority(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend._send_stream('bulk', -1)
+        tend._send_stream('msg1')
+        tend._send_stream('ping', 2)
+        tend._send_stream('pong', 1)
+
+        self.assertEqual(list(tend._sendq), ['msg1'])
+        self.assertEqual(tend.send_pending, 16)
+        self.assertEqual(tend.stats.send_buffered, 16)
+
+        tend._send_lock = mock.MagicMock()
+        tend._send()
+
+        self.assertEqual(self.sock.send.call_args_list, [
+            mock.call('ping'),
+            mock.call('pong'),
+            mock.call('msg1'),
+            mock.call('bulk'),
+        ])
+        self.assertEqual(tend.send_pending, 0)
+        self.assertEqual(tend.stats.bytes_sent, 16)
+        self.assertEqual(len(tend._frame_ends), 0)
+        self.assertTrue(tend._flush_event.is_set())
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_send_priority_latency(self, mock_time):
+        latency = stats.LatencyStats()
+        tend = unix.UnixSeqpacketTendril(
+            mock.Mock(latency=latency, coalesce_delay=None), self.sock)
+        tend._send_stream('msg1')
+        tend._send_stream('ping', 1)
+        tend._send_lock = mock.MagicMock()
+
+        tend._send()
+
+        self.assertEqual(len(tend._send_times), 0)
+        self.assertEqual(len(tend._frame_ends), 0)
+        self.assertEqual(latency.send_queue.count, 2)
+
+    def test_shift_offsets(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend.stats.bytes_sent = 10
+        tend._send_times.append((14, 1.0))
+
+        tend._shift_offsets([('ping', 2.0), ('pong', None)])
+
+        self.assertEqual(list(tend._send_times), [(14, 2.0), (22, 1.0)])
+        self.assertEqual(len(tend._frame_ends), 0)
+
+    def test_shift_offsets_nolatency(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        send_times = tend._send_times
+
+        tend._shift_offsets([('ping', None), ('pong', None)])
+
+        self.assertIs(tend._send_times, send_times)
+        self.assertEqual(len(tend._send_times), 0)
+        self.assertEqual(len(tend._frame_ends), 0)
+
+    def test_send_corked(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend.cork()
+        tend._send_stream('msg1')
+        tend._send_lock = mock.MagicMock()
+
+        tend._send()
+
+        self.assertFalse(tend._wake_send.called)
+        self.assertFalse(self.sock.send.called)
+        self.assertFalse(tend._flush_event.is_set())
+
+        tend.uncork()
+        tend._send()
+
+        tend._wake_send.assert_called_once_with()
+        self.sock.send.assert_called_once_with('msg1')
+        self.assertTrue(tend._flush_event.is_set())
+
+    def test_flush_coalesce(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend._send_stream('msg1')
+
+        tend.flush(0.01)
+
+        self.assertTrue(tend._coalesce_event.is_set())
+
+    def test_send_file(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+
+        self.assertRaises(ValueError, tend.send_file, 'file', 0, 10)
+        self.assertEqual(tend.send_pending, 0)
+
+    def test_flush_timeout(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend._send_stream('msg1')
+
+        self.assertEqual(tend.flush(0.01), False)
+
+    def test_flush_after_close(self):
+        tend = unix.UnixSeqpacketTendril('manager', self.sock)
+        tend._wake_send = mock.Mock()
+        tend._sock = None
+
+        tend._send_stream('msg1')
+
+        self.assertTrue(tend._flush_event.is_set())
+        self.assertEqual(tend.flush(), False)
+
+
+@mock.patch.dict(manager.TendrilManager._managers)
+@mock.patch.dict(manager.TendrilManager._running_managers)
+class TestUnixStreamTendrilManager(unittest.TestCase):
+    def test_init(self):
+        mgr = unix.UnixStreamTendrilManager('/tmp/sock')
+
+        self.assertEqual(mgr.endpoint, '/tmp/sock')
+        self.assertEqual(mgr.addr_family, socket.AF_UNIX)
+        self.assertEqual(mgr.proto, 'unix')
+        self.assertEqual(mgr._bind_addr, '/tmp/sock')
+
+    def test_init_noendpoint(self):
+        mgr = unix.UnixStreamTendrilManager()
+
+        self.assertEqual(mgr.addr_family, socket.AF_UNIX)
+        self.assertEqual(mgr._bind_addr, None)
+
+    def test_init_badendpoint(self):
+        self.assertRaises(ValueError, unix.UnixStreamTendrilManager,
+                          ('127.0.0.1', 8080))
+
+    def test_init_default_endpoint(self):
+        mgr = unix.UnixStreamTendrilManager(('', 0))
+
+        self.assertEqual(mgr.addr_family, socket.AF_UNIX)
+        self.assertEqual(mgr._bind_addr, None)
+
+    @mock.patch.object(unix, 'UnixStreamTendril', return_value='tendril')
+    def test_make_tendril(self, mock_UnixStreamTendril):
+        mgr = unix.UnixStreamTendrilManager()
+
+        result = mgr._make_tendril('sock', '')
+
+        self.assertEqual(result, 'tendril')
+        mock_UnixStreamTendril.assert_called_once_with(mgr, 'sock', '')
+
+    @mock.patch.object(socket, 'socket')
+    def test_connect_sock(self, mock_socket):
+        sock = mock_socket.return_value
+        mgr = unix.UnixStreamTendrilManager()
+
+        result = mgr._connect_sock('/tmp/sock')
+
+        self.assertEqual(id(result), id(sock))
+        mock_socket.assert_called_once_with(socket.AF_UNIX,
+                                            socket.SOCK_STREAM)
+        sock.assert_has_calls([mock.call.connect('/tmp/sock')])
+        self.assertFalse(sock.bind.called)
+        self.assertFalse(sock.settimeout.called)
+        self.assertFalse(sock.setsockopt.called)
+
+    @mock.patch.object(socket, 'socket')
+    def test_connect_sock_endpoint(self, mock_socket):
+        sock = mock_socket.return_value
+        mgr = unix.UnixStreamTendrilManager('/tmp/client')
+        mgr.keepalive = True
+
+        mgr._connect_sock('/tmp/sock', 5.0)
+
+        sock.assert_has_calls([
+            mock.call.settimeout(5.0),
+            mock.call.connect('/tmp/sock'),
+            mock.call.settimeout(None),
+        ])
+        self.assertFalse(sock.bind.called)
+        self.assertFalse(sock.setsockopt.called)
+
+    @mock.patch.object(socket, 'socket')
+    def test_connect_sock_error(self, mock_socket):
+        sock = mock_socket.return_value
+        sock.connect.side_effect = TestException()
+        mgr = unix.UnixStreamTendrilManager()
+
+        self.assertRaises(TestException, mgr._connect_sock, '/tmp/sock')
+        sock.close.assert_called_once_with()
+
+    @mock.patch.object(unix, '_remove_stale')
+    @mock.patch.object(socket, 'socket')
+    def test_listen_sock(self, mock_socket, mock_remove_stale):
+        sock = mock_socket.return_value
+        sock.getsockname.return_value = '/tmp/sock'
+        wrapped = mock.Mock()
+        wrapper = mock.Mock(return_value=wrapped)
+        mgr = unix.UnixStreamTendrilManager('/tmp/sock')
+
+        result = mgr._listen_sock(wrapper)
+
+        self.assertEqual(id(result), id(wrapped))
+        mock_remove_stale.assert_called_once_with('/tmp/sock',
+                                                  socket.SOCK_STREAM)
+        mock_socket.assert_called_once_with(socket.AF_UNIX,
+                                            socket.SOCK_STREAM)
+        sock.assert_has_calls([
+            mock.call.bind('/tmp/sock'),
+            mock.call.getsockname(),
+        ])
+        self.assertFalse(sock.setsockopt.called)
+        wrapper.assert_called_once_with(sock)
+        wrapped.listen.assert_called_once_with(1024)
+        self.assertEqual(mgr._local_addr, '/tmp/sock')
+
+    @mock.patch.object(unix, '_remove_stale')
+    @mock.patch.object(socket, 'socket')
+    def test_listen_sock_abstract(self, mock_socket, mock_remove_stale):
+        mgr = unix.UnixStreamTendrilManager('\0sock')
+
+        mgr._listen_sock(None)
+
+        self.assertFalse(mock_remove_stale.called)
+        mock_socket.return_value.bind.assert_called_once_with('\0sock')
+
+    def test_listen_sock_noendpoint(self):
+        mgr = unix.UnixStreamTendrilManager()
+
+        self.assertRaises(ValueError, mgr._listen_sock, None)
+
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(tcp.TCPTendrilManager, 'listener',
+                       side_effect=TestException())
+    def test_listener_cleanup(self, mock_listener, mock_unlink):
+        mgr = unix.UnixStreamTendrilManager('/tmp/sock')
+        mgr._local_addr = '/tmp/sock'
+
+        self.assertRaises(TestException, mgr.listener, 'acceptor',
+                          'wrapper')
+
+        mock_listener.assert_called_once_with('acceptor', 'wrapper')
+        mock_unlink.assert_called_once_with('/tmp/sock')
+
+    @mock.patch.object(os, 'unlink', side_effect=OSError())
+    @mock.patch.object(tcp.TCPTendrilManager, 'listener',
+                       side_effect=TestException())
+    def test_listener_cleanup_error(self, mock_listener, mock_unlink):
+        mgr = unix.UnixStreamTendrilManager('/tmp/sock')
+        mgr._local_addr = '/tmp/sock'
+
+        self.assertRaises(TestException, mgr.listener, 'acceptor',
+                          'wrapper')
+
+        mock_unlink.assert_called_once_with('/tmp/sock')
+
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(tcp.TCPTendrilManager, 'listener',
+                       side_effect=TestException())
+    def test_listener_not_bound(self, mock_listener, mock_unlink):
+        mgr = unix.UnixStreamTendrilManager('/tmp/sock')
+
+        self.assertRaises(TestException, mgr.listener, 'acceptor',
+                          'wrapper')
+
+        self.assertFalse(mock_unlink.called)
+
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(tcp.TCPTendrilManager, 'listener',
+                       side_effect=TestException())
+    def test_listener_abstract(self, mock_listener, mock_unlink):
+        mgr = unix.UnixStreamTendrilManager('\0sock')
+        mgr._local_addr = '\0sock'
+
+        self.assertRaises(TestException, mgr.listener, 'acceptor',
+                          'wrapper')
+
+        self.assertFalse(mock_unlink.called)
+
+
+@mock.patch.dict(manager.TendrilManager._managers)
+@mock.patch.dict(manager.TendrilManager._running_managers)
+class TestUnixSeqpacketTendrilManager(unittest.TestCase):
+    def test_init(self):
+        mgr = unix.UnixSeqpacketTendrilManager('/tmp/sock')
+
+        self.assertEqual(mgr.proto, 'unixseqpacket')
+        self.assertEqual(mgr.sock_type, socket.SOCK_SEQPACKET)
+        self.assertEqual(mgr.addr_family, socket.AF_UNIX)
+
+    @mock.patch.object(unix, 'UnixSeqpacketTendril', return_value='tendril')
+    def test_make_tendril(self, mock_UnixSeqpacketTendril):
+        mgr = unix.UnixSeqpacketTendrilManager()
+
+        result = mgr._make_tendril('sock')
+
+        self.assertEqual(result, 'tendril')
+        mock_UnixSeqpacketTendril.assert_called_once_with(mgr, 'sock')
+
+    @mock.patch.object(socket, 'socket')
+    def test_connect_sock(self, mock_socket):
+        mgr = unix.UnixSeqpacketTendrilManager()
+
+        mgr._connect_sock('/tmp/sock')
+
+        mock_socket.assert_called_once_with(socket.AF_UNIX,
+                                            socket.SOCK_SEQPACKET)
+
+    @mock.patch.object(unix, '_remove_stale')
+    @mock.patch.object(socket, 'socket')
+    def test_listen_sock(self, mock_socket, mock_remove_stale):
+        mgr = unix.UnixSeqpacketTendrilManager('/tmp/sock')
+
+        mgr._listen_sock(None)
+
+        mock_socket.assert_called_once_with(socket.AF_UNIX,
+                                            socket.SOCK_SEQPACKET)
+        mock_remove_stale.assert_called_once_with('/tmp/sock',
+                                                  socket.SOCK_SEQPACKET)
+
+
+class TestUnixDgramTendril(unittest.TestCase):
+    def test_init(self):
+        tend = unix.UnixDgramTendril('manager', '/tmp/sock', None)
+
+        self.assertEqual(tend.proto, 'unixdgram')
+        self.assertEqual(tend._tendril_key, ('/tmp/sock', None))
+        self.assertIsInstance(tend, udp.UDPTendril)
+
+
+@mock.patch.dict(manager.TendrilManager._managers)
+@mock.patch.dict(manager.TendrilManager._running_managers)
+class TestUnixDgramTendrilManager(unittest.TestCase):
+    def test_init(self):
+        mgr = unix.UnixDgramTendrilManager('/tmp/sock')
+
+        self.assertEqual(mgr.endpoint, '/tmp/sock')
+        self.assertEqual(mgr.proto, 'unixdgram')
+        self.assertEqual(mgr.addr_family, socket.AF_UNIX)
+        self.assertEqual(mgr.recv_bufsize, 65536)
+        self.assertEqual(mgr._sock, None)
+
+    def test_init_badendpoint(self):
+        self.assertRaises(ValueError, unix.UnixDgramTendrilManager,
+                          ('127.0.0.1', 8080))
+
+    @mock.patch.object(unix, 'UnixDgramTendril', return_value='tendril')
+    def test_make_tendril(self, mock_UnixDgramTendril):
+        mgr = unix.UnixDgramTendrilManager()
+
+        result = mgr._make_tendril('/tmp/local', '/tmp/remote')
+
+        self.assertEqual(result, 'tendril')
+        mock_UnixDgramTendril.assert_called_once_with(
+            mgr, '/tmp/local', '/tmp/remote')
+
+    @mock.patch.object(unix, '_remove_stale')
+    @mock.patch.object(socket, 'socket')
+    def test_listen_sock(self, mock_socket, mock_remove_stale):
+        sock = mock_socket.return_value
+        sock.getsockname.return_value = '/tmp/sock'
+        wrapped = mock.Mock()
+        wrapper = mock.Mock(return_value=wrapped)
+        mgr = unix.UnixDgramTendrilManager('/tmp/sock')
+
+        result = mgr._listen_sock(wrapper)
+
+        self.assertEqual(id(result), id(wrapped))
+        mock_socket.assert_called_once_with(socket.AF_UNIX,
+                                            socket.SOCK_DGRAM)
+        mock_remove_stale.assert_called_once_with('/tmp/sock',
+                                                  socket.SOCK_DGRAM)
+        sock.bind.assert_called_once_with('/tmp/sock')
+        wrapper.assert_called_once_with(sock)
+        self.assertEqual(mgr._local_addr, '/tmp/sock')
+
+    @mock.patch.object(unix, '_remove_stale')
+    @mock.patch.object(socket, 'socket')
+    def test_listen_sock_autobind(self, mock_socket, mock_remove_stale):
+        sock = mock_socket.return_value
+        sock.getsockname.return_value = '\0abcde'
+        mgr = unix.UnixDgramTendrilManager()
+
+        result = mgr._listen_sock(None)
+
+        self.assertEqual(id(result), id(sock))
+        self.assertFalse(mock_remove_stale.called)
+        sock.bind.assert_called_once_with('')
+        self.assertEqual(mgr._local_addr, '\0abcde')
+
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(udp.UDPTendrilManager, 'listener',
+                       side_effect=TestException())
+    def test_listener_cleanup(self, mock_listener, mock_unlink):
+        mgr = unix.UnixDgramTendrilManager('/tmp/sock')
+        mgr._local_addr = '/tmp/sock'
+
+        self.assertRaises(TestException, mgr.listener, 'acceptor',
+                          'wrapper')
+
+        mock_listener.assert_called_once_with('acceptor', 'wrapper')
+        mock_unlink.assert_called_once_with('/tmp/sock')
@@ -14,12 +14,15 @@
 ## along with this program.  If not, see
 ## <http://www.gnu.org/licenses/>.
 
+import sys
 import unittest
 
 import gevent
 from gevent import socket
+from gevent import ssl
 import mock
 
+from tendril import stats
 from tendril import utils
 
 
@@ -89,6 +92,124 @@ class TestWrapperChain(unittest.TestCase):
         chain._wrappers[2].assert_called_once_with("sock3")
 
 
+class TestTLSWrapper(unittest.TestCase):
+    def test_init(self):
+        wrapper = utils.TLSWrapper('context')
+
+        self.assertEqual(wrapper.context, 'context')
+        self.assertEqual(wrapper.server_side, False)
+        self.assertEqual(wrapper.server_hostname, None)
+        self.assertIsInstance(wrapper.handshake_time,
+                              stats.LatencyHistogram)
+        self.assertIsInstance(wrapper._stats, stats.TLSStats)
+
+    @mock.patch.object(ssl, 'create_default_context',
+                       return_value='context')
+    def test_init_default_context(self, mock_create_default_context):
+        wrapper = utils.TLSWrapper(server_hostname='example.com')
+
+        mock_create_default_context.assert_called_once_with(
+            ssl.Purpose.SERVER_AUTH)
+        self.assertEqual(wrapper.context, 'context')
+        self.assertEqual(wrapper.server_hostname, 'example.com')
+
+    @mock.patch.object(ssl, 'create_default_context',
+                       return_value='context')
+    def test_init_default_context_server(self, mock_create_default_context):
+        wrapper = utils.TLSWrapper(server_side=True)
+
+        mock_create_default_context.assert_called_once_with(
+            ssl.Purpose.CLIENT_AUTH)
+        self.assertEqual(wrapper.server_side, True)
+
+    @mock.patch('time.time', side_effect=[1.0, 1.5])
+    def test_call(self, mock_time):
+        sock = mock.Mock()
+        context = mock.Mock(**{'wrap_socket.return_value': sock})
+        wrapper = utils.TLSWrapper(context, server_hostname='example.com')
+
+        result = wrapper('sock')
+
+        self.assertEqual(id(result), id(sock))
+        context.wrap_socket.assert_called_once_with(
+            'sock', do_handshake_on_connect=False,
+            server_hostname='example.com')
+        sock.do_handshake.assert_called_once_with()
+        self.assertEqual(wrapper._stats.handshakes, 1)
+        self.assertEqual(wrapper._stats.handshake_errors, 0)
+        self.assertEqual(wrapper.handshake_time.count, 1)
+        self.assertEqual(wrapper.handshake_time.min, 500000)
+
+    @mock.patch('time.time', return_value=1.0)
+    def test_call_error(self, mock_time):
+        sock = mock.Mock(**{'do_handshake.side_effect': TestException()})
+        context = mock.Mock(**{'wrap_socket.return_value': sock})
+        wrapper = utils.TLSWrapper(context)
+
+        self.assertRaises(TestException, wrapper, 'sock')
+
+        self.assertEqual(wrapper._stats.handshakes, 0)
+        self.assertEqual(wrapper._stats.handshake_errors, 1)
+        self.assertEqual(wrapper.handshake_time.count, 0)
+
+    @mock.patch('time.time', side_effect=[1.0, 1.5])
+    def test_call_hostname(self, mock_time):
+        sock = mock.Mock()
+        context = mock.Mock(**{'wrap_socket.return_value': sock})
+        wrapper = utils.TLSWrapper(context, server_hostname='example.com')
+
+        result = utils.TendrilPartial(
+            wrapper, server_hostname='other.example.com')('sock')
+
+        self.assertEqual(id(result), id(sock))
+        context.wrap_socket.assert_called_once_with(
+            'sock', do_handshake_on_connect=False,
+            server_hostname='other.example.com')
+        self.assertEqual(wrapper._stats.handshakes, 1)
+
+    @mock.patch('time.time', return_value=1.0)
+    def test_call_wrap_error(self, mock_time):
+        context = mock.Mock(**{'wrap_socket.side_effect': ValueError()})
+        wrapper = utils.TLSWrapper(context)
+
+        self.assertRaises(ValueError, wrapper, 'sock')
+
+        self.assertEqual(wrapper._stats.handshakes, 0)
+        self.assertEqual(wrapper._stats.handshake_errors, 1)
+        self.assertEqual(wrapper.handshake_time.count, 0)
+
+    def test_call_server(self):
+        context = mock.Mock(**{'wrap_socket.return_value': 'wrapped'})
+        wrapper = utils.TLSWrapper(context, server_side=True)
+
+        result = wrapper('sock')
+
+        self.assertEqual(result, 'wrapped')
+        context.wrap_socket.assert_called_once_with('sock',
+                                                    server_side=True)
+        self.assertEqual(wrapper._stats.handshakes, 0)
+
+    def test_stats(self):
+        context = mock.Mock(**{'session_stats.return_value': {
+            'hits': 3L,
+            'misses': 1L,
+            'accept': 4L,
+        }})
+        wrapper = utils.TLSWrapper(context)
+        wrapper._stats.handshakes = 2
+
+        result = wrapper.stats
+
+        self.assertEqual(id(result), id(wrapper._stats))
+        self.assertEqual(result.snapshot(), {
+            'handshakes': 2,
+            'handshake_errors': 0,
+            'session_hits': 3,
+            'session_misses': 1,
+        })
+
+
+@mock.patch.dict(utils._addr_cache, clear=True)
 class TestAddrInfo(unittest.TestCase):
     def test_accept_unix(self):
         result = utils.addr_info('unixaddr')
@@ -142,6 +263,85 @@ class TestAddrInfo(unittest.TestCase):
     def test_reject_unknown(self):
         self.assertRaises(ValueError, utils.addr_info, ('unknown', 8080))
 
+    def test_reject_unhashable(self):
+        self.assertRaises(ValueError, utils.addr_info, (['::1'], 8080))
+
+
+@mock.patch.dict(utils._addr_cache, clear=True)
+class TestIpFamily(unittest.TestCase):
+    @mock.patch.object(utils, '_classify_ip', return_value=socket.AF_INET)
+    def test_cached(self, mock_classify_ip):
+        result1 = utils._ip_family('127.0.0.1')
+        result2 = utils._ip_family('127.0.0.1')
+
+        self.assertEqual(result1, socket.AF_INET)
+        self.assertEqual(result2, socket.AF_INET)
+        mock_classify_ip.assert_called_once_with('127.0.0.1')
+        self.assertEqual(utils._addr_cache, {'127.0.0.1': socket.AF_INET})
+
+    @mock.patch.object(utils, '_classify_ip', return_value=None)
+    def test_cached_invalid(self, mock_classify_ip):
+        result1 = utils._ip_family('unknown')
+        result2 = utils._ip_family('unknown')
+
+        self.assertEqual(result1, None)
+        self.assertEqual(result2, None)
+        mock_classify_ip.assert_called_once_with('unknown')
+
+    @mock.patch.object(utils, 'ADDR_CACHE_SIZE', 2)
+    @mock.patch.object(utils, '_classify_ip', return_value=socket.AF_INET)
+    def test_full(self, mock_classify_ip):
+        utils._ip_family('10.0.0.1')
+        utils._ip_family('10.0.0.2')
+        utils._ip_family('10.0.0.1')
+        utils._ip_family('10.0.0.3')
+
+        self.assertEqual(utils._addr_cache, {'10.0.0.3': socket.AF_INET})
+        self.assertEqual(mock_classify_ip.call_count, 3)
+
+    def test_unhashable(self):
+        result = utils._ip_family(['::1'])
+
+        self.assertEqual(result, None)
+        self.assertEqual(utils._addr_cache, {})
+
+
+class TestClassifyIp(unittest.TestCase):
+    def test_ipv6(self):
+        self.assertEqual(utils._classify_ip('::1'), socket.AF_INET6)
+        self.assertEqual(utils._classify_ip('::ffff:127.0.0.1'),
+                         socket.AF_INET6)
+
+    def test_ipv4(self):
+        self.assertEqual(utils._classify_ip('127.0.0.1'), socket.AF_INET)
+
+    def test_invalid(self):
+        self.assertEqual(utils._classify_ip('unknown'), None)
+        self.assertEqual(utils._classify_ip('127.0.0.256'), None)
+        self.assertEqual(utils._classify_ip(u'\u2603'), None)
+        self.assertEqual(utils._classify_ip(None), None)
+
+    @mock.patch.object(utils, 'socket', mock.Mock(spec=[
+        'AF_INET', 'AF_INET6']))
+    def test_netaddr(self):
+        mock_netaddr = mock.Mock(**{
+            'valid_ipv6.return_value': False,
+            'valid_ipv4.return_value': True,
+        })
+
+        with mock.patch.dict(sys.modules, netaddr=mock_netaddr):
+            result = utils._classify_ip('127.0.0.1')
+
+        self.assertEqual(result, utils.socket.AF_INET)
+        mock_netaddr.valid_ipv6.assert_called_once_with('127.0.0.1')
+        mock_netaddr.valid_ipv4.assert_called_once_with('127.0.0.1')
+
+    @mock.patch.object(utils, 'socket', mock.Mock(spec=[
+        'AF_INET', 'AF_INET6']))
+    @mock.patch.dict(sys.modules, netaddr=None)
+    def test_no_inet_pton_or_netaddr(self):
+        self.assertRaises(RuntimeError, utils._classify_ip, '127.0.0.1')
+
 
 class TestException(Exception):
     pass
@@ -172,6 +372,14 @@ class TestSocketCloser(unittest.TestCase):
         self.assertEqual(closer.errors, None)
         self.assertEqual(closer.ignore, frozenset([TestException]))
 
+    def test_init_on_trip(self):
+        closer = utils.SocketCloser('sock', 10, on_trip='on_trip')
+
+        self.assertEqual(closer.sock, 'sock')
+        self.assertEqual(closer.err_thresh, 10)
+        self.assertEqual(closer.errors, 0)
+        self.assertEqual(closer.on_trip, 'on_trip')
+
     def test_enter(self):
         closer = utils.SocketCloser('sock')
         result = closer.__enter__()
@@ -256,6 +464,34 @@ class TestSocketCloser(unittest.TestCase):
         sock.close.assert_called_once_with()
         self.assertEqual(closer.errors, 1)
 
+    def test_exit_error_thresh_on_trip(self):
+        sock = mock.Mock()
+        on_trip = mock.Mock()
+        closer = utils.SocketCloser(sock, 1, on_trip=on_trip)
+
+        result = closer.__exit__(TestException, TestException('foo'), [])
+
+        self.assertEqual(result, True)
+        self.assertFalse(on_trip.called)
+
+        result = closer.__exit__(TestException, TestException('foo'), [])
+
+        self.assertEqual(result, None)
+        sock.close.assert_called_once_with()
+        on_trip.assert_called_once_with(closer)
+
+    def test_exit_kill_thresh_on_trip(self):
+        sock = mock.Mock()
+        on_trip = mock.Mock()
+        closer = utils.SocketCloser(sock, 10, on_trip=on_trip)
+
+        result = closer.__exit__(gevent.GreenletExit, gevent.GreenletExit(),
+                                 [])
+
+        self.assertEqual(result, None)
+        sock.close.assert_called_once_with()
+        self.assertFalse(on_trip.called)
+
     def test_exit_kill_thresh(self):
         sock = mock.Mock()
         closer = utils.SocketCloser(sock, 10)